@@ -7,6 +7,8 @@ from flask_login import LoginManager
 from flask_caching import Cache
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from datetime import datetime, timedelta
 import logging
 import atexit
 import fcntl
@@ -224,7 +226,7 @@ class SensitiveDataFilter(logging.Filter):
 
 # Set up logging with sensitive data filter
 # Use persistent log directory that survives container restarts
-from logging.handlers import RotatingFileHandler
+from app.logging_config import configure_logging
 
 # Persistent log directory - /app/data/logs in Docker, or local data/logs for development
 log_dir = os.environ.get('LOG_DIR', '/app/data/logs')
@@ -238,33 +240,13 @@ if not os.path.exists(log_dir):
 
 log_file = os.path.join(log_dir, 'flask.log')
 
-# Create handlers with rotation (5MB max, keep 5 backup files)
-file_handler = RotatingFileHandler(
-    log_file,
-    maxBytes=5*1024*1024,  # 5MB
-    backupCount=5,
-    encoding='utf-8'
-)
-console_handler = logging.StreamHandler()
-
-# Add filter to both handlers
+# Redaction, formatting and file/console output run on a background listener thread
 sensitive_filter = SensitiveDataFilter()
-file_handler.addFilter(sensitive_filter)
-console_handler.addFilter(sensitive_filter)
-
-# Set format for handlers
-log_format = logging.Formatter(
-    '%(asctime)s [%(levelname)s] %(name)s: %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-file_handler.setFormatter(log_format)
-console_handler.setFormatter(log_format)
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    handlers=[file_handler, console_handler]
+log_listener = configure_logging(
+    log_file,
+    sensitive_filter,
+    level=os.environ.get('LOG_LEVEL', 'DEBUG'),
+    debug_sample=os.environ.get('LOG_DEBUG_SAMPLE'),
 )
 logger = logging.getLogger(__name__)
 logger.info(f"Logging to persistent file: {log_file}")
@@ -339,6 +321,22 @@ def create_app(config_class=Config):
     migrate.init_app(app, db)
     login.init_app(app)
 
+    # SQLite: WAL journaling and tuned pragmas on every connection (before the first one opens),
+    # and one writer thread that batches the background jobs' commits
+    from app.db_writer import WriteQueue, configure_sqlite_engine
+    with app.app_context():
+        if configure_sqlite_engine(db.engine):
+            logger.info("SQLite configured for WAL journaling")
+    app.config['DB_WRITE_QUEUE'] = WriteQueue(app)
+
+    # Minute energy samples are written behind, in batches (flushed as the writer stops)
+    from app.energy_buffer import EnergySampleBuffer
+    app.config['ENERGY_SAMPLE_BUFFER'] = EnergySampleBuffer(app.config['DB_WRITE_QUEUE'])
+
+    # Live updates (prices, power flow, curtailment, syncs) pushed to /api/events streams
+    from app.live_events import LiveEventBroker
+    app.config['LIVE_EVENTS'] = LiveEventBroker()
+
     # Automatically run database migrations on startup
     with app.app_context():
         try:
@@ -373,6 +371,16 @@ def create_app(config_class=Config):
         except Exception as e:
             logger.warning(f"Schema repair skipped: {e}")
 
+        # Monthly history partitions for the months ahead (PostgreSQL with HISTORY_PARTITIONING only)
+        try:
+            from app.partitioning import ensure_history_partitions
+            with db.engine.begin() as conn:
+                created = ensure_history_partitions(conn)
+            if created:
+                logger.info(f"Created history partitions: {', '.join(created)}")
+        except Exception as e:
+            logger.warning(f"History partition check skipped: {e}")
+
     # Initialize Flask-Caching for API response caching
     app.config['CACHE_TYPE'] = 'SimpleCache'  # In-memory cache
     app.config['CACHE_DEFAULT_TIMEOUT'] = 300  # Default 5 minutes
@@ -425,6 +433,11 @@ def create_app(config_class=Config):
         logger.info(f"RESPONSE: {request.method} {request.path} -> {response.status_code}")
         return response
 
+    # ETags, 304s and gzip/brotli for the JSON APIs opted in with @compressed_json()
+    # (registered after log_response so it runs first and the 304s are logged)
+    from app.compression import init_response_compression
+    init_response_compression(app)
+
     # Initialize background scheduler for automatic TOU syncing and price history
     # Use file locking to ensure only ONE worker (in multi-worker setup) runs the scheduler
     lock_file_path = os.path.join(app.instance_path, 'scheduler.lock')
@@ -444,7 +457,7 @@ def create_app(config_class=Config):
         scheduler = BackgroundScheduler()
 
         # Add jobs for smart TOU sync (3-stage approach)
-        from app.tasks import sync_initial_forecast, sync_rest_api_check, save_price_history, save_energy_usage, monitor_aemo_prices, solar_curtailment_check, demand_period_grid_charging_check, check_manual_discharge_expiry, check_manual_charge_expiry
+        from app.tasks import sync_initial_forecast, sync_rest_api_check, save_price_history, save_energy_usage, apply_history_retention, backfill_energy_history, monitor_aemo_prices, solar_curtailment_check, demand_period_grid_charging_check, check_manual_discharge_expiry, check_manual_charge_expiry
 
         # Wrapper functions to run tasks within app context
         def run_sync_initial_forecast():
@@ -474,6 +487,14 @@ def create_app(config_class=Config):
             with app.app_context():
                 save_energy_usage()
 
+        def run_apply_history_retention():
+            with app.app_context():
+                apply_history_retention()
+
+        def run_backfill_energy_history():
+            with app.app_context():
+                backfill_energy_history()
+
         def run_monitor_aemo_prices():
             with app.app_context():
                 monitor_aemo_prices()
@@ -543,6 +564,26 @@ def create_app(config_class=Config):
             replace_existing=True
         )
 
+        # Add job to apply history retention nightly - overnight across the NEM (the container clock is
+        # usually UTC) and clear of the :00/:05 sync jobs
+        scheduler.add_job(
+            func=run_apply_history_retention,
+            trigger=CronTrigger(hour=3, minute=17, second=20, timezone='Australia/Brisbane'),
+            id='apply_history_retention',
+            name='Apply retention to price and energy history',
+            replace_existing=True
+        )
+
+        # Roll up history recorded before the energy_rollup / energy_ledger tables existed, once,
+        # shortly after startup (a no-op once every user's history is covered)
+        scheduler.add_job(
+            func=run_backfill_energy_history,
+            trigger=DateTrigger(run_date=datetime.now() + timedelta(seconds=30)),
+            id='backfill_energy_history',
+            name='Backfill energy rollups and ledger from existing history',
+            replace_existing=True
+        )
+
         # Add job to monitor AEMO prices every 1 minute for spike detection (more responsive to price spikes)
         scheduler.add_job(
             func=run_monitor_aemo_prices,
@@ -600,6 +641,8 @@ def create_app(config_class=Config):
         logger.info("  - Solar curtailment: WebSocket event-driven + REST API fallback at :01")
         logger.info("  - Price history: WebSocket event-driven + REST API fallback at :01")
         logger.info("  - Energy usage: every minute (Teslemetry allows 1/min)")
+        logger.info("  - History retention: nightly at 03:17 (Australia/Brisbane)")
+        logger.info("  - Energy history backfill: once, 30s after startup")
         logger.info("  - AEMO monitoring: every minute at :35 seconds")
         logger.info("  - Demand period grid charging: every 1 minute at :45 seconds")
 
@@ -661,6 +704,18 @@ def create_app(config_class=Config):
 
         return websocket_sync_callback
 
+    def create_websocket_price_listener(site_id):
+        """Create listener that pushes every WebSocket price update to the site's live event streams."""
+        from app.live_events import amber_site_topic, price_list
+
+        def websocket_price_listener(prices_data):
+            app.config['LIVE_EVENTS'].publish(amber_site_topic(site_id), 'price', {
+                'prices': price_list(prices_data),
+                'source': 'websocket',
+            })
+
+        return websocket_price_listener
+
     # Define function to initialize/reinitialize WebSocket client
     def init_websocket_client(api_token, site_id):
         """
@@ -687,7 +742,8 @@ def create_app(config_class=Config):
             ws_client = AmberWebSocketClient(
                 api_token,
                 site_id,
-                sync_callback=create_websocket_sync_callback()
+                sync_callback=create_websocket_sync_callback(),
+                price_listener=create_websocket_price_listener(site_id)
             )
             ws_client.start()
 
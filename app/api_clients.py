@@ -2,6 +2,10 @@
 """API clients for Amber Electric and Tesla"""
 import requests
 import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
 from datetime import datetime, timedelta
 from app.utils import decrypt_token, encrypt_token
 import time
@@ -182,7 +186,7 @@ class AmberAPIClient:
             response.raise_for_status()
             data = response.json()
             logger.info(f"Successfully fetched current prices: {len(data)} channels")
-            logger.debug(f"Price data: {data}")
+            logger.debug("Price data: %s", data)
             return data
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching current prices: {e}")
@@ -303,7 +307,7 @@ class AmberAPIClient:
             response.raise_for_status()
             data = response.json()
             logger.info(f"Successfully fetched forecast: {len(data)} price points")
-            logger.debug(f"Forecast data sample: {data[:2] if len(data) > 0 else 'None'}")
+            logger.debug("Forecast data sample: %s", data[:2] if len(data) > 0 else 'None')
             return data
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching price forecast: {e}")
@@ -422,6 +426,8 @@ class FleetAPIClient(TeslaAPIClientBase):
         self.client_id = client_id
         self.client_secret = client_secret
         self.on_token_refresh = on_token_refresh
+        # Tesla rotates the refresh token, so threads sharing the client must refresh one at a time
+        self._refresh_lock = threading.Lock()
         self.base_url = self.BASE_URL
         self.headers = {
             "Authorization": f"Bearer {access_token}",
@@ -434,9 +440,20 @@ class FleetAPIClient(TeslaAPIClientBase):
         """
         Refresh the OAuth access token using refresh token
 
+        If another thread sharing this client refreshed while this one waited
+        for the lock, its token is used instead of refreshing again.
+
         Returns:
             dict: New token data with access_token and refresh_token
         """
+        expired_token = self.access_token
+        with self._refresh_lock:
+            if self.access_token != expired_token:
+                logger.info("Fleet API access token already refreshed by another thread")
+                return {"access_token": self.access_token, "refresh_token": self.refresh_token}
+            return self._refresh_access_token()
+
+    def _refresh_access_token(self):
         if not self.refresh_token:
             raise ValueError("No refresh token available for token refresh")
 
@@ -1886,8 +1903,43 @@ class TeslemetryAPIClient(TeslaAPIClientBase):
             }
 
 
+# Set inside shared_api_clients(): clients created so far, shared by everything in the block
+_shared_clients: ContextVar[Optional[dict]] = ContextVar('shared_api_clients', default=None)
+_shared_clients_lock = threading.Lock()
+
+
+@contextmanager
+def shared_api_clients():
+    """
+    Within this block get_amber_client / get_tesla_client create one client per
+    user and hand it to every caller, instead of decrypting tokens and opening a
+    new HTTP session each time. Threads run with a copy of the context
+    (contextvars.copy_context()) share the same clients.
+    """
+    token = _shared_clients.set({})
+    try:
+        yield
+    finally:
+        _shared_clients.reset(token)
+
+
+def _shared_client(kind: str, user, create):
+    clients = _shared_clients.get()
+    if clients is None:
+        return create(user)
+    key = (kind, user.id)
+    with _shared_clients_lock:
+        if key not in clients:
+            clients[key] = create(user)
+        return clients[key]
+
+
 def get_amber_client(user):
     """Get an Amber API client for the user with their selected site ID"""
+    return _shared_client('amber', user, _create_amber_client)
+
+
+def _create_amber_client(user):
     if not user.amber_api_token_encrypted:
         logger.warning(f"No Amber token for user {user.email}")
         return None
@@ -1965,7 +2017,7 @@ class AEMOAPIClient:
                         }
 
             logger.info(f"Successfully fetched AEMO prices for {len(prices)} regions")
-            logger.debug(f"AEMO price data: {prices}")
+            logger.debug("AEMO price data: %s", prices)
             return prices
 
         except requests.exceptions.RequestException as e:
@@ -2215,6 +2267,22 @@ def get_tesla_client(user):
     Returns:
         TeslaAPIClientBase instance (FleetAPIClient or TeslemetryAPIClient) or None
     """
+    return _shared_client('tesla', user, _create_tesla_client)
+
+
+# Seconds a thread sharing a Fleet API client waits for its refreshed tokens to be written
+TOKEN_WRITE_TIMEOUT = 30
+
+
+def write_fleet_api_tokens(user_id, tokens):
+    """Store a user's refreshed Fleet API tokens (database-writer job)"""
+    from sqlalchemy import update
+    from app import db
+    from app.models import User
+    db.session.execute(update(User).where(User.id == user_id).values(tokens))
+
+
+def _create_tesla_client(user):
 
     # Check for Fleet API configuration first
     if user.tesla_api_provider == 'fleet_api' and user.fleet_api_access_token_encrypted:
@@ -2237,20 +2305,41 @@ def get_tesla_client(user):
             if not client_secret:
                 client_secret = os.getenv('TESLA_CLIENT_SECRET')
 
-            # Callback to persist refreshed tokens to database
+            # Callback to persist refreshed tokens to database. Tesla refresh tokens are
+            # single-use, so the write completes before the refreshed client is used again.
+            # A client shared with other threads (shared_api_clients) refreshes from those
+            # threads too; they write by user id on the database writer and wait for it.
+            user_id = user.id
+            user_email = user.email
+            owner_thread = threading.get_ident()
+
             def on_token_refresh(new_access_token, new_refresh_token, expires_in):
                 from app import db
                 from datetime import datetime, timedelta, timezone
+                from app.db_writer import submit_write
+                tokens = {
+                    'fleet_api_access_token_encrypted': encrypt_token(new_access_token),
+                    'fleet_api_token_expires_at': datetime.now(timezone.utc) + timedelta(seconds=expires_in),
+                }
+                if new_refresh_token:
+                    tokens['fleet_api_refresh_token_encrypted'] = encrypt_token(new_refresh_token)
+
+                if threading.get_ident() == owner_thread:
+                    try:
+                        for column, value in tokens.items():
+                            setattr(user, column, value)
+                        db.session.commit()
+                        logger.info(f"Persisted refreshed Fleet API tokens for {user_email}, expires in {expires_in}s")
+                    except Exception as e:
+                        logger.error(f"Failed to persist refreshed tokens for {user_email}: {e}")
+                        db.session.rollback()
+                    return
+
                 try:
-                    user.fleet_api_access_token_encrypted = encrypt_token(new_access_token)
-                    if new_refresh_token:
-                        user.fleet_api_refresh_token_encrypted = encrypt_token(new_refresh_token)
-                    user.fleet_api_token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
-                    db.session.commit()
-                    logger.info(f"Persisted refreshed Fleet API tokens for {user.email}, expires in {expires_in}s")
+                    submit_write(write_fleet_api_tokens, user_id, tokens).result(timeout=TOKEN_WRITE_TIMEOUT)
+                    logger.info(f"Persisted refreshed Fleet API tokens for {user_email}, expires in {expires_in}s")
                 except Exception as e:
-                    logger.error(f"Failed to persist refreshed tokens for {user.email}: {e}")
-                    db.session.rollback()
+                    logger.error(f"Failed to persist refreshed tokens for {user_email}: {e!r}")
 
             return FleetAPIClient(
                 access_token=access_token,
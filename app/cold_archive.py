@@ -0,0 +1,370 @@
+# app/cold_archive.py
+"""Columnar, memory-mapped archive files for cold energy and price history"""
+import bisect
+import logging
+import mmap
+import os
+import shutil
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from app import db
+from app.models import EnergyRecord, PriceRecord
+
+logger = logging.getLogger(__name__)
+
+# Directory for the archive files; unset disables archiving (history past the
+# retention windows is deleted instead). Include it in backups alongside the database.
+ARCHIVE_DIR = os.environ.get('HISTORY_ARCHIVE_DIR', '').strip()
+
+MAGIC = b'PSHA'
+VERSION = 1
+# magic, version, kind, column count, row count
+HEADER = struct.Struct('<4sBBHq')
+
+_EPOCH = datetime(1970, 1, 1)
+_NAN = float('nan')
+
+# Price spike_status stored as a number (NaN for anything else)
+SPIKE_CODES = {'none': 0.0, 'potential': 1.0, 'spike': 2.0}
+SPIKE_NAMES = {code: name for name, code in SPIKE_CODES.items()}
+
+
+class ArchiveSchema:
+    """Column layout of one kind of archive file: an int64 timestamp column, then float64 columns."""
+
+    def __init__(self, kind: int, name: str, columns: Tuple[str, ...]):
+        self.kind = kind
+        self.name = name
+        self.columns = ('timestamp',) + columns
+
+    def typecode(self, column: str) -> str:
+        return 'q' if column in ('timestamp', 'nem_time') else 'd'
+
+
+ENERGY_SCHEMA = ArchiveSchema(1, 'energy', ('solar_power', 'grid_power', 'battery_power', 'load_power', 'battery_level'))
+PRICE_SCHEMA = ArchiveSchema(2, 'price', (
+    'nem_time', 'per_kwh', 'spot_per_kwh', 'wholesale_kwh_price', 'network_kwh_price',
+    'market_kwh_price', 'green_kwh_price', 'spike_status',
+))
+PRICE_CHANNELS = ('general', 'feedIn', 'controlledLoad')
+
+
+def archive_enabled() -> bool:
+    return bool(ARCHIVE_DIR)
+
+
+def _to_naive(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def month_start(timestamp: datetime) -> datetime:
+    """Start of the UTC month (naive) containing a timestamp."""
+    return _to_naive(timestamp).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def _to_micros(timestamp: Optional[datetime]) -> int:
+    if timestamp is None:
+        return -1
+    return (_to_naive(timestamp) - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(micros: int) -> Optional[datetime]:
+    return None if micros < 0 else _EPOCH + timedelta(microseconds=micros)
+
+
+def _user_dir(user_id: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f'user_{int(user_id)}')
+
+
+def archive_path(schema: ArchiveSchema, user_id: int, month: datetime, channel: Optional[str] = None) -> str:
+    suffix = f'-{channel}' if channel else ''
+    return os.path.join(_user_dir(user_id), schema.name, f'{month:%Y-%m}{suffix}.bin')
+
+
+class ArchiveFile:
+    """
+    One archive file opened read-only through mmap.
+
+    Columns are memoryviews cast straight onto the mapping (int64 'q' or
+    float64 'd'), so nothing is copied until rows are read; range() binary
+    searches the sorted timestamp column. Use as a context manager - the
+    mapping stays open until close().
+    """
+
+    def __init__(self, path: str, schema: ArchiveSchema):
+        self.path = path
+        self.schema = schema
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Empty archive file {path}")
+        magic, version, kind, column_count, rows = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or kind != schema.kind or column_count != len(schema.columns):
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} {schema.name} archive")
+        self.rows = rows
+        view = memoryview(self._map)
+        self._views = [view]
+        self.columns = {}
+        offset = HEADER.size
+        for column in schema.columns:
+            data = view[offset:offset + rows * 8].cast(schema.typecode(column))
+            self._views.append(data)
+            self.columns[column] = data
+            offset += rows * 8
+
+    def range(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Tuple[int, int]:
+        """Row index range [i, j) with start <= timestamp <= end."""
+        timestamps = self.columns['timestamp']
+        i = bisect.bisect_left(timestamps, _to_micros(start)) if start is not None else 0
+        j = bisect.bisect_right(timestamps, _to_micros(end)) if end is not None else self.rows
+        return i, j
+
+    def iter_rows(self, i: int, j: int) -> Iterator[Dict]:
+        """Rows i..j-1 as column dicts (datetimes for time columns, None for NaN)."""
+        columns = [(name, self.columns[name], self.schema.typecode(name)) for name in self.schema.columns]
+        for row in range(i, j):
+            values = {}
+            for name, data, typecode in columns:
+                value = data[row]
+                if typecode == 'q':
+                    values[name] = _from_micros(value)
+                else:
+                    values[name] = None if value != value else value
+            yield values
+
+    def close(self):
+        for view in reversed(getattr(self, '_views', [])):
+            view.release()
+        self._views = []
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_archive(path: str, schema: ArchiveSchema, rows: List[Dict]) -> int:
+    """
+    Write rows (column dicts) as an archive file, sorted by timestamp.
+
+    Written to a temporary file and renamed into place, so readers see either
+    the old or the new file. Returns the number of rows.
+    """
+    if sys.byteorder != 'little':
+        raise RuntimeError("Archive files are little-endian only")
+    rows = sorted(rows, key=lambda row: row['timestamp'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, schema.kind, len(schema.columns), len(rows)))
+        for column in schema.columns:
+            if schema.typecode(column) == 'q':
+                data = array('q', (_to_micros(row.get(column)) for row in rows))
+            else:
+                data = array('d', (_NAN if row.get(column) is None else float(row[column]) for row in rows))
+            data.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(rows)
+
+
+def read_archive(path: str, schema: ArchiveSchema, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None) -> List[Dict]:
+    """Rows of one archive file with start <= timestamp <= end ([] if there is no file)."""
+    if not os.path.exists(path):
+        return []
+    with ArchiveFile(path, schema) as archive:
+        return list(archive.iter_rows(*archive.range(start, end)))
+
+
+def months_in_range(start: datetime, end: datetime) -> Iterator[datetime]:
+    """Starts of the UTC months from the one containing start up to end."""
+    month = month_start(start)
+    while month <= end:
+        yield month
+        month = next_month(month)
+
+
+def _merge_into(path: str, schema: ArchiveSchema, rows: List[Dict]) -> int:
+    """
+    Rewrite an archive file with rows added; a row replaces an archived one with the same timestamp.
+
+    Returns the number of rows not archived before (0, and the file is left
+    alone, if they all were).
+    """
+    merged = {row['timestamp']: row for row in read_archive(path, schema)}
+    new = sum(1 for row in rows if row['timestamp'] not in merged)
+    if not new:
+        return 0
+    merged.update((row['timestamp'], row) for row in rows)
+    write_archive(path, schema, list(merged.values()))
+    return new
+
+
+def _energy_row(record: EnergyRecord) -> Dict:
+    return {column: getattr(record, column) for column in ENERGY_SCHEMA.columns}
+
+
+def _price_row(record: PriceRecord) -> Dict:
+    row = {column: getattr(record, column) for column in PRICE_SCHEMA.columns if column != 'spike_status'}
+    row['spike_status'] = SPIKE_CODES.get(record.spike_status)
+    return row
+
+
+def archive_energy(user_id: int, before: datetime, stop: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    Copy a user's EnergyRecords before a month boundary into monthly archive files.
+
+    Rows already archived are kept (a re-archived row replaces its copy), so
+    it is safe to run again before the rows are deleted. Deleting them is left
+    to the caller (app.retention).
+
+    Args:
+        stop: Checked before each month; once it returns True the rest is left
+            for the next run
+
+    Returns:
+        {'months': files written, 'rows': rows newly archived, 'through': rows
+        before this month boundary are archived (before, unless stopped)}
+    """
+    before = month_start(before)
+    stats = {'months': 0, 'rows': 0, 'through': before}
+    oldest = db.session.execute(
+        select(func.min(EnergyRecord.timestamp)).where(EnergyRecord.user_id == user_id, EnergyRecord.timestamp < before)
+    ).scalar()
+    if oldest is None:
+        return stats
+
+    for month in months_in_range(oldest, before - timedelta(microseconds=1)):
+        if stop is not None and stop():
+            stats['through'] = month
+            break
+        records = db.session.execute(
+            select(EnergyRecord).where(
+                EnergyRecord.user_id == user_id,
+                EnergyRecord.timestamp >= month,
+                EnergyRecord.timestamp < next_month(month),
+            ).order_by(EnergyRecord.timestamp.asc())
+        ).scalars().all()
+        if not records:
+            continue
+        added = _merge_into(archive_path(ENERGY_SCHEMA, user_id, month), ENERGY_SCHEMA, [_energy_row(r) for r in records])
+        if added:
+            stats['months'] += 1
+            stats['rows'] += added
+        db.session.expunge_all()
+    return stats
+
+
+def archive_prices(user_id: int, before: datetime, stop: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    Copy a user's actual PriceRecords (not forecasts) before a month boundary into monthly per-channel files.
+
+    Stops and returns like archive_energy().
+    """
+    before = month_start(before)
+    stats = {'months': 0, 'rows': 0, 'through': before}
+    oldest = db.session.execute(
+        select(func.min(PriceRecord.timestamp)).where(
+            PriceRecord.user_id == user_id,
+            PriceRecord.forecast == False,  # noqa: E712
+            PriceRecord.timestamp < before,
+        )
+    ).scalar()
+    if oldest is None:
+        return stats
+
+    for month in months_in_range(oldest, before - timedelta(microseconds=1)):
+        if stop is not None and stop():
+            stats['through'] = month
+            break
+        for channel in PRICE_CHANNELS:
+            records = db.session.execute(
+                select(PriceRecord).where(
+                    PriceRecord.user_id == user_id,
+                    PriceRecord.channel_type == channel,
+                    PriceRecord.forecast == False,  # noqa: E712
+                    PriceRecord.timestamp >= month,
+                    PriceRecord.timestamp < next_month(month),
+                ).order_by(PriceRecord.timestamp.asc())
+            ).scalars().all()
+            if not records:
+                continue
+            path = archive_path(PRICE_SCHEMA, user_id, month, channel)
+            added = _merge_into(path, PRICE_SCHEMA, [_price_row(r) for r in records])
+            if added:
+                stats['months'] += 1
+                stats['rows'] += added
+        db.session.expunge_all()
+    return stats
+
+
+def archived_energy_records(user_id: int, start: datetime, end: datetime) -> List[EnergyRecord]:
+    """A user's archived samples with start <= timestamp <= end, as transient EnergyRecords."""
+    if not archive_enabled():
+        return []
+    records = []
+    for month in months_in_range(start, _to_naive(end)):
+        for row in read_archive(archive_path(ENERGY_SCHEMA, user_id, month), ENERGY_SCHEMA, start, end):
+            records.append(EnergyRecord(user_id=user_id, **row))
+    return records
+
+
+def archived_price_records(user_id: int, channel: str, start: datetime, end: datetime) -> List[PriceRecord]:
+    """A user's archived actual prices of one channel with start <= timestamp <= end, as transient PriceRecords."""
+    if not archive_enabled():
+        return []
+    records = []
+    for month in months_in_range(start, _to_naive(end)):
+        for row in read_archive(archive_path(PRICE_SCHEMA, user_id, month, channel), PRICE_SCHEMA, start, end):
+            row['spike_status'] = SPIKE_NAMES.get(row['spike_status'])
+            records.append(PriceRecord(user_id=user_id, channel_type=channel, forecast=False, **row))
+    return records
+
+
+def with_archived(records: List, archived: List) -> List:
+    """Queried records (ascending) merged with archived ones; a timestamp in both keeps the database row."""
+    if not archived:
+        return records
+    stored = {_to_naive(record.timestamp) for record in records}
+    archived = [record for record in archived if record.timestamp not in stored]
+    return sorted(records + archived, key=lambda record: _to_naive(record.timestamp))
+
+
+def delete_user_archive(user_id: int):
+    """Remove every archive file of a user (account reset)."""
+    if archive_enabled():
+        shutil.rmtree(_user_dir(user_id), ignore_errors=True)
+
+
+def archive_size() -> Dict[str, int]:
+    """{'files': n, 'bytes': n} of the archive directory."""
+    files = size = 0
+    if archive_enabled():
+        for root, _, names in os.walk(ARCHIVE_DIR):
+            for name in names:
+                if name.endswith('.bin'):
+                    files += 1
+                    size += os.path.getsize(os.path.join(root, name))
+    return {'files': files, 'bytes': size}
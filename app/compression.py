@@ -0,0 +1,119 @@
+# app/compression.py
+"""
+Compression and ETags for JSON API responses, opted into per route.
+
+    @bp.route('/api/energy-history')
+    @compressed_json()
+    @api_auth_required
+    def energy_history(...):
+
+The after-request hook (init_response_compression) then, for a 200 GET/HEAD:
+
+- gives the response a strong ETag (SHA-1 of the uncompressed body, unless the
+  view set one), suffixed with the content coding it is sent in, and answers
+  If-None-Match with 304 Not Modified before anything is compressed
+- compresses bodies of at least COMPRESSION_MIN_BYTES with brotli (when the
+  package is installed) or gzip, whichever the client's Accept-Encoding prefers
+
+Streamed and file responses are left alone.
+
+Environment:
+    COMPRESSION_MIN_BYTES: Smallest body compressed (default 1024)
+"""
+import gzip
+import hashlib
+import os
+from typing import Optional, Tuple
+
+from flask import current_app, request
+
+# Brotli is optional - gzip is used without it
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+# Below this the headers outweigh the saving (and a tunnel's MTU fits the body anyway)
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Dynamic responses: close to gzip's speed, smaller output
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/csv')
+
+
+def compressed_json(etag: bool = True):
+    """
+    Opt a view into response compression and, with etag, conditional requests.
+
+    Place it between @bp.route and the auth decorators. Leave etag off for
+    responses that must not be revalidated (Cache-Control: no-store).
+    """
+    def decorator(f):
+        f.response_compression = {'etag': etag}
+        return f
+    return decorator
+
+
+def available_encodings() -> Tuple[str, ...]:
+    return ('br', 'gzip') if BROTLI_AVAILABLE else ('gzip',)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def negotiate_encoding(accept_encodings) -> Optional[str]:
+    """The content coding to send, from the request's Accept-Encoding (None for identity)."""
+    return accept_encodings.best_match(available_encodings())
+
+
+def _route_options() -> Optional[dict]:
+    view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+    return getattr(view, 'response_compression', None)
+
+
+def finalize_response(response):
+    """Apply the view's opted-in ETag, 304 and compression handling to its response."""
+    options = _route_options()
+    if (
+        options is None
+        or request.method not in ('GET', 'HEAD')
+        or response.status_code != 200
+        or response.is_streamed
+        or response.direct_passthrough
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    body = response.get_data()
+    encoding = negotiate_encoding(request.accept_encodings) if len(body) >= COMPRESSION_MIN_BYTES else None
+    response.vary.add('Accept-Encoding')
+
+    if options['etag']:
+        tag, weak = response.get_etag()
+        if tag is None or weak:
+            tag = hashlib.sha1(body).hexdigest()
+        # A strong ETag names one representation, so the coding is part of it
+        response.set_etag(f'{tag}-{encoding}' if encoding else tag)
+        if not response.cache_control.max_age and not response.cache_control.no_store:
+            # Per-user data: the browser may keep it, but revalidates every time
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_response_compression(app):
+    """Register the after-request hook that serves the views opted in with compressed_json()."""
+    app.after_request(finalize_response)
@@ -0,0 +1,124 @@
+# app/dashboard_bootstrap.py
+"""Everything the dashboard loads on first paint, assembled server-side in one response"""
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from flask import current_app, g, request
+
+from app import db
+from app.api_clients import get_amber_client, get_tesla_client, shared_api_clients
+
+logger = logging.getLogger(__name__)
+
+# Sections are fetched concurrently (most wait on Tesla / Amber / AEMO)
+MAX_WORKERS = 6
+# Seconds for all sections together. Slower ones are returned without data and the
+# dashboard requests them itself, so one slow upstream doesn't hold up first paint.
+BOOTSTRAP_TIMEOUT = 15
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='dashboard-bootstrap')
+
+
+def _has_amber(user) -> bool:
+    return bool(user.amber_api_token_encrypted)
+
+
+def _is_sigenergy(user) -> bool:
+    return user.battery_system == 'sigenergy'
+
+
+class BootstrapSection:
+    """One of the dashboard's initial requests: the URL it fetches and when it applies."""
+
+    def __init__(self, name: str, url: str, applies: Optional[Callable] = None):
+        self.name = name
+        self.url = url
+        self.applies = applies or (lambda user: True)
+
+
+# Same URLs the dashboard requests, so its responses can stand in for them
+SECTIONS = (
+    BootstrapSection('config', '/api/config'),
+    BootstrapSection('status', '/api/status'),
+    BootstrapSection('current_price', '/api/current-price'),
+    BootstrapSection('tesla_status', '/api/tesla/status', lambda user: not _is_sigenergy(user)),
+    BootstrapSection('sigenergy_status', '/api/sigenergy/live-status', _is_sigenergy),
+    BootstrapSection('curtailment_status', '/api/curtailment-status', lambda user: user.solar_curtailment_enabled),
+    BootstrapSection('inverter_status', '/api/inverter/status', lambda user: user.inverter_curtailment_enabled),
+    BootstrapSection('discharge_status', '/api/discharge-status'),
+    BootstrapSection('aemo_price', '/api/aemo-price'),
+    BootstrapSection('tou_schedule', '/api/tou-schedule'),
+    BootstrapSection('price_history', '/api/price-history?day=today'),
+    BootstrapSection('forecast_30min', '/api/amber/30min-forecast?hours=24', _has_amber),
+    BootstrapSection('forecast_5min', '/api/amber/5min-forecast?hours=1', _has_amber),
+    BootstrapSection('energy_history', '/api/energy-history?timeframe=day'),
+    BootstrapSection('energy_summary', '/api/energy-calendar-history?period=month'),
+    BootstrapSection('battery_health', '/api/battery-health'),
+    BootstrapSection('battery_health_history', '/api/battery-health/history'),
+)
+
+
+def _run_section(app, user, section: BootstrapSection) -> Dict:
+    """Dispatch a section's URL to its view as the given user, in app and request contexts of its own."""
+    path, _, query = section.url.partition('?')
+    # The worker runs in a copy of the bootstrap request's context, so without a new
+    # app context the request context would reuse the parent's - and with it the
+    # parent's scoped database session, shared by every section and removed by the
+    # parent's teardown while a slow section may still be using it
+    with app.app_context(), app.test_request_context(path, query_string=query, headers={'Accept': 'application/json'}):
+        # The user loaded once by the bootstrap request, attached to this thread's
+        # session without a query. Flask-Login reads the request's user from g.
+        g._login_user = db.session.merge(user, load=False)
+        try:
+            rule = request.url_rule
+            rv = app.view_functions[rule.endpoint](**request.view_args)
+            response = app.make_response(rv)
+            data = response.get_json(silent=True)
+            status = response.status_code
+        except Exception as e:
+            logger.error(f"Dashboard bootstrap section {section.name} failed: {e}", exc_info=True)
+            db.session.rollback()
+            data, status = {'error': str(e)}, 500
+    return {'url': section.url, 'status': status, 'data': data}
+
+
+def build_bootstrap(user, names: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """
+    Run the dashboard's initial requests for a user concurrently.
+
+    Returns:
+        Section name -> {'url', 'status', 'data'}: data is the view's JSON, or None
+        if the section didn't finish within BOOTSTRAP_TIMEOUT
+    """
+    app = current_app._get_current_object()
+    sections = [
+        section for section in SECTIONS
+        if (names is None or section.name in names) and section.applies(user)
+    ]
+
+    results = {}
+    with shared_api_clients():
+        # Create the clients here so every section shares them. A Fleet API token
+        # refresh is serialized by the client, and a section that refreshes writes the
+        # tokens by user id on the database writer and waits for the write.
+        if _has_amber(user):
+            get_amber_client(user)
+        if not _is_sigenergy(user):
+            get_tesla_client(user)
+
+        futures = [
+            (section, _executor.submit(contextvars.copy_context().run, _run_section, app, user, section))
+            for section in sections
+        ]
+        deadline = time.monotonic() + BOOTSTRAP_TIMEOUT
+        for section, future in futures:
+            try:
+                results[section.name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception as e:
+                logger.error(f"Dashboard bootstrap section {section.name} did not complete: {e!r}")
+                results[section.name] = {'url': section.url, 'status': 504, 'data': None}
+
+    return results
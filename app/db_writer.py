@@ -0,0 +1,308 @@
+# app/db_writer.py
+"""SQLite connection tuning and a single-writer queue for background database writes"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Applied to every new SQLite connection
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),  # Readers see the last commit instead of waiting for the writer
+    ('synchronous', 'NORMAL'),  # fsync at WAL checkpoints, not on every commit (durable in WAL mode)
+    ('busy_timeout', 30000),  # ms - matches the connect timeout in Config
+    ('temp_store', 'MEMORY'),
+    ('cache_size', -16000),  # 16 MB page cache per connection
+    ('mmap_size', 134217728),  # 128 MB of the file read through mmap
+)
+
+# Writer batching: jobs arriving within MAX_BATCH_DELAY of the first share one transaction
+MAX_BATCH_JOBS = 100
+MAX_BATCH_DELAY = 0.25  # seconds
+LOCKED_RETRIES = 3
+LOCKED_RETRY_DELAY = 0.5  # seconds, doubled per attempt
+
+_STOP = object()
+
+
+def configure_sqlite_engine(engine) -> bool:
+    """
+    Apply SQLITE_PRAGMAS to every connection the engine opens.
+
+    Must run before the engine's first connection (journal_mode=WAL persists in
+    the database file, the rest are per connection). No-op for other databases.
+
+    Returns:
+        True if the engine is SQLite
+    """
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in SQLITE_PRAGMAS:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+    return True
+
+
+class _WriteJob:
+    __slots__ = ('func', 'args', 'kwargs', 'exclusive', 'future')
+
+    def __init__(self, func: Callable, args: tuple, kwargs: dict, exclusive: bool = False):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.exclusive = exclusive
+        self.future = Future()
+
+    @property
+    def name(self) -> str:
+        return getattr(self.func, '__name__', repr(self.func))
+
+
+class WriteQueue:
+    """
+    One writer thread that applies background write jobs in batched transactions.
+
+    Scheduler jobs and WebSocket callbacks submit callables instead of committing
+    themselves. The writer runs every job queued within MAX_BATCH_DELAY of the
+    first in one transaction and commits once, so the database sees one writer
+    and one fsync per batch rather than a commit (and a lock race) per job.
+
+    Jobs run in the writer's app context with its own db.session. They must not
+    commit, and must take plain values (ids, dicts) rather than ORM objects
+    loaded by another session. A job's return value (or exception) is delivered
+    through the Future returned by submit(). If a batch fails, its jobs are
+    retried one per transaction so a bad job only fails itself.
+
+    Jobs queued with submit_exclusive() run on their own, between batches,
+    with no transaction open: the writer is paused for them, so maintenance
+    that needs the whole database (VACUUM) doesn't contend with queued writes.
+    """
+
+    def __init__(self, app, max_batch: int = MAX_BATCH_JOBS, max_delay: float = MAX_BATCH_DELAY):
+        self.app = app
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop_hooks = []
+        self.batches = 0
+        self.jobs = 0
+        atexit.register(self.stop)
+
+    def add_stop_hook(self, hook: Callable[[], None]):
+        """Call hook (e.g. to flush a buffer into the queue) when stop() begins, before the queue drains."""
+        self._stop_hooks.append(hook)
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """Queue func(*args, **kwargs) for the writer thread."""
+        return self._submit(_WriteJob(func, args, kwargs))
+
+    def submit_exclusive(self, func: Callable, *args, **kwargs) -> Future:
+        """Queue func(*args, **kwargs) to run alone once the writes queued before it have committed."""
+        return self._submit(_WriteJob(func, args, kwargs, exclusive=True))
+
+    def _submit(self, job: _WriteJob) -> Future:
+        if self._thread is not None and threading.current_thread() is self._thread:
+            # Submitted from inside a job: run as part of the current batch
+            job.future.set_result(job.func(*job.args, **job.kwargs))
+            return job.future
+        self._ensure_started()
+        self._queue.put(job)
+        return job.future
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+                logger.info("Database writer thread started")
+
+    def stop(self, timeout: float = 10.0):
+        """Run the stop hooks, apply everything queued so far, then stop the writer thread."""
+        hooks, self._stop_hooks = self._stop_hooks, []
+        for hook in hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.error("Database writer stop hook %r failed: %s", hook, e)
+
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning("Database writer did not drain within %.0fs (%d jobs pending)", timeout, self._queue.qsize())
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        with self.app.app_context():
+            stopping = False
+            while not stopping:
+                job = self._queue.get()
+                if job is _STOP:
+                    break
+                exclusive = job if job.exclusive else None
+                batch = [] if exclusive else [job]
+                deadline = time.monotonic() + self.max_delay
+                while exclusive is None and len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        job = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if job is _STOP:
+                        stopping = True
+                        break
+                    if job.exclusive:
+                        exclusive = job  # Ends the batch; runs once it has committed
+                        break
+                    batch.append(job)
+
+                if batch:
+                    self._apply(batch)
+                db.session.close()  # Return the connection to the pool between batches
+                if exclusive is not None:
+                    self._apply_exclusive(exclusive)
+
+            # Drain what was queued behind the stop marker
+            leftover = []
+            while True:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    continue
+                if job.exclusive:
+                    if leftover:
+                        self._apply(leftover)
+                        leftover = []
+                    db.session.close()
+                    self._apply_exclusive(job)
+                else:
+                    leftover.append(job)
+            if leftover:
+                self._apply(leftover)
+            db.session.remove()
+        logger.info("Database writer thread stopped after %d batches (%d jobs)", self.batches, self.jobs)
+
+    def _apply(self, batch: List[_WriteJob]):
+        """Run a batch in one transaction, retrying on lock errors and isolating failures."""
+        for attempt in range(LOCKED_RETRIES + 1):
+            try:
+                results = [job.func(*job.args, **job.kwargs) for job in batch]
+                db.session.commit()
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' in str(e).lower() and attempt < LOCKED_RETRIES:
+                    wait = LOCKED_RETRY_DELAY * (2 ** attempt)
+                    logger.warning("Database locked writing %d jobs, retrying in %.1fs", len(batch), wait)
+                    time.sleep(wait)
+                    continue
+                self._fail(batch, e)
+                return
+            except Exception as e:
+                db.session.rollback()
+                self._fail(batch, e)
+                return
+
+            self.batches += 1
+            self.jobs += len(batch)
+            for job, result in zip(batch, results):
+                job.future.set_result(result)
+            if len(batch) > 1:
+                logger.debug("Committed %d queued writes in one transaction", len(batch))
+            return
+
+    def _apply_exclusive(self, job: _WriteJob):
+        """Run a submit_exclusive() job with no batch open; it manages its own transactions."""
+        try:
+            result = job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Exclusive database job %s failed: %s", job.name, e)
+            job.future.set_exception(e)
+        else:
+            self.jobs += 1
+            job.future.set_result(result)
+        finally:
+            db.session.close()
+
+    def _fail(self, batch: List[_WriteJob], error: Exception):
+        if len(batch) == 1:
+            logger.error("Queued database write %s failed: %s", batch[0].name, error)
+            batch[0].future.set_exception(error)
+            return
+        logger.warning("Batch of %d queued writes failed (%s) - retrying one at a time", len(batch), error)
+        for job in batch:
+            self._apply([job])
+
+
+def submit_write(func: Callable, *args, **kwargs) -> Future:
+    """
+    Queue a background write on the app's WriteQueue.
+
+    Without one (scripts using a bare Flask app) the job runs and commits
+    immediately, so callers behave the same either way.
+    """
+    write_queue: Optional[WriteQueue] = current_app.config.get('DB_WRITE_QUEUE')
+    if write_queue is not None:
+        return write_queue.submit(func, *args, **kwargs)
+
+    future = Future()
+    try:
+        result = func(*args, **kwargs)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        future.set_exception(e)
+    else:
+        future.set_result(result)
+    return future
+
+
+def submit_exclusive(func: Callable, *args, **kwargs) -> Future:
+    """
+    Run func(*args, **kwargs) on the app's database writer with the writer paused.
+
+    The writes queued before it commit first, and none run until it returns.
+    func gets no transaction opened for it and commits (or uses its own
+    connection) itself. Without a WriteQueue it runs immediately.
+    """
+    write_queue: Optional[WriteQueue] = current_app.config.get('DB_WRITE_QUEUE')
+    if write_queue is not None:
+        return write_queue.submit_exclusive(func, *args, **kwargs)
+
+    future = Future()
+    try:
+        future.set_result(func(*args, **kwargs))
+    except Exception as e:
+        db.session.rollback()
+        future.set_exception(e)
+    return future
@@ -0,0 +1,109 @@
+# app/downsampling.py
+"""Server-side downsampling of chart series (the history endpoints' max_points)"""
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+# Smallest max_points accepted: LTTB always keeps the first and last point
+MIN_POINTS = 3
+MAX_POINTS = 10000
+
+
+def max_points_param(args) -> Optional[int]:
+    """The max_points query parameter, clamped to [MIN_POINTS, MAX_POINTS] (None if absent or invalid)."""
+    value = args.get('max_points', type=int)
+    if value is None or value <= 0:
+        return None
+    return min(max(value, MIN_POINTS), MAX_POINTS)
+
+
+def _epoch_seconds(row: Dict, key: str) -> float:
+    value = row[key]
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+def lttb_indices(xs: Sequence[float], series: Sequence[Sequence[Optional[float]]], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets: indices of the points to keep, ascending.
+
+    The first and last points are kept; the rest are split into threshold - 2
+    buckets and from each the point forming the largest triangle with the
+    previously kept point and the average of the next bucket is kept. With
+    several series sharing the x axis, each series is scaled to its own range
+    and the triangle areas are added, so a point is kept if it matters to any
+    of them. Missing values count as 0.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < MIN_POINTS:
+        return list(range(n))
+
+    scaled = []
+    for values in series:
+        values = [0.0 if value is None else float(value) for value in values]
+        low, high = min(values), max(values)
+        span = (high - low) or 1.0
+        scaled.append([value / span for value in values])
+
+    kept = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the next bucket (the last point for the final bucket)
+        next_start, next_end = end, min(int((bucket + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_ys = [sum(values[next_start:next_end]) / count for values in scaled]
+
+        best, best_area = start, -1.0
+        px = xs[previous]
+        for i in range(start, end):
+            area = 0.0
+            for values, avg_y in zip(scaled, avg_ys):
+                py = values[previous]
+                area += abs((px - avg_x) * (values[i] - py) - (px - xs[i]) * (avg_y - py))
+            if area > best_area:
+                best, best_area = i, area
+        kept.append(best)
+        previous = best
+
+    kept.append(n - 1)
+    return kept
+
+
+def lttb(rows: List[Dict], max_points: Optional[int], y_keys: Sequence[str], x_key: str = 'timestamp') -> List[Dict]:
+    """
+    Rows (ascending by x_key, a datetime or ISO 8601 string) thinned to max_points with LTTB.
+
+    Returns the rows unchanged when they already fit or max_points is None.
+    """
+    if not max_points or len(rows) <= max_points:
+        return rows
+    xs = [_epoch_seconds(row, x_key) for row in rows]
+    series = [[row.get(key) for row in rows] for key in y_keys]
+    return [rows[i] for i in lttb_indices(xs, series, max_points)]
+
+
+def sum_buckets(rows: List[Dict], max_points: Optional[int], sum_keys: Sequence[str]) -> List[Dict]:
+    """
+    Merge runs of consecutive rows so at most max_points remain, adding up sum_keys.
+
+    For energy totals, where dropping points (as LTTB does) would lose energy:
+    each merged row keeps its first row's other fields (e.g. its timestamp).
+    """
+    if not max_points or len(rows) <= max_points:
+        return rows
+    size = -(-len(rows) // max_points)  # ceil
+    merged = []
+    for start in range(0, len(rows), size):
+        group = rows[start:start + size]
+        row = dict(group[0])
+        for key in sum_keys:
+            row[key] = sum(item.get(key) or 0 for item in group)
+        merged.append(row)
+    return merged
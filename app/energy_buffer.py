@@ -0,0 +1,231 @@
+# app/energy_buffer.py
+"""Write-behind buffer for the minute energy samples"""
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from flask import current_app
+
+from app.models import EnergyRecord
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+# Flush after this many samples or seconds, whichever comes first
+FLUSH_SAMPLES = _env_int('ENERGY_BUFFER_FLUSH_SAMPLES', 100)
+FLUSH_SECONDS = _env_int('ENERGY_BUFFER_FLUSH_SECONDS', 300)
+# Samples kept in memory while the database is unavailable; the oldest are dropped beyond this
+MAX_BUFFERED = _env_int('ENERGY_BUFFER_MAX_SAMPLES', 20000)
+# Times a failed batch is retried as a whole before its samples are written one at a time
+FLUSH_ATTEMPTS = _env_int('ENERGY_BUFFER_FLUSH_ATTEMPTS', 3)
+
+
+def _utc_naive(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+class EnergySampleBuffer:
+    """
+    Holds collected energy samples in memory and writes them in batches.
+
+    save_energy_usage adds one sample per user per minute. Instead of a
+    transaction per sample, samples accumulate here and are handed to the
+    database writer (app.db_writer) as one add_energy_samples job every
+    FLUSH_SAMPLES samples or FLUSH_SECONDS, and when the writer stops.
+
+    Samples stay visible to readers (tail()) from the moment they're added
+    until their batch has committed. A failed batch is retried on its own at
+    the next flush, apart from newer samples; after flush_attempts failures
+    its samples are written one job each, and those that still fail are
+    logged and dropped, so one bad sample can't hold up the rest. The buffer lives in the process that runs the
+    scheduler - with one gunicorn worker that is also the one serving requests.
+    """
+
+    def __init__(self, write_queue, flush_samples: int = FLUSH_SAMPLES, flush_seconds: float = FLUSH_SECONDS,
+                 max_buffered: int = MAX_BUFFERED, flush_attempts: int = FLUSH_ATTEMPTS):
+        self.write_queue = write_queue
+        self.flush_samples = flush_samples
+        self.flush_seconds = flush_seconds
+        self.max_buffered = max_buffered
+        self.flush_attempts = flush_attempts
+        self._samples = []  # (values, tz_name) not yet handed to the writer
+        self._retries = []  # (samples, failed attempts) of failed batches, retried at the next flush
+        self._in_flight = {}  # flush id -> (samples, failed attempts) handed to the writer, not yet committed
+        self._flushes = 0
+        self._lock = threading.RLock()  # A batch can complete (and call back) before submit returns
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopped = False
+        self.dropped = 0
+        write_queue.add_stop_hook(self.close)
+
+    def add(self, user_id: int, values: Dict, tz_name: Optional[str] = None):
+        """Buffer one sample (EnergyRecord column values without user_id)."""
+        sample = (dict(values, user_id=user_id), tz_name)
+        with self._lock:
+            if self._stopped:
+                # Shutting down: the writer is draining, so queue the sample directly
+                self._submit([sample])
+                return
+            self._samples.append(sample)
+            overflow = len(self._samples) - self.max_buffered
+            if overflow > 0:
+                del self._samples[:overflow]
+                self.dropped += overflow
+                logger.warning("Energy sample buffer full - dropped %d oldest samples", overflow)
+            full = len(self._samples) >= self.flush_samples
+        self._ensure_timer()
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Hand everything buffered to the database writer. Returns the number of samples."""
+        with self._lock:
+            return self._submit_buffered()
+
+    def _submit_buffered(self) -> int:
+        """Queue the failed batches, each on its own, then the new samples (caller holds the lock)."""
+        retries, self._retries = self._retries, []
+        samples, self._samples = self._samples, []
+        for batch, attempts in retries:
+            self._submit(batch, attempts)
+        if samples:
+            self._submit(samples)
+        return len(samples) + sum(len(batch) for batch, _ in retries)
+
+    def _submit(self, samples: List[tuple], attempts: int = 0):
+        """Queue a batch for the writer (caller holds the lock)."""
+        from app.history_store import add_energy_samples
+
+        self._flushes += 1
+        flush_id = self._flushes
+        self._in_flight[flush_id] = (samples, attempts)
+        future = self.write_queue.submit(add_energy_samples, samples)
+        future.add_done_callback(lambda done: self._flushed(flush_id, done))
+
+    def _flushed(self, flush_id: int, future):
+        with self._lock:
+            samples, attempts = self._in_flight.pop(flush_id, ([], 0))
+            error = future.exception()
+            if error is None:
+                logger.debug("Flushed %d buffered energy samples", len(samples))
+                return
+            if self._stopped:
+                logger.error("Lost %d energy samples at shutdown: %s", len(samples), error)
+                return
+
+            attempts += 1
+            if attempts < self.flush_attempts:
+                # Retry the batch as it is at the next flush, apart from newer samples
+                self._retries.append((samples, attempts))
+                logger.warning("Writing %d buffered energy samples failed (%s) - will retry", len(samples), error)
+            elif len(samples) > 1:
+                # Find the bad samples: write the rest one job each, now
+                logger.warning("Writing %d buffered energy samples failed %d times (%s) - writing them one at a time",
+                               len(samples), attempts, error)
+                for sample in samples:
+                    self._submit([sample], attempts)
+            else:
+                self.dropped += len(samples)
+                logger.error("Dropped energy sample %r after %d failed writes: %s", samples[0][0] if samples else None,
+                             attempts, error)
+
+    def _ensure_timer(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name='energy-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._wake.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Energy sample buffer flush failed: %s", e)
+
+    def close(self):
+        """Flush and stop the timer (run by the database writer as it stops)."""
+        self._wake.set()
+        with self._lock:
+            self._stopped = True
+            flushed = self._submit_buffered()
+            if flushed:
+                logger.info("Flushed %d buffered energy samples at shutdown", flushed)
+
+    def _batches(self) -> List[List[tuple]]:
+        """Every batch not committed yet: in flight, awaiting retry, then new (caller holds the lock)."""
+        return ([samples for samples, _ in self._in_flight.values()]
+                + [samples for samples, _ in self._retries] + [self._samples])
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(samples) for samples in self._batches())
+
+    def tail(self, user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[EnergyRecord]:
+        """
+        A user's samples that may not be in the database yet, oldest first.
+
+        Returned as transient EnergyRecords (never added to the session) so
+        readers can treat them like queried rows. Bounds are inclusive.
+        """
+        start = _utc_naive(start) if start is not None else None
+        end = _utc_naive(end) if end is not None else None
+        with self._lock:
+            samples = [values for batch in self._batches() for values, _ in batch]
+
+        records = []
+        for values in samples:
+            if values['user_id'] != user_id:
+                continue
+            timestamp = _utc_naive(values['timestamp'])
+            if (start is not None and timestamp < start) or (end is not None and timestamp > end):
+                continue
+            records.append(EnergyRecord(**dict(values, timestamp=timestamp)))
+        records.sort(key=lambda record: record.timestamp)
+        return records
+
+
+def buffer_energy_sample(user_id: int, values: Dict, tz_name: Optional[str] = None):
+    """Buffer a collected sample, or queue it directly when the app has no buffer."""
+    buffer: Optional[EnergySampleBuffer] = current_app.config.get('ENERGY_SAMPLE_BUFFER')
+    if buffer is not None:
+        buffer.add(user_id, values, tz_name)
+        return
+
+    from app.db_writer import submit_write
+    from app.history_store import add_energy_sample
+    submit_write(add_energy_sample, user_id, values, tz_name)
+
+
+def with_buffered_samples(records: List[EnergyRecord], user_id: int,
+                          start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[EnergyRecord]:
+    """
+    Queried EnergyRecords (ascending) merged with the user's unflushed samples in the same range.
+
+    A sample whose batch commits between the query and this call is in both;
+    it is kept once.
+    """
+    buffer: Optional[EnergySampleBuffer] = current_app.config.get('ENERGY_SAMPLE_BUFFER')
+    if buffer is None:
+        return records
+    tail = buffer.tail(user_id, start, end)
+    if not tail:
+        return records
+
+    stored = {_utc_naive(record.timestamp) for record in records}
+    tail = [record for record in tail if record.timestamp not in stored]
+    return sorted(records + tail, key=lambda record: _utc_naive(record.timestamp))
@@ -0,0 +1,370 @@
+# app/energy_ledger.py
+"""Per-interval energy and cost ledger integrated from the power samples"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, insert, select, update
+
+from app import db
+from app.history_store import (
+    MAX_SAMPLE_GAP, _DIALECT_INSERTS, _batches, _utc_naive, nem_time_window, upsert_price_records,
+)
+from app.models import EnergyLedger, EnergyRecord, PriceRecord, User
+
+logger = logging.getLogger(__name__)
+
+LEDGER_INTERVAL = timedelta(minutes=5)  # NEM dispatch/settlement interval
+LEDGER_KEY = ('user_id', 'interval_start')
+
+# Sample power column -> (ledger column for the positive part, ledger column for the negative part)
+ENERGY_FLOWS = (
+    ('solar_power', 'solar_kwh', None),
+    ('load_power', 'load_kwh', None),
+    ('grid_power', 'grid_import_kwh', 'grid_export_kwh'),  # + import, - export
+    ('battery_power', 'battery_discharge_kwh', 'battery_charge_kwh'),  # + discharge, - charge
+)
+ENERGY_COLUMNS = tuple(column for _, positive, negative in ENERGY_FLOWS for column in (positive, negative) if column)
+
+# Money columns: (cost column, price column, energy column)
+PRICED_FLOWS = (
+    ('import_cost', 'import_price', 'grid_import_kwh'),
+    ('export_earnings', 'export_price', 'grid_export_kwh'),
+)
+
+_WATT_SECONDS_PER_KWH = 3.6e6
+
+
+def interval_start(timestamp: datetime) -> datetime:
+    """Start (naive UTC) of the 5-minute interval containing a timestamp."""
+    timestamp = _utc_naive(timestamp)
+    return timestamp.replace(minute=timestamp.minute - timestamp.minute % 5, second=0, microsecond=0)
+
+
+def _positive_area(start_power: float, end_power: float, seconds: float) -> float:
+    """Integral (W*s) of the positive part of power changing linearly from start to end."""
+    if start_power >= 0 and end_power >= 0:
+        return (start_power + end_power) / 2 * seconds
+    if start_power <= 0 and end_power <= 0:
+        return 0.0
+    # Crosses zero: only the triangle on the positive side counts
+    peak, other = (start_power, end_power) if start_power > 0 else (end_power, start_power)
+    return peak * seconds * (peak / (peak - other)) / 2
+
+
+def integrate_segment(start: datetime, start_values: Dict, end: datetime, end_values: Dict) -> Dict[datetime, Dict]:
+    """
+    Trapezoidal energy of the segment between two consecutive samples, split by interval.
+
+    Power is taken to change linearly between the samples. Where the segment
+    crosses an interval boundary it is cut there, with the power interpolated
+    at the cut, so each interval gets exactly its share. Segments longer than
+    MAX_SAMPLE_GAP (missed collections) are not integrated.
+
+    Returns:
+        {interval_start: {'covered_seconds': s, <ENERGY_COLUMNS>: kWh}}
+    """
+    start, end = _utc_naive(start), _utc_naive(end)
+    total = (end - start).total_seconds()
+    if total <= 0 or end - start > MAX_SAMPLE_GAP:
+        return {}
+
+    powers = [
+        (start_values.get(power) or 0.0, end_values.get(power) or 0.0, positive, negative)
+        for power, positive, negative in ENERGY_FLOWS
+    ]
+    intervals = {}
+    cursor = start
+    while cursor < end:
+        bucket = interval_start(cursor)
+        piece_end = min(bucket + LEDGER_INTERVAL, end)
+        seconds = (piece_end - cursor).total_seconds()
+        f0 = (cursor - start).total_seconds() / total
+        f1 = (piece_end - start).total_seconds() / total
+
+        if bucket not in intervals:
+            intervals[bucket] = dict.fromkeys(ENERGY_COLUMNS + ('covered_seconds',), 0.0)
+        entry = intervals[bucket]
+        entry['covered_seconds'] += seconds
+        for p0, p1, positive, negative in powers:
+            a = p0 + (p1 - p0) * f0
+            b = p0 + (p1 - p0) * f1
+            entry[positive] += _positive_area(a, b, seconds) / _WATT_SECONDS_PER_KWH
+            if negative:
+                entry[negative] += _positive_area(-a, -b, seconds) / _WATT_SECONDS_PER_KWH
+        cursor = piece_end
+    return intervals
+
+
+def export_price_signs(user_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Multiplier turning a user's stored feedIn per_kwh into what they're paid per kWh.
+
+    Amber reports feed-in prices negative when the customer is paid; the Flow
+    Power AEMO source stores its export rate as a positive payment.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    rows = db.session.execute(
+        select(User.id, User.electricity_provider, User.flow_power_price_source).where(User.id.in_(user_ids))
+    ).all()
+    return {
+        user_id: 1 if provider == 'flow_power' and source == 'aemo' else -1
+        for user_id, provider, source in rows
+    }
+
+
+def _interval_prices(user_id: int, first: datetime, last: datetime, export_sign: int) -> Dict[datetime, Dict]:
+    """Latest actual import/export price of each interval in [first, last] from PriceRecord."""
+    records = db.session.execute(
+        select(PriceRecord.channel_type, PriceRecord.per_kwh, PriceRecord.timestamp).where(
+            PriceRecord.user_id == user_id,
+            PriceRecord.channel_type.in_(('general', 'feedIn')),
+            PriceRecord.forecast == False,  # noqa: E712
+            PriceRecord.timestamp >= first,
+            PriceRecord.timestamp < last + LEDGER_INTERVAL,
+            nem_time_window(first, last + LEDGER_INTERVAL),
+        ).order_by(PriceRecord.timestamp.asc())
+    ).all()
+    prices = {}
+    for channel, per_kwh, timestamp in records:
+        if per_kwh is None:
+            continue
+        entry = prices.setdefault(interval_start(timestamp), {})
+        if channel == 'general':
+            entry['import_price'] = per_kwh
+        else:
+            entry['export_price'] = per_kwh * export_sign
+    return prices
+
+
+def _merge_set(excluded) -> Dict:
+    """ON CONFLICT DO UPDATE assignments adding a batch's energy to a stored interval."""
+    table = EnergyLedger.__table__.c
+    assignments = {
+        column: func.coalesce(table[column], 0) + excluded[column]
+        for column in ENERGY_COLUMNS + ('covered_seconds',)
+    }
+    for cost, price, energy in PRICED_FLOWS:
+        assignments[price] = func.coalesce(excluded[price], table[price])
+        assignments[cost] = (func.coalesce(table[energy], 0) + excluded[energy]) * func.coalesce(excluded[price], table[price])
+    return assignments
+
+
+def _upsert_intervals(rows: List[Dict]):
+    dialect_name = db.session.get_bind().dialect.name
+    dialect_insert = _DIALECT_INSERTS.get(dialect_name)
+    for batch in _batches(rows, dialect_name):
+        if dialect_insert is not None:
+            statement = dialect_insert(EnergyLedger).values(batch)
+            statement = statement.on_conflict_do_update(index_elements=list(LEDGER_KEY), set_=_merge_set(statement.excluded))
+            db.session.execute(statement)
+            continue
+
+        for row in batch:
+            entry = EnergyLedger.query.filter_by(user_id=row['user_id'], interval_start=row['interval_start']).first()
+            if entry is None:
+                db.session.add(EnergyLedger(**row))
+                continue
+            for column in ENERGY_COLUMNS + ('covered_seconds',):
+                setattr(entry, column, (getattr(entry, column) or 0.0) + row[column])
+            for cost, price, energy in PRICED_FLOWS:
+                if row[price] is not None:
+                    setattr(entry, price, row[price])
+                current_price = getattr(entry, price)
+                setattr(entry, cost, getattr(entry, energy) * current_price if current_price is not None else None)
+
+
+def _ledger_rows(user_id: int, intervals: Dict[datetime, Dict], export_sign: int) -> List[Dict]:
+    """Interval energy plus price and money columns, ready to upsert."""
+    if not intervals:
+        return []
+    prices = _interval_prices(user_id, min(intervals), max(intervals), export_sign)
+    rows = []
+    for bucket, energy in sorted(intervals.items()):
+        row = dict(energy, user_id=user_id, interval_start=bucket)
+        for cost, price, energy_column in PRICED_FLOWS:
+            row[price] = prices.get(bucket, {}).get(price)
+            row[cost] = row[energy_column] * row[price] if row[price] is not None else None
+        rows.append(row)
+    return rows
+
+
+def _add_intervals(into: Dict[datetime, Dict], intervals: Dict[datetime, Dict]):
+    for bucket, energy in intervals.items():
+        if bucket in into:
+            for column, value in energy.items():
+                into[bucket][column] += value
+        else:
+            into[bucket] = energy
+
+
+def record_ledger_samples(samples: List[Dict]):
+    """
+    Integrate new samples into their users' ledgers (database-writer job, the caller commits).
+
+    Args:
+        samples: EnergyRecord column values (with user_id and timestamp), in the
+            order collected. Each user's first sample is joined to their latest
+            stored sample before it.
+    """
+    by_user = {}
+    for values in samples:
+        by_user.setdefault(values['user_id'], []).append(values)
+
+    signs = export_price_signs(by_user)
+    rows = []
+    for user_id, user_samples in by_user.items():
+        first_at = _utc_naive(user_samples[0]['timestamp'])
+        previous = db.session.execute(
+            select(EnergyRecord).where(EnergyRecord.user_id == user_id, EnergyRecord.timestamp < first_at)
+            .order_by(EnergyRecord.timestamp.desc()).limit(1)
+        ).scalar()
+        previous = (previous.timestamp, _record_values(previous)) if previous is not None else None
+
+        intervals = {}
+        for values in user_samples:
+            timestamp = _utc_naive(values['timestamp'])
+            if previous is not None:
+                _add_intervals(intervals, integrate_segment(previous[0], previous[1], timestamp, values))
+            previous = (timestamp, values)
+        rows += _ledger_rows(user_id, intervals, signs.get(user_id, -1))
+
+    if rows:
+        _upsert_intervals(rows)
+
+
+def _record_values(record: EnergyRecord) -> Dict:
+    return {power: getattr(record, power) for power, _, _ in ENERGY_FLOWS}
+
+
+def apply_prices_to_ledger(price_rows: List[Dict]) -> int:
+    """
+    Price ledger intervals whose actual price just arrived (database-writer job).
+
+    Args:
+        price_rows: PriceRecord column values as saved by the price history job;
+            forecasts and channels other than general/feedIn are ignored
+
+    Returns:
+        Number of ledger intervals updated
+    """
+    latest = {}  # (user_id, interval, price column) -> (timestamp, price)
+    actual = [row for row in price_rows if not row.get('forecast') and row.get('per_kwh') is not None
+              and row.get('channel_type') in ('general', 'feedIn')]
+    signs = export_price_signs(row['user_id'] for row in actual)
+    for row in actual:
+        timestamp = _utc_naive(row['timestamp'])
+        if row['channel_type'] == 'general':
+            key, price = 'import_price', row['per_kwh']
+        else:
+            key, price = 'export_price', row['per_kwh'] * signs.get(row['user_id'], -1)
+        slot = (row['user_id'], interval_start(timestamp), key)
+        if slot not in latest or timestamp >= latest[slot][0]:
+            latest[slot] = (timestamp, price)
+
+    table = EnergyLedger.__table__.c
+    updated = 0
+    for (user_id, bucket, price_column), (_, price) in latest.items():
+        cost_column, energy_column = next((cost, energy) for cost, price_, energy in PRICED_FLOWS if price_ == price_column)
+        result = db.session.execute(
+            update(EnergyLedger.__table__)
+            .where(table.user_id == user_id, table.interval_start == bucket)
+            .values({price_column: price, cost_column: func.coalesce(table[energy_column], 0) * price})
+        )
+        updated += max(result.rowcount, 0)
+    return updated
+
+
+def save_price_records(rows: List[Dict]) -> int:
+    """Upsert collected price records and price the ledger intervals they cover (database-writer job)."""
+    inserted = upsert_price_records(rows)
+    apply_prices_to_ledger(rows)
+    return inserted
+
+
+def rebuild_ledger(user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    """
+    Recompute a user's ledger intervals in [start, end) from EnergyRecords and PriceRecords.
+
+    Bounds are rounded out to whole intervals. Returns the number of intervals
+    written; the caller commits.
+    """
+    if start is not None:
+        start = interval_start(start)
+    if end is not None:
+        end = interval_start(_utc_naive(end) - timedelta(microseconds=1)) + LEDGER_INTERVAL
+
+    query = select(EnergyRecord).where(EnergyRecord.user_id == user_id).order_by(EnergyRecord.timestamp.asc())
+    if start is not None:
+        # One sample earlier, so the first segment into the range is included
+        before = db.session.execute(
+            select(func.max(EnergyRecord.timestamp)).where(EnergyRecord.user_id == user_id, EnergyRecord.timestamp < start)
+        ).scalar()
+        query = query.where(EnergyRecord.timestamp >= (before or start))
+    if end is not None:
+        query = query.where(EnergyRecord.timestamp <= end)
+
+    intervals = {}
+    previous = None
+    for record in db.session.execute(query.execution_options(yield_per=5000)).scalars():
+        timestamp = _utc_naive(record.timestamp)
+        values = _record_values(record)
+        if previous is not None:
+            _add_intervals(intervals, integrate_segment(previous[0], previous[1], timestamp, values))
+        previous = (timestamp, values)
+    intervals = {
+        bucket: energy for bucket, energy in intervals.items()
+        if (start is None or bucket >= start) and (end is None or bucket < end)
+    }
+
+    stale = delete(EnergyLedger).where(EnergyLedger.user_id == user_id)
+    if start is not None:
+        stale = stale.where(EnergyLedger.interval_start >= start)
+    if end is not None:
+        stale = stale.where(EnergyLedger.interval_start < end)
+    db.session.execute(stale)
+
+    rows = _ledger_rows(user_id, intervals, export_price_signs([user_id]).get(user_id, -1))
+    for batch in _batches(rows, db.session.get_bind().dialect.name) if rows else ():
+        db.session.execute(insert(EnergyLedger), batch)
+    logger.info("Rebuilt %d energy ledger intervals for user %s", len(rows), user_id)
+    return len(rows)
+
+
+def ledger_totals(user_id: int, start: datetime, end: datetime) -> Dict:
+    """
+    Energy and money over [start, end) - one indexed aggregate over the intervals.
+
+    Returns:
+        {'intervals', 'covered_seconds', <ENERGY_COLUMNS> (kWh), 'import_cost',
+         'export_earnings', 'net_cost' (c), 'unpriced_import_kwh', 'unpriced_export_kwh'}
+    """
+    table = EnergyLedger.__table__.c
+    columns = [func.count().label('intervals'), func.sum(table.covered_seconds).label('covered_seconds')]
+    columns += [func.sum(table[column]).label(column) for column in ENERGY_COLUMNS]
+    columns += [func.sum(table[cost]).label(cost) for cost, _, _ in PRICED_FLOWS]
+    columns += [
+        func.sum(case((table.import_price.is_(None), table.grid_import_kwh), else_=0)).label('unpriced_import_kwh'),
+        func.sum(case((table.export_price.is_(None), table.grid_export_kwh), else_=0)).label('unpriced_export_kwh'),
+    ]
+    row = db.session.execute(
+        select(*columns).where(
+            table.user_id == user_id,
+            table.interval_start >= _utc_naive(start),
+            table.interval_start < _utc_naive(end),
+        )
+    ).one()._asdict()
+    totals = {key: (value or 0) for key, value in row.items()}
+    totals['net_cost'] = totals['import_cost'] - totals['export_earnings']
+    return totals
+
+
+def ledger_intervals(user_id: int, start: datetime, end: datetime) -> List[EnergyLedger]:
+    """A user's ledger intervals in [start, end), oldest first."""
+    return EnergyLedger.query.filter(
+        EnergyLedger.user_id == user_id,
+        EnergyLedger.interval_start >= _utc_naive(start),
+        EnergyLedger.interval_start < _utc_naive(end),
+    ).order_by(EnergyLedger.interval_start.asc()).all()
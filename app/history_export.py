@@ -0,0 +1,200 @@
+# app/history_export.py
+"""Streaming CSV / NDJSON export of the history tables"""
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app import db
+from app.cold_archive import (
+    ENERGY_SCHEMA, PRICE_CHANNELS, PRICE_SCHEMA, SPIKE_NAMES, archive_enabled, archive_path, months_in_range,
+    next_month, read_archive,
+)
+from app.models import BatteryHealthHistory, EnergyRecord, PriceRecord
+
+# Rows fetched per round trip and written per output chunk
+CHUNK_ROWS = 2000
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+class ExportDataset:
+    """One exportable table: its model, time column and exported columns."""
+
+    def __init__(self, model, time_column: str, columns: Tuple[str, ...], archive=None):
+        self.model = model
+        self.time_column = time_column
+        self.columns = columns
+        self.archive = archive  # cold_archive schema holding older rows, if any
+
+    def query(self, user_id: int, start: Optional[datetime], end: Optional[datetime]):
+        time_column = getattr(self.model, self.time_column)
+        statement = select(*(getattr(self.model, column) for column in self.columns)).where(
+            self.model.user_id == user_id
+        )
+        if start is not None:
+            statement = statement.where(time_column >= start)
+        if end is not None:
+            statement = statement.where(time_column < end)
+        return statement.order_by(time_column.asc())
+
+
+DATASETS = {
+    'prices': ExportDataset(PriceRecord, 'timestamp', (
+        'timestamp', 'nem_time', 'channel_type', 'forecast', 'per_kwh', 'spot_per_kwh', 'wholesale_kwh_price',
+        'network_kwh_price', 'market_kwh_price', 'green_kwh_price', 'spike_status',
+    ), archive=PRICE_SCHEMA),
+    'energy': ExportDataset(EnergyRecord, 'timestamp', (
+        'timestamp', 'solar_power', 'grid_power', 'battery_power', 'load_power', 'battery_level',
+    ), archive=ENERGY_SCHEMA),
+    'battery-health': ExportDataset(BatteryHealthHistory, 'scanned_at', (
+        'scanned_at', 'rated_capacity_wh', 'actual_capacity_wh', 'health_percent', 'degradation_percent',
+        'battery_count', 'pack_data',
+    )),
+}
+
+
+def _utc_naive(timestamp: Optional[datetime]) -> Optional[datetime]:
+    if timestamp is not None and timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _stream(statement) -> Iterator[Dict]:
+    """Rows of a select as dicts, fetched CHUNK_ROWS at a time from a server-side cursor."""
+    result = db.session.execute(statement.execution_options(stream_results=True, yield_per=CHUNK_ROWS))
+    try:
+        for row in result:
+            yield row._asdict()
+    finally:
+        result.close()
+
+
+def _archived_rows(dataset: ExportDataset, user_id: int, month: datetime,
+                   start: Optional[datetime], end: Optional[datetime]) -> List[Dict]:
+    """A month's archived rows of a dataset within [start, end), in export columns."""
+    rows = []
+    if dataset.archive is ENERGY_SCHEMA:
+        rows = read_archive(archive_path(ENERGY_SCHEMA, user_id, month), ENERGY_SCHEMA, start, end)
+    elif dataset.archive is PRICE_SCHEMA:
+        for channel in PRICE_CHANNELS:
+            for row in read_archive(archive_path(PRICE_SCHEMA, user_id, month, channel), PRICE_SCHEMA, start, end):
+                row.update(channel_type=channel, forecast=False, spike_status=SPIKE_NAMES.get(row['spike_status']))
+                rows.append(row)
+        rows.sort(key=lambda row: row['timestamp'])
+    if end is not None:
+        rows = [row for row in rows if row['timestamp'] < end]  # read_archive's end is inclusive
+    return rows
+
+
+def _row_key(row: Dict) -> tuple:
+    return row['timestamp'], row.get('channel_type'), row.get('forecast')
+
+
+def _has_archive(dataset: ExportDataset, user_id: int, month: datetime) -> bool:
+    if dataset.archive is PRICE_SCHEMA:
+        return any(os.path.exists(archive_path(PRICE_SCHEMA, user_id, month, channel)) for channel in PRICE_CHANNELS)
+    return os.path.exists(archive_path(dataset.archive, user_id, month))
+
+
+def _rows_with_archive(dataset: ExportDataset, user_id: int,
+                       start: Optional[datetime], end: Optional[datetime]) -> Iterator[Dict]:
+    """
+    Database rows merged with archived ones, oldest first.
+
+    Months with archive files are read one at a time (a month of rows in memory
+    at most), the database rows of that month deduplicated against them; the
+    rest streams straight from the database.
+    """
+    first = start or db.session.execute(
+        select(db.func.min(getattr(dataset.model, dataset.time_column))).where(dataset.model.user_id == user_id)
+    ).scalar()
+    last = end or datetime.now(timezone.utc).replace(tzinfo=None)
+    archived_months = [
+        month for month in (months_in_range(first, last) if first else ())
+        if _has_archive(dataset, user_id, month)
+    ]
+
+    cursor = start
+    for month in archived_months:
+        month_start = max(month, start) if start else month
+        month_end = min(next_month(month), end) if end else next_month(month)
+        if cursor is None or cursor < month_start:
+            yield from _stream(dataset.query(user_id, cursor, month_start))
+        archived = _archived_rows(dataset, user_id, month, month_start, month_end)
+        keys = {_row_key(row) for row in archived}
+        stored = [row for row in _stream(dataset.query(user_id, month_start, month_end)) if _row_key(row) not in keys]
+        yield from sorted(archived + stored, key=lambda row: row['timestamp'])
+        cursor = month_end
+    yield from _stream(dataset.query(user_id, cursor, end))
+
+
+def export_rows(dataset: ExportDataset, user_id: int,
+                start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[Dict]:
+    """A user's rows of a dataset with start <= time < end (naive UTC bounds; None for open), oldest first."""
+    start, end = _utc_naive(start), _utc_naive(end)
+    if dataset.archive is not None and archive_enabled():
+        yield from _rows_with_archive(dataset, user_id, start, end)
+    else:
+        yield from _stream(dataset.query(user_id, start, end))
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+    return value
+
+
+def csv_chunks(columns: Tuple[str, ...], rows: Iterable[Dict]) -> Iterator[str]:
+    """CSV text with a header row, CHUNK_ROWS rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([_format_value(row.get(column)) for column in columns])
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(columns: Tuple[str, ...], rows: Iterable[Dict]) -> Iterator[str]:
+    """One JSON object per line, CHUNK_ROWS rows per chunk."""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({column: _format_value(row.get(column)) for column in columns}))
+        if len(lines) == CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def gzip_chunks(chunks: Iterable[str]) -> Iterator[bytes]:
+    """Gzip a stream of text chunks incrementally."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(dataset_name: str, user_id: int, export_format: str = 'csv', gzip: bool = False,
+                  start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator:
+    """Encoded export chunks (str, or bytes when gzipped) of a dataset."""
+    dataset = DATASETS[dataset_name]
+    rows = export_rows(dataset, user_id, start, end)
+    chunks = csv_chunks(dataset.columns, rows) if export_format == 'csv' else ndjson_chunks(dataset.columns, rows)
+    return gzip_chunks(chunks) if gzip else chunks
@@ -0,0 +1,481 @@
+# app/history_store.py
+"""Bulk writers for the price and energy history tables"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import case, delete, insert, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import EnergyRecord, EnergyRollup, PriceRecord
+
+logger = logging.getLogger(__name__)
+
+# Natural key of a price record (ix_price_record_user_nem_time_channel, unique)
+PRICE_RECORD_KEY = ('user_id', 'nem_time', 'channel_type')
+
+# nem_time (NEM wall clock of the interval end) of an actual price lies within
+# this window around its UTC collection timestamp
+NEM_TIME_BEFORE = timedelta(days=1)
+NEM_TIME_AFTER = timedelta(days=2)
+
+# Stay under SQLite's default limit of 999 bound parameters per statement
+SQLITE_MAX_PARAMETERS = 999
+MAX_BATCH_ROWS = 500
+
+_DIALECT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def _batches(rows: List[Dict], dialect_name: str):
+    """Split rows into statement-sized batches."""
+    columns = max(len(row) for row in rows)
+    size = MAX_BATCH_ROWS
+    if dialect_name == 'sqlite':
+        size = min(size, max(1, SQLITE_MAX_PARAMETERS // columns))
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _unique_by_key(rows: List[Dict], key: tuple) -> List[Dict]:
+    """Drop rows repeating an earlier row's key (the first one wins, as with the stored row)."""
+    seen = set()
+    unique = []
+    for row in rows:
+        row_key = tuple(row.get(column) for column in key)
+        if row_key in seen:
+            continue
+        seen.add(row_key)
+        unique.append(row)
+    return unique
+
+
+def nem_time_window(start: datetime, end: datetime):
+    """
+    A nem_time condition implied by a PriceRecord.timestamp range, for actual prices.
+
+    Redundant with the timestamp filter, but it lets PostgreSQL skip the
+    price_record partitions (split on nem_time, see app.partitioning) that can't
+    hold the range. Rows without a nem_time are kept.
+    """
+    return or_(
+        PriceRecord.nem_time.is_(None),
+        PriceRecord.nem_time.between(_utc_naive(start) - NEM_TIME_BEFORE, _utc_naive(end) + NEM_TIME_AFTER),
+    )
+
+
+def upsert_price_records(rows: List[Dict]) -> int:
+    """
+    Insert price records, skipping any whose (user_id, nem_time, channel_type) is already stored.
+
+    All rows - typically one tick's prices for every user - are written with one
+    INSERT ... ON CONFLICT DO NOTHING per batch on SQLite and PostgreSQL. Other
+    dialects look up the existing keys of each batch in one query and insert the
+    rest. The unique index makes concurrent writers (WebSocket and cron paths)
+    safe: whichever commits second skips the duplicates.
+
+    Args:
+        rows: Dicts of PriceRecord column values. Every row must have the same keys.
+
+    Returns:
+        Number of records inserted. The caller commits the session.
+    """
+    if not rows:
+        return 0
+
+    rows = _unique_by_key(rows, PRICE_RECORD_KEY)
+    dialect_name = db.session.get_bind().dialect.name
+    dialect_insert = _DIALECT_INSERTS.get(dialect_name)
+    inserted = 0
+
+    for batch in _batches(rows, dialect_name):
+        if dialect_insert is not None:
+            statement = dialect_insert(PriceRecord).values(batch).on_conflict_do_nothing(
+                index_elements=list(PRICE_RECORD_KEY)
+            )
+            inserted += max(db.session.execute(statement).rowcount, 0)
+            continue
+
+        key_columns = [getattr(PriceRecord, column) for column in PRICE_RECORD_KEY]
+        batch_keys = {tuple(row.get(column) for column in PRICE_RECORD_KEY) for row in batch}
+        existing = set(db.session.execute(
+            select(*key_columns).where(tuple_(*key_columns).in_(list(batch_keys)))
+        ).all())
+        new_rows = [row for row in batch if tuple(row.get(column) for column in PRICE_RECORD_KEY) not in existing]
+        if new_rows:
+            db.session.execute(insert(PriceRecord), new_rows)
+        inserted += len(new_rows)
+
+    logger.debug("Price history upsert: %d of %d records inserted", inserted, len(rows))
+    return inserted
+
+
+# Energy rollups: granularity -> bucket length, finest first
+ROLLUP_GRANULARITIES = {
+    '5min': timedelta(minutes=5),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+ENERGY_ROLLUP_KEY = ('user_id', 'granularity', 'bucket_start')
+
+# save_energy_usage samples every minute. Energy is integrated between consecutive
+# samples with the ledger's trapezoid rule (energy_ledger.integrate_segment); a
+# longer gap (missed collections, restarts) is not integrated.
+SAMPLE_INTERVAL = timedelta(minutes=1)
+MAX_SAMPLE_GAP = timedelta(minutes=5)
+
+# History views return at most this many points (raw minute samples for a day)
+MAX_HISTORY_POINTS = 1500
+
+POWER_CHANNELS = ('solar', 'battery', 'grid', 'load')
+
+_ROLLUP_ENERGY_COLUMNS = (
+    'solar_wh', 'load_wh', 'grid_import_wh', 'grid_export_wh', 'battery_charge_wh', 'battery_discharge_wh',
+)
+_ROLLUP_SUM_COLUMNS = (
+    'sample_count',
+    *(f'{channel}_power_sum' for channel in POWER_CHANNELS),
+    *_ROLLUP_ENERGY_COLUMNS,
+    'battery_level_sum', 'battery_level_count',
+)
+_ROLLUP_MIN_COLUMNS = (*(f'{channel}_power_min' for channel in POWER_CHANNELS), 'battery_level_min')
+_ROLLUP_MAX_COLUMNS = (*(f'{channel}_power_max' for channel in POWER_CHANNELS), 'battery_level_max')
+
+
+def _utc_naive(timestamp: datetime) -> datetime:
+    """UTC timestamp without tzinfo, as stored in the history tables."""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def user_zone(tz_name: Optional[str]) -> ZoneInfo:
+    """ZoneInfo for a user's timezone setting, falling back to the User model's default."""
+    try:
+        return ZoneInfo(tz_name or 'Australia/Brisbane')
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning("Unknown timezone %r for energy rollups, using Australia/Brisbane", tz_name)
+        return ZoneInfo('Australia/Brisbane')
+
+
+def rollup_bucket_start(timestamp: datetime, granularity: str, tz: ZoneInfo) -> datetime:
+    """
+    Start of the rollup bucket containing a timestamp, as naive UTC.
+
+    5-minute buckets are aligned in UTC (every zone offset is a multiple of 5
+    minutes); hour and day buckets are aligned on the local clock, so half-hour
+    zones like Adelaide get local hours and days start at local midnight.
+    """
+    utc = _utc_naive(timestamp)
+    if granularity == '5min':
+        return utc.replace(minute=utc.minute - utc.minute % 5, second=0, microsecond=0)
+
+    local = utc.replace(tzinfo=timezone.utc).astimezone(tz)
+    if granularity == 'hour':
+        local = local.replace(minute=0, second=0, microsecond=0)
+    elif granularity == 'day':
+        local = local.replace(hour=0, minute=0, second=0, microsecond=0, fold=0)
+    else:
+        raise ValueError(f"Unknown rollup granularity: {granularity}")
+    return _utc_naive(local)
+
+
+def granularity_for_range(start: datetime, end: datetime, max_points: int = MAX_HISTORY_POINTS) -> Optional[str]:
+    """
+    Finest resolution that keeps a history range within max_points.
+
+    Returns:
+        None for raw EnergyRecord samples, else an EnergyRollup granularity
+    """
+    span = end - start
+    if span <= SAMPLE_INTERVAL * max_points:
+        return None
+    for granularity, length in ROLLUP_GRANULARITIES.items():
+        if span <= length * max_points:
+            return granularity
+    return 'day'
+
+
+def _sample_values(record: EnergyRecord, timestamp: datetime) -> Dict:
+    """Rollup column values for a single sample, without energy (see _segment_energy)."""
+    values = {'sample_count': 1, 'last_sample_at': timestamp}
+    for channel in POWER_CHANNELS:
+        watts = getattr(record, f'{channel}_power') or 0.0
+        values[f'{channel}_power_sum'] = watts
+        values[f'{channel}_power_min'] = watts
+        values[f'{channel}_power_max'] = watts
+    values.update(dict.fromkeys(_ROLLUP_ENERGY_COLUMNS, 0.0))
+
+    level = record.battery_level
+    values['battery_level_sum'] = level if level is not None else 0.0
+    values['battery_level_count'] = 1 if level is not None else 0
+    values['battery_level_min'] = level
+    values['battery_level_max'] = level
+    values['battery_level_last'] = level
+    return values
+
+
+def _energy_only_values() -> Dict:
+    """Rollup column values of a bucket a segment's energy reaches without a sample in it."""
+    values = dict.fromkeys(_ROLLUP_SUM_COLUMNS, 0)
+    values.update(dict.fromkeys(_ROLLUP_ENERGY_COLUMNS, 0.0))
+    values.update(dict.fromkeys(_ROLLUP_MIN_COLUMNS + _ROLLUP_MAX_COLUMNS, None))
+    values.update(last_sample_at=None, battery_level_last=None)
+    return values
+
+
+def _segment_energy(previous: Optional[tuple], timestamp: datetime, record: EnergyRecord, tz: ZoneInfo) -> Dict[tuple, Dict]:
+    """
+    Energy (Wh) of the segment from the previous sample to this one, per rollup bucket.
+
+    The segment is integrated and split at 5-minute boundaries exactly as the
+    energy ledger does; hour and day buckets are whole 5-minute intervals.
+
+    Args:
+        previous: (timestamp, EnergyRecord) of the user's previous sample, or None
+
+    Returns:
+        {(granularity, bucket_start): {<energy column>: Wh}}
+    """
+    from app.energy_ledger import integrate_segment, _record_values
+
+    if previous is None:
+        return {}
+    buckets = {}
+    segment = integrate_segment(previous[0], _record_values(previous[1]), timestamp, _record_values(record))
+    for interval, energy in segment.items():
+        wh = {f'{column[:-len("_kwh")]}_wh': kwh * 1000 for column, kwh in energy.items() if column.endswith('_kwh')}
+        for granularity in ROLLUP_GRANULARITIES:
+            key = (granularity, rollup_bucket_start(interval, granularity, tz))
+            bucket = buckets.setdefault(key, dict.fromkeys(_ROLLUP_ENERGY_COLUMNS, 0.0))
+            for column, value in wh.items():
+                bucket[column] += value
+    return buckets
+
+
+def _merge_values(current: Dict, sample: Dict) -> Dict:
+    """Fold a later sample's values into a bucket's values (the Python twin of _merge_set)."""
+    merged = dict(current)
+    for column in _ROLLUP_SUM_COLUMNS:
+        merged[column] = (current.get(column) or 0) + (sample.get(column) or 0)
+    for column in _ROLLUP_MIN_COLUMNS:
+        values = [value for value in (current.get(column), sample.get(column)) if value is not None]
+        merged[column] = min(values) if values else None
+    for column in _ROLLUP_MAX_COLUMNS:
+        values = [value for value in (current.get(column), sample.get(column)) if value is not None]
+        merged[column] = max(values) if values else None
+    if sample.get('last_sample_at') is not None and (
+            current.get('last_sample_at') is None or sample['last_sample_at'] >= current['last_sample_at']):
+        merged['last_sample_at'] = sample['last_sample_at']
+        if sample.get('battery_level_last') is not None:
+            merged['battery_level_last'] = sample['battery_level_last']
+    return merged
+
+
+def _merge_set(excluded) -> Dict:
+    """ON CONFLICT DO UPDATE assignments folding the new sample into the stored bucket."""
+    table = EnergyRollup.__table__.c
+    assignments = {}
+    for column in _ROLLUP_SUM_COLUMNS:
+        assignments[column] = db.func.coalesce(table[column], 0) + excluded[column]
+    for column in _ROLLUP_MIN_COLUMNS:
+        assignments[column] = case(
+            (or_(table[column].is_(None), excluded[column] < table[column]), excluded[column]),
+            else_=table[column],
+        )
+    for column in _ROLLUP_MAX_COLUMNS:
+        assignments[column] = case(
+            (or_(table[column].is_(None), excluded[column] > table[column]), excluded[column]),
+            else_=table[column],
+        )
+    is_newer = or_(table.last_sample_at.is_(None), excluded.last_sample_at >= table.last_sample_at)
+    assignments['last_sample_at'] = case((is_newer, excluded.last_sample_at), else_=table.last_sample_at)
+    assignments['battery_level_last'] = case(
+        (is_newer & excluded.battery_level_last.isnot(None), excluded.battery_level_last),
+        else_=table.battery_level_last,
+    )
+    return assignments
+
+
+def record_energy_sample(record: EnergyRecord, tz_name: Optional[str] = None) -> None:
+    """
+    Fold a new EnergyRecord into its user's 5-minute, hourly and daily rollups.
+
+    The three buckets are upserted with one INSERT ... ON CONFLICT DO UPDATE on
+    SQLite and PostgreSQL, so a sample costs one statement however long the
+    bucket has been accumulating. Other dialects read and update the rows.
+    The energy of the segment since the user's previous stored sample goes to
+    the buckets it covers (see _segment_energy). Samples are expected in time
+    order per user.
+
+    Args:
+        record: The new sample (not yet committed is fine)
+        tz_name: The user's IANA timezone, for hour and day bucket boundaries
+
+    The caller commits the session, together with the EnergyRecord.
+    """
+    tz = user_zone(tz_name)
+    timestamp = _utc_naive(record.timestamp or datetime.now(timezone.utc))
+    previous = db.session.execute(
+        select(EnergyRecord).where(EnergyRecord.user_id == record.user_id, EnergyRecord.timestamp < timestamp)
+        .order_by(EnergyRecord.timestamp.desc()).limit(1)
+    ).scalar()
+    previous = (_utc_naive(previous.timestamp), previous) if previous is not None else None
+
+    sample = _sample_values(record, timestamp)
+    buckets = {
+        (granularity, rollup_bucket_start(timestamp, granularity, tz)): dict(sample)
+        for granularity in ROLLUP_GRANULARITIES
+    }
+    for key, energy in _segment_energy(previous, timestamp, record, tz).items():
+        values = buckets.setdefault(key, _energy_only_values())
+        for column, value in energy.items():
+            values[column] += value
+    rows = [
+        dict(values, user_id=record.user_id, granularity=granularity, bucket_start=bucket_start)
+        for (granularity, bucket_start), values in buckets.items()
+    ]
+
+    dialect_insert = _DIALECT_INSERTS.get(db.session.get_bind().dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(EnergyRollup).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(ENERGY_ROLLUP_KEY),
+            set_=_merge_set(statement.excluded),
+        )
+        db.session.execute(statement)
+        return
+
+    for row in rows:
+        rollup = EnergyRollup.query.filter_by(
+            user_id=row['user_id'], granularity=row['granularity'], bucket_start=row['bucket_start']
+        ).first()
+        if rollup is None:
+            db.session.add(EnergyRollup(**row))
+            continue
+        values = {column: value for column, value in row.items() if column not in ENERGY_ROLLUP_KEY}
+        current = {column: getattr(rollup, column) for column in values}
+        for column, value in _merge_values(current, values).items():
+            setattr(rollup, column, value)
+
+
+def add_energy_sample(user_id: int, values: Dict, tz_name: Optional[str] = None) -> EnergyRecord:
+    """
+    Store one EnergyRecord and fold it into the user's rollups.
+
+    A database-writer job (see app.db_writer): the caller's transaction, or the
+    writer's batch, commits it.
+    """
+    from app.energy_ledger import record_ledger_samples
+
+    record = EnergyRecord(user_id=user_id, **values)
+    db.session.add(record)
+    record_energy_sample(record, tz_name)
+    record_ledger_samples([dict(values, user_id=user_id)])
+    return record
+
+
+def add_energy_samples(samples: List[tuple]) -> int:
+    """
+    Store a batch of buffered samples and fold each into its user's rollups.
+
+    Args:
+        samples: (EnergyRecord column values including user_id, user timezone)
+            tuples in the order they were collected
+
+    A database-writer job: the records go in with one multi-row INSERT per
+    batch, then the rollups are updated sample by sample (in order, so each one
+    integrates over the gap since the previous) and the batch is integrated
+    into the energy ledger. Returns the number stored.
+    """
+    from app.energy_ledger import record_ledger_samples
+
+    if not samples:
+        return 0
+    rows = [values for values, _ in samples]
+    for batch in _batches(rows, db.session.get_bind().dialect.name):
+        db.session.execute(insert(EnergyRecord), batch)
+    for values, tz_name in samples:
+        record_energy_sample(EnergyRecord(**values), tz_name)
+    record_ledger_samples(rows)
+    return len(samples)
+
+
+def rebuild_energy_rollups(user_id: int, tz_name: Optional[str] = None,
+                           start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    """
+    Recompute a user's rollups from their EnergyRecords (backfill or repair).
+
+    Rollups of every bucket touching [start, end) are replaced. Bounds are
+    widened to whole local days so no day bucket is left half-rebuilt. As in
+    energy_ledger.rebuild_ledger, the last sample before start is read so the
+    segment into the range is integrated.
+
+    Returns:
+        Number of rollup rows written. The caller commits the session.
+    """
+    tz = user_zone(tz_name)
+    if start is not None:
+        start = rollup_bucket_start(start, 'day', tz)
+    if end is not None:
+        end = rollup_bucket_start(end, 'day', tz)
+        end = rollup_bucket_start(end + timedelta(hours=36), 'day', tz)  # Start of the next local day
+
+    query = select(EnergyRecord).where(EnergyRecord.user_id == user_id).order_by(EnergyRecord.timestamp.asc())
+    if start is not None:
+        before = db.session.execute(
+            select(db.func.max(EnergyRecord.timestamp)).where(EnergyRecord.user_id == user_id, EnergyRecord.timestamp < start)
+        ).scalar()
+        query = query.where(EnergyRecord.timestamp >= (before or start))
+    if end is not None:
+        query = query.where(EnergyRecord.timestamp < end)
+
+    buckets = {}
+    previous = None
+    for record in db.session.execute(query.execution_options(yield_per=5000)).scalars():
+        timestamp = _utc_naive(record.timestamp)
+        for key, energy in _segment_energy(previous, timestamp, record, tz).items():
+            if start is not None and key[1] < start:
+                continue
+            values = buckets.setdefault(key, _energy_only_values())
+            for column, value in energy.items():
+                values[column] += value
+        previous = (timestamp, record)
+        if start is not None and timestamp < start:
+            continue
+
+        sample = _sample_values(record, timestamp)
+        for granularity in ROLLUP_GRANULARITIES:
+            key = (granularity, rollup_bucket_start(timestamp, granularity, tz))
+            buckets[key] = _merge_values(buckets[key], sample) if key in buckets else dict(sample)
+
+    stale = delete(EnergyRollup).where(EnergyRollup.user_id == user_id)
+    if start is not None:
+        stale = stale.where(EnergyRollup.bucket_start >= start)
+    if end is not None:
+        stale = stale.where(EnergyRollup.bucket_start < end)
+    db.session.execute(stale)
+
+    rows = [
+        dict(values, user_id=user_id, granularity=granularity, bucket_start=bucket_start)
+        for (granularity, bucket_start), values in buckets.items()
+    ]
+    if rows:
+        for batch in _batches(rows, db.session.get_bind().dialect.name):
+            db.session.execute(insert(EnergyRollup), batch)
+    logger.info("Rebuilt %d energy rollups for user %s", len(rows), user_id)
+    return len(rows)
+
+
+def energy_rollups(user_id: int, granularity: str, start: datetime, end: datetime) -> List[EnergyRollup]:
+    """A user's rollups of one granularity with bucket_start in [start, end], oldest first."""
+    return EnergyRollup.query.filter(
+        EnergyRollup.user_id == user_id,
+        EnergyRollup.granularity == granularity,
+        EnergyRollup.bucket_start >= _utc_naive(start),
+        EnergyRollup.bucket_start <= _utc_naive(end),
+    ).order_by(EnergyRollup.bucket_start.asc()).all()
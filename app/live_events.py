@@ -0,0 +1,247 @@
+# app/live_events.py
+"""In-process publish/subscribe of live updates for the Server-Sent Events stream (/api/events)"""
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+# Concurrent streams served; each holds a server thread for as long as it is open
+MAX_STREAMS = _env_int('LIVE_EVENTS_MAX_STREAMS', 8)
+# A comment line is sent after this much silence, so proxies keep the connection
+# open and a gone client is noticed
+KEEPALIVE_SECONDS = _env_int('LIVE_EVENTS_KEEPALIVE_SECONDS', 15)
+# Streams end after this long and the browser reconnects (EventSource does so by
+# itself, resuming from Last-Event-ID), so a thread is never held forever
+MAX_STREAM_SECONDS = _env_int('LIVE_EVENTS_MAX_STREAM_SECONDS', 1800)
+RETRY_MILLISECONDS = 5000
+# Events waiting for a slow client; the oldest are dropped beyond this
+QUEUE_SIZE = 100
+
+# price: current prices ({'prices': [...], 'source': ...}, each price as from /api/current-price)
+# power: a power-flow snapshot (watts and battery percentage, as from /api/tesla/status)
+# curtailment: export rule and inverter curtailment state
+# sync: the result of a TOU schedule sync
+EVENT_TYPES = ('price', 'power', 'curtailment', 'sync')
+
+_CLOSED = object()
+
+
+def user_topic(user_id: int) -> str:
+    return f'user:{user_id}'
+
+
+def amber_site_topic(site_id: str) -> str:
+    """Topic of the prices the Amber WebSocket pushes for a site (shared by its users)."""
+    return f'amber_site:{site_id}'
+
+
+class LiveEvent:
+    __slots__ = ('id', 'topic', 'type', 'message')
+
+    def __init__(self, epoch: str, event_id: int, topic: str, event_type: str, data: Dict):
+        self.id = event_id
+        self.topic = topic
+        self.type = event_type
+        # Encoded once, however many streams it goes to
+        self.message = (
+            f'id: {epoch}-{event_id}\nevent: {event_type}\n'
+            f'data: {json.dumps(data, default=str)}\n\n'
+        )
+
+
+class Subscription:
+    """One stream's queue of events on its topics."""
+
+    def __init__(self, broker: 'LiveEventBroker', topics: Iterable[str]):
+        self.broker = broker
+        self.topics = frozenset(topics)
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Slow client: keep the newest events
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            self._queue.put_nowait(event)
+
+    def get(self, timeout: float):
+        """The next event, None after timeout seconds without one, or _CLOSED."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LiveEventBroker:
+    """
+    Fans events published by the background jobs out to the open SSE streams.
+
+    Publishing never blocks: each stream has its own bounded queue. The latest
+    event of each type on each topic is kept, so a new stream starts with the
+    current state (and a reconnecting one with whatever it missed) instead of
+    polling for it. Like the energy sample buffer, the broker lives in the
+    process that runs the scheduler - with one gunicorn worker that is also
+    the one serving requests.
+
+    Event ids are "<epoch>-<counter>". The counter restarts with the process,
+    so the epoch tells a Last-Event-ID from before a restart (or from another
+    worker) apart from one of this broker's events.
+    """
+
+    def __init__(self, max_streams: int = MAX_STREAMS):
+        self.max_streams = max_streams
+        self.epoch = f'{int(time.time()):x}.{os.getpid():x}'
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._last_id = 0
+        self._subscriptions: Dict[str, set] = {}  # topic -> subscriptions
+        self._latest: Dict[tuple, LiveEvent] = {}  # (topic, type) -> last event
+        self._open = set()
+        atexit.register(self.close)
+
+    def publish(self, topic: str, event_type: str, data: Dict) -> LiveEvent:
+        with self._lock:
+            self._last_id = next(self._ids)
+            event = LiveEvent(self.epoch, self._last_id, topic, event_type, data)
+            self._latest[(topic, event_type)] = event
+            subscriptions = list(self._subscriptions.get(topic, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+        return event
+
+    def _parse_last_event_id(self, last_event_id: Optional[str]) -> Optional[int]:
+        """The counter of a Last-Event-ID this broker issued, else None (send everything)."""
+        if not last_event_id:
+            return None
+        epoch, _, counter = last_event_id.rpartition('-')
+        if epoch != self.epoch:
+            return None
+        try:
+            counter = int(counter)
+        except ValueError:
+            return None
+        return counter if 0 < counter <= self._last_id else None
+
+    def subscribe(self, topics: Iterable[str], last_event_id: Optional[str] = None) -> Optional[Subscription]:
+        """
+        Open a subscription, queued with the latest event of each type on its topics.
+
+        With last_event_id (a reconnecting client's Last-Event-ID header) only
+        latest events newer than it are queued; an id from another epoch or
+        beyond the last one published is ignored. Returns None when max_streams
+        are already open.
+        """
+        with self._lock:
+            if len(self._open) >= self.max_streams:
+                return None
+            last_event_id = self._parse_last_event_id(last_event_id)
+            subscription = Subscription(self, topics)
+            self._open.add(subscription)
+            for topic in subscription.topics:
+                self._subscriptions.setdefault(topic, set()).add(subscription)
+            latest = sorted(
+                (event for (topic, _), event in self._latest.items() if topic in subscription.topics),
+                key=lambda event: event.id,
+            )
+            for event in latest:
+                if last_event_id is None or event.id > last_event_id:
+                    subscription.put(event)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription not in self._open:
+                return
+            self._open.discard(subscription)
+            for topic in subscription.topics:
+                subscribers = self._subscriptions[topic]
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[topic]
+
+    @property
+    def streams(self) -> int:
+        with self._lock:
+            return len(self._open)
+
+    def close(self):
+        """End every open stream (at shutdown)."""
+        with self._lock:
+            subscriptions = list(self._open)
+        for subscription in subscriptions:
+            subscription.put(_CLOSED)
+
+
+def event_stream(subscription: Subscription, keepalive: float = KEEPALIVE_SECONDS,
+                 max_seconds: float = MAX_STREAM_SECONDS) -> Iterator[str]:
+    """The text/event-stream body of a subscription; closes it when the stream ends."""
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            event = subscription.get(timeout=min(keepalive, remaining))
+            if event is _CLOSED:
+                return
+            yield event.message if event is not None else ': keepalive\n\n'
+    finally:
+        subscription.close()
+
+
+def publish(topic: str, event_type: str, data: Dict):
+    """Publish to the app's broker (no-op outside an app context or without one)."""
+    broker: Optional[LiveEventBroker] = current_app.config.get('LIVE_EVENTS') if has_app_context() else None
+    if broker is None:
+        return
+    try:
+        broker.publish(topic, event_type, data)
+    except Exception as e:
+        logger.error(f"Failed to publish live {event_type} event: {e}")
+
+
+def publish_to_user(user_id: int, event_type: str, data: Dict):
+    publish(user_topic(user_id), event_type, data)
+
+
+def publish_curtailment(user):
+    """Publish a user's current curtailment state (after it has been committed)."""
+    publish_to_user(user.id, 'curtailment', {
+        'export_rule': user.current_export_rule,
+        'inverter_state': getattr(user, 'inverter_last_state', None),
+        'inverter_power_limit_w': getattr(user, 'inverter_power_limit_w', None),
+        'sigenergy_state': getattr(user, 'sigenergy_curtailment_state', None),
+        'sigenergy_export_limit_kw': getattr(user, 'sigenergy_export_limit_kw', None),
+    })
+
+
+def price_list(prices: Dict) -> list:
+    """Amber channel -> price dict (as the WebSocket delivers them) to a /api/current-price style list."""
+    return [dict(price, channelType=channel) for channel, price in prices.items() if price]
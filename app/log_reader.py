@@ -0,0 +1,317 @@
+# app/log_reader.py
+"""
+Reading the rotating log file from its end, for the log viewer.
+
+Lines are read backwards from EOF a block at a time, so a request costs the
+lines it returns (and the ones its level filter skips), not the size of the
+file. Positions are exchanged with the client as cursors, "<inode>:<offset>":
+the inode survives RotatingFileHandler renaming flask.log to flask.log.1, so
+a cursor keeps pointing at the same lines after a rotation.
+
+WARNING and above are usually a small fraction of the log, and a filter for
+them alone would otherwise scan whole files. Their line offsets are kept in a
+small sidecar index next to the log, extended from where it left off on each
+request.
+
+Environment:
+    LOG_LEVEL_INDEX: Set to 0 to disable the sidecar index
+"""
+import json
+import logging
+import os
+import re
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.logging_config import LOG_BACKUP_COUNT
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+INDEXED_LEVELS = ('WARNING', 'ERROR', 'CRITICAL')
+INDEX_ENABLED = os.environ.get('LOG_LEVEL_INDEX', '1') != '0'
+
+BLOCK_SIZE = 64 * 1024
+# Bytes at the start of a file stored with its index, to notice a reused inode
+INDEX_HEAD_BYTES = 64
+
+# "2025-11-12 18:16:31 [INFO] app: ..." (LOG_FORMAT); continuation lines (tracebacks) have no level
+_LEVEL_PATTERN = re.compile(rb'^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d \[([A-Z]+)\] ')
+
+
+class LogCursorError(ValueError):
+    """A cursor that can't be parsed."""
+
+
+def line_level(line: bytes) -> Optional[str]:
+    match = _LEVEL_PATTERN.match(line)
+    if match is None:
+        return None
+    level = match.group(1).decode('ascii')
+    return level if level in LEVELS else None
+
+
+def format_cursor(inode: int, offset: int) -> str:
+    return f'{inode}:{offset}'
+
+
+def parse_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        inode, offset = (int(part) for part in cursor.split(':'))
+    except (AttributeError, ValueError):
+        raise LogCursorError(f'Invalid log cursor: {cursor!r}')
+    if offset < 0:
+        raise LogCursorError(f'Invalid log cursor: {cursor!r}')
+    return inode, offset
+
+
+def log_files(path: str) -> List[Tuple[str, os.stat_result]]:
+    """The log file and its existing backups with their stat, newest first."""
+    files = []
+    for name in [path] + [f'{path}.{number}' for number in range(1, LOG_BACKUP_COUNT + 1)]:
+        try:
+            files.append((name, os.stat(name)))
+        except OSError:
+            continue
+    return files
+
+
+def _complete_end(f, size: int) -> int:
+    """Offset just past the file's last newline (a line still being written is left out)."""
+    position = size
+    while position > 0:
+        start = max(0, position - BLOCK_SIZE)
+        f.seek(start)
+        newline = f.read(position - start).rfind(b'\n')
+        if newline >= 0:
+            return start + newline + 1
+        position = start
+    return 0
+
+
+def iter_lines_backwards(f, end: int, start: int = 0, block_size: int = BLOCK_SIZE) -> Iterator[Tuple[int, bytes]]:
+    """
+    (offset, line) of the lines in [start, end) of a binary file, last first.
+
+    end must be a line boundary (see _complete_end). Lines are yielded without
+    their newline.
+    """
+    position = end
+    buffer = b''  # The bytes from position on not yielded yet: the tail of a line starting earlier
+    while position > start:
+        read_size = min(block_size, position - start)
+        position -= read_size
+        f.seek(position)
+        buffer = f.read(read_size) + buffer
+
+        cut = 0
+        if position > start:
+            # Everything up to the first newline may belong to a line starting in an earlier block
+            cut = buffer.find(b'\n') + 1
+            if cut == 0:
+                continue
+        region, buffer = buffer[cut:], buffer[:cut]
+
+        lines = region.split(b'\n')[:-1]
+        offsets = []
+        offset = position + cut
+        for line in lines:
+            offsets.append(offset)
+            offset += len(line) + 1
+        yield from zip(reversed(offsets), reversed(lines))
+
+
+class LevelIndex:
+    """
+    Offsets of the INDEXED_LEVELS lines of each log file, in a JSON sidecar.
+
+    Files are identified by inode, so a backup's entry stays valid after it is
+    renamed; entries of files no longer present are dropped. Each process
+    extends the index from the sidecar's state and writes it back atomically.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.levels.json')
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self._loaded_mtime = None
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self._entries = json.load(f)
+            self._loaded_mtime = mtime
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable log index {self.path}: {e}")
+            self._entries = {}
+
+    def _save(self, live_inodes):
+        self._entries = {inode: entry for inode, entry in self._entries.items() if inode in live_inodes}
+        temporary = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(temporary, 'w') as f:
+                json.dump(self._entries, f, separators=(',', ':'))
+            os.replace(temporary, self.path)
+            self._loaded_mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logger.warning(f"Could not write log index {self.path}: {e}")
+
+    def offsets(self, f, stat: os.stat_result, end: int, live_inodes) -> Dict[str, List[int]]:
+        """Level -> ascending line offsets in [0, end) of an open log file, indexing what's new."""
+        key = str(stat.st_ino)
+        f.seek(0)
+        head = f.read(INDEX_HEAD_BYTES).hex()
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            # Indexed further than end is fine (another process saw more of the file), past its size is not
+            if entry is None or entry['head'] != head[:len(entry['head'])] or entry['indexed'] > os.fstat(f.fileno()).st_size:
+                entry = {'head': head, 'indexed': 0, **{level: [] for level in INDEXED_LEVELS}}
+            if entry['indexed'] < end:
+                self._extend(f, entry, end)
+                entry['head'] = head
+                self._entries[key] = entry
+                self._save(live_inodes)
+            return {level: entry[level] for level in INDEXED_LEVELS}
+
+    @staticmethod
+    def _extend(f, entry: Dict, end: int):
+        position = line_start = entry['indexed']
+        f.seek(position)
+        pending = b''
+        while position < end:
+            data = f.read(min(BLOCK_SIZE, end - position))
+            if not data:
+                break
+            position += len(data)
+            lines = (pending + data).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                level = line_level(line)
+                if level in INDEXED_LEVELS:
+                    entry[level].append(line_start)
+                line_start += len(line) + 1
+        entry['indexed'] = line_start
+
+
+_indexes: Dict[str, LevelIndex] = {}
+
+
+def _level_index(path: str) -> LevelIndex:
+    index = _indexes.get(path)
+    if index is None:
+        index = _indexes.setdefault(path, LevelIndex(path))
+    return index
+
+
+def _read_line(f, offset: int) -> bytes:
+    f.seek(offset)
+    return f.readline().rstrip(b'\n')
+
+
+def _matching_lines(f, stat, start: int, end: int, levels: Sequence[str], limit: int,
+                    index: Optional[LevelIndex], live_inodes) -> Iterator[Tuple[int, bytes, str]]:
+    """(offset, line, level) of up to limit lines in [start, end) at the given levels, last first."""
+    if index is not None and set(levels) <= set(INDEXED_LEVELS):
+        by_level = index.offsets(f, stat, end, live_inodes)
+        candidates = []
+        for level in levels:
+            offsets = by_level[level]
+            first = bisect_left(offsets, start)
+            last = bisect_left(offsets, end)
+            candidates.extend((offset, level) for offset in offsets[max(first, last - limit):last])
+        for offset, level in sorted(candidates, reverse=True)[:limit]:
+            yield offset, _read_line(f, offset), level
+        return
+
+    found = 0
+    for offset, line in iter_lines_backwards(f, end, start):
+        level = line_level(line)
+        if level in levels:
+            yield offset, line, level
+            found += 1
+            if found >= limit:
+                return
+
+
+def read_log_tail(path: str, levels: Sequence[str] = LEVELS, limit: int = 1000,
+                  before: Optional[str] = None, after: Optional[str] = None) -> Dict:
+    """
+    The last lines of the log at the given levels, newest first.
+
+    Args:
+        path: The log file (its backups are path.1 .. path.N)
+        levels: Levels to return (lines without one, like tracebacks, are skipped)
+        limit: Maximum number of lines
+        before: Cursor of an earlier response: return the lines before it.
+            Once a file is exhausted the next cursor points at the end of the
+            next older backup.
+        after: follow_cursor of an earlier response: return the lines written
+            since (the newest limit of them)
+
+    Returns:
+        {'logs': [{'line', 'level'}], 'cursor': older page or None,
+         'follow_cursor': position after the newest line, 'reset': True if the
+         cursor's lines no longer exist and the tail is returned instead}
+
+    Raises:
+        LogCursorError: If a cursor can't be parsed
+        FileNotFoundError: If the log file doesn't exist
+    """
+    files = log_files(path)
+    if not files or files[0][0] != path:
+        raise FileNotFoundError(path)
+    live_inodes = {str(stat.st_ino) for _, stat in files}
+    position = parse_cursor(before or after) if (before or after) else None
+    file_number = next((number for number, (_, stat) in enumerate(files) if position and stat.st_ino == position[0]), None)
+    reset = position is not None and file_number is None
+
+    with open(path, 'rb') as current:
+        current_end = _complete_end(current, files[0][1].st_size)
+    follow_cursor = format_cursor(files[0][1].st_ino, current_end)
+
+    # (file number, start, end) ranges to read, newest first
+    if after and not reset:
+        # The rest of the file the cursor was in, and everything written since
+        ranges = [(number, 0, None) for number in range(file_number)]
+        ranges.append((file_number, position[1], None))
+    elif before and not reset:
+        ranges = [(file_number, 0, position[1])]
+    else:
+        ranges = [(0, 0, current_end)]
+
+    index = _level_index(path) if INDEX_ENABLED else None
+    logs = []
+    oldest = None  # (file number, offset) of the oldest line returned once limit is reached
+    for number, start, end in ranges:
+        name, stat = files[number]
+        with open(name, 'rb') as f:
+            if end is None:
+                end = current_end if number == 0 else _complete_end(f, stat.st_size)
+            end = min(end, stat.st_size)
+            for offset, line, level in _matching_lines(f, stat, min(start, end), end, levels,
+                                                       limit - len(logs), index, live_inodes):
+                logs.append({'line': line.decode('utf-8', errors='replace').strip(), 'level': level})
+                if len(logs) >= limit:
+                    oldest = (number, offset)
+        if oldest:
+            break
+
+    cursor = None
+    if not after or reset:
+        if oldest and oldest[1] > 0:
+            cursor = format_cursor(files[oldest[0]][1].st_ino, oldest[1])
+        else:
+            # The file is exhausted: the next page starts at the end of the next older one
+            older = (oldest[0] if oldest else number) + 1
+            if older < len(files):
+                cursor = format_cursor(files[older][1].st_ino, files[older][1].st_size)
+
+    return {'logs': logs, 'cursor': cursor, 'follow_cursor': follow_cursor, 'reset': reset}
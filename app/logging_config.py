@@ -0,0 +1,159 @@
+# app/logging_config.py
+"""
+Logging setup for the Flask app and its background threads.
+
+Log calls on the scheduler, WebSocket and request threads only build the record
+and put it on a queue. A single listener thread applies SensitiveDataFilter
+redaction once per record, formats it and writes it to the rotating file and the
+console, so regex redaction and file I/O never run on the thread that logged.
+
+Environment:
+    LOG_LEVEL: Root log level (default DEBUG)
+    LOG_DEBUG_SAMPLE: Per-module sampling of DEBUG records, keeping 1 in N, e.g.
+        "app.tariff_converter=10,app.websocket_client=20". A logger name matches
+        a module and its children (app.inverters matches app.inverters.sigenergy).
+"""
+import atexit
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+LOG_MAX_BYTES = 5 * 1024 * 1024  # Rotate at 5MB
+LOG_BACKUP_COUNT = 5  # flask.log.1 (newest) .. flask.log.5
+
+
+def parse_sample_rates(spec: Optional[str]) -> Dict[str, int]:
+    """Parse "module=N,module=N" into {module: N}, ignoring malformed entries."""
+    rates = {}
+    for entry in (spec or '').split(','):
+        name, sep, every = entry.strip().partition('=')
+        if not sep:
+            continue
+        try:
+            every = int(every)
+        except ValueError:
+            continue
+        if name.strip() and every > 1:
+            rates[name.strip()] = every
+    return rates
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    Keep 1 in N DEBUG records per logger for the configured modules.
+
+    INFO and above always pass. Runs on the logging thread before the record is
+    queued, so dropped records cost a dict lookup and a counter increment.
+    """
+
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = rates
+        self._every = {}     # logger name -> N (resolved from the longest matching module)
+        self._counters = {}  # logger name -> DEBUG records seen
+        self._lock = threading.Lock()
+
+    def _resolve(self, name: str) -> int:
+        best, every = '', 1
+        for module, rate in self.rates.items():
+            if (name == module or name.startswith(module + '.')) and len(module) > len(best):
+                best, every = module, rate
+        self._every[name] = every
+        return every
+
+    def filter(self, record):
+        if record.levelno >= logging.INFO or not self.rates:
+            return True
+
+        every = self._every.get(record.name)
+        if every is None:
+            every = self._resolve(record.name)
+        if every <= 1:
+            return True
+
+        with self._lock:
+            count = self._counters.get(record.name, 0)
+            self._counters[record.name] = count + 1
+        return count % every == 0
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+
+    The stdlib prepare() formats the record (and any traceback) on the calling
+    thread. Here only %-style args are merged into the message - they may be
+    mutated once the log call returns - and everything else is deferred.
+    """
+
+    def prepare(self, record):
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+class RedactingQueueListener(QueueListener):
+    """QueueListener that redacts each record once before handing it to every handler."""
+
+    def __init__(self, log_queue, redaction_filter: logging.Filter, *handlers):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.redaction_filter = redaction_filter
+
+    def prepare(self, record):
+        self.redaction_filter.filter(record)
+        return record
+
+    def stop(self):
+        """Flush queued records and stop the listener thread (safe to call twice)."""
+        if self._thread is not None:
+            super().stop()
+
+
+def configure_logging(log_file: str, redaction_filter: logging.Filter, level: str = 'DEBUG',
+                      debug_sample: Optional[str] = None) -> RedactingQueueListener:
+    """
+    Route the root logger through a queue to the file and console handlers.
+
+    Args:
+        log_file: Path of the rotating log file (5MB, 5 backups)
+        redaction_filter: Filter that obfuscates sensitive data (SensitiveDataFilter)
+        level: Root log level name
+        debug_sample: LOG_DEBUG_SAMPLE spec (see module docstring)
+
+    Returns:
+        The started listener (stopped at interpreter exit to flush pending records)
+    """
+    log_format = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+
+    # Create handlers with rotation (5MB max, keep 5 backup files)
+    file_handler = RotatingFileHandler(
+        log_file,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    console_handler = logging.StreamHandler()
+    file_handler.setFormatter(log_format)
+    console_handler.setFormatter(log_format)
+
+    log_queue = queue.Queue(-1)
+    queue_handler = DeferredQueueHandler(log_queue)
+    rates = parse_sample_rates(debug_sample)
+    if rates:
+        queue_handler.addFilter(DebugSamplingFilter(rates))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, (level or 'DEBUG').upper(), logging.DEBUG))
+
+    listener = RedactingQueueListener(log_queue, redaction_filter, file_handler, console_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -74,7 +74,7 @@ class User(UserMixin, db.Model):
     current_export_rule_updated = db.Column(db.DateTime)  # When the export rule was last updated
     manual_export_override = db.Column(db.Boolean, default=False)  # User manually set export rule, skip auto-restore
     manual_export_rule = db.Column(db.String(20))  # The rule the user manually selected
-    last_tariff_hash = db.Column(db.String(32))  # MD5 hash of last synced tariff for deduplication
+    last_tariff_hash = db.Column(db.String(32))  # Fingerprint of last synced tariff for deduplication (app.tariff_fingerprint)
 
     # Alpha: Force mode toggle after tariff sync
     # Toggle to self_consumption then back to TOU after tariff upload for faster PW response
@@ -261,6 +261,13 @@ class User(UserMixin, db.Model):
 
 class PriceRecord(db.Model):
     """Stores historical Amber electricity pricing data"""
+    __table_args__ = (
+        # /api/price-history: one user's actual (or forecast) prices for a channel over a time range
+        db.Index('ix_price_record_user_channel_forecast_timestamp', 'user_id', 'channel_type', 'forecast', 'timestamp'),
+        # One record per user, interval and channel - the key app.history_store upserts on
+        db.Index('ix_price_record_user_nem_time_channel', 'user_id', 'nem_time', 'channel_type', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
@@ -295,6 +302,11 @@ class PriceRecord(db.Model):
 
 class EnergyRecord(db.Model):
     """Stores historical energy usage data from Tesla Powerwall"""
+    __table_args__ = (
+        # /api/energy-history and the Sigenergy calendar: one user's records over a time range
+        db.Index('ix_energy_record_user_timestamp', 'user_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
@@ -314,6 +326,128 @@ class EnergyRecord(db.Model):
         return f'<EnergyRecord {self.timestamp} - Solar:{self.solar_power}W Grid:{self.grid_power}W>'
 
 
+class EnergyRollup(db.Model):
+    """
+    Incrementally maintained energy history at 5-minute, hourly and daily granularity.
+
+    Updated from each EnergyRecord sample (see history_store.record_energy_sample)
+    so month and year views read a few hundred pre-aggregated rows instead of
+    minute samples. Hour and day buckets follow the user's local clock;
+    bucket_start is the UTC instant the bucket starts.
+    """
+    __table_args__ = (
+        db.Index('ix_energy_rollup_user_granularity_bucket', 'user_id', 'granularity', 'bucket_start', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    granularity = db.Column(db.String(8), nullable=False)  # '5min', 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, nullable=False)  # UTC
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    last_sample_at = db.Column(db.DateTime)  # UTC timestamp of the newest sample in the bucket
+
+    # Power statistics (W) - mean is sum / sample_count
+    solar_power_sum = db.Column(db.Float, default=0.0)
+    solar_power_min = db.Column(db.Float)
+    solar_power_max = db.Column(db.Float)
+    battery_power_sum = db.Column(db.Float, default=0.0)
+    battery_power_min = db.Column(db.Float)
+    battery_power_max = db.Column(db.Float)
+    grid_power_sum = db.Column(db.Float, default=0.0)
+    grid_power_min = db.Column(db.Float)
+    grid_power_max = db.Column(db.Float)
+    load_power_sum = db.Column(db.Float, default=0.0)
+    load_power_min = db.Column(db.Float)
+    load_power_max = db.Column(db.Float)
+
+    # Energy integrals (Wh)
+    solar_wh = db.Column(db.Float, default=0.0)
+    load_wh = db.Column(db.Float, default=0.0)
+    grid_import_wh = db.Column(db.Float, default=0.0)
+    grid_export_wh = db.Column(db.Float, default=0.0)
+    battery_charge_wh = db.Column(db.Float, default=0.0)
+    battery_discharge_wh = db.Column(db.Float, default=0.0)
+
+    # Battery state of charge (%) - samples without a level are not counted
+    battery_level_sum = db.Column(db.Float, default=0.0)
+    battery_level_count = db.Column(db.Integer, default=0)
+    battery_level_min = db.Column(db.Float)
+    battery_level_max = db.Column(db.Float)
+    battery_level_last = db.Column(db.Float)
+
+    def mean(self, channel: str):
+        """Mean power (W) of a channel ('solar', 'battery', 'grid', 'load') over the bucket."""
+        if not self.sample_count:
+            return None
+        return (getattr(self, f'{channel}_power_sum') or 0.0) / self.sample_count
+
+    @property
+    def battery_level_mean(self):
+        if not self.battery_level_count:
+            return None
+        return self.battery_level_sum / self.battery_level_count
+
+    def __repr__(self):
+        return f'<EnergyRollup {self.granularity} {self.bucket_start} user={self.user_id} n={self.sample_count}>'
+
+
+class EnergyLedger(db.Model):
+    """
+    Energy and cost per 5-minute NEM interval, integrated from EnergyRecord samples.
+
+    Power samples are integrated with the trapezoidal rule (segments longer than
+    the sample gap limit are left out, see covered_seconds) and joined with the
+    interval's actual PriceRecords. Maintained incrementally by
+    energy_ledger.record_ledger_samples and energy_ledger.apply_prices_to_ledger.
+    """
+    __table_args__ = (
+        db.Index('ix_energy_ledger_user_interval', 'user_id', 'interval_start', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    interval_start = db.Column(db.DateTime, nullable=False)  # UTC, on a 5-minute boundary
+    covered_seconds = db.Column(db.Float, default=0.0)  # Seconds of the interval backed by samples (max 300)
+
+    # Energy (kWh)
+    solar_kwh = db.Column(db.Float, default=0.0)
+    load_kwh = db.Column(db.Float, default=0.0)
+    grid_import_kwh = db.Column(db.Float, default=0.0)
+    grid_export_kwh = db.Column(db.Float, default=0.0)
+    battery_charge_kwh = db.Column(db.Float, default=0.0)
+    battery_discharge_kwh = db.Column(db.Float, default=0.0)
+
+    # Prices (c/kWh) and money (c) - NULL until the interval's actual price is known
+    import_price = db.Column(db.Float)
+    export_price = db.Column(db.Float)  # Paid to the user per kWh exported (negative = paying to export)
+    import_cost = db.Column(db.Float)
+    export_earnings = db.Column(db.Float)
+
+    def __repr__(self):
+        return f'<EnergyLedger {self.interval_start} user={self.user_id} import={self.grid_import_kwh}kWh>'
+
+
+class TariffArtifact(db.Model):
+    """
+    The last tariff built for a user, shared by the sync and /api/tou-schedule.
+
+    One row per user, replaced by every tariff build (see app.tariff_artifacts).
+    The tariff is the one the sync pushes (without Chip Mode); fingerprint is the
+    user's tariff settings it was built under, so a settings change invalidates it.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    fingerprint = db.Column(db.String(40), nullable=False)  # sha1 of tariff_settings_fingerprint()
+    built_at = db.Column(db.DateTime, nullable=False)  # UTC
+    source = db.Column(db.String(20))  # 'sync' or 'on_demand'
+    price_source = db.Column(db.String(10))  # 'amber' or 'aemo'
+    tariff_json = db.Column(db.Text, nullable=False)  # Tesla tariff structure
+    actual_interval_json = db.Column(db.Text, nullable=True)  # JSON: {general, feedIn} live prices of the current period
+
+    def __repr__(self):
+        return f'<TariffArtifact user={self.user_id} {self.source} {self.built_at}>'
+
+
 class CustomTOUSchedule(db.Model):
     """Custom Time-of-Use electricity rate schedules for fixed-rate providers"""
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,204 @@
+# app/partitioning.py
+"""Optional monthly range partitioning of the history tables on PostgreSQL"""
+import logging
+import os
+import re
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# HISTORY_PARTITIONING=monthly turns it on (PostgreSQL only; SQLite keeps plain tables)
+PARTITIONING = os.environ.get('HISTORY_PARTITIONING', '').strip().lower()
+try:
+    MONTHS_AHEAD = max(1, int(os.environ.get('HISTORY_PARTITION_MONTHS_AHEAD', 3)))
+except ValueError:
+    MONTHS_AHEAD = 3
+
+# Partitioned table -> partition key. price_record is split on nem_time because
+# its unique key (user_id, nem_time, channel_type) has to contain the key.
+PARTITIONED_TABLES = {
+    'price_record': 'nem_time',
+    'energy_record': 'timestamp',
+}
+
+
+def partitioning_enabled(conn) -> bool:
+    """True if monthly partitioning is configured and the database is PostgreSQL."""
+    return PARTITIONING == 'monthly' and conn.dialect.name == 'postgresql'
+
+
+def _month_start(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f'{table}_p{month:%Y_%m}'
+
+
+def is_partitioned(conn, table: str) -> bool:
+    if conn.dialect.name != 'postgresql':
+        return False
+    return bool(conn.execute(text(
+        'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+        'WHERE c.relname = :table AND pg_table_is_visible(c.oid)'
+    ), {'table': table}).scalar())
+
+
+def list_partitions(conn, table: str) -> List[Tuple[str, datetime, datetime]]:
+    """Monthly partitions of a table as (name, lower bound, upper bound), oldest first."""
+    names = conn.execute(text(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = CAST(:table AS regclass)'
+    ), {'table': table}).scalars().all()
+    pattern = re.compile(rf'^{table}_p(\d{{4}})_(\d{{2}})$')
+    partitions = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            month = datetime(int(match.group(1)), int(match.group(2)), 1)
+            partitions.append((name, month, _next_month(month)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _create_partition(conn, table: str, month: datetime):
+    """
+    Add the partition for one month.
+
+    Rows of that month already in the default partition are moved into the
+    new table before it is attached, so this works whether or not the default
+    partition has caught any.
+    """
+    column = PARTITIONED_TABLES[table]
+    name = partition_name(table, month)
+    lower, upper = f'{month:%Y-%m-%d %H:%M:%S}', f'{_next_month(month):%Y-%m-%d %H:%M:%S}'
+    conn.execute(text(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)'))
+    conn.execute(text(
+        f'WITH moved AS (DELETE FROM {table}_default WHERE {column} >= :lower AND {column} < :upper RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved'
+    ), {'lower': lower, 'upper': upper})
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')"))
+    logger.info("Created partition %s", name)
+
+
+def ensure_partitions(conn, table: str, months_ahead: int = MONTHS_AHEAD,
+                      since: Optional[datetime] = None, now: Optional[datetime] = None) -> List[str]:
+    """
+    Create any missing monthly partitions from since (default: this month) to months_ahead ahead.
+
+    Returns:
+        Names of the partitions created. The caller commits.
+    """
+    now = now or datetime.now(timezone.utc)
+    existing = {name for name, _, _ in list_partitions(conn, table)}
+    month = _month_start(since or now)
+    last = _month_start(now)
+    for _ in range(months_ahead):
+        last = _next_month(last)
+
+    created = []
+    while month <= last:
+        if partition_name(table, month) not in existing:
+            _create_partition(conn, table, month)
+            created.append(partition_name(table, month))
+        month = _next_month(month)
+    return created
+
+
+def _model_table(table: str):
+    from app import db
+    return db.metadata.tables[table]
+
+
+def _create_constraints_and_indexes(conn, table: str, primary_key: Tuple[str, ...]):
+    """Primary key (or id index), user foreign key and the model's indexes, once the data is in."""
+    if primary_key:
+        conn.execute(text(f'ALTER TABLE {table} ADD PRIMARY KEY ({", ".join(primary_key)})'))
+    else:
+        conn.execute(text(f'CREATE INDEX ix_{table}_id ON {table} (id)'))
+    conn.execute(text(f'ALTER TABLE {table} ADD FOREIGN KEY (user_id) REFERENCES "user" (id)'))
+    for index in _model_table(table).indexes:
+        index.create(conn)
+    conn.execute(text(f'ANALYZE {table}'))
+
+
+def _move_table(conn, table: str, old: str):
+    """Copy old's rows into table, hand the id sequence over and drop old."""
+    conn.execute(text(f'INSERT INTO {table} SELECT * FROM {old}'))
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:old, 'id')"), {'old': old}).scalar()
+    if sequence:
+        conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id'))
+    conn.execute(text(f'DROP TABLE {old} CASCADE'))
+
+
+def convert_to_partitioned(conn, table: str, months_ahead: int = MONTHS_AHEAD) -> bool:
+    """
+    Rebuild a plain history table as a monthly range-partitioned one, keeping its rows.
+
+    Partitions cover the oldest stored month to months_ahead ahead; a default
+    partition takes anything outside them (and rows with a NULL key). PostgreSQL
+    only allows a primary key that contains the partition key, which is nullable
+    here, so id gets a plain index instead. Runs in the caller's transaction and
+    takes an exclusive lock on the table while it copies.
+
+    Returns:
+        False if the table was already partitioned
+    """
+    if is_partitioned(conn, table):
+        return False
+    column = PARTITIONED_TABLES[table]
+    heap = f'{table}_heap'
+    conn.execute(text(f'ALTER TABLE {table} RENAME TO {heap}'))
+    conn.execute(text(f'CREATE TABLE {table} (LIKE {heap} INCLUDING DEFAULTS) PARTITION BY RANGE ({column})'))
+    conn.execute(text(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT'))
+    oldest = conn.execute(text(f'SELECT MIN({column}) FROM {heap}')).scalar()
+    ensure_partitions(conn, table, months_ahead, since=oldest)
+    _move_table(conn, table, heap)
+    _create_constraints_and_indexes(conn, table, primary_key=())
+    logger.info("Converted %s to monthly partitions on %s", table, column)
+    return True
+
+
+def convert_to_plain(conn, table: str) -> bool:
+    """Rebuild a partitioned history table as a plain one, keeping its rows. Returns False if it wasn't partitioned."""
+    if not is_partitioned(conn, table):
+        return False
+    partitioned = f'{table}_partitioned'
+    conn.execute(text(f'ALTER TABLE {table} RENAME TO {partitioned}'))
+    conn.execute(text(f'CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS)'))
+    _move_table(conn, table, partitioned)
+    _create_constraints_and_indexes(conn, table, primary_key=('id',))
+    logger.info("Converted %s back to a plain table", table)
+    return True
+
+
+def ensure_history_partitions(conn, months_ahead: int = MONTHS_AHEAD) -> List[str]:
+    """Create upcoming monthly partitions of every partitioned history table (no-op elsewhere)."""
+    created = []
+    for table in PARTITIONED_TABLES:
+        if is_partitioned(conn, table):
+            created += ensure_partitions(conn, table, months_ahead)
+    return created
+
+
+def expired_partitions(conn, table: str, cutoff: datetime) -> List[Tuple[str, datetime, datetime]]:
+    """Monthly partitions whose whole range is before cutoff (never the default partition)."""
+    if not is_partitioned(conn, table):
+        return []
+    cutoff = cutoff.astimezone(timezone.utc).replace(tzinfo=None) if cutoff.tzinfo else cutoff
+    return [partition for partition in list_partitions(conn, table) if partition[2] <= cutoff]
+
+
+def drop_partition(conn, table: str, name: str):
+    """Detach and drop one partition - retention without row deletes or VACUUM."""
+    conn.execute(text(f'ALTER TABLE {table} DETACH PARTITION {name}'))
+    conn.execute(text(f'DROP TABLE {name}'))
+    logger.info("Dropped partition %s", name)
@@ -0,0 +1,253 @@
+# app/price_intervals.py
+"""Parse-once representation of Amber/AEMO price forecasts"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+# NumPy is optional - used for bulk slot indexing when installed
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Half-hour slots: slot of day = hour * 2 + (1 if minute >= 30 else 0)
+SLOT_SECONDS = 30 * 60
+SLOTS_PER_DAY = 48
+
+
+def local_slot_indexes(starts: List[float], tz, today) -> List[int]:
+    """
+    Convert interval start times (epoch seconds) to half-hour slot indexes.
+
+    Slot 0 is 00:00-00:30 local time on ``today``, slot 48 is 00:00 tomorrow and so
+    on (negative for earlier days). The local UTC offset is looked up once when it
+    is the same at both ends of the forecast (no DST transition), otherwise per point.
+    """
+    if not starts:
+        return []
+
+    origin = datetime(today.year, today.month, today.day, tzinfo=timezone.utc).timestamp()
+
+    first_offset = datetime.fromtimestamp(min(starts), tz).utcoffset()
+    last_offset = datetime.fromtimestamp(max(starts), tz).utcoffset()
+
+    if first_offset is not None and first_offset == last_offset:
+        shift = first_offset.total_seconds() - origin
+        if NUMPY_AVAILABLE:
+            local = np.asarray(starts, dtype=np.float64) + shift
+            return np.floor_divide(local, SLOT_SECONDS).astype(np.int64).tolist()
+        return [int((start + shift) // SLOT_SECONDS) for start in starts]
+
+    # DST transition inside the forecast window - convert each point
+    slots = []
+    for start in starts:
+        local = datetime.fromtimestamp(start, tz)
+        day_offset = (local.date() - today).days
+        slots.append(day_offset * SLOTS_PER_DAY + local.hour * 2 + (1 if local.minute >= 30 else 0))
+    return slots
+
+
+class PriceIntervals:
+    """
+    A price forecast (Amber API or AEMO pre-dispatch) parsed once into parallel arrays.
+
+    Every consumer of a fetched forecast - the Tesla and Sigenergy converters,
+    get_wholesale_lookup(), TOUScheduler.analyze_forecast() and
+    extract_most_recent_actual_interval() - accepts either the raw list of points or
+    a PriceIntervals, so the sync parses ISO timestamps once per fetch and shares the
+    result. Derived values (selected prices, local slot indexes) are memoized.
+
+    A point without a nemTime uses its startTime in its place; points whose time
+    or duration can't be parsed are dropped.
+
+    Attributes (one entry per parsed point, in forecast order):
+        starts: Interval START time, epoch seconds (nemTime is the interval END)
+        ends: Interval END time (nemTime), epoch seconds
+        offsets: UTC offset of nemTime in seconds (Amber reports NEM time, +10:00)
+        durations: Interval length in minutes (5 or 30)
+        channels: 'general', 'feedIn' or 'controlledLoad'
+        types: 'ActualInterval', 'CurrentInterval' or 'ForecastInterval'
+        per_kwh: perKwh in c/kWh (Amber sign convention: feedIn negative when paid)
+        advanced: advancedPrice (dict of low/predicted/high, a number, or None)
+        spike_status: Amber spikeStatus ('none', 'potential', 'spike')
+        wholesale: wholesaleKWHPrice in c/kWh, or None
+        index: Position of the point in the original forecast list
+    """
+
+    __slots__ = (
+        'points', 'starts', 'ends', 'offsets', 'durations', 'channels', 'types', 'per_kwh',
+        'advanced', 'spike_status', 'wholesale', 'index', 'type_counts', 'tzinfo', '_memo',
+    )
+
+    def __init__(self, points: List[Dict]):
+        self.points = points
+        self.starts = []
+        self.ends = []
+        self.offsets = []
+        self.durations = []
+        self.channels = []
+        self.types = []
+        self.per_kwh = []
+        self.advanced = []
+        self.spike_status = []
+        self.wholesale = []
+        self.index = []
+        self.type_counts = {}  # interval type -> number of points (including unparsed ones)
+        self.tzinfo = None     # tzinfo of the first parsed nemTime
+        self._memo = {}
+
+        for position, point in enumerate(points):
+            interval_type = point.get('type', 'unknown')
+            self.type_counts[interval_type] = self.type_counts.get(interval_type, 0) + 1
+
+            # Points without a nemTime fall back to startTime, as the Sigenergy converter always has
+            nem_time = point.get('nemTime') or point.get('startTime', '')
+            try:
+                if isinstance(nem_time, datetime):
+                    timestamp = nem_time
+                else:
+                    timestamp = datetime.fromisoformat(nem_time.replace('Z', '+00:00'))
+                duration = point.get('duration', 30)
+                end = timestamp.timestamp()
+                start = end - duration * 60
+                offset = timestamp.utcoffset()
+            except (AttributeError, TypeError, ValueError) as e:
+                logger.debug(f"Skipping price point with unparseable time {nem_time!r}: {e}")
+                continue
+
+            if self.tzinfo is None:
+                self.tzinfo = timestamp.tzinfo
+
+            self.starts.append(start)
+            self.ends.append(end)
+            self.offsets.append(offset.total_seconds() if offset is not None else 0.0)
+            self.durations.append(duration)
+            self.channels.append(point.get('channelType', ''))
+            self.types.append(interval_type)
+            self.per_kwh.append(point.get('perKwh', 0))
+            self.advanced.append(point.get('advancedPrice'))
+            self.spike_status.append(point.get('spikeStatus', 'none'))
+            self.wholesale.append(point.get('wholesaleKWHPrice'))
+            self.index.append(position)
+
+    @classmethod
+    def of(cls, forecast_data) -> 'PriceIntervals':
+        """Return forecast_data as PriceIntervals, parsing it only if it isn't already."""
+        if isinstance(forecast_data, cls):
+            return forecast_data
+        return cls(forecast_data or [])
+
+    def channel(self, channel_type: str) -> 'PriceIntervals':
+        """The intervals of one channel ('general', 'feedIn'), sliced from the parsed arrays."""
+        key = ('channel', channel_type)
+        if key in self._memo:
+            return self._memo[key]
+
+        keep = [i for i, channel in enumerate(self.channels) if channel == channel_type]
+        subset = PriceIntervals([])
+        subset.points = [self.points[self.index[i]] for i in keep]
+        for name in ('starts', 'ends', 'offsets', 'durations', 'channels', 'types', 'per_kwh',
+                     'advanced', 'spike_status', 'wholesale'):
+            values = getattr(self, name)
+            setattr(subset, name, [values[i] for i in keep])
+        subset.index = list(range(len(keep)))
+        for interval_type in subset.types:
+            subset.type_counts[interval_type] = subset.type_counts.get(interval_type, 0) + 1
+        subset.tzinfo = self.tzinfo
+
+        self._memo[key] = subset
+        return subset
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def end_datetime(self, i: int) -> datetime:
+        """nemTime of interval i as an aware datetime in its original UTC offset."""
+        return datetime.fromtimestamp(self.ends[i], timezone(timedelta(seconds=self.offsets[i])))
+
+    def price_cents(self, forecast_type: str = 'predicted', strict: bool = False) -> List[Optional[float]]:
+        """
+        Select each interval's price (c/kWh, Amber sign convention).
+
+        - ActualInterval: perKwh (actual settled price)
+        - CurrentInterval: advancedPrice (forecast_type, else predicted) when present, else perKwh
+        - ForecastInterval: advancedPrice[forecast_type] when present, else perKwh (AEMO data)
+
+        With strict=True (Tesla converter) a ForecastInterval whose advancedPrice lacks
+        forecast_type or has an unknown format is an error and gets None; otherwise
+        (Sigenergy converter) it falls back to predicted / perKwh.
+        """
+        key = ('price_cents', forecast_type, strict)
+        if key in self._memo:
+            return self._memo[key]
+
+        prices = []
+        for i, (interval_type, advanced_price, per_kwh) in enumerate(zip(self.types, self.advanced, self.per_kwh)):
+            if interval_type == 'ForecastInterval' and advanced_price:
+                if isinstance(advanced_price, dict):
+                    if forecast_type in advanced_price:
+                        price = advanced_price[forecast_type]
+                    elif strict:
+                        logger.error(
+                            f"{self.points[self.index[i]].get('nemTime')}: Forecast type '{forecast_type}' not found "
+                            f"in advancedPrice. Available: {list(advanced_price.keys())}"
+                        )
+                        price = None
+                    else:
+                        price = advanced_price.get('predicted', 0)
+                elif isinstance(advanced_price, (int, float)):
+                    price = advanced_price
+                elif strict:
+                    logger.error(
+                        f"Invalid advancedPrice format at {self.points[self.index[i]].get('nemTime')}: "
+                        f"{type(advanced_price).__name__}"
+                    )
+                    price = None
+                else:
+                    price = per_kwh
+            elif interval_type == 'CurrentInterval' and advanced_price:
+                # CurrentInterval has advancedPrice during first 25 mins - Amber retail forecast
+                if isinstance(advanced_price, dict):
+                    price = advanced_price.get(forecast_type, advanced_price.get('predicted', 0))
+                elif strict or isinstance(advanced_price, (int, float)):
+                    price = advanced_price
+                else:
+                    price = per_kwh
+            else:
+                # ActualInterval, or no advancedPrice (AEMO data / last 5 mins of a 30-min period)
+                price = per_kwh
+            prices.append(price)
+
+        self._memo[key] = prices
+        return prices
+
+    def local_slots(self, tz, today) -> List[int]:
+        """Slot index of each interval's start in tz, relative to 00:00 on today (see local_slot_indexes)."""
+        key = ('local_slots', tz, today)
+        if key not in self._memo:
+            self._memo[key] = local_slot_indexes(self.starts, tz, today)
+        return self._memo[key]
+
+    def slots_of_day(self, tz) -> List[int]:
+        """Local half-hour slot of day (0-47) of each interval's start in tz."""
+        key = ('slots_of_day', tz)
+        if key not in self._memo:
+            anchor = datetime.fromtimestamp(self.starts[0], tz).date() if self.starts else None
+            self._memo[key] = [slot % SLOTS_PER_DAY for slot in self.local_slots(tz, anchor)] if anchor else []
+        return self._memo[key]
+
+    def nem_slots_of_day(self) -> List[int]:
+        """Half-hour slot of day of each interval's start in its own nemTime UTC offset."""
+        key = ('nem_slots_of_day',)
+        if key not in self._memo:
+            self._memo[key] = [
+                int((start + offset) // SLOT_SECONDS) % SLOTS_PER_DAY
+                for start, offset in zip(self.starts, self.offsets)
+            ]
+        return self._memo[key]
@@ -0,0 +1,502 @@
+# app/retention.py
+"""Retention and downsampling of the price and energy history tables"""
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, text
+
+from app import db
+from app.cold_archive import archive_enabled, archive_energy, archive_prices, archive_size, month_start
+from app.db_writer import submit_exclusive, submit_write
+from app.energy_ledger import rebuild_ledger
+from app.history_store import rebuild_energy_rollups, rollup_bucket_start, user_zone
+from app.partitioning import drop_partition, expired_partitions, is_partitioned
+from app.models import EnergyLedger, EnergyRecord, EnergyRollup, PriceRecord, User
+
+logger = logging.getLogger(__name__)
+
+# Rebuild SQLite with VACUUM once this share of the file is free pages
+SQLITE_VACUUM_FREE_RATIO = 0.25
+# Seconds to wait for one queued retention write (a batch, or VACUUM behind the queue)
+WRITE_TIMEOUT = 600
+
+HISTORY_TABLES = ('energy_record', 'energy_rollup', 'energy_ledger', 'price_record')
+
+
+def _env_days(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.environ.get(name, default)))
+    except ValueError:
+        logger.warning("Ignoring invalid %s=%r, using %d", name, os.environ.get(name), default)
+        return default
+
+
+@dataclass
+class RetentionPolicy:
+    """How long each kind of history is kept, in days (0 keeps it forever)."""
+    raw_energy_days: int = 35  # Minute EnergyRecords - the day view; older data lives on in the rollups
+    energy_5min_days: int = 90
+    energy_hour_days: int = 730
+    energy_day_days: int = 0
+    energy_ledger_days: int = 0  # 5-minute kWh and cost intervals
+    price_days: int = 730
+    price_forecast_days: int = 2  # Forecast rows are superseded by actual prices
+    batch_size: int = 2000  # Rows deleted per statement (and database-writer job)
+    max_seconds: float = 120.0  # Stop after this long; the next run carries on
+    pause_seconds: float = 0.05  # Between batches, so collectors can get the write lock
+
+    @classmethod
+    def from_env(cls) -> 'RetentionPolicy':
+        """Policy with day counts overridden by HISTORY_RETENTION_* environment variables."""
+        defaults = cls()
+        return cls(
+            raw_energy_days=_env_days('HISTORY_RETENTION_RAW_ENERGY_DAYS', defaults.raw_energy_days),
+            energy_5min_days=_env_days('HISTORY_RETENTION_ENERGY_5MIN_DAYS', defaults.energy_5min_days),
+            energy_hour_days=_env_days('HISTORY_RETENTION_ENERGY_HOUR_DAYS', defaults.energy_hour_days),
+            energy_day_days=_env_days('HISTORY_RETENTION_ENERGY_DAY_DAYS', defaults.energy_day_days),
+            energy_ledger_days=_env_days('HISTORY_RETENTION_ENERGY_LEDGER_DAYS', defaults.energy_ledger_days),
+            price_days=_env_days('HISTORY_RETENTION_PRICE_DAYS', defaults.price_days),
+            price_forecast_days=_env_days('HISTORY_RETENTION_PRICE_FORECAST_DAYS', defaults.price_forecast_days),
+        )
+
+    def rollup_days(self, granularity: str) -> int:
+        return {
+            '5min': self.energy_5min_days,
+            'hour': self.energy_hour_days,
+            'day': self.energy_day_days,
+        }[granularity]
+
+
+class _Budget:
+    """Time budget shared by the steps of one retention run."""
+
+    def __init__(self, policy: RetentionPolicy):
+        self.policy = policy
+        self.deadline = time.monotonic() + policy.max_seconds
+
+    @property
+    def exhausted(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def pause(self):
+        if self.policy.pause_seconds:
+            time.sleep(self.policy.pause_seconds)
+
+
+def _write(func, *args):
+    """
+    Run a job on the database writer (app.db_writer) and wait for its result.
+
+    This thread's read transaction is ended first, so its next query sees
+    what the job committed.
+    """
+    db.session.commit()
+    return submit_write(func, *args).result(timeout=WRITE_TIMEOUT)
+
+
+def _users() -> List[Tuple[int, Optional[str]]]:
+    """(id, timezone) of every user, as plain values for writer jobs."""
+    return [(user.id, user.timezone) for user in User.query.order_by(User.id).all()]
+
+
+def _delete_batch(model, condition, batch_size: int) -> int:
+    """Delete up to batch_size matching rows, oldest ids first (database-writer job)."""
+    batch = select(model.id).where(condition).order_by(model.id).limit(batch_size)
+    result = db.session.execute(delete(model).where(model.id.in_(batch)).execution_options(synchronize_session=False))
+    return max(result.rowcount, 0)
+
+
+def _delete_in_batches(model, condition, budget: _Budget) -> int:
+    """Delete matching rows a batch at a time, each batch a database-writer job."""
+    deleted = 0
+    while not budget.exhausted:
+        count = _write(_delete_batch, model, condition, budget.policy.batch_size)
+        deleted += count
+        if count < budget.policy.batch_size:
+            break
+        budget.pause()
+    return deleted
+
+
+def _fold_energy_day(user_id: int, tz_name: Optional[str], day_start: datetime, day_end: datetime) -> Dict[str, int]:
+    """
+    Make sure a local day's samples are in its day rollup and the energy ledger before they go.
+
+    A database-writer job. Returns the days rebuilt: {'rebuilt_days', 'ledger_days'}.
+    """
+    stats = {'rebuilt_days': 0, 'ledger_days': 0}
+    in_day = (
+        (EnergyRecord.user_id == user_id)
+        & (EnergyRecord.timestamp >= day_start)
+        & (EnergyRecord.timestamp < day_end)
+    )
+    samples = db.session.execute(select(func.count()).where(in_day)).scalar()
+    if not samples:
+        return stats
+    rolled_up = db.session.execute(
+        select(EnergyRollup.sample_count).where(
+            EnergyRollup.user_id == user_id,
+            EnergyRollup.granularity == 'day',
+            EnergyRollup.bucket_start == day_start,
+        )
+    ).scalar()
+    if rolled_up != samples:
+        rebuild_energy_rollups(user_id, tz_name, start=day_start, end=day_start)
+        stats['rebuilt_days'] += 1
+    ledgered = db.session.execute(
+        select(func.count()).where(
+            EnergyLedger.user_id == user_id,
+            EnergyLedger.interval_start >= day_start,
+            EnergyLedger.interval_start < day_end,
+        )
+    ).scalar()
+    if samples > 1 and not ledgered:
+        rebuild_ledger(user_id, start=day_start, end=day_end)
+        stats['ledger_days'] += 1
+    return stats
+
+
+def _fold_and_delete_energy_day(user_id: int, tz_name: Optional[str], day_start: datetime, day_end: datetime) -> Dict[str, int]:
+    """Fold a local day's samples (_fold_energy_day), then delete them (database-writer job)."""
+    stats = _fold_energy_day(user_id, tz_name, day_start, day_end)
+    in_day = (
+        (EnergyRecord.user_id == user_id)
+        & (EnergyRecord.timestamp >= day_start)
+        & (EnergyRecord.timestamp < day_end)
+    )
+    result = db.session.execute(delete(EnergyRecord).where(in_day).execution_options(synchronize_session=False))
+    stats['deleted'] = max(result.rowcount, 0)
+    return stats
+
+
+def _fold_and_purge_energy(user_id: int, tz_name: Optional[str], cutoff: datetime, budget: _Budget) -> Dict[str, int]:
+    """
+    Delete a user's EnergyRecords before cutoff, one local day per batch.
+
+    Before a day's samples go, its day rollup is compared with them: a day
+    that was never rolled up (history from before the rollups, or a sample
+    that failed to fold in) is rebuilt from the samples first, so nothing is
+    lost from the month and year views. A day with no energy ledger intervals
+    gets its ledger built the same way. Each day is one database-writer job.
+    """
+    tz = user_zone(tz_name)
+    cutoff = rollup_bucket_start(cutoff, 'day', tz)  # Whole local days only
+    stats = {'days': 0, 'rebuilt_days': 0, 'ledger_days': 0, 'deleted': 0}
+
+    while not budget.exhausted:
+        oldest = db.session.execute(
+            select(func.min(EnergyRecord.timestamp)).where(
+                EnergyRecord.user_id == user_id, EnergyRecord.timestamp < cutoff
+            )
+        ).scalar()
+        if oldest is None:
+            break
+
+        day_start = rollup_bucket_start(oldest, 'day', tz)
+        day_end = min(rollup_bucket_start(day_start + timedelta(hours=36), 'day', tz), cutoff)
+        for key, value in _write(_fold_and_delete_energy_day, user_id, tz_name, day_start, day_end).items():
+            stats[key] += value
+        stats['days'] += 1
+        budget.pause()
+
+    return stats
+
+
+def _drop_partition(table: str, name: str):
+    """Drop one monthly partition (database-writer job)."""
+    drop_partition(db.session.connection(), table, name)
+
+
+def _drop_expired_energy_partitions(cutoff: datetime, budget: _Budget) -> Dict[str, int]:
+    """
+    Drop monthly energy_record partitions that end before cutoff (partitioned PostgreSQL).
+
+    Every user's local days in the month are folded first, as row-by-row
+    retention does. A day straddling the start of the month was checked when
+    the previous partition was dropped, so it is skipped. Stops (keeping the
+    partition) when the time budget runs out.
+    """
+    stats = {'days': 0, 'rebuilt_days': 0, 'ledger_days': 0, 'deleted': 0, 'partitions': 0}
+    for name, lower, upper in expired_partitions(db.session.connection(), 'energy_record', cutoff):
+        rows = db.session.execute(text(f'SELECT COUNT(*) FROM {name}')).scalar()
+        for user_id, tz_name in _users():
+            tz = user_zone(tz_name)
+            day_start = rollup_bucket_start(lower, 'day', tz)
+            if day_start < lower:
+                day_start = rollup_bucket_start(day_start + timedelta(hours=36), 'day', tz)
+            while day_start < upper:
+                if budget.exhausted:
+                    return stats
+                day_end = rollup_bucket_start(day_start + timedelta(hours=36), 'day', tz)
+                for key, value in _write(_fold_energy_day, user_id, tz_name, day_start, day_end).items():
+                    stats[key] += value
+                stats['days'] += 1
+                day_start = day_end
+
+        _write(_drop_partition, 'energy_record', name)
+        stats['deleted'] += rows
+        stats['partitions'] += 1
+    return stats
+
+
+def _drop_expired_price_partitions(cutoff: datetime, budget: _Budget) -> int:
+    """Drop monthly price_record partitions (on nem_time) that end before cutoff. Returns rows dropped."""
+    dropped = 0
+    for name, _, _ in expired_partitions(db.session.connection(), 'price_record', cutoff):
+        if budget.exhausted:
+            break
+        dropped += db.session.execute(text(f'SELECT COUNT(*) FROM {name}')).scalar()
+        _write(_drop_partition, 'price_record', name)
+    return dropped
+
+
+def _archive_user(archive, user_id: int, before: datetime, stats: Dict[str, int], budget: _Budget) -> datetime:
+    """
+    Run an app.cold_archive archive function for one user within the time budget.
+
+    Adds its stats up and returns the month boundary the user's rows are
+    archived before (before itself, unless the budget ran out).
+    """
+    result = archive(user_id, before, stop=lambda: budget.exhausted)
+    for key in ('months', 'rows'):
+        stats[key] += result[key]
+    return result['through']
+
+
+def table_sizes() -> Dict[str, Dict[str, Optional[int]]]:
+    """
+    Row counts and on-disk sizes of the history tables.
+
+    Returns:
+        {table: {'rows': int, 'bytes': int or None}, '_database': {'bytes': ..., 'free_bytes': ...}}
+        Sizes come from pg_total_relation_size on PostgreSQL and the dbstat
+        table on SQLite (None when SQLite was built without it).
+    """
+    dialect = db.session.get_bind().dialect.name
+    sizes = {}
+    for table in HISTORY_TABLES:
+        rows = db.session.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+        size = None
+        try:
+            if dialect == 'postgresql':
+                # A partitioned table's own size is 0 - add up its partitions
+                size = db.session.execute(text(
+                    'SELECT pg_total_relation_size(CAST(:table AS regclass)) + COALESCE(('
+                    'SELECT SUM(pg_total_relation_size(inhrelid)) FROM pg_inherits '
+                    'WHERE inhparent = CAST(:table AS regclass)), 0)'
+                ), {'table': table}).scalar()
+            elif dialect == 'sqlite':
+                # Table plus its indexes
+                size = db.session.execute(
+                    text("SELECT SUM(pgsize) FROM dbstat WHERE name = :table "
+                         "OR name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table)"),
+                    {'table': table},
+                ).scalar()
+        except Exception:
+            db.session.rollback()
+        sizes[table] = {'rows': rows, 'bytes': size}
+
+    if dialect == 'sqlite':
+        page_size = db.session.execute(text('PRAGMA page_size')).scalar()
+        sizes['_database'] = {
+            'bytes': db.session.execute(text('PRAGMA page_count')).scalar() * page_size,
+            'free_bytes': db.session.execute(text('PRAGMA freelist_count')).scalar() * page_size,
+        }
+    elif dialect == 'postgresql':
+        sizes['_database'] = {
+            'bytes': db.session.execute(text('SELECT pg_database_size(current_database())')).scalar(),
+            'free_bytes': None,
+        }
+    return sizes
+
+
+def _vacuum_sqlite(deleted_any: bool) -> str:
+    """VACUUM when enough of the file is free, else PRAGMA optimize (exclusive database-writer job)."""
+    with db.session.get_bind().connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        pages = conn.execute(text('PRAGMA page_count')).scalar() or 0
+        free = conn.execute(text('PRAGMA freelist_count')).scalar() or 0
+        if deleted_any and pages and free / pages >= SQLITE_VACUUM_FREE_RATIO:
+            conn.execute(text('VACUUM'))
+            conn.execute(text('ANALYZE'))
+            return f'vacuumed ({free} of {pages} pages free)'
+        conn.execute(text('PRAGMA optimize'))
+        return 'optimized'
+
+
+def _maintain_database(deleted_any: bool) -> str:
+    """
+    Refresh planner statistics and reclaim space after a purge.
+
+    On SQLite this runs on the database writer with it paused, once the
+    writes queued before it have committed: VACUUM needs the database to
+    itself.
+    """
+    engine = db.session.get_bind()
+    db.session.commit()
+    if engine.dialect.name == 'sqlite':
+        return submit_exclusive(_vacuum_sqlite, deleted_any).result(timeout=WRITE_TIMEOUT)
+    if engine.dialect.name == 'postgresql':
+        if not deleted_any:
+            return 'skipped'
+        with engine.connect() as conn:
+            conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+            for table in HISTORY_TABLES:
+                conn.execute(text(f'VACUUM (ANALYZE) {table}'))
+        return 'vacuum analyzed'
+    return 'skipped'
+
+
+def _backfill_user_history(user_id: int, tz_name: Optional[str]) -> Dict[str, int]:
+    """
+    Roll up and integrate a user's samples from before the rollups and ledger existed.
+
+    A database-writer job, so no sample is folded in while its buckets are
+    rebuilt. Does nothing once the rollups and ledger reach the oldest sample.
+    """
+    stats = {'rollups': 0, 'ledger_intervals': 0}
+    first = db.session.execute(select(func.min(EnergyRecord.timestamp)).where(EnergyRecord.user_id == user_id)).scalar()
+    if first is None:
+        return stats
+
+    first_rollup = db.session.execute(
+        select(func.min(EnergyRollup.bucket_start)).where(EnergyRollup.user_id == user_id, EnergyRollup.granularity == 'day')
+    ).scalar()
+    if first_rollup is None or first < first_rollup:
+        stats['rollups'] = rebuild_energy_rollups(user_id, tz_name)
+
+    # The first sample's interval has no energy if the next one is a gap away, so allow a day
+    ledger_started = db.session.execute(
+        select(EnergyLedger.id).where(EnergyLedger.user_id == user_id, EnergyLedger.interval_start < first + timedelta(days=1)).limit(1)
+    ).scalar()
+    if ledger_started is None:
+        stats['ledger_intervals'] = rebuild_ledger(user_id)
+    return stats
+
+
+def backfill_history() -> Dict[str, int]:
+    """
+    Build the rollups and ledger of history recorded before they were added.
+
+    The energy_rollup and energy_ledger migrations create empty tables, and the
+    collectors only fold in new samples. Run once at startup (and safe to run
+    again: users already covered are skipped); scripts/backfill_energy_rollups.py
+    does the same by hand, and can also rebuild a range.
+    """
+    totals = {'users': 0, 'rollups': 0, 'ledger_intervals': 0}
+    for user_id, tz_name in _users():
+        stats = _write(_backfill_user_history, user_id, tz_name)
+        if stats['rollups'] or stats['ledger_intervals']:
+            totals['users'] += 1
+            totals['rollups'] += stats['rollups']
+            totals['ledger_intervals'] += stats['ledger_intervals']
+    return totals
+
+
+def run_retention(policy: Optional[RetentionPolicy] = None, now: Optional[datetime] = None) -> Dict:
+    """
+    Apply the retention policy: fold and purge old samples, thin old rollups and prices.
+
+    Work is done in small batches, each a job on the database writer
+    (app.db_writer), and stops once policy.max_seconds is spent (archiving
+    included), so a first run over years of history is spread over several
+    nights instead of holding the database for minutes. Tables partitioned by
+    month (app.partitioning) lose whole partitions instead of rows, so they keep
+    up to a month more than their window. With HISTORY_ARCHIVE_DIR set, raw
+    samples and actual prices are copied to the archive (app.cold_archive) a
+    whole month at a time before they're deleted.
+
+    Returns:
+        Summary of what was deleted, the maintenance done and the table sizes
+    """
+    policy = policy or RetentionPolicy.from_env()
+    now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc).replace(tzinfo=None)
+    budget = _Budget(policy)
+    summary = {
+        'energy_record': {'days': 0, 'rebuilt_days': 0, 'ledger_days': 0, 'deleted': 0},
+        'energy_rollup': {},
+        'energy_ledger': 0,
+        'price_record': {},
+        'archive': {'energy': {'months': 0, 'rows': 0}, 'price': {'months': 0, 'rows': 0}},
+    }
+    archiving = archive_enabled()
+
+    if policy.raw_energy_days:
+        cutoff = now - timedelta(days=policy.raw_energy_days)
+        if archiving:
+            # Whole UTC months go to the archive, then leave the database
+            cutoff = month_start(cutoff)
+        if is_partitioned(db.session.connection(), 'energy_record'):
+            # A partition holds every user's rows: drop it only once all are archived
+            archived = all(
+                _archive_user(archive_energy, user_id, cutoff, summary['archive']['energy'], budget) >= cutoff
+                for user_id, _ in _users()
+            ) if archiving else True
+            if archived:
+                summary['energy_record'] = _drop_expired_energy_partitions(cutoff, budget)
+        else:
+            for user_id, tz_name in _users():
+                user_cutoff = cutoff
+                if archiving:
+                    # Only what made it into the archive leaves the database
+                    user_cutoff = _archive_user(archive_energy, user_id, cutoff, summary['archive']['energy'], budget)
+                for key, value in _fold_and_purge_energy(user_id, tz_name, user_cutoff, budget).items():
+                    summary['energy_record'][key] += value
+
+    for granularity in ('5min', 'hour', 'day'):
+        days = policy.rollup_days(granularity)
+        if days:
+            summary['energy_rollup'][granularity] = _delete_in_batches(
+                EnergyRollup,
+                (EnergyRollup.granularity == granularity) & (EnergyRollup.bucket_start < now - timedelta(days=days)),
+                budget,
+            )
+
+    if policy.energy_ledger_days:
+        summary['energy_ledger'] = _delete_in_batches(
+            EnergyLedger, EnergyLedger.interval_start < now - timedelta(days=policy.energy_ledger_days), budget
+        )
+
+    if policy.price_forecast_days:
+        summary['price_record']['forecast'] = _delete_in_batches(
+            PriceRecord,
+            (PriceRecord.forecast == True) & (PriceRecord.timestamp < now - timedelta(days=policy.price_forecast_days)),  # noqa: E712
+            budget,
+        )
+    if policy.price_days:
+        price_cutoff = now - timedelta(days=policy.price_days)
+        if archiving:
+            price_cutoff = month_start(price_cutoff)
+        if is_partitioned(db.session.connection(), 'price_record'):
+            archived = all(
+                _archive_user(archive_prices, user_id, price_cutoff, summary['archive']['price'], budget) >= price_cutoff
+                for user_id, _ in _users()
+            ) if archiving else True
+            if archived:
+                summary['price_record']['all'] = _drop_expired_price_partitions(price_cutoff, budget)
+        elif archiving:
+            summary['price_record']['all'] = 0
+            for user_id, _ in _users():
+                user_cutoff = _archive_user(archive_prices, user_id, price_cutoff, summary['archive']['price'], budget)
+                summary['price_record']['all'] += _delete_in_batches(
+                    PriceRecord, (PriceRecord.user_id == user_id) & (PriceRecord.timestamp < user_cutoff), budget
+                )
+        else:
+            summary['price_record']['all'] = _delete_in_batches(PriceRecord, PriceRecord.timestamp < price_cutoff, budget)
+
+    deleted_any = bool(
+        summary['energy_record']['deleted']
+        or any(summary['energy_rollup'].values())
+        or summary['energy_ledger']
+        or any(summary['price_record'].values())
+    )
+    summary['maintenance'] = _maintain_database(deleted_any)
+    summary['complete'] = not budget.exhausted
+    summary['sizes'] = table_sizes()
+    if archiving:
+        summary['sizes']['_archive'] = archive_size()
+    return summary
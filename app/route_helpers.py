@@ -9,7 +9,7 @@ import threading
 import time
 import traceback
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timezone
 from functools import wraps
 
 from flask import jsonify, flash, redirect, url_for, request, current_app
@@ -269,6 +269,35 @@ def db_transaction(success_msg=None, error_msg=None, logger_context=None, retry_
         raise
 
 
+# ============================================================================
+# Response Helpers
+# ============================================================================
+
+def local_isoformats(timestamps, tz):
+    """ISO 8601 local times for ascending UTC timestamps (naive values are taken as UTC)
+
+    Rather than a zone lookup per row, the zone's UTC offset is looked up at
+    the first and last timestamp. If they agree (a day holds at most one DST
+    change) every row is shifted by that fixed offset; otherwise each row is
+    converted on its own.
+
+    Args:
+        timestamps: Ascending datetimes
+        tz: Target ZoneInfo
+
+    Returns:
+        list of isoformat() strings, same order
+    """
+    if not timestamps:
+        return []
+    utc = [ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc) for ts in timestamps]
+    first_offset = utc[0].astimezone(tz).utcoffset()
+    if utc[-1].astimezone(tz).utcoffset() != first_offset:
+        return [ts.astimezone(tz).isoformat() for ts in utc]
+    fixed = timezone(first_offset)
+    return [(ts + first_offset).replace(tzinfo=fixed).isoformat() for ts in utc]
+
+
 # ============================================================================
 # Background Task Helpers
 # ============================================================================
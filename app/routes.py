@@ -7,6 +7,8 @@ from app.forms import LoginForm, RegistrationForm, SettingsForm, DemandChargeFor
 from app.utils import encrypt_token, decrypt_token
 from app.api_clients import get_amber_client, get_tesla_client, AEMOAPIClient
 from app.scheduler import TOUScheduler
+from app.live_events import publish_curtailment
+from app.compression import compressed_json
 from app.route_helpers import (
     require_tesla_client,
     require_amber_client,
@@ -15,7 +17,8 @@ from app.route_helpers import (
     db_commit_with_retry,
     start_background_task,
     restore_tariff_background,
-    get_api_user
+    get_api_user,
+    local_isoformats
 )
 import os
 import requests
@@ -23,13 +26,13 @@ import time
 import logging
 import secrets
 import asyncio
+import hashlib
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
 from urllib.parse import urlencode
 
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+# Logging is configured in app/__init__.py (app.logging_config)
 logger = logging.getLogger(__name__)
 
 
@@ -455,8 +458,13 @@ def reset_account():
 
         # Delete related records first (due to foreign key constraints)
         PriceRecord.query.filter_by(user_id=user.id).delete()
-        from app.models import EnergyRecord, SavedTOUProfile, CustomTOUSchedule
+        from app.models import EnergyRecord, EnergyRollup, EnergyLedger, SavedTOUProfile, CustomTOUSchedule, TariffArtifact
         EnergyRecord.query.filter_by(user_id=user.id).delete()
+        EnergyRollup.query.filter_by(user_id=user.id).delete()
+        EnergyLedger.query.filter_by(user_id=user.id).delete()
+        TariffArtifact.query.filter_by(user_id=user.id).delete()
+        from app.cold_archive import delete_user_archive
+        delete_user_archive(user.id)
         SavedTOUProfile.query.filter_by(user_id=user.id).delete()
         CustomTOUSchedule.query.filter_by(user_id=user.id).delete()
 
@@ -514,6 +522,40 @@ def dashboard():
                            tesla_api_provider=tesla_api_provider)
 
 
+@bp.route('/api/dashboard/bootstrap')
+@compressed_json(etag=False)
+@api_auth_required
+def dashboard_bootstrap(api_user=None, **kwargs):
+    """Get everything the dashboard loads on first paint in one response
+
+    Query params:
+        sections: optional comma-separated section names (default: all that apply)
+
+    Each section is the JSON its own endpoint would return ({'url', 'status',
+    'data'}, keyed by section name). They are fetched concurrently with the
+    user loaded once and one Tesla / Amber client shared between them; a
+    section slower than the bootstrap timeout comes back with data null.
+
+    Supports both session login and Bearer token authentication.
+    """
+    from app.dashboard_bootstrap import SECTIONS, build_bootstrap
+
+    user = api_user or current_user
+    user = getattr(user, '_get_current_object', lambda: user)()  # the User itself, not the proxy
+    logger.info(f"Dashboard bootstrap requested by user: {user.email}")
+
+    names = None
+    if request.args.get('sections'):
+        names = [name.strip() for name in request.args['sections'].split(',') if name.strip()]
+        unknown = sorted(set(names) - {section.name for section in SECTIONS})
+        if unknown:
+            return jsonify({'error': f"Unknown sections: {', '.join(unknown)}"}), 400
+
+    response = jsonify({'sections': build_bootstrap(user, names)})
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+
 @bp.route('/api/curtailment-status')
 @login_required
 def api_curtailment_status():
@@ -826,6 +868,7 @@ def api_inverter_curtail():
             user.inverter_last_state_updated = datetime.utcnow()
             user.inverter_power_limit_w = home_load_w
             db.session.commit()
+            publish_curtailment(user)
 
         response = {'success': success, 'state': 'curtailed' if success else 'unknown'}
         if home_load_w is not None:
@@ -885,6 +928,7 @@ def api_inverter_set_power_limit():
             current_user.inverter_last_state_updated = datetime.utcnow()
             current_user.inverter_power_limit_w = power_limit_w
             db.session.commit()
+            publish_curtailment(current_user)
 
         response = {'success': success}
         if power_limit_w is not None:
@@ -932,6 +976,7 @@ def api_inverter_restore():
             user.inverter_last_state_updated = datetime.utcnow()
             user.inverter_power_limit_w = None  # Clear power limit
             db.session.commit()
+            publish_curtailment(user)
 
         return jsonify({'success': success, 'state': 'online' if success else 'unknown'})
 
@@ -1469,10 +1514,8 @@ def settings():
             db.session.commit()
             logger.info("Settings saved successfully to database")
 
-            # Clear TOU schedule cache so new settings take effect immediately
-            cache_key = f'tou_schedule_{current_user.id}'
-            cache.delete(cache_key)
-            logger.info("Cleared TOU schedule cache after settings update")
+            # The TOU schedule needs no invalidation: its stored tariff is keyed by these
+            # settings (see tariff_artifacts.settings_fingerprint)
 
             flash('Your settings have been saved.')
         except Exception as e:
@@ -1790,6 +1833,7 @@ def amber_settings():
 
         try:
             db.session.commit()
+            publish_curtailment(current_user)
             logger.info(f"Amber settings saved successfully: forecast_type={form.amber_forecast_type.data}, site_id={current_user.amber_site_id}")
 
             # Reinitialize WebSocket client with new site_id
@@ -2296,6 +2340,7 @@ def amber_5min_forecast(api_user=None, **kwargs):
 
 
 @bp.route('/api/amber/30min-forecast')
+@compressed_json()
 @login_required
 def amber_30min_forecast():
     """Get 30-minute interval forecast for extended hours (48 hours available)"""
@@ -2653,15 +2698,15 @@ def sigenergy_energy_summary(api_user=None, **kwargs):
 def sigenergy_calendar_history(api_user=None, **kwargs):
     """Get historical energy summaries for Sigenergy users.
 
-    Aggregates data from EnergyRecord table since Sigenergy Cloud API
-    doesn't provide historical energy data like Tesla does.
+    Aggregates the energy integrals of the EnergyRollup table (built from
+    EnergyRecord samples) since Sigenergy Cloud API doesn't provide historical
+    energy data like Tesla does.
 
     Supports both session login and Bearer token authentication.
     """
     from datetime import datetime, timezone, timedelta
     from zoneinfo import ZoneInfo
-    from sqlalchemy import func
-    from app.models import EnergyRecord
+    from app.history_store import energy_rollups
 
     user = api_user or current_user
     logger.info(f"Sigenergy calendar history requested by user: {user.email}")
@@ -2717,14 +2762,11 @@ def sigenergy_calendar_history(api_user=None, **kwargs):
     start_utc = start_date.astimezone(timezone.utc)
     end_utc = end_date.astimezone(timezone.utc)
 
-    # Query EnergyRecord for this period
-    records = EnergyRecord.query.filter(
-        EnergyRecord.user_id == user.id,
-        EnergyRecord.timestamp >= start_utc,
-        EnergyRecord.timestamp <= end_utc
-    ).order_by(EnergyRecord.timestamp.asc()).all()
+    # Energy integrals from the rollups: hourly buckets for the hourly day view, daily otherwise
+    granularity = 'hour' if group_format.endswith('%H:00') else 'day'
+    rollups = energy_rollups(user.id, granularity, start_utc, end_utc)
 
-    if not records:
+    if not rollups:
         logger.info(f"No energy records found for period {period}")
         return jsonify({
             'period': period,
@@ -2743,17 +2785,12 @@ def sigenergy_calendar_history(api_user=None, **kwargs):
             }
         })
 
-    # Aggregate records into time buckets
-    # Power is in watts, we need to convert to Wh (energy)
-    # Since records are typically 5 minutes apart, each record represents ~5 min of energy
-    # Energy (Wh) = Power (W) * Time (h) = Power (W) * (5/60)
-
+    # Aggregate rollups into time buckets (energy in Wh)
     time_buckets = {}
-    sample_interval_hours = 5 / 60  # Assume 5-minute sampling
 
-    for record in records:
-        # Convert timestamp to local time and format for grouping
-        local_ts = record.timestamp.replace(tzinfo=timezone.utc).astimezone(user_tz)
+    for rollup in rollups:
+        # Rollup buckets start on local hour/day boundaries, so they group cleanly by local time
+        local_ts = rollup.bucket_start.replace(tzinfo=timezone.utc).astimezone(user_tz)
         bucket_key = local_ts.strftime(group_format)
 
         if bucket_key not in time_buckets:
@@ -2768,29 +2805,15 @@ def sigenergy_calendar_history(api_user=None, **kwargs):
             }
 
         bucket = time_buckets[bucket_key]
-
-        # Convert power (W) to energy (Wh) for this interval
-        solar_wh = max(0, record.solar_power or 0) * sample_interval_hours
-        home_wh = max(0, record.load_power or 0) * sample_interval_hours
-
-        # Battery: positive = discharging, negative = charging
-        battery_power = record.battery_power or 0
-        if battery_power > 0:
-            bucket['battery_discharge_wh'] += battery_power * sample_interval_hours
-        else:
-            bucket['battery_charge_wh'] += abs(battery_power) * sample_interval_hours
-
-        # Grid: positive = importing, negative = exporting
-        grid_power = record.grid_power or 0
-        if grid_power > 0:
-            bucket['grid_import_wh'] += grid_power * sample_interval_hours
-        else:
-            bucket['grid_export_wh'] += abs(grid_power) * sample_interval_hours
-
-        bucket['solar_wh'] += solar_wh
-        bucket['home_wh'] += home_wh
+        bucket['solar_wh'] += rollup.solar_wh or 0
+        bucket['home_wh'] += rollup.load_wh or 0
+        bucket['battery_discharge_wh'] += rollup.battery_discharge_wh or 0
+        bucket['battery_charge_wh'] += rollup.battery_charge_wh or 0
+        bucket['grid_import_wh'] += rollup.grid_import_wh or 0
+        bucket['grid_export_wh'] += rollup.grid_export_wh or 0
 
     # Build time series in Tesla calendar history format
+    from app.downsampling import max_points_param, sum_buckets
     time_series = []
     for bucket_key in sorted(time_buckets.keys()):
         bucket = time_buckets[bucket_key]
@@ -2822,6 +2845,11 @@ def sigenergy_calendar_history(api_user=None, **kwargs):
         'consumer_energy_imported_from_battery': sum(b['battery_discharge_wh'] for b in time_buckets.values()) * 0.5,
     }
 
+    # Optional cap on the points returned: adjacent buckets are merged, keeping the energy totals
+    time_series = sum_buckets(
+        time_series, max_points_param(request.args), [key for key in time_series[0] if key != 'timestamp']
+    )
+
     logger.info(f"Returning {len(time_series)} time series records for period '{period}'")
 
     return jsonify({
@@ -2831,10 +2859,100 @@ def sigenergy_calendar_history(api_user=None, **kwargs):
     })
 
 
+# Past days' price history never changes once the day's last interval is in
+PRICE_HISTORY_SETTLE = 600  # seconds after local midnight before a day counts as complete
+PRICE_HISTORY_CACHE_SECONDS = 86400
+
+
+def _price_history_payload(user, user_tz, day, target_date, start_of_day_local, end_of_day_local, max_points=None):
+    """Import/export price history of one local day, as returned by /api/price-history
+
+    max_points caps each channel's series (LTTB); the max prices cover every record.
+    """
+    from datetime import timezone
+    from app.cold_archive import archived_price_records, with_archived
+    from app.downsampling import lttb
+    from app.history_store import nem_time_window
+
+    # Convert to UTC for database query
+    start_of_day_utc = start_of_day_local.astimezone(timezone.utc)
+    end_of_day_utc = end_of_day_local.astimezone(timezone.utc)
+
+    logger.info(f"Fetching price history for {day}: {start_of_day_local.date()} (UTC range: {start_of_day_utc} to {end_of_day_utc})")
+
+    # Both channels in one query (only actual prices, not forecasts); ordering by
+    # channel first lets the index return the rows already sorted
+    records = PriceRecord.query.filter(
+        PriceRecord.user_id == user.id,
+        PriceRecord.channel_type.in_(('general', 'feedIn')),
+        PriceRecord.forecast == False,
+        PriceRecord.timestamp >= start_of_day_utc,
+        PriceRecord.timestamp <= end_of_day_utc,
+        nem_time_window(start_of_day_utc, end_of_day_utc)
+    ).order_by(
+        PriceRecord.channel_type.asc(),
+        PriceRecord.timestamp.asc()
+    ).all()
+
+    channels = {'general': [], 'feedIn': []}
+    for record in records:
+        channels[record.channel_type].append(record)
+    for channel in channels:
+        channels[channel] = with_archived(
+            channels[channel], archived_price_records(user.id, channel, start_of_day_utc, end_of_day_utc)
+        )
+
+    # One pass per channel: local timestamps, rows and the day's max price
+    series = {}
+    max_prices = {}
+    for channel, channel_records in channels.items():
+        rows = []
+        max_price = None
+        local_times = local_isoformats([record.timestamp for record in channel_records], user_tz)
+        for record, local_time in zip(channel_records, local_times):
+            rows.append({
+                'timestamp': local_time,
+                'per_kwh': record.per_kwh,
+                'spike_status': record.spike_status,
+                'forecast': record.forecast
+            })
+            if record.per_kwh is not None and (max_price is None or record.per_kwh > max_price):
+                max_price = record.per_kwh
+        series[channel] = lttb(rows, max_points, ('per_kwh',))
+        max_prices[channel] = max_price if max_price is not None else 0
+
+    logger.info(f"Returning {len(series['general'])} import and {len(series['feedIn'])} export price history records for {day}")
+    logger.info(f"Max prices for {day}: Import={max_prices['general']}¢/kWh, Export={max_prices['feedIn']}¢/kWh")
+
+    # Include metadata for chart configuration (midnight-to-midnight display)
+    return {
+        'import': series['general'],
+        'export': series['feedIn'],
+        'metadata': {
+            'start_of_day': start_of_day_local.isoformat(),
+            'end_of_day': end_of_day_local.isoformat(),
+            'day': day,
+            'date': target_date.strftime('%Y-%m-%d'),
+            'timezone': str(user_tz),
+            'max_import_price': max_prices['general'],
+            'max_export_price': max_prices['feedIn']
+        }
+    }
+
+
 @bp.route('/api/price-history')
+@compressed_json()
 @login_required
 def price_history():
-    """Get historical price data"""
+    """Get historical price data
+
+    The day is either relative (?day=today|yesterday|<days ago>) or absolute
+    (?date=YYYY-MM-DD, in the user's timezone). Completed days are served from
+    a cached response with an ETag and Last-Modified, so a browser revisiting
+    one gets 304 Not Modified without the database being queried. Only the
+    absolute URL is marked immutable: a relative one names a different day
+    after local midnight, so the browser must revalidate it.
+    """
     from datetime import datetime, timezone, timedelta
     from zoneinfo import ZoneInfo
 
@@ -2846,10 +2964,21 @@ def price_history():
     # Get day parameter (default to 'today')
     day = request.args.get('day', 'today')
 
+    # Optional cap on the points per channel (LTTB downsampling)
+    from app.downsampling import max_points_param
+    max_points = max_points_param(request.args)
+
     # Calculate date range based on day parameter
     now_local = datetime.now(user_tz)
 
-    if day == 'today':
+    date_param = request.args.get('date')
+    if date_param:
+        try:
+            target_date = datetime.strptime(date_param, '%Y-%m-%d').replace(tzinfo=user_tz)
+        except ValueError:
+            return jsonify({'error': 'Invalid date, expected YYYY-MM-DD'}), 400
+        day = target_date.strftime('%Y-%m-%d')
+    elif day == 'today':
         target_date = now_local
     elif day == 'yesterday':
         target_date = now_local - timedelta(days=1)
@@ -2866,96 +2995,39 @@ def price_history():
     start_of_day_local = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
     end_of_day_local = target_date.replace(hour=23, minute=59, second=59, microsecond=999999)
 
-    # Convert to UTC for database query
-    start_of_day_utc = start_of_day_local.astimezone(timezone.utc)
-    end_of_day_utc = end_of_day_local.astimezone(timezone.utc)
-
-    logger.info(f"Fetching price history for {day}: {start_of_day_local.date()} (UTC range: {start_of_day_utc} to {end_of_day_utc})")
-
-    # Get import price data for target day (general channel, only actual prices, not forecasts)
-    import_records = PriceRecord.query.filter(
-        PriceRecord.user_id == current_user.id,
-        PriceRecord.channel_type == 'general',
-        PriceRecord.forecast == False,
-        PriceRecord.timestamp >= start_of_day_utc,
-        PriceRecord.timestamp <= end_of_day_utc
-    ).order_by(
-        PriceRecord.timestamp.asc()
-    ).all()
-
-    # Get export price data for target day (feedIn channel, only actual prices, not forecasts)
-    export_records = PriceRecord.query.filter(
-        PriceRecord.user_id == current_user.id,
-        PriceRecord.channel_type == 'feedIn',
-        PriceRecord.forecast == False,
-        PriceRecord.timestamp >= start_of_day_utc,
-        PriceRecord.timestamp <= end_of_day_utc
-    ).order_by(
-        PriceRecord.timestamp.asc()
-    ).all()
-
-    import_data = []
-    for record in import_records:
-        # Convert UTC timestamp to user's timezone
-        if record.timestamp.tzinfo is None:
-            # Assume UTC if no timezone info
-            utc_time = record.timestamp.replace(tzinfo=timezone.utc)
-        else:
-            utc_time = record.timestamp
-
-        local_time = utc_time.astimezone(user_tz)
-
-        import_data.append({
-            'timestamp': local_time.isoformat(),
-            'per_kwh': record.per_kwh,
-            'spike_status': record.spike_status,
-            'forecast': record.forecast
-        })
-
-    export_data = []
-    for record in export_records:
-        # Convert UTC timestamp to user's timezone
-        if record.timestamp.tzinfo is None:
-            # Assume UTC if no timezone info
-            utc_time = record.timestamp.replace(tzinfo=timezone.utc)
-        else:
-            utc_time = record.timestamp
-
-        local_time = utc_time.astimezone(user_tz)
-
-        export_data.append({
-            'timestamp': local_time.isoformat(),
-            'per_kwh': record.per_kwh,
-            'spike_status': record.spike_status,
-            'forecast': record.forecast
-        })
-
-    # Calculate max prices from all records for the day
-    max_import_price = max([record.per_kwh for record in import_records], default=0)
-    max_export_price = max([record.per_kwh for record in export_records], default=0)
-
-    logger.info(f"Returning {len(import_data)} import and {len(export_data)} export price history records for {day}")
-    logger.info(f"Max prices for {day}: Import={max_import_price}¢/kWh, Export={max_export_price}¢/kWh")
-
-    # Include metadata for chart configuration (midnight-to-midnight display)
-    response_data = {
-        'import': import_data,
-        'export': export_data,
-        'metadata': {
-            'start_of_day': start_of_day_local.isoformat(),
-            'end_of_day': end_of_day_local.isoformat(),
-            'day': day,
-            'date': target_date.strftime('%Y-%m-%d'),
-            'timezone': str(user_tz),
-            'max_import_price': max_import_price,
-            'max_export_price': max_export_price
+    day_complete = now_local >= end_of_day_local + timedelta(seconds=PRICE_HISTORY_SETTLE)
+    if not day_complete:
+        return jsonify(_price_history_payload(
+            current_user, user_tz, day, target_date, start_of_day_local, end_of_day_local, max_points
+        ))
+
+    cache_key = f'price_history_{current_user.id}_{user_tz.key}_{target_date:%Y-%m-%d}_{day}_{max_points}'
+    cached = cache.get(cache_key)
+    if cached is None:
+        body = jsonify(_price_history_payload(
+            current_user, user_tz, day, target_date, start_of_day_local, end_of_day_local, max_points
+        )).get_data()
+        cached = {
+            'body': body,
+            'etag': hashlib.sha1(body).hexdigest(),
+            'last_modified': end_of_day_local.astimezone(timezone.utc),
         }
-    }
-
-    return jsonify(response_data)
+        cache.set(cache_key, cached, timeout=PRICE_HISTORY_CACHE_SECONDS)
+
+    response = current_app.response_class(cached['body'], mimetype='application/json')
+    response.set_etag(cached['etag'])
+    response.last_modified = cached['last_modified']
+    response.cache_control.private = True
+    if date_param:
+        response.cache_control.max_age = PRICE_HISTORY_CACHE_SECONDS
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 
 @bp.route('/api/energy-history')
+@compressed_json()
 @api_auth_required
 def energy_history(api_user=None, **kwargs):
     """Get historical energy usage data for graphing
@@ -2977,9 +3049,17 @@ def energy_history(api_user=None, **kwargs):
     # Get optional date parameter (YYYY-MM-DD format) for historical queries
     date_param = request.args.get('date')
 
+    # Optional cap on the points returned (LTTB downsampling)
+    from app.downsampling import lttb, max_points_param
+    max_points = max_points_param(request.args)
+
     # Calculate time range based on timeframe
     from app.models import EnergyRecord
+    from app.cold_archive import archived_energy_records, with_archived
+    from app.energy_buffer import with_buffered_samples
+    from app.history_store import MAX_HISTORY_POINTS, energy_rollups, granularity_for_range
 
+    granularity = None  # Raw samples, or the EnergyRollup granularity used
     if timeframe == 'day':
         # If date provided, use that date; otherwise use today
         if date_param:
@@ -2997,7 +3077,7 @@ def energy_history(api_user=None, **kwargs):
         start_of_day_utc = start_of_day_local.astimezone(timezone.utc)
         end_of_day_utc = end_of_day_local.astimezone(timezone.utc)
 
-        # Query records for the specified day
+        # Query records for the specified day, plus samples still in the write-behind buffer
         records = EnergyRecord.query.filter(
             EnergyRecord.user_id == user.id,
             EnergyRecord.timestamp >= start_of_day_utc,
@@ -3005,31 +3085,41 @@ def energy_history(api_user=None, **kwargs):
         ).order_by(
             EnergyRecord.timestamp.asc()
         ).all()
+        records = with_buffered_samples(records, user.id, start_of_day_utc, end_of_day_utc)
+        records = with_archived(records, archived_energy_records(user.id, start_of_day_utc, end_of_day_utc))
 
-    elif timeframe == 'month':
-        # Get last 30 days of data
-        limit = 720  # 30 days * 24 hours
-        records = EnergyRecord.query.filter_by(
-            user_id=user.id
-        ).order_by(
-            EnergyRecord.timestamp.desc()
-        ).limit(limit).all()
-
-    else:  # year
-        # Get last 365 days of data
-        limit = 8760  # 365 days * 24 hours
-        records = EnergyRecord.query.filter_by(
-            user_id=user.id
-        ).order_by(
-            EnergyRecord.timestamp.desc()
-        ).limit(limit).all()
+    else:
+        # month / year: last 30 or 365 days, from the rollup resolution that fits the range
+        end_utc = datetime.now(timezone.utc)
+        start_utc = end_utc - timedelta(days=30 if timeframe == 'month' else 365)
+        granularity = granularity_for_range(start_utc, end_utc, max_points or MAX_HISTORY_POINTS)
+        if granularity is None:
+            records = EnergyRecord.query.filter(
+                EnergyRecord.user_id == user.id,
+                EnergyRecord.timestamp >= start_utc,
+            ).order_by(
+                EnergyRecord.timestamp.asc()
+            ).all()
+            records = with_buffered_samples(records, user.id, start_utc, end_utc)
+            records = with_archived(records, archived_energy_records(user.id, start_utc, end_utc))
+        else:
+            records = []
 
     data = []
-    # For 'day' view, records are already in ascending order
-    # For 'month' and 'year', we need to reverse them (they're in desc order)
-    records_to_process = records if timeframe == 'day' else reversed(records)
+    if granularity is not None:
+        for rollup in energy_rollups(user.id, granularity, start_utc, end_utc):
+            local_time = rollup.bucket_start.replace(tzinfo=timezone.utc).astimezone(user_tz)
+            # Bucket means, in the same shape as raw samples
+            data.append({
+                'timestamp': local_time.isoformat(),
+                'solar_power': rollup.mean('solar'),
+                'battery_power': rollup.mean('battery'),
+                'grid_power': rollup.mean('grid'),
+                'load_power': rollup.mean('load'),
+                'battery_level': rollup.battery_level_mean
+            })
 
-    for record in records_to_process:
+    for record in records:
         # Convert UTC timestamp to user's timezone
         if record.timestamp.tzinfo is None:
             # Assume UTC if no timezone info
@@ -3048,13 +3138,19 @@ def energy_history(api_user=None, **kwargs):
             'battery_level': record.battery_level
         })
 
+    source_points = len(data)
+    data = lttb(data, max_points, ('solar_power', 'battery_power', 'grid_power', 'load_power', 'battery_level'))
+
     logger.info(f"Returning {len(data)} energy history records for timeframe: {timeframe}")
 
     # For 'day' timeframe, include date range metadata for frontend chart configuration
     response_data = {
         'records': data,
-        'timeframe': timeframe
+        'timeframe': timeframe,
+        'granularity': granularity or 'raw'
     }
+    if len(data) < source_points:
+        response_data['downsampling'] = {'method': 'lttb', 'source_points': source_points}
 
     if timeframe == 'day':
         # Send start/end of day in user's timezone for chart x-axis configuration
@@ -3078,7 +3174,174 @@ def energy_history(api_user=None, **kwargs):
     return jsonify(response_data)
 
 
+@bp.route('/api/energy-ledger')
+@compressed_json()
+@api_auth_required
+def energy_ledger(api_user=None, **kwargs):
+    """Get integrated energy (kWh) and cost over a date range from the energy ledger
+
+    Query params:
+        start: YYYY-MM-DD, first local day (default today)
+        end: YYYY-MM-DD, last local day, inclusive (default start)
+
+    Totals come from one aggregate over the 5-minute ledger intervals; the
+    intervals themselves are included for ranges of up to a week. Prices are
+    c/kWh, money in cents; export_earnings is what the user was paid.
+
+    Supports both session login and Bearer token authentication.
+    """
+    from datetime import datetime, timezone, timedelta
+    from zoneinfo import ZoneInfo
+    from app.energy_ledger import ENERGY_COLUMNS, ledger_intervals, ledger_totals
+
+    user = api_user or current_user
+    user_tz = ZoneInfo(get_powerwall_timezone(user))
+
+    try:
+        today = datetime.now(user_tz).date()
+        start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else today
+        end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else start_date
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    if end_date < start_date:
+        return jsonify({'error': 'end must not be before start'}), 400
+
+    start_local = datetime(start_date.year, start_date.month, start_date.day, tzinfo=user_tz)
+    end_local = datetime(end_date.year, end_date.month, end_date.day, tzinfo=user_tz) + timedelta(days=1)
+    start_utc = start_local.astimezone(timezone.utc)
+    end_utc = end_local.astimezone(timezone.utc)
+
+    totals = ledger_totals(user.id, start_utc, end_utc)
+    response_data = {
+        'start': start_local.isoformat(),
+        'end': end_local.isoformat(),
+        'timezone': str(user_tz),
+        'totals': totals,
+    }
+
+    if (end_date - start_date).days < 7:
+        response_data['intervals'] = [
+            dict(
+                {column: getattr(entry, column) for column in ENERGY_COLUMNS},
+                interval_start=entry.interval_start.replace(tzinfo=timezone.utc).astimezone(user_tz).isoformat(),
+                covered_seconds=entry.covered_seconds,
+                import_price=entry.import_price,
+                export_price=entry.export_price,
+                import_cost=entry.import_cost,
+                export_earnings=entry.export_earnings,
+            )
+            for entry in ledger_intervals(user.id, start_utc, end_utc)
+        ]
+
+    return jsonify(response_data)
+
+
+@bp.route('/api/events')
+@api_auth_required
+def live_events(api_user=None, **kwargs):
+    """Server-Sent Events stream of live updates
+
+    Events (data is JSON):
+        price: current prices, pushed as the Amber WebSocket delivers them
+               ({'prices': [...], 'source': ...} as from /api/current-price)
+        power: power-flow snapshot from the energy collector (as from /api/tesla/status)
+        curtailment: export rule / inverter curtailment state after it changes
+        sync: result of each TOU schedule sync
+
+    A new stream starts with the latest event of each type; a reconnecting
+    EventSource (Last-Event-ID header) gets those it missed. Nothing is fetched
+    upstream per viewer - the events come from the background jobs. Streams
+    end after LIVE_EVENTS_MAX_STREAM_SECONDS and the client reconnects; beyond
+    LIVE_EVENTS_MAX_STREAMS open streams it gets a 503 and should keep polling.
+
+    Supports both session login and Bearer token authentication.
+    """
+    from flask import Response
+    from app.live_events import amber_site_topic, event_stream, user_topic
+
+    user = api_user or current_user
+    broker = current_app.config.get('LIVE_EVENTS')
+    if broker is None:
+        return jsonify({'error': 'Live events are not available'}), 503
+
+    topics = [user_topic(user.id)]
+    if user.amber_site_id:
+        topics.append(amber_site_topic(user.amber_site_id))
+    subscription = broker.subscribe(topics, request.headers.get('Last-Event-ID'))
+    if subscription is None:
+        logger.warning(f"Live event stream refused for {user.email} - {broker.max_streams} streams already open")
+        response = jsonify({'error': 'Too many live event streams open'})
+        response.headers['Retry-After'] = '60'
+        return response, 503
+
+    # The stream needs no request or app context (and shouldn't hold a database
+    # session open), so it is not wrapped in stream_with_context
+    response = Response(event_stream(subscription), mimetype='text/event-stream')
+    response.call_on_close(subscription.close)  # Also if the body is never iterated
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: don't buffer the stream
+    return response
+
+
+@bp.route('/api/export/<dataset>')
+@api_auth_required
+def export_history(dataset, api_user=None, **kwargs):
+    """Download a history table as CSV or NDJSON
+
+    dataset: prices, energy or battery-health
+
+    Query params:
+        start: YYYY-MM-DD, first local day (default: oldest stored)
+        end: YYYY-MM-DD, last local day, inclusive (default: latest stored)
+        format: csv (default) or ndjson
+        gzip: 1 to gzip the download
+
+    The file is streamed: rows are read from a server-side cursor a chunk at a
+    time (archived months included), so any date range takes constant memory.
+    Timestamps are UTC ISO 8601.
+
+    Supports both session login and Bearer token authentication.
+    """
+    from flask import Response, stream_with_context
+    from app.history_export import DATASETS, FORMATS, export_stream
+
+    user = api_user or current_user
+    user_tz = ZoneInfo(get_powerwall_timezone(user))
+
+    if dataset not in DATASETS:
+        return jsonify({'error': f"Unknown dataset. Use one of: {', '.join(DATASETS)}"}), 400
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in FORMATS:
+        return jsonify({'error': f"Unknown format. Use one of: {', '.join(FORMATS)}"}), 400
+    gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+    try:
+        start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else None
+        end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    if start_date and end_date and end_date < start_date:
+        return jsonify({'error': 'end must not be before start'}), 400
+
+    start = datetime(start_date.year, start_date.month, start_date.day, tzinfo=user_tz) if start_date else None
+    end = (datetime(end_date.year, end_date.month, end_date.day, tzinfo=user_tz) + timedelta(days=1)
+           if end_date else None)
+
+    mimetype, extension = FORMATS[export_format]
+    filename = f"powersync-{dataset}-{start_date or 'all'}-{end_date or 'latest'}.{extension}"
+    if gzip:
+        mimetype, filename = 'application/gzip', filename + '.gz'
+    logger.info(f"History export requested by {user.email}: {filename}")
+
+    chunks = export_stream(dataset, user.id, export_format, gzip, start, end)
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
 @bp.route('/api/energy-calendar-history')
+@compressed_json()
 @api_auth_required
 def energy_calendar_history_unified(api_user=None, **kwargs):
     """Get historical energy summaries - routes to appropriate backend.
@@ -3247,27 +3510,15 @@ def energy_calendar_history_unified(api_user=None, **kwargs):
     return jsonify(data)
 
 
-@bp.route('/api/tou-schedule')
-@api_auth_required
-def tou_schedule(api_user=None, **kwargs):
-    """Get the rolling 24-hour tariff schedule that will be sent to Tesla
-
-    Supports both session login and Bearer token authentication.
+def _build_tou_schedule_tariff(user):
     """
-    user = api_user or current_user
-    # Check for cache bypass (used after settings changes)
-    bypass_cache = request.args.get('refresh') == '1'
+    Build a user's tariff as the sync does, for /api/tou-schedule when none is stored.
 
-    if not bypass_cache:
-        # Try to get from cache
-        cache_key = f'tou_schedule_{user.id}'
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.debug(f"TOU schedule served from cache for user: {user.email}")
-            return cached_result
-
-    logger.info(f"TOU tariff schedule requested by user: {user.email} (bypass_cache={bypass_cache})")
+    The tariff (without Chip Mode) is stored for the next request.
 
+    Returns:
+        (tariff, actual_interval, None), or (None, None, error response)
+    """
     # Determine price source based on user settings
     use_aemo = (
         user.electricity_provider == 'flow_power' and
@@ -3282,7 +3533,7 @@ def tou_schedule(api_user=None, **kwargs):
         aemo_region = user.flow_power_state
         if not aemo_region:
             logger.error("AEMO price source selected but no region configured")
-            return jsonify({'error': 'AEMO region not configured. Please set your Flow Power state in settings.'}), 400
+            return None, None, (jsonify({'error': 'AEMO region not configured. Please set your Flow Power state in settings.'}), 400)
 
         logger.info(f"TOU Schedule - Using AEMO price source for region: {aemo_region}")
         aemo_client = AEMOAPIClient()
@@ -3291,7 +3542,7 @@ def tou_schedule(api_user=None, **kwargs):
         forecast_30min = aemo_client.get_price_forecast(aemo_region, periods=96)
         if not forecast_30min:
             logger.error(f"Failed to fetch AEMO price forecast for {aemo_region}")
-            return jsonify({'error': 'Failed to fetch AEMO price forecast'}), 500
+            return None, None, (jsonify({'error': 'Failed to fetch AEMO price forecast'}), 500)
 
         logger.info(f"Using AEMO forecast for TOU schedule: {len(forecast_30min)} intervals")
     else:
@@ -3299,11 +3550,10 @@ def tou_schedule(api_user=None, **kwargs):
         amber_client = get_amber_client(user)
         if not amber_client:
             logger.warning("Amber client not available for tariff schedule")
-            return jsonify({'error': 'Amber API not configured'}), 400
+            return None, None, (jsonify({'error': 'Amber API not configured'}), 400)
 
         # Step 1: Get current interval prices from WebSocket (real-time) with REST API fallback
         # This ensures we have the most up-to-date pricing for the current period
-        from flask import current_app
         ws_client = current_app.config.get('AMBER_WEBSOCKET_CLIENT')
 
         # Get live prices (WebSocket first, REST API fallback)
@@ -3326,7 +3576,7 @@ def tou_schedule(api_user=None, **kwargs):
         forecast_30min = amber_client.get_price_forecast(next_hours=48, resolution=30)
         if not forecast_30min:
             logger.error("Failed to fetch 48-hour forecast for TOU schedule")
-            return jsonify({'error': 'Failed to fetch price forecast'}), 500
+            return None, None, (jsonify({'error': 'Failed to fetch price forecast'}), 500)
 
         logger.info(f"Using 30-min forecast for TOU schedule: {len(forecast_30min)} intervals")
 
@@ -3357,7 +3607,10 @@ def tou_schedule(api_user=None, **kwargs):
 
     # Convert to Tesla tariff format using 30-min forecast data
     # The actual_interval (from 5-min data) will be injected for the current period only
-    from app.tariff_converter import AmberTariffConverter, apply_flow_power_export, apply_network_tariff, apply_flow_power_pea, get_wholesale_lookup
+    from app.tariff_converter import AmberTariffConverter, get_tariff_pipeline
+    from app.tariff_artifacts import save_tariff_artifact
+    from app.price_intervals import PriceIntervals
+    forecast_30min = PriceIntervals.of(forecast_30min)  # Parsed once for the converter and PEA
     converter = AmberTariffConverter()
     tariff = converter.convert_amber_to_tesla_tariff(
         forecast_30min,
@@ -3368,60 +3621,52 @@ def tou_schedule(api_user=None, **kwargs):
 
     if not tariff:
         logger.error("Failed to convert tariff")
-        return jsonify({'error': 'Failed to convert tariff'}), 500
-
-    # Apply Flow Power PEA pricing (works with both AEMO and Amber price sources)
-    if user.electricity_provider == 'flow_power':
-        # Check if PEA (Price Efficiency Adjustment) is enabled
-        pea_enabled = getattr(user, 'pea_enabled', True)  # Default True for Flow Power
-
-        if pea_enabled:
-            # Use Flow Power PEA pricing model: Base Rate + PEA
-            # Works with both AEMO (raw wholesale) and Amber (wholesaleKWHPrice forecast)
-            base_rate = getattr(user, 'flow_power_base_rate', 34.0) or 34.0
-            custom_pea = getattr(user, 'pea_custom_value', None)
-            wholesale_prices = get_wholesale_lookup(forecast_30min)
-            price_source = user.flow_power_price_source or 'amber'
-            logger.info(f"Applying Flow Power PEA ({price_source}): base_rate={base_rate}c, custom_pea={custom_pea}")
-            tariff = apply_flow_power_pea(tariff, wholesale_prices, base_rate, custom_pea)
-        elif user.flow_power_price_source == 'aemo':
-            # PEA disabled + AEMO: fall back to network tariff calculation
-            # (Amber prices already include network fees, no fallback needed)
-            logger.info("Applying network tariff to AEMO wholesale prices (PEA disabled)")
-            tariff = apply_network_tariff(tariff, user)
-
-    # Apply Flow Power export rates if user is on Flow Power (for preview display)
-    if user.electricity_provider == 'flow_power' and user.flow_power_state:
-        logger.info(f"Preview: Applying Flow Power export rates for state: {user.flow_power_state}")
-        tariff = apply_flow_power_export(tariff, user.flow_power_state)
-
-    # Apply export price boost for Amber users (if enabled)
-    if user.electricity_provider == 'amber' and getattr(user, 'export_boost_enabled', False):
-        from app.tariff_converter import apply_export_boost
-        offset = getattr(user, 'export_price_offset', 0) or 0
-        min_price = getattr(user, 'export_min_price', 0) or 0
-        boost_start = getattr(user, 'export_boost_start', '17:00') or '17:00'
-        boost_end = getattr(user, 'export_boost_end', '21:00') or '21:00'
-        threshold = getattr(user, 'export_boost_threshold', 0) or 0
-        logger.info(f"Preview: Applying export boost: offset={offset}c, min={min_price}c, threshold={threshold}c, window={boost_start}-{boost_end}")
-        tariff = apply_export_boost(tariff, offset, min_price, boost_start, boost_end, threshold)
-
-    # Apply Chip Mode for Amber users (if enabled) - suppress exports unless above threshold
-    if user.electricity_provider == 'amber' and getattr(user, 'chip_mode_enabled', False):
-        from app.tariff_converter import apply_chip_mode
-        chip_start = getattr(user, 'chip_mode_start', '22:00') or '22:00'
-        chip_end = getattr(user, 'chip_mode_end', '06:00') or '06:00'
-        chip_threshold = getattr(user, 'chip_mode_threshold', 30.0) or 30.0
-        logger.info(f"Preview: Applying Chip Mode: window={chip_start}-{chip_end}, threshold={chip_threshold}c")
-        tariff = apply_chip_mode(tariff, chip_start, chip_end, chip_threshold)
+        return None, None, (jsonify({'error': 'Failed to convert tariff'}), 500)
+
+    # Apply Flow Power PEA / network tariff, Flow Power export rates and export boost
+    tariff = get_tariff_pipeline(user).apply(tariff, forecast_30min)
+    save_tariff_artifact(user, tariff, actual_interval, price_source='aemo' if use_aemo else 'amber', source='on_demand')
+    return tariff, actual_interval, None
+
+
+@bp.route('/api/tou-schedule')
+@compressed_json()
+@api_auth_required
+def tou_schedule(api_user=None, **kwargs):
+    """Get the rolling 24-hour tariff schedule that will be sent to Tesla
+
+    Supports both session login and Bearer token authentication.
+    """
+    user = api_user or current_user
+    # Rebuild instead of serving the stored tariff (used after settings changes)
+    refresh = request.args.get('refresh') == '1'
+
+    from app.tariff_artifacts import load_tariff_artifact
+    from app.tariff_converter import get_chip_mode_pipeline
+
+    # The sync stores every tariff it builds; only build one here when there is none
+    # for the user's current settings (sync not running, or the settings just changed)
+    artifact = None if refresh else load_tariff_artifact(user)
+    if artifact:
+        logger.debug(f"TOU schedule served from {artifact['source']} tariff built at {artifact['built_at']} for user: {user.email}")
+        tariff = artifact['tariff']
+        actual_interval = artifact['actual_interval']
+        built_at = artifact['built_at']
+    else:
+        logger.info(f"TOU tariff schedule requested by user: {user.email} (refresh={refresh})")
+        tariff, actual_interval, error = _build_tou_schedule_tariff(user)
+        if error:
+            return error
+        built_at = datetime.now(timezone.utc)
+
+    # Chip Mode is shown in the schedule, but not part of the tariff the sync pushes
+    tariff = get_chip_mode_pipeline(user).apply(tariff)
 
     # Extract tariff periods for display
     energy_rates = tariff.get('energy_charges', {}).get('Summer', {}).get('rates', {})
     feedin_rates = tariff.get('sell_tariff', {}).get('energy_charges', {}).get('Summer', {}).get('rates', {})
 
     # Get current time in user's timezone to mark current period
-    from datetime import datetime
-    from zoneinfo import ZoneInfo
     user_tz = ZoneInfo(get_powerwall_timezone(user))
     now = datetime.now(user_tz)
     current_hour = now.hour
@@ -3521,18 +3766,13 @@ def tou_schedule(api_user=None, **kwargs):
 
     logger.info(f"Generated tariff schedule with {len(periods)} periods")
 
-    result = jsonify({
+    return jsonify({
         'periods': periods,
         'stats': stats,
-        'tariff_name': tariff.get('name', 'Unknown')
+        'tariff_name': tariff.get('name', 'Unknown'),
+        'built_at': built_at.isoformat()
     })
 
-    # Cache the result for 5 minutes (unless bypassed)
-    cache_key = f'tou_schedule_{user.id}'
-    cache.set(cache_key, result, timeout=300)
-
-    return result
-
 
 @bp.route('/api/sync-tesla-schedule', methods=['POST'])
 @login_required
@@ -3593,7 +3833,9 @@ def sync_tesla_schedule(tesla_client, api_user=None):
             logger.warning("Failed to fetch site_info from Tesla API, will auto-detect timezone from Amber data")
 
         # Convert Amber prices to Tesla tariff format
-        from app.tariff_converter import AmberTariffConverter, apply_flow_power_export, apply_network_tariff, apply_flow_power_pea, get_wholesale_lookup
+        from app.tariff_converter import AmberTariffConverter, get_tariff_pipeline
+        from app.price_intervals import PriceIntervals
+        forecast = PriceIntervals.of(forecast)  # Parsed once for the converter and PEA
         converter = AmberTariffConverter()
         tariff = converter.convert_amber_to_tesla_tariff(
             forecast,
@@ -3605,50 +3847,8 @@ def sync_tesla_schedule(tesla_client, api_user=None):
             logger.error("Failed to convert tariff")
             return jsonify({'error': 'Failed to convert Amber prices to Tesla tariff format'}), 500
 
-        # Apply Flow Power PEA pricing (works with both AEMO and Amber price sources)
-        if current_user.electricity_provider == 'flow_power':
-            # Check if PEA (Price Efficiency Adjustment) is enabled
-            pea_enabled = getattr(current_user, 'pea_enabled', True)  # Default True for Flow Power
-
-            if pea_enabled:
-                # Use Flow Power PEA pricing model: Base Rate + PEA
-                # Works with both AEMO (raw wholesale) and Amber (wholesaleKWHPrice forecast)
-                base_rate = getattr(current_user, 'flow_power_base_rate', 34.0) or 34.0
-                custom_pea = getattr(current_user, 'pea_custom_value', None)
-                wholesale_prices = get_wholesale_lookup(forecast)
-                price_source = current_user.flow_power_price_source or 'amber'
-                logger.info(f"Applying Flow Power PEA ({price_source}): base_rate={base_rate}c, custom_pea={custom_pea}")
-                tariff = apply_flow_power_pea(tariff, wholesale_prices, base_rate, custom_pea)
-            elif use_aemo:
-                # PEA disabled + AEMO: fall back to network tariff calculation
-                # (Amber prices already include network fees, no fallback needed)
-                logger.info("Applying network tariff to AEMO wholesale prices (PEA disabled)")
-                tariff = apply_network_tariff(tariff, current_user)
-
-        # Apply Flow Power export rates if user is on Flow Power
-        if current_user.electricity_provider == 'flow_power' and current_user.flow_power_state:
-            logger.info(f"Applying Flow Power export rates for state: {current_user.flow_power_state}")
-            tariff = apply_flow_power_export(tariff, current_user.flow_power_state)
-
-        # Apply export price boost for Amber users (if enabled)
-        if current_user.electricity_provider == 'amber' and getattr(current_user, 'export_boost_enabled', False):
-            from app.tariff_converter import apply_export_boost
-            offset = getattr(current_user, 'export_price_offset', 0) or 0
-            min_price = getattr(current_user, 'export_min_price', 0) or 0
-            boost_start = getattr(current_user, 'export_boost_start', '17:00') or '17:00'
-            boost_end = getattr(current_user, 'export_boost_end', '21:00') or '21:00'
-            threshold = getattr(current_user, 'export_boost_threshold', 0) or 0
-            logger.info(f"Applying export boost: offset={offset}c, min={min_price}c, threshold={threshold}c, window={boost_start}-{boost_end}")
-            tariff = apply_export_boost(tariff, offset, min_price, boost_start, boost_end, threshold)
-
-        # Apply Chip Mode for Amber users (if enabled) - suppress exports unless above threshold
-        if current_user.electricity_provider == 'amber' and getattr(current_user, 'chip_mode_enabled', False):
-            from app.tariff_converter import apply_chip_mode
-            chip_start = getattr(current_user, 'chip_mode_start', '22:00') or '22:00'
-            chip_end = getattr(current_user, 'chip_mode_end', '06:00') or '06:00'
-            chip_threshold = getattr(current_user, 'chip_mode_threshold', 30.0) or 30.0
-            logger.info(f"Applying Chip Mode: window={chip_start}-{chip_end}, threshold={chip_threshold}c")
-            tariff = apply_chip_mode(tariff, chip_start, chip_end, chip_threshold)
+        # Apply Flow Power PEA / network tariff, Flow Power export rates, export boost and Chip Mode
+        tariff = get_tariff_pipeline(current_user, include_chip_mode=True).apply(tariff, forecast)
 
         num_periods = len(tariff.get('energy_charges', {}).get('Summer', {}).get('rates', {}))
         logger.info(f"Applying POWER SYNC tariff with {num_periods} rate periods")
@@ -4091,70 +4291,58 @@ def get_log_file_path():
 @login_required
 def get_logs():
     """
-    Fetch application logs with optional filtering by log level
+    Fetch application logs with optional filtering by log level, most recent first
     Query params:
         - level: Filter by log level (DEBUG, INFO, WARNING, ERROR) - can specify multiple comma-separated
-        - limit: Maximum number of log lines to return (default: 1000)
+        - limit: Maximum number of log lines to return (default: 1000, max: 5000)
+        - before: The cursor of a previous response, to page to older lines
+        - after: The follow_cursor of a previous response, to fetch only lines logged since
     """
+    from app.log_reader import LEVELS, read_log_tail
+
     try:
         # Get query parameters
         levels_param = request.args.get('level', '')
-        limit = int(request.args.get('limit', 1000))
+        limit = min(max(int(request.args.get('limit', 1000)), 1), 5000)
 
         # Parse levels filter
         if levels_param:
             requested_levels = [level.strip().upper() for level in levels_param.split(',')]
         else:
-            requested_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
-
-        # Read log file from persistent location
-        log_file_path = get_log_file_path()
-
-        if not os.path.exists(log_file_path):
-            return jsonify({
-                'success': False,
-                'error': 'Log file not found'
-            }), 404
-
-        logs = []
-        with open(log_file_path, 'r') as f:
-            # Read all lines (most recent last)
-            all_lines = f.readlines()
-
-            # Process lines in reverse to get most recent first
-            for line in reversed(all_lines):
-                if len(logs) >= limit:
-                    break
-
-                # Parse log line format: "2025-11-12 18:16:31 [INFO] app: Creating Flask application"
-                line = line.strip()
-                if not line:
-                    continue
-
-                # Extract log level from line
-                log_level = None
-                for level in ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']:
-                    if f'[{level}]' in line:
-                        log_level = level
-                        break
-
-                # Filter by level if specified
-                if log_level and log_level in requested_levels:
-                    logs.append({
-                        'line': line,
-                        'level': log_level
-                    })
+            requested_levels = list(LEVELS)
+
+        # Read log file from persistent location, from the end
+        result = read_log_tail(
+            get_log_file_path(),
+            levels=requested_levels,
+            limit=limit,
+            before=request.args.get('before') or None,
+            after=request.args.get('after') or None,
+        )
 
         return jsonify({
             'success': True,
-            'logs': logs,
-            'total': len(logs),
+            'logs': result['logs'],
+            'total': len(result['logs']),
+            'cursor': result['cursor'],
+            'follow_cursor': result['follow_cursor'],
+            'reset': result['reset'],
             'filters': {
                 'levels': requested_levels,
                 'limit': limit
             }
         })
 
+    except FileNotFoundError:
+        return jsonify({
+            'success': False,
+            'error': 'Log file not found'
+        }), 404
+    except ValueError as e:  # Bad limit or cursor (LogCursorError)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Error fetching logs: {e}")
         return jsonify({
@@ -6659,6 +6847,7 @@ def api_battery_health_get(api_user=None, **kwargs):
 
 
 @bp.route('/api/battery-health/history', methods=['GET'])
+@compressed_json()
 @login_required
 def api_battery_health_history():
     """
@@ -1,9 +1,11 @@
 # app/scheduler.py
 """Time-of-Use scheduling based on Amber Electric price forecasts"""
 import logging
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import List, Dict, Tuple, Optional
 
+from app.price_intervals import PriceIntervals
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,7 +31,7 @@ class TOUScheduler:
         Analyze Amber price forecast to determine optimal charge/discharge windows
 
         Args:
-            forecast_data: List of price forecast data points from Amber API
+            forecast_data: Price forecast data points from Amber API (list or PriceIntervals)
 
         Returns:
             Dict containing charge windows, discharge windows, and statistics
@@ -43,24 +45,21 @@ class TOUScheduler:
             }
 
         # Separate general (buy) and feedIn (sell) prices
+        intervals = PriceIntervals.of(forecast_data)
         general_prices = []
         feedin_prices = []
 
-        for point in forecast_data:
-            timestamp = datetime.fromisoformat(point.get('nemTime', '').replace('Z', '+00:00'))
-            channel_type = point.get('channelType', '')
-            per_kwh = point.get('perKwh', 0)
-
+        for i, channel_type in enumerate(intervals.channels):
             if channel_type == 'general':
                 general_prices.append({
-                    'timestamp': timestamp,
-                    'price': per_kwh,
-                    'spike_status': point.get('spikeStatus', 'none')
+                    'timestamp': intervals.end_datetime(i),
+                    'price': intervals.per_kwh[i],
+                    'spike_status': intervals.spike_status[i]
                 })
             elif channel_type == 'feedIn':
                 feedin_prices.append({
-                    'timestamp': timestamp,
-                    'price': per_kwh  # Note: This is typically negative (you get paid)
+                    'timestamp': intervals.end_datetime(i),
+                    'price': intervals.per_kwh[i]  # Note: This is typically negative (you get paid)
                 })
 
         logger.info(f"Analyzed {len(general_prices)} general and {len(feedin_prices)} feed-in price points")
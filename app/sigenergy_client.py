@@ -16,6 +16,8 @@ from typing import Optional
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives import padding
 
+from app.price_intervals import PriceIntervals
+
 logger = logging.getLogger(__name__)
 
 # Sigenergy password encryption constants
@@ -387,7 +389,7 @@ class SigenergyClient:
 
 
 def convert_amber_prices_to_sigenergy(
-    amber_prices: list[dict],
+    amber_prices,
     price_type: str = "buy",
     forecast_type: str = "predicted",
     current_actual_interval: Optional[dict] = None,
@@ -399,7 +401,8 @@ def convert_amber_prices_to_sigenergy(
     Optionally injects live 5-min ActualInterval price for current period to catch spikes.
 
     Args:
-        amber_prices: List of Amber price intervals with nemTime/startTime/endTime and perKwh
+        amber_prices: Amber price intervals (list of points with nemTime/startTime and perKwh, or
+                      PriceIntervals)
         price_type: 'buy' for import prices, 'sell' for export prices
         forecast_type: Amber forecast type to use ('predicted', 'low', 'high')
         current_actual_interval: Dict with 'general' and 'feedIn' ActualInterval data (optional)
@@ -460,66 +463,19 @@ def convert_amber_prices_to_sigenergy(
     current_slot_key = f"{now.hour:02d}:{current_slot_minute:02d}"
     logger.debug(f"Current 30-min period: {current_slot_key} ({detected_tz})")
 
-    # Group prices by 30-minute slots
-    slots = {}
+    # Group prices by 30-minute slots (local slot of day of the interval START time -
+    # Amber's nemTime is the END of the interval, same bucketing as the Tesla converter)
+    intervals = PriceIntervals.of(amber_prices)
+    slots_of_day = intervals.slots_of_day(detected_tz)
 
-    for price in amber_prices:
-        # Get the timestamp - Amber's nemTime is the END of the interval
-        nem_time = price.get("nemTime") or price.get("startTime")
-        if not nem_time:
-            continue
-
-        # Parse the timestamp
-        if isinstance(nem_time, str):
-            try:
-                timestamp = datetime.fromisoformat(nem_time.replace("Z", "+00:00"))
-            except ValueError:
-                continue
-        else:
-            timestamp = nem_time
-
-        # Get interval duration (Amber provides 5 or 30 minute intervals)
-        duration = price.get("duration", 30)
-
-        # CRITICAL: Use interval START time for bucketing (same as Tesla converter)
-        # Amber's nemTime is the END of the interval, not the start
-        # Example: nemTime=18:00, duration=30 → startTime=17:30 → slot "17:30"
-        interval_start = timestamp - timedelta(minutes=duration)
-
-        # Convert to local timezone to handle DST correctly
-        interval_start_local = interval_start.astimezone(detected_tz)
-
-        # Round down to 30-minute slot
-        slot_minute = 0 if interval_start_local.minute < 30 else 30
-        slot_key = f"{interval_start_local.hour:02d}:{slot_minute:02d}"
-
-        # Price extraction - matches Tesla tariff converter logic
-        # - ActualInterval (past): Use perKwh (actual settled price)
-        # - CurrentInterval (now): Use perKwh or advancedPrice
-        # - ForecastInterval (future): Use advancedPrice (with forecast type selection)
-        interval_type = price.get("type", "unknown")
-        advanced_price = price.get("advancedPrice")
-
-        if interval_type == "ForecastInterval" and advanced_price:
-            # ForecastInterval: Prefer advancedPrice with forecast type selection
-            if isinstance(advanced_price, dict):
-                # Dict format: {predicted, low, high}
-                per_kwh_cents = advanced_price.get(forecast_type, advanced_price.get("predicted", 0))
-            elif isinstance(advanced_price, (int, float)):
-                # Numeric format (legacy)
-                per_kwh_cents = advanced_price
-            else:
-                per_kwh_cents = price.get("perKwh", 0)
-        elif interval_type == "CurrentInterval" and advanced_price:
-            # CurrentInterval with advancedPrice available
-            if isinstance(advanced_price, dict):
-                per_kwh_cents = advanced_price.get(forecast_type, advanced_price.get("predicted", 0))
-            else:
-                per_kwh_cents = advanced_price if isinstance(advanced_price, (int, float)) else price.get("perKwh", 0)
-        else:
-            # ActualInterval or fallback: Use perKwh (actual retail price)
-            per_kwh_cents = price.get("perKwh", 0)
+    # Price extraction - matches Tesla tariff converter logic
+    # - ActualInterval (past): Use perKwh (actual settled price)
+    # - CurrentInterval (now): Use perKwh or advancedPrice
+    # - ForecastInterval (future): Use advancedPrice (with forecast type selection)
+    cents = intervals.price_cents(forecast_type)
 
+    slots = {}
+    for i, per_kwh_cents in enumerate(cents):
         # For sell prices (feedIn channel), Amber uses negative values (you receive money)
         # We negate to convert to Sigenergy's convention (positive = you receive)
         # Note: Unlike Tesla, Sigenergy can handle negative prices - no clamping to zero
@@ -528,6 +484,8 @@ def convert_amber_prices_to_sigenergy(
             per_kwh_cents = -per_kwh_cents
 
         # Store the price (average overlapping 5-min intervals)
+        slot_of_day = slots_of_day[i]
+        slot_key = f"{slot_of_day // 2:02d}:{(slot_of_day % 2) * 30:02d}"
         if slot_key not in slots:
             slots[slot_key] = []
         slots[slot_key].append(per_kwh_cents)
@@ -616,8 +574,9 @@ def convert_amber_prices_to_sigenergy(
 
         # Log full pricing schedule for debugging/app display
         # Format: "00:00=15.2, 00:30=14.8, 01:00=13.5, ..."
-        slot_str = ", ".join([f"{p['timeRange'].split('-')[0]}={p['price']:.1f}" for p in result])
-        logger.debug(f"Sigenergy {price_type} schedule: {slot_str}")
+        if logger.isEnabledFor(logging.DEBUG):
+            slot_str = ", ".join([f"{p['timeRange'].split('-')[0]}={p['price']:.1f}" for p in result])
+            logger.debug("Sigenergy %s schedule: %s", price_type, slot_str)
 
     return result
 
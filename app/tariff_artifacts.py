@@ -0,0 +1,109 @@
+# app/tariff_artifacts.py
+"""The last tariff built for each user, stored for /api/tou-schedule to serve"""
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.db_writer import submit_write
+from app.models import TariffArtifact
+from app.tariff_converter import tariff_settings_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Artifacts older than this are treated as missing. The sync rebuilds every 5 minutes,
+# so this allows for one missed sync before the endpoint builds a tariff itself.
+MAX_AGE = timedelta(seconds=int(os.environ.get('TARIFF_ARTIFACT_MAX_AGE_SECONDS', 600)))
+
+_DIALECT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def settings_fingerprint(user) -> str:
+    """Stable digest of tariff_settings_fingerprint(user), comparable across processes."""
+    return hashlib.sha1(repr(tariff_settings_fingerprint(user)).encode('utf-8')).hexdigest()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def write_tariff_artifact(values: Dict):
+    """Insert or replace a user's artifact (database-writer job; the caller commits)."""
+    dialect_insert = _DIALECT_INSERTS.get(db.session.get_bind().dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(TariffArtifact).values(values)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={column: statement.excluded[column] for column in values if column != 'user_id'},
+        ))
+        return
+
+    updated = db.session.execute(
+        update(TariffArtifact).where(TariffArtifact.user_id == values['user_id']).values(values)
+    ).rowcount
+    if not updated:
+        db.session.add(TariffArtifact(**values))
+
+
+def save_tariff_artifact(user, tariff: Dict, actual_interval: Optional[Dict] = None,
+                         price_source: str = 'amber', source: str = 'sync') -> Optional[Future]:
+    """
+    Store the tariff just built for a user (without Chip Mode) in the background.
+
+    The tariff is serialized here, so the caller may go on modifying it.
+
+    Returns:
+        The write's Future, or None if it couldn't be queued
+    """
+    try:
+        values = {
+            'user_id': user.id,
+            'fingerprint': settings_fingerprint(user),
+            'built_at': _utcnow(),
+            'source': source,
+            'price_source': price_source,
+            'tariff_json': json.dumps(tariff),
+            'actual_interval_json': json.dumps(actual_interval, default=str) if actual_interval else None,
+        }
+        return submit_write(write_tariff_artifact, values)
+    except Exception as e:
+        logger.error(f"Failed to store tariff artifact for user {user.id}: {e}")
+        return None
+
+
+def load_tariff_artifact(user) -> Optional[Dict]:
+    """
+    The user's stored tariff, if it was built under their current settings within MAX_AGE.
+
+    Returns:
+        {'tariff', 'actual_interval', 'built_at', 'source', 'price_source'}, or None
+    """
+    artifact = db.session.execute(
+        select(TariffArtifact).where(TariffArtifact.user_id == user.id)
+    ).scalar_one_or_none()
+    if artifact is None:
+        return None
+    if artifact.fingerprint != settings_fingerprint(user) or _utcnow() - artifact.built_at > MAX_AGE:
+        return None
+
+    try:
+        return {
+            'tariff': json.loads(artifact.tariff_json),
+            'actual_interval': json.loads(artifact.actual_interval_json) if artifact.actual_interval_json else None,
+            'built_at': artifact.built_at.replace(tzinfo=timezone.utc),
+            'source': artifact.source,
+            'price_source': artifact.price_source,
+        }
+    except ValueError as e:
+        logger.error(f"Discarding unreadable tariff artifact for user {user.id}: {e}")
+        return None
@@ -1,8 +1,10 @@
 # app/tariff_converter.py
 """Convert Amber Electric pricing to Tesla tariff format"""
 import logging
+import threading
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional
+from zoneinfo import ZoneInfo
 
 # Import aemo_to_tariff library for automatic network tariff calculation
 try:
@@ -11,8 +13,161 @@ try:
 except ImportError:
     AEMO_TARIFF_AVAILABLE = False
 
+# NumPy is optional - used for bulk slot bucketing when installed
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from app.price_intervals import PriceIntervals, SLOT_SECONDS, SLOTS_PER_DAY
+
 logger = logging.getLogger(__name__)
 
+# Half-hour slot grid used by the converter
+# Slot index = hour * 2 + (1 if minute >= 30 else 0); the grid holds today then tomorrow
+GRID_SLOTS = 2 * SLOTS_PER_DAY
+PERIOD_KEYS = [f"PERIOD_{hour:02d}_{minute:02d}" for hour in range(24) for minute in (0, 30)]
+
+
+# User settings that change the tariff built for a user (converter overrides and post-processing)
+TARIFF_SETTINGS_FIELDS = (
+    'amber_forecast_type', 'electricity_provider', 'flow_power_state', 'flow_power_price_source',
+    'flow_power_base_rate', 'pea_enabled', 'pea_custom_value',
+    'network_distributor', 'network_tariff_code', 'network_use_manual_rates', 'network_tariff_type',
+    'network_flat_rate', 'network_peak_rate', 'network_shoulder_rate', 'network_offpeak_rate',
+    'network_peak_start', 'network_peak_end', 'network_offpeak_start', 'network_offpeak_end',
+    'network_other_fees', 'network_include_gst',
+    'export_boost_enabled', 'export_price_offset', 'export_min_price', 'export_boost_start',
+    'export_boost_end', 'export_boost_threshold',
+    'chip_mode_enabled', 'chip_mode_start', 'chip_mode_end', 'chip_mode_threshold',
+    'spike_protection_enabled', 'demand_artificial_price_enabled', 'enable_demand_charges',
+    'demand_charge_apply_to', 'peak_days', 'peak_demand_rate', 'peak_start_hour', 'peak_start_minute',
+    'peak_end_hour', 'peak_end_minute', 'shoulder_demand_rate', 'shoulder_start_hour',
+    'shoulder_start_minute', 'shoulder_end_hour', 'shoulder_end_minute', 'offpeak_demand_rate',
+    'daily_supply_charge',
+)
+
+
+def tariff_settings_fingerprint(user) -> tuple:
+    """
+    Snapshot of the user settings that affect the tariff built for them.
+
+    Two fingerprints compare equal while none of TARIFF_SETTINGS_FIELDS have changed,
+    so anything derived from a user's settings can be cached against it.
+    """
+    return tuple(getattr(user, field, None) for field in TARIFF_SETTINGS_FIELDS)
+
+
+def _average_slots(slots: List[int], prices: List[float]) -> List[Optional[float]]:
+    """
+    Average prices per grid slot.
+
+    Args:
+        slots: Grid slot index for each price (values outside the grid are ignored)
+        prices: Price for each slot index
+
+    Returns:
+        GRID_SLOTS-element list of the mean price per slot (None where a slot has no prices)
+    """
+    if NUMPY_AVAILABLE and slots:
+        slot_array = np.asarray(slots, dtype=np.int64)
+        price_array = np.asarray(prices, dtype=np.float64)
+        in_grid = (slot_array >= 0) & (slot_array < GRID_SLOTS)
+        sums = np.bincount(slot_array[in_grid], weights=price_array[in_grid], minlength=GRID_SLOTS)
+        counts = np.bincount(slot_array[in_grid], minlength=GRID_SLOTS)
+        return [
+            total / count if count else None
+            for total, count in zip(sums.tolist(), counts.tolist())
+        ]
+
+    sums = [0.0] * GRID_SLOTS
+    counts = [0] * GRID_SLOTS
+    for slot, price in zip(slots, prices):
+        if 0 <= slot < GRID_SLOTS:
+            sums[slot] += price
+            counts[slot] += 1
+    return [total / count if count else None for total, count in zip(sums, counts)]
+
+
+def _roll_slots(grid: List, start_slot: int) -> List:
+    """
+    Take the 48 grid slots beginning at ``start_slot`` (wrapping around the grid)
+    and rotate them so that index == slot of day.
+
+    With start_slot = current slot this yields tomorrow's value for slots that have
+    already passed today and today's value for the rest of the day.
+    """
+    start_slot %= GRID_SLOTS
+    window = (grid + grid)[start_slot:start_slot + SLOTS_PER_DAY]
+    shift = start_slot % SLOTS_PER_DAY
+    return window[SLOTS_PER_DAY - shift:] + window[:SLOTS_PER_DAY - shift]
+
+
+def build_tou_periods(period_keys) -> Dict:
+    """
+    Build TOU period definitions for all time slots
+    Omits fields when they're 0 for cleaner output
+
+    build_tou_periods(PERIOD_KEYS) is the tou_periods block every converted
+    tariff carries.
+
+    Args:
+        period_keys: Set of period keys like "PERIOD_14_30"
+
+    Returns:
+        Dictionary mapping period keys to time slot definitions
+    """
+    tou_periods = {}
+
+    for period_key in period_keys:
+        # Extract hour and minute from period key
+        # PERIOD_14_30 -> hour=14, minute=30
+        try:
+            parts = period_key.split('_')
+            from_hour = int(parts[1])
+            from_minute = int(parts[2])
+
+            # Calculate end time (30 minutes later)
+            to_hour = from_hour
+            to_minute = from_minute + 30
+
+            if to_minute >= 60:
+                to_minute = 0
+                to_hour += 1
+
+            # Build period definition, omitting fields when they're 0
+            period_def = {
+                "toDayOfWeek": 6  # Saturday (covers all days with implicit fromDayOfWeek=0)
+            }
+
+            # Only include fromHour if non-zero
+            if from_hour > 0:
+                period_def["fromHour"] = from_hour
+
+            # Only include fromMinute if non-zero
+            if from_minute > 0:
+                period_def["fromMinute"] = from_minute
+
+            # Only include toHour if it's not same as fromHour or if it's non-zero
+            if to_hour != from_hour or to_hour > 0:
+                period_def["toHour"] = to_hour
+
+            # Only include toMinute if non-zero
+            if to_minute > 0:
+                period_def["toMinute"] = to_minute
+
+            tou_periods[period_key] = {
+                "periods": [period_def]
+            }
+
+        except (IndexError, ValueError) as e:
+            logger.error(f"Error parsing period key {period_key}: {e}")
+            continue
+
+    logger.debug(f"Built {len(tou_periods)} TOU period definitions")
+    return tou_periods
+
 
 class AmberTariffConverter:
     """Converts Amber Electric price forecasts to Tesla-compatible tariff structure"""
@@ -48,11 +203,16 @@ class AmberTariffConverter:
         Implements rolling 24-hour window: periods that have passed today get tomorrow's prices,
         future periods get today's prices. This gives Tesla a full 24-hour lookahead.
 
+        Forecast points are bucketed once into a fixed 96-slot grid (today + tomorrow,
+        48 half-hour slots each) keyed by integer slot index, averaged in bulk, and the
+        rolling window is taken from the grid with an index shift.
+
         NEW: Optionally uses ActualInterval (5-min actual price) for the current 30-min period
         to capture short-term price spikes that would otherwise be averaged out.
 
         Args:
-            forecast_data: List of price forecast points from Amber API (5-min or 30-min resolution)
+            forecast_data: Price forecast points from Amber API (5-min or 30-min resolution),
+                           as a list or PriceIntervals
             user: User object for demand charge settings (optional)
             powerwall_timezone: Powerwall timezone from site_info (optional)
                                If provided, uses this instead of auto-detecting from Amber data
@@ -62,197 +222,75 @@ class AmberTariffConverter:
         Returns:
             Tesla-compatible tariff structure
         """
+        rolling = self.build_rolling_prices(forecast_data, user, powerwall_timezone, current_actual_interval)
+        if rolling is None:
+            return None
+
+        return self.tariff_from_rolling_prices(rolling, user)
+
+    def build_rolling_prices(self, forecast_data: List[Dict], user=None, powerwall_timezone=None, current_actual_interval: Dict = None) -> Optional[Dict]:
+        """
+        Build the rolling 24h buy/sell prices that convert_amber_to_tesla_tariff() turns into a tariff.
+
+        The result is kept by the sync job so that a later WebSocket price update can patch
+        just the current period (see patch_current_period()) instead of re-fetching and
+        re-converting the forecast.
+
+        Args:
+            Same as convert_amber_to_tesla_tariff()
+
+        Returns:
+            Dict with:
+            - 'general', 'feedin': PERIOD_XX_XX -> $/kWh before spike/demand overrides
+            - 'spike_slots': slot of day -> Amber spikeStatus
+            - 'timezone': Timezone the rolling window is anchored to
+            - 'now': Time the window was built (in that timezone)
+            or None if there is no data or too many periods are missing
+        """
         if not forecast_data:
             logger.warning("No forecast data provided")
             return None
 
-        logger.info(f"Converting {len(forecast_data)} Amber forecast points to Tesla tariff")
+        intervals = PriceIntervals.of(forecast_data)
+        logger.info(f"Converting {len(intervals.points)} Amber forecast points to Tesla tariff")
 
         # Timezone handling:
         # 1. Prefer Powerwall timezone from site_info (most accurate)
         # 2. Fall back to auto-detection from Amber data
         detected_tz = None
         if powerwall_timezone:
-            from zoneinfo import ZoneInfo
             try:
                 detected_tz = ZoneInfo(powerwall_timezone)
                 logger.info(f"Using Powerwall timezone from site_info: {powerwall_timezone}")
             except Exception as e:
                 logger.warning(f"Invalid Powerwall timezone '{powerwall_timezone}': {e}, falling back to auto-detection")
 
-        if not detected_tz:
+        if not detected_tz and intervals.tzinfo:
             # Auto-detect timezone from first Amber timestamp
             # Amber timestamps include timezone info: "2025-11-11T16:05:00+10:00"
-            for point in forecast_data:
-                nem_time = point.get('nemTime', '')
-                if nem_time:
-                    try:
-                        timestamp = datetime.fromisoformat(nem_time.replace('Z', '+00:00'))
-                        detected_tz = timestamp.tzinfo
-                        logger.info(f"Auto-detected timezone from Amber data: {detected_tz}")
-                        break
-                    except Exception:
-                        continue
-
-        # Build timestamp-indexed price lookup: (date, hour, minute) -> price
-        general_lookup = {}  # (date_str, hour, minute) -> [prices]
-        feedin_lookup = {}
-        spike_lookup = {}  # (date_str, hour, minute) -> spikeStatus ('potential' or 'spike')
-
-        # Count interval types for logging
-        interval_types = {}
-        for point in forecast_data:
-            interval_type = point.get('type', 'unknown')
-            interval_types[interval_type] = interval_types.get(interval_type, 0) + 1
-        logger.info(f"Forecast data contains: {interval_types}")
+            detected_tz = intervals.tzinfo
+            logger.info(f"Auto-detected timezone from Amber data: {detected_tz}")
 
-        # Debug: Log sample of forecast data to understand date keys
-        if forecast_data:
-            sample = forecast_data[:4] if len(forecast_data) >= 4 else forecast_data
-            logger.debug(f"AEMO/Amber forecast sample: {[p.get('nemTime') for p in sample]}")
-
-        for point in forecast_data:
-            try:
-                nem_time = point.get('nemTime', '')
-                timestamp = datetime.fromisoformat(nem_time.replace('Z', '+00:00'))
-                channel_type = point.get('channelType', '')
-                interval_type = point.get('type', 'unknown')
-                duration = point.get('duration', 30)  # Get actual interval duration (usually 5 or 30 minutes)
-
-                # Price extraction logic:
-                # - ActualInterval (past): Use perKwh (actual settled price)
-                # - CurrentInterval (now): Use perKwh (current actual price)
-                # - ForecastInterval (future): Use advancedPrice (forecast with user-selected type)
-                #
-                # advancedPrice includes complete forecast:
-                # - Wholesale price forecast
-                # - Network fees
-                # - Market fees
-                # - Renewable energy certificates
-                #
-                # User can select: 'predicted' (default), 'low' (conservative), 'high' (optimistic)
-                forecast_type = 'predicted'
-                if user and hasattr(user, 'amber_forecast_type') and user.amber_forecast_type:
-                    forecast_type = user.amber_forecast_type
-
-                advanced_price = point.get('advancedPrice')
-
-                # For ForecastInterval: Prefer advancedPrice, fall back to perKwh (for AEMO data)
-                if interval_type == 'ForecastInterval':
-                    if advanced_price:
-                        # Handle dict format (standard: {predicted, low, high})
-                        if isinstance(advanced_price, dict):
-                            if forecast_type not in advanced_price:
-                                available = list(advanced_price.keys())
-                                error_msg = f"Forecast type '{forecast_type}' not found in advancedPrice. Available: {available}"
-                                logger.error(f"{nem_time}: {error_msg}")
-                                raise ValueError(error_msg)
-
-                            per_kwh_cents = advanced_price[forecast_type]
-                            logger.debug(f"{nem_time} [ForecastInterval]: advancedPrice.{forecast_type}={per_kwh_cents:.2f}c/kWh")
-
-                        # Handle simple number format (legacy)
-                        elif isinstance(advanced_price, (int, float)):
-                            per_kwh_cents = advanced_price
-                            logger.debug(f"{nem_time} [ForecastInterval]: advancedPrice={per_kwh_cents:.2f}c/kWh (numeric)")
-
-                        else:
-                            error_msg = f"Invalid advancedPrice format at {nem_time}: {type(advanced_price).__name__}"
-                            logger.error(error_msg)
-                            raise ValueError(error_msg)
-                    else:
-                        # No advancedPrice - use perKwh directly (AEMO data or far-future Amber forecasts)
-                        per_kwh_cents = point.get('perKwh', 0)
-                        logger.debug(f"{nem_time} [ForecastInterval]: perKwh={per_kwh_cents:.2f}c/kWh (AEMO/wholesale)")
-
-                # For CurrentInterval: Prefer advancedPrice (Amber retail forecast) over perKwh (AEMO wholesale)
-                # For ActualInterval: Use perKwh (actual settled retail price)
-                else:
-                    if interval_type == 'CurrentInterval' and advanced_price:
-                        # CurrentInterval has advancedPrice during first 25 mins - use it for Amber retail forecast
-                        if isinstance(advanced_price, dict):
-                            per_kwh_cents = advanced_price.get(forecast_type, advanced_price.get('predicted', 0))
-                            logger.debug(f"{nem_time} [CurrentInterval]: advancedPrice.{forecast_type}={per_kwh_cents:.2f}c/kWh (Amber retail forecast)")
-                        else:
-                            per_kwh_cents = advanced_price
-                            logger.debug(f"{nem_time} [CurrentInterval]: advancedPrice={per_kwh_cents:.2f}c/kWh (Amber retail forecast)")
-                    else:
-                        # ActualInterval or CurrentInterval without advancedPrice (last 5 mins of 30-min period)
-                        per_kwh_cents = point.get('perKwh', 0)
-                        if interval_type == 'ActualInterval':
-                            logger.debug(f"{nem_time} [ActualInterval]: perKwh={per_kwh_cents:.2f}c/kWh (actual settled retail)")
-                        else:
-                            logger.debug(f"{nem_time} [CurrentInterval]: perKwh={per_kwh_cents:.2f}c/kWh (fallback - AEMO wholesale)")
-
-                # Amber API convention: feedIn (sell) prices are negative when you get paid
-                # Tesla convention: sell prices are positive when you get paid
-                # So we need to NEGATE feedIn prices to convert to Tesla's convention
-                if channel_type == 'feedIn':
-                    per_kwh_cents = -per_kwh_cents
-
-                per_kwh_dollars = self._round_price(per_kwh_cents / 100)
-
-                # Use interval START time for bucketing
-                # Amber's nemTime is the END of the interval, duration tells us the length
-                # Calculate startTime = nemTime - duration
-                # This gives us direct alignment with Tesla's PERIOD_XX_XX naming
-                #
-                # Example:
-                #   nemTime=18:00, duration=30
-                #   startTime=17:30
-                #   Tesla PERIOD_17_30 (17:30-18:00) → looks up key (17, 30)
-                #   Result: Direct match, no shifting needed!
-                interval_start = timestamp - timedelta(minutes=duration)
-
-                # CRITICAL: Convert to local Powerwall timezone to handle DST correctly
-                # Amber may provide timestamps with fixed offsets (e.g., +10:00 during AEDT when it should be +11:00)
-                # Converting to the Powerwall's timezone ensures we get the correct local time
-                if detected_tz:
-                    interval_start_local = interval_start.astimezone(detected_tz)
-                else:
-                    interval_start_local = interval_start
-
-                # Round to nearest 30-minute interval using START time
-                start_minute_bucket = 0 if interval_start_local.minute < 30 else 30
-
-                # Key by date, hour, minute for lookup (using START time)
-                date_str = interval_start_local.date().isoformat()
-                lookup_key = (date_str, interval_start_local.hour, start_minute_bucket)
-
-                if channel_type == 'general':
-                    if lookup_key not in general_lookup:
-                        general_lookup[lookup_key] = []
-                    general_lookup[lookup_key].append(per_kwh_dollars)
-
-                    # Track spike status for this period (from general channel)
-                    spike_status = point.get('spikeStatus', 'none')
-                    if spike_status in ['potential', 'spike']:
-                        spike_lookup[lookup_key] = spike_status
-
-                elif channel_type == 'feedIn':
-                    if lookup_key not in feedin_lookup:
-                        feedin_lookup[lookup_key] = []
-                    # Keep the actual value - will handle Tesla restrictions in _build_rolling_24h_tariff
-                    feedin_lookup[lookup_key].append(per_kwh_dollars)
-
-            except Exception as e:
-                logger.error(f"Error processing price point: {e}")
-                continue
+        # Use Powerwall timezone from site_info (if provided)
+        # Otherwise fall back to auto-detection from Amber data
+        # This ensures correct "past vs future" period detection aligned with Powerwall's location
+        if detected_tz:
+            tariff_tz = detected_tz
+            logger.info(f"Using timezone: {tariff_tz}")
+        else:
+            tariff_tz = ZoneInfo('Australia/Sydney')
+            logger.warning("Timezone detection failed, falling back to Australia/Sydney")
+        now = datetime.now(tariff_tz)
 
-        # Debug: Log what dates are in the lookup tables
-        if general_lookup:
-            dates_in_lookup = sorted(set(k[0] for k in general_lookup.keys()))
-            times_sample = sorted(list(general_lookup.keys())[:5])
-            logger.debug(f"Lookup dates available: {dates_in_lookup}")
-            logger.debug(f"Lookup keys sample: {times_sample}")
+        # Debug: Log sample of forecast data to understand date keys
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("AEMO/Amber forecast sample: %s", [p.get('nemTime') for p in intervals.points[:4]])
 
-        # Log any spike periods detected
-        if spike_lookup:
-            logger.info(f"⚡ Amber spike status detected for {len(spike_lookup)} periods: {spike_lookup}")
+        general_avg, feedin_avg, spike_slots = self._bucket_forecast(intervals, user, detected_tz, now.date())
 
         # Now build the rolling 24-hour tariff
         general_prices, feedin_prices = self._build_rolling_24h_tariff(
-            general_lookup, feedin_lookup, user, detected_tz, current_actual_interval, spike_lookup
+            general_avg, feedin_avg, now, current_actual_interval
         )
 
         # If too many periods are missing, abort sync to preserve last good tariff
@@ -260,17 +298,220 @@ class AmberTariffConverter:
             logger.error("Aborting tariff conversion - too many missing price periods")
             return None
 
+        return {
+            'general': general_prices,
+            'feedin': feedin_prices,
+            'spike_slots': spike_slots,
+            'timezone': tariff_tz,
+            'now': now,
+        }
+
+    def tariff_from_rolling_prices(self, rolling: Dict, user=None) -> Dict:
+        """
+        Build the Tesla tariff structure from build_rolling_prices() output.
+
+        Spike protection and demand-period price overrides are applied to copies of the
+        rolling prices, so the same rolling prices can be patched and rebuilt later.
+
+        Args:
+            rolling: Output of build_rolling_prices() or patch_current_period()
+            user: User object for demand charge and spike protection settings (optional)
+
+        Returns:
+            Tesla-compatible tariff structure
+        """
+        general_prices = dict(rolling['general'])
+        feedin_prices = dict(rolling['feedin'])
+
+        self._apply_price_overrides(general_prices, feedin_prices, user, rolling['now'], rolling['spike_slots'])
+
         logger.info(f"Built rolling 24h tariff with {len(general_prices)} general and {len(feedin_prices)} feed-in periods")
 
         # Create the Tesla tariff structure
-        tariff = self._build_tariff_structure(general_prices, feedin_prices, user)
+        return self._build_tariff_structure(general_prices, feedin_prices, user)
 
-        return tariff
+    def patch_current_period(self, rolling: Dict, current_actual_interval: Dict) -> Optional[Dict]:
+        """
+        Patch the current 30-min period of previously built rolling prices with a live price.
+
+        Used for WebSocket re-syncs, where only the current period's price changes. Every
+        other period keeps the price from the last full conversion. The current period is
+        injected exactly as a full build would (_inject_current_period); spike overrides for
+        all periods are recomputed by tariff_from_rolling_prices().
+
+        Args:
+            rolling: Output of build_rolling_prices()
+            current_actual_interval: Dict with 'general' and 'feedIn' live interval data
+
+        Returns:
+            New rolling prices dict, or None if the rolling prices were built for a different
+            30-min period or the live data is missing a channel (caller should do a full sync)
+        """
+        if not current_actual_interval:
+            return None
+
+        now = datetime.now(rolling['timezone'])
+        built = rolling['now']
+        current_slot = now.hour * 2 + (1 if now.minute >= 30 else 0)
+        built_slot = built.hour * 2 + (1 if built.minute >= 30 else 0)
+        if now.date() != built.date() or current_slot != built_slot:
+            logger.debug("Rolling prices built for %s, now %s - cannot patch", PERIOD_KEYS[built_slot], PERIOD_KEYS[current_slot])
+            return None
+
+        general_prices = dict(rolling['general'])
+        feedin_prices = dict(rolling['feedin'])
+
+        if not self._inject_current_period(general_prices, feedin_prices, current_slot, current_actual_interval):
+            return None
+
+        return {
+            'general': general_prices,
+            'feedin': feedin_prices,
+            'spike_slots': rolling['spike_slots'],
+            'timezone': rolling['timezone'],
+            'now': now,
+        }
+
+    def _inject_current_period(self, general_prices: Dict[str, float], feedin_prices: Dict[str, float],
+                               current_slot: int, current_actual_interval: Dict) -> bool:
+        """
+        Put the live (ActualInterval) price into the current 30-min period, in place.
 
-    def _build_rolling_24h_tariff(self, general_lookup: Dict, feedin_lookup: Dict, user=None, detected_tz=None, current_actual_interval: Dict = None, spike_lookup: Dict = None) -> tuple:
+        Shared by the full build and the incremental patch so both give the same tariff for
+        the same live data: buy and sell from perKwh (clamped to 0). Spike status stays the
+        forecast's in both.
+
+        Args:
+            general_prices: PERIOD_XX_XX -> buy price (modified in place)
+            feedin_prices: PERIOD_XX_XX -> sell price (modified in place)
+            current_slot: Slot of day of the current period
+            current_actual_interval: Dict with 'general' and 'feedIn' live interval data
+
+        Returns:
+            False (nothing changed) if the live data is missing a channel
+        """
+        period_key = PERIOD_KEYS[current_slot]
+        general = current_actual_interval.get('general')
+        feedin = current_actual_interval.get('feedIn')
+        if not general:
+            logger.warning(f"{period_key}: No general ActualInterval, falling back to forecast")
+            return False
+        if not feedin:
+            logger.warning(f"{period_key}: No feedIn ActualInterval, falling back to forecast")
+            return False
+
+        # Tesla restriction: no negatives. Amber convention: feedIn is negative, Tesla convention: positive
+        general_prices[period_key] = max(0, self._round_price(general.get('perKwh', 0) / 100))
+        feedin_prices[period_key] = max(0, self._round_price(-feedin.get('perKwh', 0) / 100))
+        logger.info(
+            f"{period_key} (CURRENT): Using ActualInterval buy=${general_prices[period_key]:.4f}/kWh, "
+            f"sell=${feedin_prices[period_key]:.4f}/kWh"
+        )
+        return True
+
+    def _bucket_forecast(self, intervals: PriceIntervals, user=None, detected_tz=None, today=None) -> tuple:
+        """
+        Bucket forecast points into the today + tomorrow slot grid and average each slot.
+
+        Each point's interval START time (nemTime - duration) is converted to local
+        wall-clock time and bucketed by integer slot index:
+            slot = day_offset * 48 + hour * 2 + (1 if minute >= 30 else 0)
+        where day_offset is 0 for today and 1 for tomorrow. Points outside the grid are
+        ignored (they were never used for the rolling window).
+
+        Args:
+            intervals: Parsed price forecast (5-min or 30-min resolution)
+            user: User object for forecast type selection (optional)
+            detected_tz: Timezone to bucket in (Powerwall or auto-detected Amber timezone)
+            today: Local date of grid day 0
+
+        Returns:
+            (general_avg, feedin_avg, spike_slots) where the averages are 96-element lists of
+            $/kWh (None for empty slots) and spike_slots maps slot-of-day -> spikeStatus
+        """
+        # Price extraction logic (PriceIntervals.price_cents):
+        # - ActualInterval (past): Use perKwh (actual settled price)
+        # - CurrentInterval (now): Use advancedPrice when present, else perKwh
+        # - ForecastInterval (future): Use advancedPrice (forecast with user-selected type),
+        #   falling back to perKwh for AEMO data
+        #
+        # advancedPrice includes complete forecast:
+        # - Wholesale price forecast
+        # - Network fees
+        # - Market fees
+        # - Renewable energy certificates
+        #
+        # User can select: 'predicted' (default), 'low' (conservative), 'high' (optimistic)
+        forecast_type = 'predicted'
+        if user and hasattr(user, 'amber_forecast_type') and user.amber_forecast_type:
+            forecast_type = user.amber_forecast_type
+
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        cents = intervals.price_cents(forecast_type, strict=True)
+
+        logger.info(f"Forecast data contains: {intervals.type_counts}")
+
+        # CRITICAL: Bucket in local Powerwall time to handle DST correctly
+        # Amber may provide timestamps with fixed offsets (e.g., +10:00 during AEDT when it should be +11:00)
+        slots = intervals.local_slots(detected_tz, today)
+
+        general_slots, general_prices = [], []
+        feedin_slots, feedin_prices = [], []
+        spike_slots = {}
+        spike_periods = set()
+
+        for i, channel_type in enumerate(intervals.channels):
+            per_kwh_cents = cents[i]
+            if per_kwh_cents is None or channel_type not in ('general', 'feedIn'):
+                continue
+
+            # Amber API convention: feedIn (sell) prices are negative when you get paid
+            # Tesla convention: sell prices are positive when you get paid
+            # So we need to NEGATE feedIn prices to convert to Tesla's convention
+            try:
+                if channel_type == 'feedIn':
+                    feedin_prices.append(self._round_price(-per_kwh_cents / 100))
+                    feedin_slots.append(slots[i])
+                    continue
+                general_prices.append(self._round_price(per_kwh_cents / 100))
+                general_slots.append(slots[i])
+            except TypeError as e:
+                logger.error(f"Error processing price point: {e}")
+                continue
+
+            # Track spike status for this period (from general channel)
+            # Spike status applies to the time of day regardless of which date reported it
+            status = intervals.spike_status[i]
+            if status in ('potential', 'spike'):
+                spike_slots[slots[i] % SLOTS_PER_DAY] = status
+                spike_periods.add(slots[i])
+
+        general_avg = _average_slots(general_slots, general_prices)
+        feedin_avg = _average_slots(feedin_slots, feedin_prices)
+
+        if debug_enabled:
+            logger.debug(
+                "Slot grid filled: %d/%d general, %d/%d feedIn",
+                sum(1 for v in general_avg if v is not None), GRID_SLOTS,
+                sum(1 for v in feedin_avg if v is not None), GRID_SLOTS,
+            )
+
+        # Log any spike periods detected
+        if spike_periods:
+            spike_summary = {PERIOD_KEYS[slot]: status for slot, status in sorted(spike_slots.items())}
+            logger.info(f"⚡ Amber spike status detected for {len(spike_periods)} periods: {spike_summary}")
+
+        return general_avg, feedin_avg, spike_slots
+
+    def _build_rolling_24h_tariff(self, general_avg: List, feedin_avg: List, now=None, current_actual_interval: Dict = None) -> tuple:
         """
         Build a rolling 24-hour tariff where past periods use tomorrow's prices
 
+        The rolling window is an index shift over the slot grid: the 48 slots starting at
+        "now" are rotated so that index == slot of day, which gives tomorrow's price for
+        slots that have passed and today's price for the rest. The same shift one day later
+        gives the other day's price, used as a fallback for AEMO data keyed to forecast dates.
+
         NEW: Optionally injects ActualInterval (5-min actual price) for the current 30-min period
         to capture short-term price spikes.
 
@@ -279,41 +520,38 @@ class AmberTariffConverter:
         - All other periods → use normal 30-min averaged forecast
 
         Args:
-            general_lookup: Dict of (date, hour, minute) -> [prices] for buy prices
-            feedin_lookup: Dict of (date, hour, minute) -> [prices] for sell prices
-            user: User object with demand charge settings
-            spike_lookup: Dict of (date, hour, minute) -> spike status for periods with spikes
-            detected_tz: Timezone detected from Amber data timestamps
+            general_avg: 96-slot grid of averaged buy prices (None for empty slots)
+            feedin_avg: 96-slot grid of averaged sell prices (None for empty slots)
+            now: Current time in the tariff timezone
             current_actual_interval: Dict with 'general' and 'feedIn' ActualInterval data (optional)
                                     If provided, uses this for the current 30-min period
 
         Returns:
             (general_prices, feedin_prices) as dicts mapping PERIOD_XX_XX to price
         """
-        from datetime import datetime, timedelta
-        from zoneinfo import ZoneInfo
-
-        # Use Powerwall timezone from site_info (if provided)
-        # Otherwise fall back to auto-detection from Amber data
-        # This ensures correct "past vs future" period detection aligned with Powerwall's location
-        if detected_tz:
-            amber_tz = detected_tz
-            logger.info(f"Using timezone: {amber_tz}")
-        else:
-            amber_tz = ZoneInfo('Australia/Sydney')
-            logger.warning("Timezone detection failed, falling back to Australia/Sydney")
-
-        now = datetime.now(amber_tz)
         today = now.date()
         tomorrow = today + timedelta(days=1)
 
-        current_hour = now.hour
-        current_minute = 0 if now.minute < 30 else 30
+        current_slot = now.hour * 2 + (1 if now.minute >= 30 else 0)
 
         # Calculate current period key for ActualInterval injection
-        current_period_key = f"PERIOD_{current_hour:02d}_{current_minute:02d}"
+        current_period_key = PERIOD_KEYS[current_slot]
         logger.info(f"Current 30-min period: {current_period_key}")
 
+        # Primary: tomorrow for passed slots, today for the rest. Fallback: the other day.
+        buy_primary = _roll_slots(general_avg, current_slot)
+        buy_fallback = _roll_slots(general_avg, current_slot + SLOTS_PER_DAY)
+        sell_primary = _roll_slots(feedin_avg, current_slot)
+        sell_fallback = _roll_slots(feedin_avg, current_slot + SLOTS_PER_DAY)
+
+        # SPECIAL CASE: Use ActualInterval for current period if available
+        # This captures short-term (5-min) price spikes that would otherwise be averaged out
+        # Both channels are needed, otherwise the current period falls back to forecast
+        actual_general, actual_feedin = {}, {}
+        injected = bool(current_actual_interval) and self._inject_current_period(
+            actual_general, actual_feedin, current_slot, current_actual_interval
+        )
+
         general_prices = {}
         feedin_prices = {}
 
@@ -325,143 +563,56 @@ class AmberTariffConverter:
         last_valid_sell_price = None
 
         # Build all 48 half-hour periods in a day
-        for hour in range(24):
-            for minute in [0, 30]:
-                period_key = f"PERIOD_{hour:02d}_{minute:02d}"
-
-                # SPECIAL CASE: Use ActualInterval for current period if available
-                # This captures short-term (5-min) price spikes that would otherwise be averaged out
-                if period_key == current_period_key and current_actual_interval:
-                    # Use live 5-min ActualInterval price for current period
-                    if current_actual_interval.get('general'):
-                        actual_price_cents = current_actual_interval['general'].get('perKwh', 0)
-                        buy_price = self._round_price(actual_price_cents / 100)
-                        buy_price = max(0, buy_price)  # Tesla restriction: no negatives
-                        general_prices[period_key] = buy_price
-                        logger.info(f"{period_key} (CURRENT): Using ActualInterval buy price: ${buy_price:.4f}/kWh")
-                    else:
-                        logger.warning(f"{period_key}: No general ActualInterval, falling back to forecast")
-                        # Will fall through to normal lookup below
-                        current_actual_interval = None  # Disable for this iteration to fall through
-
-                    # Use live 5-min ActualInterval sell price for current period
-                    if current_actual_interval and current_actual_interval.get('feedIn'):
-                        actual_feedin_cents = current_actual_interval['feedIn'].get('perKwh', 0)
-                        # Amber convention: feedIn is negative, Tesla convention: positive
-                        sell_price = self._round_price(-actual_feedin_cents / 100)
-                        sell_price = max(0, sell_price)  # No negatives
-
-                        feedin_prices[period_key] = sell_price
-                        logger.info(f"{period_key} (CURRENT): Using ActualInterval sell price: ${sell_price:.4f}/kWh")
-
-                        # Skip normal lookup logic for this period since we've set both prices
-                        continue
-                    else:
-                        if current_actual_interval:
-                            logger.warning(f"{period_key}: No feedIn ActualInterval, falling back to forecast")
-
-                # NORMAL CASE: Use forecast data for all other periods
-                # Determine if this period has already passed today
-                if (hour < current_hour) or (hour == current_hour and minute < current_minute):
-                    # Past period - use tomorrow's price
-                    date_to_use = tomorrow
-                else:
-                    # Future period - use today's price
-                    date_to_use = today
-
-                # Direct lookup - no shifting needed with START time bucketing
-                # Tesla PERIOD_17_30 (17:30-18:00) directly looks up bucket (17, 30)
-                date_str = date_to_use.isoformat()
-                lookup_key = (date_str, hour, minute)
-
-                # Get general price (buy price)
-                # Try primary lookup key first, then try both today and tomorrow as fallbacks
-                # This handles AEMO data where all prices are keyed to forecast dates
-                found_in_lookup = lookup_key in general_lookup
-                if not found_in_lookup:
-                    # Try today's date first (for AEMO forecasts that start from now)
-                    today_key = (today.isoformat(), hour, minute)
-                    if today_key in general_lookup:
-                        lookup_key = today_key
-                        found_in_lookup = True
-                    else:
-                        # Try tomorrow's date (for AEMO forecasts that extend past midnight)
-                        tomorrow_key = (tomorrow.isoformat(), hour, minute)
-                        if tomorrow_key in general_lookup:
-                            lookup_key = tomorrow_key
-                            found_in_lookup = True
-
-                if found_in_lookup:
-                    prices = general_lookup[lookup_key]
-                    buy_price = self._round_price(sum(prices) / len(prices))
-
-                    # Tesla restriction: No negative prices - clamp to 0
-                    if buy_price < 0:
-                        logger.debug(f"{period_key}: Buy price adjusted: {buy_price:.4f} -> 0.0000 (negative->zero)")
-                        buy_price = 0
-
-                    general_prices[period_key] = buy_price
-                    last_valid_buy_price = buy_price  # Track for fallback (always update, even if clamped to 0)
-                    logger.debug(f"{period_key} (using {hour:02d}:{minute:02d} price): ${buy_price:.4f}")
-                else:
-                    # No data found - use fallback price if available
-                    # This commonly happens with AEMO forecast which only provides ~20 hours ahead
-                    # Early morning tomorrow (04:00-08:00) typically won't have forecast data
-                    tried_keys = [
-                        (date_str, hour, minute),
-                        (today.isoformat(), hour, minute),
-                        (tomorrow.isoformat(), hour, minute)
-                    ]
-                    if last_valid_buy_price is not None:
-                        general_prices[period_key] = last_valid_buy_price
-                        logger.info(f"{period_key}: Using fallback buy price ${last_valid_buy_price:.4f} (AEMO forecast gap)")
-                    else:
-                        logger.warning(f"{period_key}: No price data available for ({hour:02d}:{minute:02d}) - tried keys: {tried_keys}")
-                        general_prices[period_key] = None
-
-                # Get feedin price (sell price)
-                # Use same flexible lookup approach for AEMO compatibility
-                feedin_lookup_key = lookup_key  # Start with same key as general
-                found_feedin = feedin_lookup_key in feedin_lookup
-                if not found_feedin:
-                    today_key = (today.isoformat(), hour, minute)
-                    if today_key in feedin_lookup:
-                        feedin_lookup_key = today_key
-                        found_feedin = True
-                    else:
-                        tomorrow_key = (tomorrow.isoformat(), hour, minute)
-                        if tomorrow_key in feedin_lookup:
-                            feedin_lookup_key = tomorrow_key
-                            found_feedin = True
-
-                if found_feedin:
-                    prices = feedin_lookup[feedin_lookup_key]
-                    sell_price = self._round_price(sum(prices) / len(prices))
-                    original_sell = sell_price
-                    adjustments = []
-
-                    # Tesla restriction: No negative prices - clamp to 0
-                    if sell_price < 0:
-                        adjustments.append(f"negative({sell_price:.4f})->zero")
-                        sell_price = 0
-
-                    # Log all adjustments made for this period
-                    if adjustments:
-                        logger.debug(f"{period_key}: Sell price adjusted: {original_sell:.4f} -> {sell_price:.4f} ({', '.join(adjustments)})")
-
-                    feedin_prices[period_key] = sell_price
-                    last_valid_sell_price = sell_price  # Track for fallback
-                    if not adjustments:
-                        logger.debug(f"{period_key} (using {hour:02d}:{minute:02d} sell price): ${sell_price:.4f}")
-                else:
-                    # No data found - use fallback price if available
-                    # This commonly happens with AEMO forecast which only provides ~20 hours ahead
-                    if last_valid_sell_price is not None:
-                        feedin_prices[period_key] = last_valid_sell_price
-                        logger.info(f"{period_key}: Using fallback sell price ${last_valid_sell_price:.4f} (AEMO forecast gap)")
-                    else:
-                        logger.warning(f"{period_key}: No feedIn price data available for ({hour:02d}:{minute:02d})")
-                        feedin_prices[period_key] = None
+        for slot, period_key in enumerate(PERIOD_KEYS):
+            if slot == current_slot and injected:
+                general_prices[period_key] = actual_general[period_key]
+                feedin_prices[period_key] = actual_feedin[period_key]
+                continue
+
+            # Get general price (buy price)
+            average = buy_primary[slot] if buy_primary[slot] is not None else buy_fallback[slot]
+            if average is not None:
+                buy_price = self._round_price(average)
+
+                # Tesla restriction: No negative prices - clamp to 0
+                if buy_price < 0:
+                    logger.debug("%s: Buy price adjusted: %.4f -> 0.0000 (negative->zero)", period_key, buy_price)
+                    buy_price = 0
+
+                general_prices[period_key] = buy_price
+                last_valid_buy_price = buy_price  # Track for fallback (always update, even if clamped to 0)
+            elif last_valid_buy_price is not None:
+                # No data found - use fallback price
+                # This commonly happens with AEMO forecast which only provides ~20 hours ahead
+                # Early morning tomorrow (04:00-08:00) typically won't have forecast data
+                general_prices[period_key] = last_valid_buy_price
+                logger.info(f"{period_key}: Using fallback buy price ${last_valid_buy_price:.4f} (AEMO forecast gap)")
+            else:
+                logger.warning(f"{period_key}: No price data available for {today} or {tomorrow}")
+                general_prices[period_key] = None
+
+            # Get feedin price (sell price)
+            average = sell_primary[slot] if sell_primary[slot] is not None else sell_fallback[slot]
+            if average is not None:
+                sell_price = self._round_price(average)
+
+                # Tesla restriction: No negative prices - clamp to 0
+                if sell_price < 0:
+                    logger.debug("%s: Sell price adjusted: %.4f -> 0.0000 (negative->zero)", period_key, sell_price)
+                    sell_price = 0
+
+                feedin_prices[period_key] = sell_price
+                last_valid_sell_price = sell_price  # Track for fallback
+            elif last_valid_sell_price is not None:
+                feedin_prices[period_key] = last_valid_sell_price
+                logger.info(f"{period_key}: Using fallback sell price ${last_valid_sell_price:.4f} (AEMO forecast gap)")
+            else:
+                logger.warning(f"{period_key}: No feedIn price data available for {today} or {tomorrow}")
+                feedin_prices[period_key] = None
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Rolling 24h buy prices: %s", general_prices)
+            logger.debug("Rolling 24h sell prices: %s", feedin_prices)
 
         # Count missing periods and abort if too many are missing
         # This prevents sending bad tariffs when API is unreachable
@@ -491,13 +642,30 @@ class AmberTariffConverter:
             if feedin_prices[key] is None:
                 feedin_prices[key] = 0
 
+        return general_prices, feedin_prices
+
+    def _apply_price_overrides(self, general_prices: Dict[str, float], feedin_prices: Dict[str, float],
+                               user=None, now=None, spike_slots: Dict = None):
+        """
+        Apply spike protection and demand-period price overrides in place, then validate.
+
+        Args:
+            general_prices: PERIOD_XX_XX -> buy price (modified in place)
+            feedin_prices: PERIOD_XX_XX -> sell price
+            user: User object with spike protection and demand charge settings
+            now: Current time in the tariff timezone
+            spike_slots: Dict of slot-of-day -> spike status for periods with spikes
+        """
+        today = now.date()
+        tomorrow = today + timedelta(days=1)
+
         # SPIKE PROTECTION: Prevent grid charging during Amber price spikes
         # When Amber reports spikeStatus='potential' or 'spike' for a period, the Powerwall may see an
         # arbitrage opportunity (cheap now, expensive later) and charge from grid.
         # Solution: Override buy prices to max(all_sell_prices) + $1.00 for periods Amber marks as spikes.
         # Note: spikeStatus only applies to HIGH price events. Low/negative prices use descriptor='extremelyLow'.
         spike_protection_enabled = getattr(user, 'spike_protection_enabled', False) if user else False
-        if spike_protection_enabled and spike_lookup:
+        if spike_protection_enabled and spike_slots:
             # Find maximum sell price across all periods (for override calculation)
             max_sell_price = max(feedin_prices.values()) if feedin_prices else 0
 
@@ -520,11 +688,7 @@ class AmberTariffConverter:
             periods_overridden = 0
 
             # Build set of period keys that have spike status
-            # spike_lookup keys are (date, hour, minute), we need to map to PERIOD_HH_MM
-            spike_period_keys = set()
-            for (date_str, hour, minute), status in spike_lookup.items():
-                period_key = f"PERIOD_{hour:02d}_{minute:02d}"
-                spike_period_keys.add(period_key)
+            spike_period_keys = {PERIOD_KEYS[slot] for slot in spike_slots}
 
             logger.info(f"⚡ Amber reports spikes for periods: {sorted(spike_period_keys)}")
 
@@ -561,17 +725,14 @@ class AmberTariffConverter:
             # 'all' matches any day
 
             if day_is_valid:
-                for period_key in general_prices.keys():
-                    # Extract hour/minute from PERIOD_HH_MM
-                    parts = period_key.split('_')
-                    hour = int(parts[1])
-                    minute = int(parts[2])
-
-                    # Check if this period is in the demand peak window
-                    peak_start_hour = getattr(user, 'peak_start_hour', 14)
-                    peak_start_minute = getattr(user, 'peak_start_minute', 0)
-                    peak_end_hour = getattr(user, 'peak_end_hour', 20)
-                    peak_end_minute = getattr(user, 'peak_end_minute', 0)
+                # Check if this period is in the demand peak window
+                peak_start_hour = getattr(user, 'peak_start_hour', 14)
+                peak_start_minute = getattr(user, 'peak_start_minute', 0)
+                peak_end_hour = getattr(user, 'peak_end_hour', 20)
+                peak_end_minute = getattr(user, 'peak_end_minute', 0)
+
+                for slot, period_key in enumerate(PERIOD_KEYS):
+                    hour, minute = divmod(slot * 30, 60)
 
                     if self._is_in_time_range(hour, minute,
                                                peak_start_hour, peak_start_minute,
@@ -579,7 +740,8 @@ class AmberTariffConverter:
                         original_price = general_prices[period_key]
                         general_prices[period_key] = original_price + artificial_increase
                         periods_modified += 1
-                        logger.debug(f"{period_key}: Artificial price increase applied: ${original_price:.4f} -> ${general_prices[period_key]:.4f} (+${artificial_increase})")
+                        logger.debug("%s: Artificial price increase applied: $%.4f -> $%.4f (+$%s)",
+                                     period_key, original_price, general_prices[period_key], artificial_increase)
 
                 if periods_modified > 0:
                     logger.info(f"🔺 ALPHA: Artificial price increase (+${artificial_increase}/kWh) applied to {periods_modified} demand periods")
@@ -591,8 +753,6 @@ class AmberTariffConverter:
         # Validate Tesla TOU restrictions before returning
         self._validate_tesla_restrictions(general_prices, feedin_prices)
 
-        return general_prices, feedin_prices
-
     def _validate_tesla_restrictions(self, general_prices: Dict[str, float], feedin_prices: Dict[str, float]):
         """
         Validate that the tariff complies with Tesla's restrictions:
@@ -642,7 +802,7 @@ class AmberTariffConverter:
         """Build the complete Tesla tariff structure"""
 
         # Build TOU periods for Summer season (covers whole year for Amber)
-        tou_periods = self._build_tou_periods(general_prices.keys())
+        tou_periods = build_tou_periods(general_prices.keys())
 
         # Build demand charges if enabled
         demand_charges_summer = {}
@@ -779,67 +939,6 @@ class AmberTariffConverter:
         logger.info("Built Tesla tariff structure")
         return tariff
 
-    def _build_tou_periods(self, period_keys) -> Dict:
-        """
-        Build TOU period definitions for all time slots
-        Omits fields when they're 0 for cleaner output
-
-        Args:
-            period_keys: Set of period keys like "PERIOD_14_30"
-
-        Returns:
-            Dictionary mapping period keys to time slot definitions
-        """
-        tou_periods = {}
-
-        for period_key in period_keys:
-            # Extract hour and minute from period key
-            # PERIOD_14_30 -> hour=14, minute=30
-            try:
-                parts = period_key.split('_')
-                from_hour = int(parts[1])
-                from_minute = int(parts[2])
-
-                # Calculate end time (30 minutes later)
-                to_hour = from_hour
-                to_minute = from_minute + 30
-
-                if to_minute >= 60:
-                    to_minute = 0
-                    to_hour += 1
-
-                # Build period definition, omitting fields when they're 0
-                period_def = {
-                    "toDayOfWeek": 6  # Saturday (covers all days with implicit fromDayOfWeek=0)
-                }
-
-                # Only include fromHour if non-zero
-                if from_hour > 0:
-                    period_def["fromHour"] = from_hour
-
-                # Only include fromMinute if non-zero
-                if from_minute > 0:
-                    period_def["fromMinute"] = from_minute
-
-                # Only include toHour if it's not same as fromHour or if it's non-zero
-                if to_hour != from_hour or to_hour > 0:
-                    period_def["toHour"] = to_hour
-
-                # Only include toMinute if non-zero
-                if to_minute > 0:
-                    period_def["toMinute"] = to_minute
-
-                tou_periods[period_key] = {
-                    "periods": [period_def]
-                }
-
-            except (IndexError, ValueError) as e:
-                logger.error(f"Error parsing period key {period_key}: {e}")
-                continue
-
-        logger.debug(f"Built {len(tou_periods)} TOU period definitions")
-        return tou_periods
-
     def _build_demand_charge_rates(self, user, period_keys) -> Dict[str, float]:
         """
         Build demand charge rates based on user configuration
@@ -948,54 +1047,22 @@ def _normalize_network_rate(rate, default, name="rate"):
     return rate
 
 
-def apply_network_tariff(tariff: Dict, user) -> Dict:
-    """
-    Apply network tariff (DNSP) charges to wholesale prices.
-
-    AEMO wholesale prices only include energy costs. This function adds:
-    - Network (DNSP) charges (via aemo_to_tariff library or manual rates)
-    - Other fees (environmental, market fees)
-    - GST (optional)
-
-    Args:
-        tariff: Tesla tariff structure with wholesale prices
-        user: User object with network tariff configuration
-
-    Returns:
-        Modified tariff with network charges applied to buy prices
-    """
-    if not tariff:
-        logger.warning("No tariff provided for network tariff adjustment")
-        return tariff
-
-    # Check if user wants manual rates or library-based calculation
-    use_manual_rates = getattr(user, 'network_use_manual_rates', False)
-
-    # If library is available and user doesn't want manual rates, use it
-    if AEMO_TARIFF_AVAILABLE and not use_manual_rates:
-        return _apply_network_tariff_library(tariff, user)
-
-    # Otherwise fall back to manual rate entry
-    if not AEMO_TARIFF_AVAILABLE and not use_manual_rates:
-        logger.warning("aemo_to_tariff library not available, falling back to manual rates")
-
-    return _apply_network_tariff_manual(tariff, user)
-
+# Network charge tables for the aemo_to_tariff path:
+# (library_distributor, tariff_code, date) -> 48 per-slot (slope, intercept) entries
+_network_table_cache = {}
+# Syncs for different users run in parallel; the table is built outside the lock
+_network_table_lock = threading.Lock()
 
-def _apply_network_tariff_library(tariff: Dict, user) -> Dict:
-    """
-    Apply network tariff using the aemo_to_tariff library.
+# Wholesale prices ($/MWh) used to probe spot_to_tariff when building a table
+_NETWORK_PROBE_RRPS = (0.0, 100.0, 1000.0)
 
-    Uses distributor and tariff code to automatically calculate network charges.
-    """
-    distributor = getattr(user, 'network_distributor', 'energex') or 'energex'
-    tariff_code = getattr(user, 'network_tariff_code', '6900') or '6900'
 
+def _library_tariff_args(distributor: str, tariff_code: str) -> tuple:
+    """Map user network settings to the (network, tariff) arguments spot_to_tariff expects."""
     # Strip common prefixes from tariff code (e.g., NTC6900 -> 6900, EA025 -> EA025)
     # The aemo_to_tariff library expects codes without the NTC prefix
     if tariff_code.upper().startswith('NTC'):
         tariff_code = tariff_code[3:]
-        logger.info(f"Stripped NTC prefix from tariff code: {tariff_code}")
 
     # Map distributors to library module names
     # CitiPower and United Energy use the generic Victoria module
@@ -1003,174 +1070,152 @@ def _apply_network_tariff_library(tariff: Dict, user) -> Dict:
         "citipower": "victoria",
         "united": "victoria",
     }
-    library_distributor = library_distributor_map.get(distributor, distributor)
+    return library_distributor_map.get(distributor, distributor), tariff_code
 
-    logger.info(f"Applying network tariff via library: distributor={distributor} -> {library_distributor}, tariff_code={tariff_code}")
 
-    # Apply to Summer season buy rates (energy_charges)
-    for season in ['Summer']:
-        if season not in tariff.get('energy_charges', {}):
-            continue
-
-        rates = tariff['energy_charges'][season].get('rates', {})
-        modified_count = 0
-
-        for period, price in list(rates.items()):
-            # Extract hour and minute from PERIOD_HH_MM
-            try:
-                parts = period.split('_')
-                hour = int(parts[1])
-                minute = int(parts[2])
-
-                # Create datetime for this period
-                now = datetime.now()
-                interval_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-
-                # Convert wholesale price from $/kWh to $/MWh for the library
-                wholesale_mwh = price * 1000
-
-                # Use aemo_to_tariff library to get total retail price
-                # Returns price in c/kWh including network charges
-                try:
-                    retail_price_cents = spot_to_tariff(
-                        interval_time=interval_time,
-                        network=library_distributor,
-                        tariff=tariff_code,
-                        rrp=wholesale_mwh
-                    )
+def get_network_charge_table(library_distributor: str, tariff_code: str, day) -> List[Optional[tuple]]:
+    """
+    Get the per-slot network charges for a distributor/tariff on a given day.
 
-                    # Convert from c/kWh to $/kWh
-                    new_price = round(retail_price_cents / 100, 4)
+    spot_to_tariff() is affine in the wholesale price for a fixed network, tariff
+    and interval: retail c/kWh = slope * rrp ($/MWh) + intercept, where the slope
+    carries the loss factors and the intercept the network charge + GST. Each slot
+    is probed once per day and the (slope, intercept) pair cached, so applying the
+    network tariff is a multiply-add per slot instead of a library call.
 
-                    # Tesla restriction: no negative prices
-                    new_price = max(0, new_price)
+    Tables are keyed by date, so they roll over at midnight; settings changes pick a
+    different (distributor, tariff_code) key. Slots the library can't price, or
+    that don't behave affinely, are None and fall back to a live spot_to_tariff call.
 
-                    if rates[period] != new_price:
-                        modified_count += 1
-                        logger.debug(f"{period}: ${price:.4f} wholesale -> ${new_price:.4f} retail (via library)")
-                        rates[period] = new_price
+    Args:
+        library_distributor: aemo_to_tariff network module name
+        tariff_code: Tariff code without NTC prefix
+        day: Date the table applies to (server local time, as the library path uses)
 
-                except Exception as e:
-                    logger.warning(f"{period}: Library error for {library_distributor}/{tariff_code}: {e}, keeping wholesale price")
+    Returns:
+        List of 48 (slope, intercept) tuples or None
+    """
+    cache_key = (library_distributor, tariff_code, day)
+    with _network_table_lock:
+        table = _network_table_cache.get(cache_key)
+    if table is not None:
+        return table
+
+    table = []
+    fallback_count = 0
+    low_rrp, mid_rrp, high_rrp = _NETWORK_PROBE_RRPS
+    for slot in range(SLOTS_PER_DAY):
+        interval_time = datetime(day.year, day.month, day.day, slot // 2, (slot % 2) * 30)
+        try:
+            low, mid, high = (
+                spot_to_tariff(interval_time=interval_time, network=library_distributor, tariff=tariff_code, rrp=rrp)
+                for rrp in _NETWORK_PROBE_RRPS
+            )
+        except Exception as e:
+            logger.debug(f"{PERIOD_KEYS[slot]}: Library error building network table for {library_distributor}/{tariff_code}: {e}")
+            table.append(None)
+            fallback_count += 1
+            continue
 
-            except (IndexError, ValueError):
-                continue
+        slope = (high - low) / (high_rrp - low_rrp)
+        if abs(low + slope * mid_rrp - mid) > 1e-9:
+            # Not a straight line in rrp - price this slot live
+            table.append(None)
+            fallback_count += 1
+            continue
+        table.append((slope, low))
 
-        total_periods = len(rates)
-        if modified_count == 0 and total_periods > 0:
-            logger.error(f"Network tariff library failed for ALL {total_periods} periods! Check distributor={library_distributor}, tariff={tariff_code}")
-        else:
-            logger.info(f"Network tariff (library) applied to {modified_count}/{total_periods} periods in {season}")
+    with _network_table_lock:
+        # Drop tables from previous days
+        for key in [key for key in _network_table_cache if key[2] != day]:
+            del _network_table_cache[key]
+        _network_table_cache[cache_key] = table
 
-    return tariff
+    logger.info(
+        f"Built network charge table for {library_distributor}/{tariff_code} on {day}: "
+        f"{SLOTS_PER_DAY - fallback_count}/{SLOTS_PER_DAY} slots precomputed"
+    )
+    return table
 
 
-def _apply_network_tariff_manual(tariff: Dict, user) -> Dict:
+def _network_library_price(table: List[Optional[tuple]], slot: int, now: datetime,
+                           library_distributor: str, tariff_code: str, price: float) -> float:
     """
-    Apply network tariff using user-entered manual rates.
+    Retail buy price ($/kWh) for one slot's wholesale price ($/kWh) via a network charge table.
 
-    Falls back to this when library is unavailable or user prefers manual entry.
+    Raises whatever spot_to_tariff raises for slots that have to be priced live.
     """
-    # Check if network tariff is configured
-    tariff_type = getattr(user, 'network_tariff_type', 'flat') or 'flat'
-    raw_other_fees = getattr(user, 'network_other_fees', None)
-    other_fees = _normalize_network_rate(raw_other_fees, 1.5, "other_fees")
-    include_gst = getattr(user, 'network_include_gst', True)
-
-    logger.info(f"Applying network tariff (manual): type={tariff_type}, other_fees={other_fees}c/kWh, gst={include_gst}")
-
-    # Get rate configuration
-    if tariff_type == 'flat':
-        raw_flat = getattr(user, 'network_flat_rate', None)
-        flat_rate = _normalize_network_rate(raw_flat, 8.0, "flat_rate")
-        logger.info(f"Network flat rate: {flat_rate}c/kWh")
+    wholesale_mwh = price * 1000
+    entry = table[slot]
+    if entry is None:
+        retail_price_cents = spot_to_tariff(
+            interval_time=now.replace(hour=slot // 2, minute=(slot % 2) * 30, second=0, microsecond=0),
+            network=library_distributor,
+            tariff=tariff_code,
+            rrp=wholesale_mwh
+        )
     else:
-        # TOU rates - normalize each one
-        raw_peak = getattr(user, 'network_peak_rate', None)
-        raw_shoulder = getattr(user, 'network_shoulder_rate', None)
-        raw_offpeak = getattr(user, 'network_offpeak_rate', None)
-
-        peak_rate = _normalize_network_rate(raw_peak, 15.0, "peak_rate")
-        shoulder_rate = _normalize_network_rate(raw_shoulder, 5.0, "shoulder_rate")
-        offpeak_rate = _normalize_network_rate(raw_offpeak, 2.0, "offpeak_rate")
-
-        # Time periods
-        peak_start = getattr(user, 'network_peak_start', '16:00') or '16:00'
-        peak_end = getattr(user, 'network_peak_end', '21:00') or '21:00'
-        offpeak_start = getattr(user, 'network_offpeak_start', '10:00') or '10:00'
-        offpeak_end = getattr(user, 'network_offpeak_end', '15:00') or '15:00'
-
-        # Parse times
-        peak_start_hour, peak_start_min = map(int, peak_start.split(':'))
-        peak_end_hour, peak_end_min = map(int, peak_end.split(':'))
-        offpeak_start_hour, offpeak_start_min = map(int, offpeak_start.split(':'))
-        offpeak_end_hour, offpeak_end_min = map(int, offpeak_end.split(':'))
-
-        logger.info(f"Network TOU: peak={peak_rate}c ({peak_start}-{peak_end}), "
-                   f"shoulder={shoulder_rate}c, offpeak={offpeak_rate}c ({offpeak_start}-{offpeak_end})")
+        slope, intercept = entry
+        retail_price_cents = slope * wholesale_mwh + intercept
 
-    # Apply to Summer season buy rates (energy_charges)
-    for season in ['Summer']:
-        if season not in tariff.get('energy_charges', {}):
-            continue
+    # Convert from c/kWh to $/kWh; Tesla restriction: no negative prices
+    return max(0, round(retail_price_cents / 100, 4))
 
-        rates = tariff['energy_charges'][season].get('rates', {})
-        modified_count = 0
 
-        for period, price in list(rates.items()):
-            # Extract hour and minute from PERIOD_HH_MM
-            try:
-                parts = period.split('_')
-                hour = int(parts[1])
-                minute = int(parts[2])
-            except (IndexError, ValueError):
-                continue
-
-            # Calculate network charge based on tariff type
-            if tariff_type == 'flat':
-                network_charge_cents = flat_rate
-            else:
-                # TOU - determine which rate applies
-                time_minutes = hour * 60 + minute
-
-                # Check peak period
-                peak_start_mins = peak_start_hour * 60 + peak_start_min
-                peak_end_mins = peak_end_hour * 60 + peak_end_min
+def apply_network_tariff(tariff: Dict, user) -> Dict:
+    """
+    Apply network tariff (DNSP) charges to wholesale prices.
 
-                # Check off-peak period
-                offpeak_start_mins = offpeak_start_hour * 60 + offpeak_start_min
-                offpeak_end_mins = offpeak_end_hour * 60 + offpeak_end_min
+    AEMO wholesale prices only include energy costs. This function adds:
+    - Network (DNSP) charges (via aemo_to_tariff library or manual rates)
+    - Other fees (environmental, market fees)
+    - GST (optional)
 
-                if peak_start_mins <= time_minutes < peak_end_mins:
-                    network_charge_cents = peak_rate
-                elif offpeak_start_mins <= time_minutes < offpeak_end_mins:
-                    network_charge_cents = offpeak_rate
-                else:
-                    network_charge_cents = shoulder_rate
+    Runs the user's network stage as a one-stage TariffPipeline.
 
-            # Add other fees
-            total_charge_cents = network_charge_cents + other_fees
+    Args:
+        tariff: Tesla tariff structure with wholesale prices
+        user: User object with network tariff configuration
 
-            # Apply GST (10%)
-            if include_gst:
-                total_charge_cents = total_charge_cents * 1.10
+    Returns:
+        Modified tariff with network charges applied to buy prices
+    """
+    if not tariff:
+        logger.warning("No tariff provided for network tariff adjustment")
+        return tariff
 
-            # Convert wholesale price ($/kWh) to cents, add network charges, convert back
-            wholesale_cents = price * 100
-            total_cents = wholesale_cents + total_charge_cents
-            new_price = round(total_cents / 100, 4)
+    return TariffPipeline([network_tariff_stage(user)]).apply(tariff)
 
-            # Tesla restriction: no negative prices
-            new_price = max(0, new_price)
 
-            if rates[period] != new_price:
-                modified_count += 1
-                logger.debug(f"{period}: ${price:.4f} + {total_charge_cents:.2f}c network = ${new_price:.4f}")
-                rates[period] = new_price
+def network_tariff_stage(user) -> tuple:
+    """
+    The (stage_name, params) pipeline stage for a user's network tariff.
 
-        logger.info(f"Network tariff applied to {modified_count} periods in {season}")
+    Uses the aemo_to_tariff library when it is installed, unless the user
+    prefers manual rate entry.
+    """
+    use_manual_rates = getattr(user, 'network_use_manual_rates', False)
+    if AEMO_TARIFF_AVAILABLE and not use_manual_rates:
+        return ('network_library', {
+            'distributor': getattr(user, 'network_distributor', 'energex') or 'energex',
+            'tariff_code': getattr(user, 'network_tariff_code', '6900') or '6900',
+        })
 
-    return tariff
+    if not use_manual_rates:
+        logger.warning("aemo_to_tariff library not available, falling back to manual rates")
+    return ('network_manual', {
+        'tariff_type': getattr(user, 'network_tariff_type', 'flat') or 'flat',
+        'other_fees': getattr(user, 'network_other_fees', None),
+        'include_gst': getattr(user, 'network_include_gst', True),
+        'flat_rate': getattr(user, 'network_flat_rate', None),
+        'peak_rate': getattr(user, 'network_peak_rate', None),
+        'shoulder_rate': getattr(user, 'network_shoulder_rate', None),
+        'offpeak_rate': getattr(user, 'network_offpeak_rate', None),
+        'peak_start': getattr(user, 'network_peak_start', '16:00') or '16:00',
+        'peak_end': getattr(user, 'network_peak_end', '21:00') or '21:00',
+        'offpeak_start': getattr(user, 'network_offpeak_start', '10:00') or '10:00',
+        'offpeak_end': getattr(user, 'network_offpeak_end', '15:00') or '15:00',
+    })
 
 
 # Flow Power Electricity Provider Support
@@ -1222,32 +1267,7 @@ def apply_flow_power_export(tariff: Dict, state: str) -> Dict:
         logger.warning("No tariff provided for Flow Power export adjustment")
         return tariff
 
-    # Get the happy hour export rate for this state
-    export_rate = FLOW_POWER_EXPORT_RATES.get(state, 0.45)  # Default to 45c if unknown state
-
-    logger.info(f"Applying Flow Power export rates for {state}: {export_rate * 100:.0f}c during Happy Hour, 0c otherwise")
-
-    # Apply to both Summer and Winter seasons in sell_tariff
-    for season in ['Summer', 'Winter']:
-        if season not in tariff.get('sell_tariff', {}).get('energy_charges', {}):
-            continue
-
-        rates = tariff['sell_tariff']['energy_charges'][season].get('rates', {})
-
-        # Set ALL periods to 0c first
-        for period in list(rates.keys()):
-            rates[period] = 0.0
-
-        # Then set Happy Hour periods to the fixed rate
-        for period in FLOW_POWER_HAPPY_HOUR_PERIODS:
-            if period in rates or len(rates) > 0:  # Only add if rates exist
-                rates[period] = export_rate
-
-    # Log summary of changes
-    happy_hour_periods_count = len(FLOW_POWER_HAPPY_HOUR_PERIODS)
-    logger.info(f"Flow Power export applied: {happy_hour_periods_count} periods at ${export_rate}/kWh, remaining periods at $0.00/kWh")
-
-    return tariff
+    return TariffPipeline([('flow_power_export', {'state': state})]).apply(tariff)
 
 
 def apply_flow_power_pea(
@@ -1286,120 +1306,55 @@ def apply_flow_power_pea(
         logger.warning("No tariff provided for Flow Power PEA adjustment")
         return tariff
 
-    logger.info(f"Applying Flow Power PEA: base_rate={base_rate}c/kWh, custom_pea={custom_pea}")
-
-    # Track statistics for logging
-    pea_values = []
-    final_prices = []
+    stage = ('flow_power_pea', {'base_rate': base_rate, 'custom_pea': custom_pea})
+    return TariffPipeline([stage]).apply(tariff, wholesale_prices=wholesale_prices)
 
-    # Apply to Summer season buy rates (energy_charges)
-    for season in ['Summer']:
-        if season not in tariff.get('energy_charges', {}):
-            continue
 
-        rates = tariff['energy_charges'][season].get('rates', {})
-        modified_count = 0
-
-        for period in list(rates.keys()):
-            if custom_pea is not None:
-                # User override - apply fixed PEA from bills
-                pea = custom_pea
-            else:
-                # Calculate PEA from wholesale price
-                # Get wholesale price for this period ($/kWh -> c/kWh)
-                wholesale_dollars = wholesale_prices.get(period, 0.08)  # Default 8c if missing
-                wholesale_cents = wholesale_dollars * 100
-                pea = wholesale_cents - FLOW_POWER_PEA_OFFSET  # wholesale - 9.7
-
-            pea_values.append(pea)
-
-            # Final rate = base_rate + PEA (in c/kWh)
-            final_cents = base_rate + pea
-
-            # Convert to $/kWh and clamp to 0 (Tesla restriction: no negatives)
-            final_dollars = max(0, final_cents / 100)
-            final_dollars = round(final_dollars, 4)
-
-            final_prices.append(final_cents)
-
-            if rates[period] != final_dollars:
-                modified_count += 1
-                logger.debug(f"{period}: base={base_rate}c + PEA={pea:.1f}c = {final_cents:.1f}c (${final_dollars:.4f}/kWh)")
-
-            rates[period] = final_dollars
-
-        logger.info(f"Flow Power PEA applied to {modified_count} periods in {season}")
-
-    # Log summary statistics
-    if pea_values:
-        avg_pea = sum(pea_values) / len(pea_values)
-        min_pea = min(pea_values)
-        max_pea = max(pea_values)
-        avg_final = sum(final_prices) / len(final_prices)
-
-        logger.info(
-            f"Flow Power PEA summary: avg_pea={avg_pea:.1f}c, "
-            f"range=[{min_pea:.1f}c to {max_pea:.1f}c], "
-            f"avg_final={avg_final:.1f}c/kWh"
-        )
-
-    return tariff
-
-
-def get_wholesale_lookup(forecast_data: list) -> Dict[str, float]:
+def get_wholesale_lookup(forecast_data) -> Dict[str, float]:
     """
     Extract wholesale prices from forecast data into a period lookup.
 
     Used by apply_flow_power_pea() to calculate PEA from wholesale prices.
 
     Args:
-        forecast_data: List of price forecast points (5-min or 30-min resolution)
+        forecast_data: Price forecast points (5-min or 30-min resolution), as a list or PriceIntervals
 
     Returns:
         Dict mapping PERIOD_HH_MM to wholesale price in $/kWh
     """
-    wholesale_lookup = {}
+    intervals = PriceIntervals.of(forecast_data)
 
-    for point in forecast_data:
-        try:
-            nem_time = point.get('nemTime', '')
-            timestamp = datetime.fromisoformat(nem_time.replace('Z', '+00:00'))
-            channel_type = point.get('channelType', '')
-            duration = point.get('duration', 30)
+    # Bucket by interval START time in the forecast's own (NEM time) offset,
+    # same as the tariff converter's 30-minute periods
+    period_slots = intervals.nem_slots_of_day()
+    sums = [0.0] * SLOTS_PER_DAY
+    counts = [0] * SLOTS_PER_DAY
 
-            # Only use general (import) prices
-            if channel_type != 'general':
-                continue
+    for i, channel_type in enumerate(intervals.channels):
+        # Only use general (import) prices
+        if channel_type != 'general':
+            continue
 
-            # Get wholesale component - prefer wholesaleKWHPrice for raw wholesale
-            # Fall back to perKwh for AEMO data (which is already wholesale)
-            wholesale_cents = point.get('wholesaleKWHPrice')
-            if wholesale_cents is None:
-                # AEMO data - perKwh is the wholesale price
-                wholesale_cents = point.get('perKwh', 0)
+        # Get wholesale component - prefer wholesaleKWHPrice for raw wholesale
+        # Fall back to perKwh for AEMO data (which is already wholesale)
+        wholesale_cents = intervals.wholesale[i]
+        if wholesale_cents is None:
+            wholesale_cents = intervals.per_kwh[i]
 
+        try:
             wholesale_dollars = wholesale_cents / 100
-
-            # Use interval START time for bucketing (same as tariff converter)
-            interval_start = timestamp - timedelta(minutes=duration)
-
-            # Round to nearest 30-minute interval
-            start_minute_bucket = 0 if interval_start.minute < 30 else 30
-            period_key = f"PERIOD_{interval_start.hour:02d}_{start_minute_bucket:02d}"
-
-            # Store in lookup (average if multiple intervals in same 30-min period)
-            if period_key not in wholesale_lookup:
-                wholesale_lookup[period_key] = []
-            wholesale_lookup[period_key].append(wholesale_dollars)
-
-        except Exception as e:
+        except TypeError as e:
             logger.debug(f"Error extracting wholesale price: {e}")
             continue
 
-    # Average multiple values per period
-    result = {}
-    for period, prices in wholesale_lookup.items():
-        result[period] = sum(prices) / len(prices)
+        # Average if multiple intervals in same 30-min period
+        sums[period_slots[i]] += wholesale_dollars
+        counts[period_slots[i]] += 1
+
+    result = {
+        PERIOD_KEYS[slot]: sums[slot] / counts[slot]
+        for slot in range(SLOTS_PER_DAY) if counts[slot]
+    }
 
     logger.debug(f"Built wholesale lookup with {len(result)} periods")
     return result
@@ -1448,102 +1403,14 @@ def apply_export_boost(
         With offset_cents=5, min_price_cents=20, activation_threshold_cents=10:
         → Tesla sees 5c (below threshold, boost skipped)
     """
-    if offset_cents == 0 and min_price_cents == 0:
-        logger.debug("Export boost disabled (offset=0, min=0)")
-        return tariff
-
-    # Parse time window
-    try:
-        start_parts = boost_start.split(":")
-        start_hour, start_minute = int(start_parts[0]), int(start_parts[1])
-        end_parts = boost_end.split(":")
-        end_hour, end_minute = int(end_parts[0]), int(end_parts[1])
-    except (ValueError, IndexError) as err:
-        logger.error(f"Invalid export boost time format: {err}")
-        return tariff
-
-    # Build list of periods within the time window
-    boost_periods = set()
-    for hour in range(24):
-        for minute in [0, 30]:
-            period_minutes = hour * 60 + minute
-            start_minutes = start_hour * 60 + start_minute
-            end_minutes = end_hour * 60 + end_minute
-
-            # Handle overnight windows (e.g., 22:00 to 06:00)
-            if end_minutes <= start_minutes:
-                in_window = period_minutes >= start_minutes or period_minutes < end_minutes
-            else:
-                in_window = start_minutes <= period_minutes < end_minutes
-
-            if in_window:
-                boost_periods.add(f"PERIOD_{hour:02d}_{minute:02d}")
-
-    logger.debug(
-        f"Export boost active for {len(boost_periods)} periods ({boost_start} to {boost_end}): "
-        f"offset={offset_cents:.1f}c, min={min_price_cents:.1f}c, threshold={activation_threshold_cents:.1f}c"
-    )
-
-    modified_count = 0
-    skipped_count = 0
-    boosted_prices = []
-
-    # Process sell prices in the sell_tariff structure
-    # Tesla tariff structure: sell prices are in sell_tariff.energy_charges.{season}.rates
-    sell_tariff = tariff.get("sell_tariff", {})
-    for season, season_data in sell_tariff.get("energy_charges", {}).items():
-        sell_prices = season_data.get("rates", {})
-
-        for period in boost_periods:
-            if period not in sell_prices:
-                continue
-
-            original_dollars = sell_prices[period]
-            original_cents = original_dollars * 100
-
-            # Skip boost if actual price is below activation threshold
-            if activation_threshold_cents > 0 and original_cents < activation_threshold_cents:
-                skipped_count += 1
-                logger.debug(
-                    f"{period}: Boost skipped - actual price {original_cents:.2f}c below threshold {activation_threshold_cents:.1f}c"
-                )
-                continue
-
-            # Apply offset
-            boosted_cents = original_cents + offset_cents
-
-            # Apply minimum floor
-            boosted_cents = max(boosted_cents, min_price_cents)
-
-            # Convert back to dollars
-            boosted_dollars = round(boosted_cents / 100, 4)
-
-            # Note: sell > buy is now allowed by Tesla API (restriction removed)
-
-            if boosted_dollars != original_dollars:
-                modified_count += 1
-                boosted_prices.append(boosted_cents)
-                logger.debug(
-                    f"{period}: Export boost {original_cents:.2f}c → {boosted_dollars * 100:.2f}c "
-                    f"(offset={offset_cents:.1f}c, min={min_price_cents:.1f}c)"
-                )
-
-            sell_prices[period] = boosted_dollars
-
-    # Log summary
-    if boosted_prices:
-        avg_boost = sum(boosted_prices) / len(boosted_prices)
-        skip_msg = f", {skipped_count} skipped (below threshold)" if skipped_count > 0 else ""
-        logger.info(
-            f"Export boost applied to {modified_count} periods{skip_msg}: avg={avg_boost:.1f}c/kWh, "
-            f"range=[{min(boosted_prices):.1f}c to {max(boosted_prices):.1f}c]"
-        )
-    elif skipped_count > 0:
-        logger.info(f"Export boost: {skipped_count} periods skipped (below threshold {activation_threshold_cents:.1f}c)")
-    else:
-        logger.info("Export boost: no periods modified (prices already meet criteria)")
-
-    return tariff
+    stage = ('export_boost', {
+        'offset_cents': offset_cents,
+        'min_price_cents': min_price_cents,
+        'boost_start': boost_start,
+        'boost_end': boost_end,
+        'activation_threshold_cents': activation_threshold_cents,
+    })
+    return TariffPipeline([stage]).apply(tariff)
 
 
 def apply_chip_mode(
@@ -1579,75 +1446,365 @@ def apply_chip_mode(
         Amber says export = 35c, threshold = 30c
         → Tesla sees 35c (above threshold - allow export)
     """
-    # Parse time window
+    stage = ('chip_mode', {'chip_start': chip_start, 'chip_end': chip_end, 'threshold_cents': threshold_cents})
+    return TariffPipeline([stage]).apply(tariff)
+
+
+# Compiled tariff transform pipeline
+#
+# The post-processing above (PEA / network tariff, Flow Power export, export boost,
+# Chip Mode) is described per user as a list of (stage, params) tuples and compiled
+# once per settings fingerprint into per-slot functions. Applying the pipeline is a
+# single pass over the 48 half-hour slots of the buy and sell rates; the apply_*
+# functions still run one stage on their own.
+
+# Per-user compiled pipelines: (user_id, include_chip_mode or 'chip_mode') -> (settings fingerprint, TariffPipeline)
+_pipeline_cache = {}
+_pipeline_cache_lock = threading.Lock()
+
+
+def build_tariff_pipeline_stages(user, include_chip_mode: bool = False) -> List[tuple]:
+    """
+    Describe the tariff post-processing a user's settings call for.
+
+    Stages are returned in the order they are applied: Flow Power PEA (or network
+    tariff for AEMO without PEA), Flow Power export rates, Amber export boost and,
+    when include_chip_mode is set, Amber Chip Mode.
+
+    Args:
+        user: User object with provider settings
+        include_chip_mode: Whether to add the Chip Mode stage (not applied by the sync)
+
+    Returns:
+        List of (stage_name, params) tuples
+    """
+    stages = []
+    provider = getattr(user, 'electricity_provider', 'amber')
+
+    if provider == 'flow_power':
+        # Check if PEA (Price Efficiency Adjustment) is enabled
+        if getattr(user, 'pea_enabled', True):  # Default True for Flow Power
+            stages.append(('flow_power_pea', {
+                'base_rate': getattr(user, 'flow_power_base_rate', FLOW_POWER_DEFAULT_BASE_RATE) or FLOW_POWER_DEFAULT_BASE_RATE,
+                'custom_pea': getattr(user, 'pea_custom_value', None),
+            }))
+        elif getattr(user, 'flow_power_price_source', None) == 'aemo':
+            # PEA disabled + AEMO: fall back to network tariff calculation
+            # (Amber prices already include network fees, no fallback needed)
+            stages.append(network_tariff_stage(user))
+
+        if getattr(user, 'flow_power_state', None):
+            stages.append(('flow_power_export', {'state': user.flow_power_state}))
+
+    if provider == 'amber' and getattr(user, 'export_boost_enabled', False):
+        stages.append(('export_boost', {
+            'offset_cents': getattr(user, 'export_price_offset', 0) or 0,
+            'min_price_cents': getattr(user, 'export_min_price', 0) or 0,
+            'boost_start': getattr(user, 'export_boost_start', '17:00') or '17:00',
+            'boost_end': getattr(user, 'export_boost_end', '21:00') or '21:00',
+            'activation_threshold_cents': getattr(user, 'export_boost_threshold', 0) or 0,
+        }))
+
+    if include_chip_mode and provider == 'amber' and getattr(user, 'chip_mode_enabled', False):
+        stages.append(('chip_mode', {
+            'chip_start': getattr(user, 'chip_mode_start', '22:00') or '22:00',
+            'chip_end': getattr(user, 'chip_mode_end', '06:00') or '06:00',
+            'threshold_cents': getattr(user, 'chip_mode_threshold', 30.0) or 30.0,
+        }))
+
+    return stages
+
+
+def _window_slots(start: str, end: str) -> Optional[List[bool]]:
+    """
+    Flag the half-hour slots that fall inside an HH:MM time window.
+
+    Overnight windows (end <= start) wrap past midnight. Returns None if either
+    time can't be parsed.
+    """
     try:
-        start_parts = chip_start.split(":")
-        start_hour, start_minute = int(start_parts[0]), int(start_parts[1])
-        end_parts = chip_end.split(":")
-        end_hour, end_minute = int(end_parts[0]), int(end_parts[1])
-    except (ValueError, IndexError) as err:
-        logger.error(f"Invalid Chip Mode time format: {err}")
-        return tariff
+        start_parts = start.split(":")
+        start_minutes = int(start_parts[0]) * 60 + int(start_parts[1])
+        end_parts = end.split(":")
+        end_minutes = int(end_parts[0]) * 60 + int(end_parts[1])
+    except (ValueError, IndexError):
+        return None
+
+    flags = []
+    for slot in range(SLOTS_PER_DAY):
+        period_minutes = slot * 30
+        if end_minutes <= start_minutes:
+            flags.append(period_minutes >= start_minutes or period_minutes < end_minutes)
+        else:
+            flags.append(start_minutes <= period_minutes < end_minutes)
+    return flags
+
+
+def _compile_flow_power_pea(base_rate: float, custom_pea: float = None):
+    """Buy stage: Final Rate = Base Rate + PEA (see apply_flow_power_pea)."""
+    if custom_pea is not None:
+        # Fixed PEA from bills - the same price in every slot
+        fixed = round(max(0, (base_rate + custom_pea) / 100), 4)
+        return lambda slot, price, inputs: fixed
+
+    def pea_slot(slot, price, inputs):
+        pea = inputs['wholesale'][slot] * 100 - FLOW_POWER_PEA_OFFSET
+        return round(max(0, (base_rate + pea) / 100), 4)
+    return pea_slot
+
+
+def _compile_network_manual(tariff_type: str, other_fees, include_gst: bool, flat_rate, peak_rate,
+                            shoulder_rate, offpeak_rate, peak_start: str, peak_end: str,
+                            offpeak_start: str, offpeak_end: str):
+    """Buy stage: wholesale + manual network charge per slot (see apply_network_tariff)."""
+    other_fees = _normalize_network_rate(other_fees, 1.5, "other_fees")
 
-    # Build list of periods within the time window
-    chip_periods = set()
-    for hour in range(24):
-        for minute in [0, 30]:
-            period_minutes = hour * 60 + minute
-            start_minutes = start_hour * 60 + start_minute
-            end_minutes = end_hour * 60 + end_minute
-
-            # Handle overnight windows (e.g., 22:00 to 06:00)
-            if end_minutes <= start_minutes:
-                in_window = period_minutes >= start_minutes or period_minutes < end_minutes
+    if tariff_type == 'flat':
+        network_charges = [_normalize_network_rate(flat_rate, 8.0, "flat_rate")] * SLOTS_PER_DAY
+    else:
+        peak_rate = _normalize_network_rate(peak_rate, 15.0, "peak_rate")
+        shoulder_rate = _normalize_network_rate(shoulder_rate, 5.0, "shoulder_rate")
+        offpeak_rate = _normalize_network_rate(offpeak_rate, 2.0, "offpeak_rate")
+
+        peak_start_hour, peak_start_min = map(int, peak_start.split(':'))
+        peak_end_hour, peak_end_min = map(int, peak_end.split(':'))
+        offpeak_start_hour, offpeak_start_min = map(int, offpeak_start.split(':'))
+        offpeak_end_hour, offpeak_end_min = map(int, offpeak_end.split(':'))
+        peak_start_mins = peak_start_hour * 60 + peak_start_min
+        peak_end_mins = peak_end_hour * 60 + peak_end_min
+        offpeak_start_mins = offpeak_start_hour * 60 + offpeak_start_min
+        offpeak_end_mins = offpeak_end_hour * 60 + offpeak_end_min
+
+        network_charges = []
+        for slot in range(SLOTS_PER_DAY):
+            time_minutes = slot * 30
+            if peak_start_mins <= time_minutes < peak_end_mins:
+                network_charges.append(peak_rate)
+            elif offpeak_start_mins <= time_minutes < offpeak_end_mins:
+                network_charges.append(offpeak_rate)
             else:
-                in_window = start_minutes <= period_minutes < end_minutes
+                network_charges.append(shoulder_rate)
 
-            if in_window:
-                chip_periods.add(f"PERIOD_{hour:02d}_{minute:02d}")
+    # Total charge per slot in c/kWh: network + other fees (+ 10% GST)
+    charges = []
+    for network_charge_cents in network_charges:
+        total_charge_cents = network_charge_cents + other_fees
+        if include_gst:
+            total_charge_cents = total_charge_cents * 1.10
+        charges.append(total_charge_cents)
 
-    logger.debug(
-        f"Chip Mode active for {len(chip_periods)} periods ({chip_start} to {chip_end}): "
-        f"threshold={threshold_cents:.1f}c"
-    )
+    logger.info(f"Network tariff (manual): type={tariff_type}, other_fees={other_fees}c/kWh, gst={include_gst}")
 
-    suppressed_count = 0
-    allowed_count = 0
+    def network_slot(slot, price, inputs):
+        return max(0, round((price * 100 + charges[slot]) / 100, 4))
+    return network_slot
 
-    # Process sell prices in the sell_tariff structure
-    sell_tariff = tariff.get("sell_tariff", {})
-    for season, season_data in sell_tariff.get("energy_charges", {}).items():
-        sell_prices = season_data.get("rates", {})
 
-        for period in chip_periods:
-            if period not in sell_prices:
-                continue
+def _compile_network_library(distributor: str, tariff_code: str):
+    """Buy stage: retail price from the cached aemo_to_tariff network charge table."""
+    library_distributor, tariff_code = _library_tariff_args(distributor, tariff_code)
+    logger.info(f"Network tariff (library): distributor={distributor} -> {library_distributor}, tariff_code={tariff_code}")
 
-            original_dollars = sell_prices[period]
-            original_cents = original_dollars * 100
+    def network_slot(slot, price, inputs):
+        now = inputs['now']
+        table = get_network_charge_table(library_distributor, tariff_code, now.date())
+        try:
+            return _network_library_price(table, slot, now, library_distributor, tariff_code, price)
+        except Exception as e:
+            logger.warning(f"{PERIOD_KEYS[slot]}: Library error for {library_distributor}/{tariff_code}: {e}, keeping wholesale price")
+            return price
+    return network_slot
 
-            # If price is at or above threshold, allow export (keep original price)
-            if original_cents >= threshold_cents:
-                allowed_count += 1
-                logger.debug(
-                    f"{period}: Chip Mode ALLOW - price {original_cents:.2f}c >= threshold {threshold_cents:.1f}c"
-                )
+
+def _compile_flow_power_export(state: str):
+    """Sell stage: fixed Happy Hour export rate, 0c otherwise (see apply_flow_power_export)."""
+    export_rate = FLOW_POWER_EXPORT_RATES.get(state, 0.45)  # Default to 45c if unknown state
+    rates = [export_rate if key in FLOW_POWER_HAPPY_HOUR_PERIODS else 0.0 for key in PERIOD_KEYS]
+    return lambda slot, price: rates[slot]
+
+
+def _compile_export_boost(offset_cents: float, min_price_cents: float, boost_start: str,
+                          boost_end: str, activation_threshold_cents: float):
+    """Sell stage: offset and floor export prices inside the boost window (see apply_export_boost)."""
+    if offset_cents == 0 and min_price_cents == 0:
+        return None
+
+    in_window = _window_slots(boost_start, boost_end)
+    if in_window is None:
+        logger.error(f"Invalid export boost time format: {boost_start}-{boost_end}")
+        return None
+
+    def boost_slot(slot, price):
+        if not in_window[slot]:
+            return price
+        original_cents = price * 100
+        # Skip boost if actual price is below activation threshold
+        if activation_threshold_cents > 0 and original_cents < activation_threshold_cents:
+            return price
+        return round(max(original_cents + offset_cents, min_price_cents) / 100, 4)
+    return boost_slot
+
+
+def _compile_chip_mode(chip_start: str, chip_end: str, threshold_cents: float):
+    """Sell stage: zero export prices below threshold inside the window (see apply_chip_mode)."""
+    in_window = _window_slots(chip_start, chip_end)
+    if in_window is None:
+        logger.error(f"Invalid Chip Mode time format: {chip_start}-{chip_end}")
+        return None
+
+    def chip_slot(slot, price):
+        if in_window[slot] and price * 100 < threshold_cents:
+            return 0.0
+        return price
+    return chip_slot
+
+
+_STAGE_COMPILERS = {
+    'flow_power_pea': ('buy', _compile_flow_power_pea),
+    'network_manual': ('buy', _compile_network_manual),
+    'network_library': ('buy', _compile_network_library),
+    'flow_power_export': ('sell', _compile_flow_power_export),
+    'export_boost': ('sell', _compile_export_boost),
+    'chip_mode': ('sell', _compile_chip_mode),
+}
+
+
+def _fuse(slot_functions: list):
+    """Chain per-slot functions into one, or None if there are none."""
+    if not slot_functions:
+        return None
+    if len(slot_functions) == 1:
+        return slot_functions[0]
+
+    def fused(slot, price, *args):
+        for slot_function in slot_functions:
+            price = slot_function(slot, price, *args)
+        return price
+    return fused
+
+
+class TariffPipeline:
+    """A user's tariff post-processing, compiled into fused per-slot buy and sell functions."""
+
+    def __init__(self, stages: List[tuple]):
+        self.stages = stages
+        self.stage_names = [name for name, _ in stages]
+        self.needs_wholesale = any(
+            name == 'flow_power_pea' and params.get('custom_pea') is None for name, params in stages
+        )
+
+        buy_functions = []
+        sell_functions = []
+        for name, params in stages:
+            side, compile_stage = _STAGE_COMPILERS[name]
+            slot_function = compile_stage(**params)
+            if slot_function is None:
                 continue
+            (buy_functions if side == 'buy' else sell_functions).append(slot_function)
 
-            # Price is below threshold - suppress export by setting price to 0
-            suppressed_count += 1
-            logger.debug(
-                f"{period}: Chip Mode SUPPRESS - price {original_cents:.2f}c < threshold {threshold_cents:.1f}c → 0c"
-            )
-            sell_prices[period] = 0.0
+        self._buy = _fuse(buy_functions)
+        self._sell = _fuse(sell_functions)
+
+    def apply(self, tariff: Dict, forecast_data: list = None, wholesale_prices: Dict[str, float] = None) -> Dict:
+        """
+        Apply every stage to a converted tariff in one pass over the slots.
+
+        Args:
+            tariff: Tesla tariff from AmberTariffConverter (modified in place)
+            forecast_data: Forecast the tariff was built from (for PEA wholesale prices)
+            wholesale_prices: PERIOD_HH_MM -> wholesale $/kWh, instead of reading
+                them from forecast_data (see get_wholesale_lookup)
+
+        Returns:
+            The adjusted tariff
+        """
+        if not tariff or (self._buy is None and self._sell is None):
+            return tariff
+
+        buy_rates = tariff.get('energy_charges', {}).get('Summer', {}).get('rates') if self._buy else None
+        sell_rates = tariff.get('sell_tariff', {}).get('energy_charges', {}).get('Summer', {}).get('rates') if self._sell else None
+
+        # Per-apply inputs shared by the buy stages
+        inputs = {'now': datetime.now(), 'wholesale': None}
+        if self.needs_wholesale:
+            wholesale_lookup = wholesale_prices if wholesale_prices is not None else get_wholesale_lookup(forecast_data or [])
+            inputs['wholesale'] = [wholesale_lookup.get(key, 0.08) for key in PERIOD_KEYS]  # Default 8c if missing
+
+        buy_modified = 0
+        sell_modified = 0
+        for slot, key in enumerate(PERIOD_KEYS):
+            if buy_rates and key in buy_rates:
+                price = buy_rates[key]
+                new_price = self._buy(slot, price, inputs)
+                if new_price != price:
+                    buy_modified += 1
+                buy_rates[key] = new_price
+            if sell_rates and key in sell_rates:
+                price = sell_rates[key]
+                new_price = self._sell(slot, price)
+                if new_price != price:
+                    sell_modified += 1
+                sell_rates[key] = new_price
+
+        if 'network_library' in self.stage_names and buy_rates and buy_modified == 0:
+            logger.error(f"Network tariff library failed for ALL {len(buy_rates)} periods! Check distributor/tariff code settings")
 
-    # Log summary
-    if suppressed_count > 0 or allowed_count > 0:
         logger.info(
-            f"Chip Mode: {suppressed_count} periods suppressed (export blocked), "
-            f"{allowed_count} periods allowed (above {threshold_cents:.1f}c threshold)"
+            f"Tariff pipeline [{' -> '.join(self.stage_names)}] applied: "
+            f"{buy_modified} buy / {sell_modified} sell periods modified"
         )
-    else:
-        logger.info("Chip Mode: no periods in configured window")
+        return tariff
+
+
+def get_tariff_pipeline(user, include_chip_mode: bool = False) -> TariffPipeline:
+    """
+    Get the compiled tariff pipeline for a user.
 
-    return tariff
+    Pipelines are compiled once and reused until tariff_settings_fingerprint(user)
+    changes, so a sync only pays for the single pass in TariffPipeline.apply().
+
+    Args:
+        user: User object with provider settings
+        include_chip_mode: Whether to include the Chip Mode stage
+
+    Returns:
+        TariffPipeline for the user's current settings
+    """
+    cache_key = (getattr(user, 'id', None), include_chip_mode)
+    fingerprint = tariff_settings_fingerprint(user)
+
+    with _pipeline_cache_lock:
+        cached = _pipeline_cache.get(cache_key)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+
+    pipeline = TariffPipeline(build_tariff_pipeline_stages(user, include_chip_mode))
+    if cache_key[0] is not None:
+        with _pipeline_cache_lock:
+            _pipeline_cache[cache_key] = (fingerprint, pipeline)
+
+    logger.info(f"Compiled tariff pipeline for {getattr(user, 'email', 'user')}: {' -> '.join(pipeline.stage_names) or 'no stages'}")
+    return pipeline
+
+
+def get_chip_mode_pipeline(user) -> TariffPipeline:
+    """
+    Get the Chip Mode stage on its own, compiled for a user.
+
+    Chip Mode is the last stage and the sync doesn't apply it, so applying this to
+    a tariff from get_tariff_pipeline(user) equals get_tariff_pipeline(user, True).
+    """
+    cache_key = (getattr(user, 'id', None), 'chip_mode')
+    fingerprint = tariff_settings_fingerprint(user)
+
+    with _pipeline_cache_lock:
+        cached = _pipeline_cache.get(cache_key)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+
+    stages = [stage for stage in build_tariff_pipeline_stages(user, include_chip_mode=True) if stage[0] == 'chip_mode']
+    pipeline = TariffPipeline(stages)
+    if cache_key[0] is not None:
+        with _pipeline_cache_lock:
+            _pipeline_cache[cache_key] = (fingerprint, pipeline)
+    return pipeline
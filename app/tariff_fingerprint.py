@@ -0,0 +1,203 @@
+# app/tariff_fingerprint.py
+"""Canonical fingerprints and structural diffs of Tesla tariff structures"""
+import json
+import logging
+from array import array
+from typing import Dict, List, Optional
+
+from app.tariff_converter import PERIOD_KEYS, build_tou_periods
+
+# xxhash (requirements.txt) is the fast non-cryptographic hash; BLAKE2b is used if it isn't installed
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    import hashlib
+    XXHASH_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# channel -> (path to the tariff part, charges key)
+RATE_CHANNELS = (
+    ('buy', (), 'energy_charges'),
+    ('sell', ('sell_tariff',), 'energy_charges'),
+    ('demand', (), 'demand_charges'),
+    ('sell_demand', ('sell_tariff',), 'demand_charges'),
+)
+
+_CHARGE_KEYS = ('energy_charges', 'demand_charges', 'sell_tariff')
+
+# TOU period window fields (missing fields mean 0 to Tesla)
+_WINDOW_KEYS = ('fromDayOfWeek', 'toDayOfWeek', 'fromHour', 'fromMinute', 'toHour', 'toMinute')
+_WINDOW_KEY_SET = frozenset(_WINDOW_KEYS)
+
+
+def _new_hasher():
+    """128-bit hasher: xxh3_128 when xxhash is installed, else BLAKE2b (both 32 hex chars)."""
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def _tariff_part(tariff: Dict, path: tuple) -> Dict:
+    for key in path:
+        tariff = tariff.get(key) or {}
+    return tariff
+
+
+def tariff_rate_tables(tariff: Dict) -> Dict[str, Dict[str, Dict]]:
+    """
+    Rates of a tariff by channel and season.
+
+    Returns:
+        {'buy'|'sell'|'demand'|'sell_demand': {season: {period: rate}}}, omitting
+        seasons without rates (e.g. the empty Winter season PowerSync sends)
+    """
+    tables = {}
+    for channel, path, charges_key in RATE_CHANNELS:
+        charges = _tariff_part(tariff, path).get(charges_key) or {}
+        tables[channel] = {
+            season: charge['rates']
+            for season, charge in charges.items()
+            if isinstance(charge, dict) and charge.get('rates')
+        }
+    return tables
+
+
+def _slot_array(rates: Dict) -> Optional[bytes]:
+    """Rates of a 48-slot PERIOD_HH_MM season packed as doubles in slot order, else None."""
+    if len(rates) != len(PERIOD_KEYS):
+        return None
+    slots = [rates.get(period) for period in PERIOD_KEYS]
+    try:
+        return array('d', slots).tobytes()
+    except TypeError:
+        return None  # Missing period or non-numeric rate
+
+
+_powersync_tou_periods = None  # The 48 half-hour TOU periods every converted tariff carries
+
+
+def _tou_periods_key(tou_periods: Dict) -> str:
+    """TOU period names and windows, with the usual integer windows packed as a short array."""
+    global _powersync_tou_periods
+    if _powersync_tou_periods is None:
+        _powersync_tou_periods = build_tou_periods(PERIOD_KEYS)
+    # Dict equality runs in C - far cheaper than canonicalizing the same 48 windows every sync
+    if tou_periods == _powersync_tou_periods:
+        return 'powersync-48'
+
+    names = sorted(tou_periods)
+    packed = array('h')
+    other = []
+    for name in names:
+        windows = (tou_periods[name] or {}).get('periods', [])
+        packed.append(len(windows))
+        for window in windows:
+            if window.keys() <= _WINDOW_KEY_SET:
+                try:
+                    packed.extend([window.get(key, 0) for key in _WINDOW_KEYS])
+                    continue
+                except (TypeError, OverflowError):
+                    pass
+            packed.extend([-1] * len(_WINDOW_KEYS))
+            other.append((name, sorted(window.items())))
+    return f'{",".join(names)}|{packed.tobytes().hex()}|{other!r}'
+
+
+def _structure_key(tariff: Dict) -> bytes:
+    """Everything except the rates: names, daily charges, seasons and TOU period windows."""
+    structure = {}
+    for prefix, part in (('', tariff), ('sell_tariff.', tariff.get('sell_tariff') or {})):
+        for key, value in part.items():
+            if key in _CHARGE_KEYS:
+                continue
+            if key == 'seasons' and isinstance(value, dict):
+                value = {
+                    season: dict(spec, tou_periods=_tou_periods_key(spec.get('tou_periods') or {}))
+                    if isinstance(spec, dict) else spec
+                    for season, spec in value.items()
+                }
+            structure[prefix + key] = value
+
+        # Charge entries other than rates (rare, but part of the tariff identity)
+        for charges_key in ('energy_charges', 'demand_charges'):
+            for season, charge in (part.get(charges_key) or {}).items():
+                if not isinstance(charge, dict) or charge.keys() != {'rates'}:
+                    extra = {k: v for k, v in charge.items() if k != 'rates'} if isinstance(charge, dict) else charge
+                    structure[f'{prefix}{charges_key}.{season}'] = extra
+
+    return json.dumps(structure, sort_keys=True, default=str).encode()
+
+
+def tariff_fingerprint(tariff: Dict) -> str:
+    """
+    Canonical 128-bit fingerprint of a tariff structure (32 hex chars).
+
+    Rates are hashed as numbers, so 0 and 0.0 (or key order) don't change the
+    fingerprint. PowerSync's 48-slot PERIOD_HH_MM seasons are packed as flat
+    double arrays; other rate tables (Tesla utility tariffs) are hashed as sorted
+    (period, rate) pairs. Structural metadata (names, daily charges, seasons and
+    TOU windows) is included, so any change Tesla would see changes the result.
+    """
+    hasher = _new_hasher()
+    for channel, seasons in tariff_rate_tables(tariff).items():
+        for season in sorted(seasons):
+            rates = seasons[season]
+            packed = _slot_array(rates)
+            if packed is not None:
+                hasher.update(f'\x00{channel}/{season}/slots\x00'.encode())
+                hasher.update(packed)
+            else:
+                hasher.update(f'\x00{channel}/{season}/rates\x00'.encode())
+                hasher.update(repr(sorted(
+                    (period, float(rate) if isinstance(rate, (int, float)) else rate)
+                    for period, rate in rates.items()
+                )).encode())
+    hasher.update(b'\x00structure\x00')
+    hasher.update(_structure_key(tariff))
+    return hasher.hexdigest()
+
+
+def diff_tariffs(old: Optional[Dict], new: Dict) -> Dict:
+    """
+    Which periods changed between two tariffs.
+
+    Returns:
+        {
+            'buy'|'sell'|'demand'|'sell_demand': {season: [period, ...]},  # only channels/seasons with changes
+            'structure_changed': bool,  # names, seasons, TOU windows or daily charges differ
+        }
+        With no previous tariff every period of the new one is reported as changed.
+    """
+    old_tables = tariff_rate_tables(old) if old else {}
+    changes = {}
+    for channel, new_seasons in tariff_rate_tables(new).items():
+        old_seasons = old_tables.get(channel, {})
+        channel_changes = {}
+        for season in sorted(set(old_seasons) | set(new_seasons)):
+            old_rates = old_seasons.get(season, {})
+            new_rates = new_seasons.get(season, {})
+            periods = [
+                period for period in _ordered_periods(old_rates, new_rates)
+                if old_rates.get(period) != new_rates.get(period)
+            ]
+            if periods:
+                channel_changes[season] = periods
+        if channel_changes:
+            changes[channel] = channel_changes
+
+    changes['structure_changed'] = old is None or _structure_key(old) != _structure_key(new)
+    return changes
+
+
+def _ordered_periods(old_rates: Dict, new_rates: Dict) -> List[str]:
+    """Periods of both rate tables, PERIOD_HH_MM keys in slot order and others sorted."""
+    periods = set(old_rates) | set(new_rates)
+    slotted = [period for period in PERIOD_KEYS if period in periods]
+    return slotted + sorted(periods.difference(slotted))
+
+
+def count_changed_periods(changes: Dict, channel: str) -> int:
+    """Number of changed periods for a channel in a diff_tariffs() result."""
+    return sum(len(periods) for periods in changes.get(channel, {}).values())
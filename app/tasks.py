@@ -2,12 +2,15 @@
 """Background tasks for automatic syncing"""
 import logging
 import threading
-import hashlib
 from datetime import datetime, timezone
-from app.models import User, PriceRecord, EnergyRecord, SavedTOUProfile
+from app.models import User, PriceRecord, SavedTOUProfile
 from app.api_clients import get_amber_client, get_tesla_client, AEMOAPIClient
 from app.sigenergy_client import get_sigenergy_client, convert_amber_prices_to_sigenergy
-from app.tariff_converter import AmberTariffConverter
+from app.price_intervals import PriceIntervals
+from app.tariff_converter import AmberTariffConverter, get_tariff_pipeline, tariff_settings_fingerprint
+from app.tariff_fingerprint import tariff_fingerprint, diff_tariffs, count_changed_periods
+from app.live_events import publish_curtailment, publish_to_user
+from app.tariff_artifacts import save_tariff_artifact
 import json
 
 logger = logging.getLogger(__name__)
@@ -15,14 +18,13 @@ logger = logging.getLogger(__name__)
 
 def get_tariff_hash(tariff_structure):
     """
-    Generate MD5 hash of tariff structure for deduplication.
+    Generate a fingerprint of the tariff structure for deduplication.
 
     This allows us to skip sending unchanged tariffs to Tesla,
     which prevents duplicate rate plan entries in the Tesla dashboard.
+    See app.tariff_fingerprint.tariff_fingerprint().
     """
-    # Sort keys for consistent hashing
-    tariff_json = json.dumps(tariff_structure, sort_keys=True)
-    return hashlib.md5(tariff_json.encode()).hexdigest()
+    return tariff_fingerprint(tariff_structure)
 
 
 class SyncCoordinator:
@@ -53,6 +55,8 @@ class SyncCoordinator:
         self._last_synced_prices = {}  # {user_id: {'general': price, 'feedIn': price}}
         self._websocket_received = False  # Has WebSocket delivered this period?
         self._baseline_operation_modes = {}  # {user_id: 'autonomous'|'self_consumption'|etc} - mode at interval start
+        self._rolling_tariffs = {}  # {user_id: {...}} - last full tariff build this period (for incremental re-sync)
+        self._synced_tariffs = {}  # {user_id: tariff} - last tariff pushed to the battery (kept across periods)
 
     def _get_current_period(self):
         """Get the current 5-minute period timestamp."""
@@ -70,6 +74,7 @@ class SyncCoordinator:
             self._websocket_received = False
             self._last_synced_prices = {}
             self._baseline_operation_modes = {}  # Clear baseline modes for new period
+            self._rolling_tariffs = {}  # Next period starts with a full forecast fetch
             self._websocket_event.clear()
             self._websocket_data = None
             return True
@@ -214,6 +219,48 @@ class SyncCoordinator:
             self._baseline_operation_modes[user_id] = mode
             logger.debug(f"Stored baseline operation mode for user {user_id}: {mode}")
 
+    def store_rolling_tariff(self, user_id, rolling, forecast, settings):
+        """
+        Keep the rolling prices from a full tariff build for WebSocket re-syncs this period.
+
+        Args:
+            user_id: The user's ID
+            rolling: Output of AmberTariffConverter.build_rolling_prices()
+            forecast: The 30-min forecast (PriceIntervals) the prices were built from
+            settings: tariff_settings_fingerprint() of the user at build time
+        """
+        with self._lock:
+            self._reset_if_new_period()
+            self._rolling_tariffs[user_id] = {
+                'rolling': rolling,
+                'forecast': forecast,
+                'settings': settings,
+            }
+
+    def get_rolling_tariff(self, user_id):
+        """
+        Get the rolling prices stored by the last full tariff build this period.
+
+        Args:
+            user_id: The user's ID
+
+        Returns:
+            dict: {'rolling', 'forecast', 'settings'}, or None if no full build this period
+        """
+        with self._lock:
+            self._reset_if_new_period()
+            return self._rolling_tariffs.get(user_id)
+
+    def record_synced_tariff(self, user_id, tariff):
+        """Remember the tariff last pushed for a user, to report which periods the next sync changes."""
+        with self._lock:
+            self._synced_tariffs[user_id] = tariff
+
+    def get_synced_tariff(self, user_id):
+        """Get the tariff last pushed for a user (None after a restart)."""
+        with self._lock:
+            return self._synced_tariffs.get(user_id)
+
     def get_baseline_mode(self, user_id):
         """
         Get the operation mode that was recorded at the start of this interval.
@@ -249,7 +296,7 @@ def extract_most_recent_actual_interval(forecast_data, timezone_str=None):
     This ensures we always use the most up-to-date pricing to catch spikes.
 
     Args:
-        forecast_data: List of price intervals from Amber API (with resolution=5)
+        forecast_data: Price intervals from Amber API (with resolution=5), as a list or PriceIntervals
         timezone_str: IANA timezone string (e.g., 'Australia/Sydney') for logging
 
     Returns:
@@ -266,86 +313,56 @@ def extract_most_recent_actual_interval(forecast_data, timezone_str=None):
         logger.warning("No forecast data provided to extract pricing interval")
         return None
 
+    intervals = PriceIntervals.of(forecast_data)
+    five_minute = [i for i, duration in enumerate(intervals.durations) if duration == 5]
+
     # PRIORITY 1: Check for CurrentInterval (ongoing period with real-time price)
-    current_intervals = [
-        interval for interval in forecast_data
-        if interval.get('type') == 'CurrentInterval' and interval.get('duration') == 5
-    ]
+    # PRIORITY 2: Fall back to ActualInterval (last completed period), most recent first
+    current_intervals = [i for i in five_minute if intervals.types[i] == 'CurrentInterval']
+    actual_intervals = sorted(
+        (i for i in five_minute if intervals.types[i] == 'ActualInterval'),
+        key=lambda i: intervals.ends[i],
+        reverse=True
+    )
+
+    for label, candidates in (
+        ('CurrentInterval (real-time price)', current_intervals),
+        ('ActualInterval (last completed period)', actual_intervals),
+    ):
+        if not candidates:
+            continue
 
-    if current_intervals:
         # Extract prices by channel (general = buy, feedIn = sell)
         result = {'general': None, 'feedIn': None}
-
-        for interval in current_intervals:
-            channel = interval.get('channelType')
+        for i in candidates:
+            channel = intervals.channels[i]
             if channel in ['general', 'feedIn'] and result[channel] is None:
-                result[channel] = interval
+                result[channel] = intervals.points[intervals.index[i]]
 
             # Stop when we have both channels
             if result['general'] and result['feedIn']:
                 break
 
-        if result['general'] or result['feedIn']:
-            latest_time = current_intervals[0].get('nemTime', 'unknown')
-            general_price = result['general'].get('perKwh') if result['general'] else None
-            feedin_price = result['feedIn'].get('perKwh') if result['feedIn'] else None
-
-            logger.info(f"Using CurrentInterval (real-time price) at {latest_time}")
-            if general_price is not None:
-                logger.info(f"  - General (buy): {general_price:.2f}¢/kWh")
-            if feedin_price is not None:
-                logger.info(f"  - FeedIn (sell): {feedin_price:.2f}¢/kWh")
-
-            return result
-
-    # PRIORITY 2: Fall back to ActualInterval (last completed period)
-    actual_intervals = [
-        interval for interval in forecast_data
-        if interval.get('type') == 'ActualInterval' and interval.get('duration') == 5
-    ]
-
-    if not actual_intervals:
-        logger.warning("No 5-minute CurrentInterval or ActualInterval found - may be too early in period")
-        return None
-
-    # Sort by nemTime descending to get most recent
-    try:
-        actual_intervals.sort(
-            key=lambda x: datetime.fromisoformat(x.get('nemTime', '').replace('Z', '+00:00')),
-            reverse=True
-        )
-    except Exception as e:
-        logger.error(f"Error sorting ActualIntervals by time: {e}")
-        return None
-
-    # Extract prices by channel (general = buy, feedIn = sell)
-    result = {'general': None, 'feedIn': None}
-
-    for interval in actual_intervals:
-        channel = interval.get('channelType')
-        if channel in ['general', 'feedIn'] and result[channel] is None:
-            result[channel] = interval
-
-        # Stop when we have both channels from the same timestamp
-        if result['general'] and result['feedIn']:
-            break
+        if not (result['general'] or result['feedIn']):
+            if label.startswith('ActualInterval'):
+                logger.warning("ActualIntervals found but no valid channel data")
+                return None
+            continue
 
-    # Log what we found
-    if result['general'] or result['feedIn']:
-        latest_time = actual_intervals[0].get('nemTime', 'unknown')
+        latest_time = intervals.points[intervals.index[candidates[0]]].get('nemTime', 'unknown')
         general_price = result['general'].get('perKwh') if result['general'] else None
         feedin_price = result['feedIn'].get('perKwh') if result['feedIn'] else None
 
-        logger.info(f"Using ActualInterval (last completed period) at {latest_time}")
+        logger.info(f"Using {label} at {latest_time}")
         if general_price is not None:
             logger.info(f"  - General (buy): {general_price:.2f}¢/kWh")
         if feedin_price is not None:
             logger.info(f"  - FeedIn (sell): {feedin_price:.2f}¢/kWh")
 
         return result
-    else:
-        logger.warning("ActualIntervals found but no valid channel data")
-        return None
+
+    logger.warning("No 5-minute CurrentInterval or ActualInterval found - may be too early in period")
+    return None
 
 
 def sync_initial_forecast():
@@ -401,6 +418,56 @@ def sync_all_users():
     sync_rest_api_check(check_name="legacy fallback")
 
 
+def _apply_tariff_transforms(tariff, user, forecast_30min):
+    """
+    Apply the provider-specific post-processing to a converted tariff.
+
+    Flow Power PEA (or network tariff for AEMO without PEA), Flow Power export rates
+    and Amber export boost, in that order, via the user's compiled tariff pipeline.
+
+    Args:
+        tariff: Tesla tariff from AmberTariffConverter
+        user: User object with provider settings
+        forecast_30min: Forecast the tariff was built from (for PEA wholesale prices)
+
+    Returns:
+        The adjusted tariff
+    """
+    return get_tariff_pipeline(user).apply(tariff, forecast_30min)
+
+
+def _build_incremental_tariff(user, current_actual_interval):
+    """
+    Rebuild a user's tariff from this period's cached rolling prices with only the
+    current 30-min period (and spike-affected periods) updated from live prices.
+
+    Args:
+        user: User object
+        current_actual_interval: Dict with 'general' and 'feedIn' live interval data
+
+    Returns:
+        (tariff, forecast_30min), or (None, None) if a full sync is needed
+    """
+    cached = _sync_coordinator.get_rolling_tariff(user.id)
+    if not cached:
+        return None, None
+
+    if cached['settings'] != tariff_settings_fingerprint(user):
+        logger.info(f"Tariff settings changed for {user.email} - doing full re-sync")
+        return None, None
+
+    converter = AmberTariffConverter()
+    rolling = converter.patch_current_period(cached['rolling'], current_actual_interval)
+    if rolling is None:
+        return None, None
+
+    tariff = converter.tariff_from_rolling_prices(rolling, user)
+    tariff = _apply_tariff_transforms(tariff, user, cached['forecast'])
+
+    logger.info(f"⚡ Incremental re-sync for {user.email}: current period patched, forecast not re-fetched")
+    return tariff, cached['forecast']
+
+
 def _sync_all_users_internal(websocket_data, sync_mode='initial_forecast'):
     """
     Internal sync logic with smart price-aware re-sync.
@@ -586,105 +653,83 @@ def _sync_all_users_internal(websocket_data, sync_mode='initial_forecast'):
                         continue
                     logger.info(f"🔄 Price changed for {user.email} - proceeding with re-sync")
 
-            # Step 2: Fetch forecast for TOU schedule building
-            # Request 96 periods (48 hours) for AEMO to ensure rolling 24h window is fully covered
-            if use_aemo:
-                # AEMO mode: Get forecast from AEMO API
-                aemo_client = AEMOAPIClient()
-                forecast_30min = aemo_client.get_price_forecast(user.flow_power_state, periods=96)
-                if not forecast_30min:
-                    logger.error(f"Failed to fetch AEMO forecast for user {user.email} (region: {user.flow_power_state})")
-                    error_count += 1
-                    continue
-                logger.info(f"✅ AEMO forecast: {len(forecast_30min) // 2} periods for {user.flow_power_state}")
-            else:
-                # Amber mode: Get forecast from Amber API with 30-min resolution
-                forecast_30min = amber_client.get_price_forecast(next_hours=48, resolution=30)
-                if not forecast_30min:
-                    logger.error(f"Failed to fetch Amber forecast for user {user.email}")
+            # Stage 2 fast path: only the current period's price changes on a WebSocket update,
+            # so patch it into the rolling prices from this period's full sync instead of
+            # re-fetching and re-converting the forecast. Sigenergy builds its prices from the
+            # raw forecast rather than a Tesla tariff, so it always takes the full path
+            tariff = None
+            if sync_mode == 'websocket_update' and current_actual_interval and battery_system != 'sigenergy':
+                tariff, forecast_30min = _build_incremental_tariff(user, current_actual_interval)
+
+            if tariff is None:
+                # Step 2: Fetch forecast for TOU schedule building
+                # Request 96 periods (48 hours) for AEMO to ensure rolling 24h window is fully covered
+                if use_aemo:
+                    # AEMO mode: Get forecast from AEMO API
+                    aemo_client = AEMOAPIClient()
+                    forecast_30min = aemo_client.get_price_forecast(user.flow_power_state, periods=96)
+                    if not forecast_30min:
+                        logger.error(f"Failed to fetch AEMO forecast for user {user.email} (region: {user.flow_power_state})")
+                        error_count += 1
+                        continue
+                    logger.info(f"✅ AEMO forecast: {len(forecast_30min) // 2} periods for {user.flow_power_state}")
+                else:
+                    # Amber mode: Get forecast from Amber API with 30-min resolution
+                    forecast_30min = amber_client.get_price_forecast(next_hours=48, resolution=30)
+                    if not forecast_30min:
+                        logger.error(f"Failed to fetch Amber forecast for user {user.email}")
+                        error_count += 1
+                        continue
+
+                # Parse the forecast once - the Tesla/Sigenergy converters and PEA share it
+                forecast_30min = PriceIntervals.of(forecast_30min)
+
+                # Fetch Powerwall timezone from site_info
+                # This ensures time alignment with the Powerwall's actual location
+                powerwall_tz = None
+                site_info = tesla_client.get_site_info(user.tesla_energy_site_id)
+                if site_info:
+                    powerwall_tz = site_info.get('installation_time_zone')
+                    if powerwall_tz:
+                        logger.info(f"Using Powerwall timezone: {powerwall_tz}")
+                    else:
+                        logger.warning(f"No installation_time_zone in site_info for {user.email}")
+
+                    # Check for firmware updates and notify if changed
+                    firmware_version = site_info.get('version')
+                    if firmware_version:
+                        try:
+                            from app.push_notifications import check_and_notify_firmware_change
+                            check_and_notify_firmware_change(user, firmware_version)
+                        except Exception as e:
+                            logger.warning(f"Error checking firmware change: {e}")
+                else:
+                    logger.warning(f"Failed to fetch site_info for {user.email}")
+
+                # Convert Amber prices to Tesla tariff format using 30-min forecast
+                # The current_actual_interval (from 5-min data) will be injected for the current period only
+                converter = AmberTariffConverter()
+                rolling = converter.build_rolling_prices(
+                    forecast_30min,
+                    user=user,
+                    powerwall_timezone=powerwall_tz,
+                    current_actual_interval=current_actual_interval
+                )
+                tariff = converter.tariff_from_rolling_prices(rolling, user) if rolling else None
+
+                if not tariff:
+                    logger.error(f"Failed to convert tariff for user {user.email}")
                     error_count += 1
                     continue
 
-            # Fetch Powerwall timezone from site_info
-            # This ensures time alignment with the Powerwall's actual location
-            powerwall_tz = None
-            site_info = tesla_client.get_site_info(user.tesla_energy_site_id)
-            if site_info:
-                powerwall_tz = site_info.get('installation_time_zone')
-                if powerwall_tz:
-                    logger.info(f"Using Powerwall timezone: {powerwall_tz}")
-                else:
-                    logger.warning(f"No installation_time_zone in site_info for {user.email}")
-
-                # Check for firmware updates and notify if changed
-                firmware_version = site_info.get('version')
-                if firmware_version:
-                    try:
-                        from app.push_notifications import check_and_notify_firmware_change
-                        check_and_notify_firmware_change(user, firmware_version)
-                    except Exception as e:
-                        logger.warning(f"Error checking firmware change: {e}")
-            else:
-                logger.warning(f"Failed to fetch site_info for {user.email}")
-
-            # Convert Amber prices to Tesla tariff format using 30-min forecast
-            # The current_actual_interval (from 5-min data) will be injected for the current period only
-            converter = AmberTariffConverter()
-            tariff = converter.convert_amber_to_tesla_tariff(
-                forecast_30min,
-                user=user,
-                powerwall_timezone=powerwall_tz,
-                current_actual_interval=current_actual_interval
-            )
+                # Keep the rolling prices so WebSocket updates this period only patch the current period
+                if not use_aemo:
+                    _sync_coordinator.store_rolling_tariff(user.id, rolling, forecast_30min, tariff_settings_fingerprint(user))
 
-            if not tariff:
-                logger.error(f"Failed to convert tariff for user {user.email}")
-                error_count += 1
-                continue
+                tariff = _apply_tariff_transforms(tariff, user, forecast_30min)
 
-            # Apply Flow Power PEA pricing (works with both AEMO and Amber price sources)
-            if user.electricity_provider == 'flow_power':
-                # Check if PEA (Price Efficiency Adjustment) is enabled
-                pea_enabled = getattr(user, 'pea_enabled', True)  # Default True for Flow Power
-
-                if pea_enabled:
-                    # Use Flow Power PEA pricing model: Base Rate + PEA
-                    # Works with both AEMO (raw wholesale) and Amber (wholesaleKWHPrice forecast)
-                    from app.tariff_converter import apply_flow_power_pea, get_wholesale_lookup
-
-                    base_rate = getattr(user, 'flow_power_base_rate', 34.0) or 34.0
-                    custom_pea = getattr(user, 'pea_custom_value', None)
-
-                    # Build wholesale price lookup from forecast data
-                    # get_wholesale_lookup() handles both AEMO and Amber data formats
-                    wholesale_prices = get_wholesale_lookup(forecast_30min)
-
-                    price_source = user.flow_power_price_source or 'amber'
-                    logger.info(f"Applying Flow Power PEA for {user.email} ({price_source}): base_rate={base_rate}c, custom_pea={custom_pea}")
-                    tariff = apply_flow_power_pea(tariff, wholesale_prices, base_rate, custom_pea)
-                elif user.flow_power_price_source == 'aemo':
-                    # PEA disabled + AEMO: fall back to network tariff calculation
-                    # (Amber prices already include network fees, no fallback needed)
-                    from app.tariff_converter import apply_network_tariff
-                    logger.info(f"Applying network tariff to AEMO wholesale prices for {user.email} (PEA disabled)")
-                    tariff = apply_network_tariff(tariff, user)
-
-            # Apply Flow Power export rates if user is on Flow Power
-            if user.electricity_provider == 'flow_power' and user.flow_power_state:
-                from app.tariff_converter import apply_flow_power_export
-                logger.info(f"Applying Flow Power export rates for {user.email} (state: {user.flow_power_state})")
-                tariff = apply_flow_power_export(tariff, user.flow_power_state)
-
-            # Apply export price boost for Amber users (if enabled)
-            if user.electricity_provider == 'amber' and getattr(user, 'export_boost_enabled', False):
-                from app.tariff_converter import apply_export_boost
-                offset = getattr(user, 'export_price_offset', 0) or 0
-                min_price = getattr(user, 'export_min_price', 0) or 0
-                boost_start = getattr(user, 'export_boost_start', '17:00') or '17:00'
-                boost_end = getattr(user, 'export_boost_end', '21:00') or '21:00'
-                threshold = getattr(user, 'export_boost_threshold', 0) or 0
-                logger.info(f"Applying export boost for {user.email}: offset={offset}c, min={min_price}c, threshold={threshold}c, window={boost_start}-{boost_end}")
-                tariff = apply_export_boost(tariff, offset, min_price, boost_start, boost_end, threshold)
+            # Share the tariff with /api/tou-schedule, which serves it instead of rebuilding it
+            save_tariff_artifact(user, tariff, current_actual_interval, price_source='aemo' if use_aemo else 'amber')
 
             logger.info(f"Applying tariff for {user.email} with {len(tariff.get('energy_charges', {}).get('Summer', {}).get('rates', {}))} rate periods")
 
@@ -695,11 +740,22 @@ def _sync_all_users_internal(websocket_data, sync_mode='initial_forecast'):
                 success_count += 1  # Count as success since current state is correct
                 continue
 
+            previous_tariff = _sync_coordinator.get_synced_tariff(user.id)
+            if previous_tariff is not None:
+                changes = diff_tariffs(previous_tariff, tariff)
+                logger.info(
+                    f"Tariff changed for {user.email}: {count_changed_periods(changes, 'buy')} buy, "
+                    f"{count_changed_periods(changes, 'sell')} sell periods"
+                    f"{' (structure changed)' if changes['structure_changed'] else ''}"
+                )
+                logger.debug("Changed periods for %s: %s", user.email, changes)
+
             # Apply tariff to appropriate battery system
             if battery_system == 'sigenergy':
-                # Convert forecast data to Sigenergy format (30-min time slots)
-                buy_prices = convert_amber_prices_to_sigenergy(forecast_30min, price_type='buy')
-                sell_prices = convert_amber_prices_to_sigenergy(forecast_30min, price_type='sell')
+                # Convert forecast data to Sigenergy format (30-min time slots), one channel
+                # per direction (general = buy, feedIn = sell) as /api/sigenergy-tariff does
+                buy_prices = convert_amber_prices_to_sigenergy(forecast_30min.channel('general'), price_type='buy')
+                sell_prices = convert_amber_prices_to_sigenergy(forecast_30min.channel('feedIn'), price_type='sell')
 
                 result = battery_client.set_tariff_rate(
                     user.sigenergy_station_id,
@@ -763,6 +819,13 @@ def _sync_all_users_internal(websocket_data, sync_mode='initial_forecast'):
                 user.last_update_status = f"Auto-sync successful ({sync_mode}, {battery_system})"
                 user.last_tariff_hash = tariff_hash  # Save hash for deduplication
                 db.session.commit()
+                _sync_coordinator.record_synced_tariff(user.id, tariff)
+                publish_to_user(user.id, 'sync', {
+                    'success': True,
+                    'mode': sync_mode,
+                    'status': user.last_update_status,
+                    'time': user.last_update_time.isoformat(),
+                })
 
                 # Record the synced price for smart price-change detection
                 if general_price is not None or feedin_price is not None:
@@ -782,12 +845,24 @@ def _sync_all_users_internal(websocket_data, sync_mode='initial_forecast'):
                 success_count += 1
             else:
                 logger.error(f"Failed to apply schedule to {battery_system} for user {user.email}")
+                publish_to_user(user.id, 'sync', {
+                    'success': False,
+                    'mode': sync_mode,
+                    'status': f"Failed to apply schedule to {battery_system}",
+                    'time': datetime.now(timezone.utc).isoformat(),
+                })
                 error_count += 1
 
         except Exception as e:
             logger.error(f"Error syncing schedule for user {user.email}: {e}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
+            publish_to_user(user.id, 'sync', {
+                'success': False,
+                'mode': sync_mode,
+                'status': f"Sync error: {e}",
+                'time': datetime.now(timezone.utc).isoformat(),
+            })
             error_count += 1
             continue
 
@@ -1012,9 +1087,16 @@ def _normalize_rate(rate, default, name="rate"):
 
 
 def _save_price_history_internal(websocket_data):
-    """Internal price history logic shared by both event-driven and cron-fallback paths."""
+    """
+    Internal price history logic shared by both event-driven and cron-fallback paths.
+
+    Prices for every user are collected first, then written with one bulk upsert
+    (duplicates of stored records are skipped by the unique index).
+    """
     from app import db
     from app.api_clients import AEMOAPIClient
+    from app.db_writer import submit_write
+    from app.energy_ledger import save_price_records
 
     logger.info("=== Starting automatic price history collection ===")
 
@@ -1026,6 +1108,7 @@ def _save_price_history_internal(websocket_data):
 
     success_count = 0
     error_count = 0
+    price_rows = []  # PriceRecord column values for every user, written in one upsert
 
     for user in users:
         try:
@@ -1159,53 +1242,39 @@ def _save_price_history_internal(websocket_data):
                 error_count += 1
                 continue
 
-            # Save prices to database
-            records_saved = 0
+            # Push to the user's live event streams (WebSocket prices also go out as they arrive)
+            price_source = 'aemo' if use_aemo else ('websocket' if websocket_data else 'rest')
+            publish_to_user(user.id, 'price', {'prices': prices, 'source': price_source})
+
+            # Collect price records for the bulk upsert below
+            user_rows = 0
             for price_data in prices:
                 try:
                     # Parse NEM time
                     nem_time = datetime.fromisoformat(price_data['nemTime'].replace('Z', '+00:00'))
 
-                    # Check if we already have this exact price record (avoid duplicates)
-                    existing = PriceRecord.query.filter_by(
-                        user_id=user.id,
-                        nem_time=nem_time,
-                        channel_type=price_data.get('channelType')
-                    ).first()
-
-                    if existing:
-                        logger.debug(f"Price record already exists for {user.email} at {nem_time}")
-                        continue
-
-                    # Create new price record
-                    record = PriceRecord(
-                        user_id=user.id,
-                        per_kwh=price_data.get('perKwh'),
-                        spot_per_kwh=price_data.get('spotPerKwh'),
-                        wholesale_kwh_price=price_data.get('wholesaleKWHPrice'),
-                        network_kwh_price=price_data.get('networkKWHPrice'),
-                        market_kwh_price=price_data.get('marketKWHPrice'),
-                        green_kwh_price=price_data.get('greenKWHPrice'),
-                        channel_type=price_data.get('channelType'),
-                        forecast=price_data.get('forecast', False),
-                        nem_time=nem_time,
-                        spike_status=price_data.get('spikeStatus'),
-                        timestamp=datetime.now(timezone.utc)
-                    )
-                    db.session.add(record)
-                    records_saved += 1
+                    price_rows.append({
+                        'user_id': user.id,
+                        'per_kwh': price_data.get('perKwh'),
+                        'spot_per_kwh': price_data.get('spotPerKwh'),
+                        'wholesale_kwh_price': price_data.get('wholesaleKWHPrice'),
+                        'network_kwh_price': price_data.get('networkKWHPrice'),
+                        'market_kwh_price': price_data.get('marketKWHPrice'),
+                        'green_kwh_price': price_data.get('greenKWHPrice'),
+                        'channel_type': price_data.get('channelType'),
+                        'forecast': price_data.get('forecast', False),
+                        'nem_time': nem_time,
+                        'spike_status': price_data.get('spikeStatus'),
+                        'timestamp': datetime.now(timezone.utc),
+                    })
+                    user_rows += 1
 
                 except Exception as e:
-                    logger.error(f"Error saving individual price record for {user.email}: {e}")
+                    logger.error(f"Error preparing individual price record for {user.email}: {e}")
                     continue
 
-            # Commit all records for this user
-            if records_saved > 0:
-                db.session.commit()
-                logger.info(f"✅ Saved {records_saved} price records for user {user.email}")
+            if user_rows > 0:
                 success_count += 1
-            else:
-                logger.debug(f"No new price records to save for user {user.email}")
 
         except Exception as e:
             logger.error(f"Error collecting price history for user {user.email}: {e}")
@@ -1215,6 +1284,23 @@ def _save_price_history_internal(websocket_data):
             error_count += 1
             continue
 
+    # Write every user's records in one statement per batch; existing records are skipped.
+    # The database writer commits it, batched with any other queued background writes,
+    # and prices the energy ledger intervals the new actual prices cover.
+    if price_rows:
+        try:
+            records_saved = submit_write(save_price_records, price_rows).result(timeout=60)
+            logger.info(f"✅ Saved {records_saved} new price records ({len(price_rows) - records_saved} already stored) for {success_count} users")
+        except Exception as e:
+            logger.error(f"Error saving price history: {e}")
+            import traceback
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            db.session.rollback()
+            error_count += success_count
+            success_count = 0
+    else:
+        logger.debug("No price records to save")
+
     logger.info(f"=== Price history collection completed: {success_count} users successful, {error_count} errors ===")
     return success_count, error_count
 
@@ -1274,7 +1360,7 @@ def _collect_tesla_energy(user) -> bool:
     Returns:
         True if successful, False if error, None if not configured
     """
-    from app import db
+    from app.energy_buffer import buffer_energy_sample
 
     if not user.tesla_energy_site_id:
         logger.debug(f"Skipping user {user.email} - no Tesla site ID")
@@ -1301,21 +1387,27 @@ def _collect_tesla_energy(user) -> bool:
     load_power = site_status.get('load_power', 0.0)
     battery_level = site_status.get('percentage_charged', 0.0)
 
-    # Create energy record
-    record = EnergyRecord(
-        user_id=user.id,
-        solar_power=solar_power,
-        battery_power=battery_power,
-        grid_power=grid_power,
-        load_power=load_power,
-        battery_level=battery_level,
-        timestamp=datetime.now(timezone.utc)
-    )
-
-    db.session.add(record)
-    db.session.commit()
-
-    logger.debug(f"✅ Saved Tesla energy record for user {user.email}: Solar={solar_power}W Grid={grid_power}W Battery={battery_power}W Load={load_power}W")
+    # Buffer the sample - it is written with others in one batched transaction
+    timestamp = datetime.now(timezone.utc)
+    buffer_energy_sample(user.id, {
+        'solar_power': solar_power,
+        'battery_power': battery_power,
+        'grid_power': grid_power,
+        'load_power': load_power,
+        'battery_level': battery_level,
+        'timestamp': timestamp,
+    }, user.timezone)
+    # Pushed to the user's live event streams as a power-flow snapshot
+    publish_to_user(user.id, 'power', {
+        'solar_power': solar_power,
+        'battery_power': battery_power,
+        'grid_power': grid_power,
+        'load_power': load_power,
+        'percentage_charged': battery_level,
+        'timestamp': timestamp.isoformat(),
+    })
+
+    logger.debug(f"✅ Buffered Tesla energy record for user {user.email}: Solar={solar_power}W Grid={grid_power}W Battery={battery_power}W Load={load_power}W")
     return True
 
 
@@ -1325,7 +1417,7 @@ def _collect_sigenergy_energy(user) -> bool:
     Returns:
         True if successful, False if error, None if not configured
     """
-    from app import db
+    from app.energy_buffer import buffer_energy_sample
     from app.sigenergy_modbus import get_sigenergy_modbus_client
 
     if not user.sigenergy_modbus_host:
@@ -1353,22 +1445,87 @@ def _collect_sigenergy_energy(user) -> bool:
     load_power = status.get('load_power', 0.0)
     battery_level = status.get('percentage_charged', 0.0)
 
-    # Create energy record
-    record = EnergyRecord(
-        user_id=user.id,
-        solar_power=solar_power,
-        battery_power=battery_power,
-        grid_power=grid_power,
-        load_power=load_power,
-        battery_level=battery_level,
-        timestamp=datetime.now(timezone.utc)
-    )
+    # Buffer the sample - it is written with others in one batched transaction
+    timestamp = datetime.now(timezone.utc)
+    buffer_energy_sample(user.id, {
+        'solar_power': solar_power,
+        'battery_power': battery_power,
+        'grid_power': grid_power,
+        'load_power': load_power,
+        'battery_level': battery_level,
+        'timestamp': timestamp,
+    }, user.timezone)
+    # Pushed to the user's live event streams as a power-flow snapshot
+    publish_to_user(user.id, 'power', {
+        'solar_power': solar_power,
+        'battery_power': battery_power,
+        'grid_power': grid_power,
+        'load_power': load_power,
+        'percentage_charged': battery_level,
+        'timestamp': timestamp.isoformat(),
+    })
+
+    logger.debug(f"✅ Buffered Sigenergy energy record for user {user.email}: Solar={solar_power}W Grid={grid_power}W Battery={battery_power}W Load={load_power}W")
+    return True
 
-    db.session.add(record)
-    db.session.commit()
 
-    logger.debug(f"✅ Saved Sigenergy energy record for user {user.email}: Solar={solar_power}W Grid={grid_power}W Battery={battery_power}W Load={load_power}W")
-    return True
+def backfill_energy_history():
+    """
+    One-off startup job: roll up energy history recorded before the rollup and
+    ledger tables existed (see app.retention.backfill_history).
+    """
+    from app import db
+    from app.retention import backfill_history
+
+    try:
+        totals = backfill_history()
+    except Exception as e:
+        logger.error(f"Energy history backfill failed: {e}", exc_info=True)
+        db.session.rollback()
+        return
+    if totals['users']:
+        logger.info(
+            f"Backfilled energy history for {totals['users']} users: {totals['rollups']} rollups, "
+            f"{totals['ledger_intervals']} ledger intervals"
+        )
+
+
+def apply_history_retention():
+    """
+    Nightly retention of the history tables (see app.retention).
+
+    Folds minute energy samples older than the raw retention window into the
+    rollups and deletes them, thins old rollups and price records, then lets the
+    database reclaim space and refresh statistics. Windows are configured with
+    the HISTORY_RETENTION_* environment variables. On a partitioned PostgreSQL
+    database it also creates the coming months' partitions.
+    """
+    from app import db
+    from app.partitioning import ensure_history_partitions
+    from app.retention import run_retention
+
+    logger.info("=== Starting history retention ===")
+    try:
+        created = ensure_history_partitions(db.session.connection())
+        db.session.commit()
+        if created:
+            logger.info(f"Created history partitions: {', '.join(created)}")
+        summary = run_retention()
+    except Exception as e:
+        logger.error(f"History retention failed: {e}", exc_info=True)
+        db.session.rollback()
+        return
+
+    energy = summary['energy_record']
+    logger.info(
+        f"History retention: {energy['deleted']} energy samples removed over {energy['days']} days "
+        f"({energy['rebuilt_days']} days re-rolled up), rollups removed {summary['energy_rollup']}, "
+        f"price records removed {summary['price_record']}, archived {summary['archive']}, "
+        f"database {summary['maintenance']}"
+        + ("" if summary['complete'] else " - time budget reached, continuing next run")
+    )
+    for table, size in summary['sizes'].items():
+        logger.info(f"  {table}: {size}")
 
 
 def monitor_aemo_prices():
@@ -2408,6 +2565,7 @@ def _apply_inverter_curtailment(user, curtail: bool = True):
             elif not curtail:
                 user.inverter_power_limit_w = None  # Clear when restored
             db.session.commit()
+            publish_curtailment(user)
             if home_load_w is not None and curtail:
                 logger.info(f"✅ INVERTER: Load-following curtailment to {home_load_w}W for {user.email} (state: {new_state})")
             else:
@@ -2484,6 +2642,7 @@ def _apply_sigenergy_curtailment(user, export_earnings: float, import_price: flo
                         user.sigenergy_curtailment_state = 'normal'
                         user.sigenergy_curtailment_updated = datetime.utcnow()
                         db.session.commit()
+                        publish_curtailment(user)
                         logger.info(f"✅ SIGENERGY: Export restored (battery can absorb solar)")
                 return True
 
@@ -2504,6 +2663,7 @@ def _apply_sigenergy_curtailment(user, export_earnings: float, import_price: flo
                 user.sigenergy_export_limit_kw = export_limit_kw
                 user.sigenergy_curtailment_updated = datetime.utcnow()
                 db.session.commit()
+                publish_curtailment(user)
                 logger.info(f"✅ SIGENERGY LOAD-FOLLOWING: Export limit set to {export_limit_kw:.1f}kW (home load) for {user.email}")
                 return True
             else:
@@ -2525,6 +2685,7 @@ def _apply_sigenergy_curtailment(user, export_earnings: float, import_price: flo
                 user.sigenergy_export_limit_kw = None
                 user.sigenergy_curtailment_updated = datetime.utcnow()
                 db.session.commit()
+                publish_curtailment(user)
                 logger.info(f"✅ SIGENERGY: Export limit restored to unlimited for {user.email}")
                 return True
             else:
@@ -2699,6 +2860,7 @@ def solar_curtailment_check():
                     user.current_export_rule = 'never'
                     user.current_export_rule_updated = datetime.utcnow()
                     db.session.commit()
+                    publish_curtailment(user)
 
                 # AC-coupled inverter curtailment uses smart logic:
                 # Only curtail if battery is full (100%) OR import price is negative
@@ -2755,6 +2917,7 @@ def solar_curtailment_check():
                     user.current_export_rule = restore_rule
                     user.current_export_rule_updated = datetime.utcnow()
                     db.session.commit()
+                    publish_curtailment(user)
 
                     # Restore inverter - export is now profitable, check if we should still curtail (import negative)
                     if getattr(user, 'inverter_curtailment_enabled', False):
@@ -2891,6 +3054,7 @@ def solar_curtailment_with_websocket_data(prices_data):
                         user.current_export_rule = 'never'
                         user.current_export_rule_updated = datetime.utcnow()
                         db.session.commit()
+                        publish_curtailment(user)
                     else:
                         logger.error(f"Failed to apply curtailment for {user.email}")
                         error_count += 1
@@ -2932,6 +3096,7 @@ def solar_curtailment_with_websocket_data(prices_data):
                         user.current_export_rule = 'battery_ok'
                         user.current_export_rule_updated = datetime.utcnow()
                         db.session.commit()
+                        publish_curtailment(user)
                     else:
                         logger.error(f"Failed to restore from curtailment for {user.email}")
                         error_count += 1
@@ -25,7 +25,7 @@ class AmberWebSocketClient:
 
     WS_URL = "wss://api-ws.amber.com.au"
 
-    def __init__(self, api_token: str, site_id: str, sync_callback=None):
+    def __init__(self, api_token: str, site_id: str, sync_callback=None, price_listener=None):
         """
         Initialize WebSocket client.
 
@@ -33,6 +33,7 @@ class AmberWebSocketClient:
             api_token: Amber API token (PSK key)
             site_id: Amber site ID to subscribe to
             sync_callback: Optional callback function to trigger Tesla sync on price updates
+            price_listener: Optional callback called with every price update (no cooldown)
         """
         self.api_token = api_token
         self.site_id = site_id
@@ -66,6 +67,9 @@ class AmberWebSocketClient:
         self._last_sync_trigger: Optional[datetime] = None
         self._sync_cooldown_seconds = 60  # Minimum 60s between sync triggers
 
+        # Live price push (called on the event loop thread, so it must not block)
+        self._price_listener = price_listener
+
         logger.info(f"AmberWebSocketClient initialized for site {site_id}")
 
     def start(self):
@@ -195,13 +199,14 @@ class AmberWebSocketClient:
         """
         try:
             # Log raw message for debugging (full message, not truncated)
-            logger.info(f"📨 Raw WebSocket message ({len(message)} bytes): {message}")
+            logger.debug("📨 Raw WebSocket message (%d bytes): %s", len(message), message)
 
             data = json.loads(message)
             self._message_count += 1
 
             # Log parsed message structure
-            logger.info(f"📨 Parsed message keys: {list(data.keys()) if isinstance(data, dict) else type(data)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("📨 Parsed message keys: %s", list(data.keys()) if isinstance(data, dict) else type(data))
 
             # Expected format from Amber WebSocket:
             # {
@@ -258,6 +263,12 @@ class AmberWebSocketClient:
                     if general_price is not None and feedin_price is not None:
                         logger.info(f"💰 Price update: buy={general_price:.2f}¢/kWh, sell={feedin_price:.2f}¢/kWh")
 
+                if self._price_listener and converted_prices:
+                    try:
+                        self._price_listener(converted_prices)
+                    except Exception as e:
+                        logger.error(f"Error in price listener: {e}")
+
                 # Notify coordinator when price data arrives (cooldown prevents notification spam)
                 if self._should_trigger_sync():
                     self._trigger_sync(converted_prices)
@@ -47,10 +47,13 @@ class Config:
 
     # SQLite-specific settings to reduce locking issues
     # Increase busy timeout to 30 seconds (default is 5 seconds)
+    # WAL journaling and the other per-connection pragmas are set in app.db_writer
+    # (PostgreSQL drivers reject these connect_args, so they're only passed to SQLite)
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'connect_args': {
-            'timeout': 30,  # SQLite busy timeout in seconds
-            'check_same_thread': False,  # Allow multi-threaded access
-        },
         'pool_pre_ping': True,  # Verify connections before use
     }
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {
+            'timeout': 30,  # SQLite busy timeout in seconds
+            'check_same_thread': False,  # Allow multi-threaded access
+        }
@@ -0,0 +1,30 @@
+"""Add composite indexes for price and energy history queries
+
+Revision ID: c2v3w4x5y6z7
+Revises: b1u2v3w4x5y6
+Create Date: 2026-01-12 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2v3w4x5y6z7'
+down_revision = 'b1u2v3w4x5y6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # /api/price-history filters by user, channel, forecast flag and a timestamp range
+    op.create_index('ix_price_record_user_channel_forecast_timestamp', 'price_record',
+                    ['user_id', 'channel_type', 'forecast', 'timestamp'], unique=False, if_not_exists=True)
+    # /api/energy-history and the Sigenergy calendar filter by user and a timestamp range
+    op.create_index('ix_energy_record_user_timestamp', 'energy_record',
+                    ['user_id', 'timestamp'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_energy_record_user_timestamp', table_name='energy_record', if_exists=True)
+    op.drop_index('ix_price_record_user_channel_forecast_timestamp', table_name='price_record', if_exists=True)
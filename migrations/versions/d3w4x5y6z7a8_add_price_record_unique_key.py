@@ -0,0 +1,33 @@
+"""Add unique (user_id, nem_time, channel_type) index to price_record
+
+Revision ID: d3w4x5y6z7a8
+Revises: c2v3w4x5y6z7
+Create Date: 2026-01-12 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3w4x5y6z7a8'
+down_revision = 'c2v3w4x5y6z7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Remove duplicates left by the old check-then-insert race, keeping the first record
+    op.execute(
+        "DELETE FROM price_record "
+        "WHERE nem_time IS NOT NULL AND channel_type IS NOT NULL "
+        "AND id NOT IN ("
+        "    SELECT MIN(id) FROM price_record GROUP BY user_id, nem_time, channel_type"
+        ")"
+    )
+    op.create_index('ix_price_record_user_nem_time_channel', 'price_record',
+                    ['user_id', 'nem_time', 'channel_type'], unique=True, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_price_record_user_nem_time_channel', table_name='price_record', if_exists=True)
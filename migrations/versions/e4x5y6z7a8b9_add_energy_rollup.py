@@ -0,0 +1,58 @@
+"""Add energy_rollup table (5-minute, hourly and daily energy history)
+
+Revision ID: e4x5y6z7a8b9
+Revises: d3w4x5y6z7a8
+Create Date: 2026-01-13 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4x5y6z7a8b9'
+down_revision = 'd3w4x5y6z7a8'
+branch_labels = None
+depends_on = None
+
+POWER_CHANNELS = ('solar', 'battery', 'grid', 'load')
+ENERGY_COLUMNS = ('solar_wh', 'load_wh', 'grid_import_wh', 'grid_export_wh',
+                  'battery_charge_wh', 'battery_discharge_wh')
+
+
+def upgrade():
+    columns = [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('granularity', sa.String(length=8), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False),
+        sa.Column('last_sample_at', sa.DateTime(), nullable=True),
+    ]
+    for channel in POWER_CHANNELS:
+        columns += [
+            sa.Column(f'{channel}_power_sum', sa.Float(), nullable=True),
+            sa.Column(f'{channel}_power_min', sa.Float(), nullable=True),
+            sa.Column(f'{channel}_power_max', sa.Float(), nullable=True),
+        ]
+    columns += [sa.Column(name, sa.Float(), nullable=True) for name in ENERGY_COLUMNS]
+    columns += [
+        sa.Column('battery_level_sum', sa.Float(), nullable=True),
+        sa.Column('battery_level_count', sa.Integer(), nullable=True),
+        sa.Column('battery_level_min', sa.Float(), nullable=True),
+        sa.Column('battery_level_max', sa.Float(), nullable=True),
+        sa.Column('battery_level_last', sa.Float(), nullable=True),
+    ]
+    op.create_table(
+        'energy_rollup',
+        *columns,
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_energy_rollup_user_granularity_bucket', 'energy_rollup',
+                    ['user_id', 'granularity', 'bucket_start'], unique=True, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_energy_rollup_user_granularity_bucket', table_name='energy_rollup', if_exists=True)
+    op.drop_table('energy_rollup')
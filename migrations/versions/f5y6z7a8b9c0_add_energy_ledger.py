@@ -0,0 +1,41 @@
+"""Add energy_ledger table (per-interval energy and cost)
+
+Revision ID: f5y6z7a8b9c0
+Revises: e4x5y6z7a8b9
+Create Date: 2026-01-14 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5y6z7a8b9c0'
+down_revision = 'e4x5y6z7a8b9'
+branch_labels = None
+depends_on = None
+
+FLOAT_COLUMNS = (
+    'covered_seconds',
+    'solar_kwh', 'load_kwh', 'grid_import_kwh', 'grid_export_kwh', 'battery_charge_kwh', 'battery_discharge_kwh',
+    'import_price', 'export_price', 'import_cost', 'export_earnings',
+)
+
+
+def upgrade():
+    op.create_table(
+        'energy_ledger',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('interval_start', sa.DateTime(), nullable=False),
+        *[sa.Column(name, sa.Float(), nullable=True) for name in FLOAT_COLUMNS],
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_energy_ledger_user_interval', 'energy_ledger',
+                    ['user_id', 'interval_start'], unique=True, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_energy_ledger_user_interval', table_name='energy_ledger', if_exists=True)
+    op.drop_table('energy_ledger')
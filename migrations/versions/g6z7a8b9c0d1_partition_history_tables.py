@@ -0,0 +1,37 @@
+"""Partition price_record and energy_record by month (PostgreSQL, opt-in)
+
+Only acts when HISTORY_PARTITIONING=monthly and the database is PostgreSQL;
+elsewhere (and by default) it is a no-op. To partition a database that has
+already passed this revision, use scripts/manage_history_partitions.py.
+
+Revision ID: g6z7a8b9c0d1
+Revises: f5y6z7a8b9c0
+Create Date: 2026-01-20 09:00:00.000000
+
+"""
+from alembic import op
+
+from app.partitioning import PARTITIONED_TABLES, convert_to_partitioned, convert_to_plain, partitioning_enabled
+
+
+# revision identifiers, used by Alembic.
+revision = 'g6z7a8b9c0d1'
+down_revision = 'f5y6z7a8b9c0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not partitioning_enabled(bind):
+        return
+    for table in PARTITIONED_TABLES:
+        convert_to_partitioned(bind, table)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    for table in PARTITIONED_TABLES:
+        convert_to_plain(bind, table)
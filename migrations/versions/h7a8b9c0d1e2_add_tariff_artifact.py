@@ -0,0 +1,37 @@
+"""Add tariff_artifact table (last built tariff per user)
+
+Revision ID: h7a8b9c0d1e2
+Revises: g6z7a8b9c0d1
+Create Date: 2026-01-22 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'h7a8b9c0d1e2'
+down_revision = 'g6z7a8b9c0d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'tariff_artifact',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('fingerprint', sa.String(length=40), nullable=False),
+        sa.Column('built_at', sa.DateTime(), nullable=False),
+        sa.Column('source', sa.String(length=20), nullable=True),
+        sa.Column('price_source', sa.String(length=10), nullable=True),
+        sa.Column('tariff_json', sa.Text(), nullable=False),
+        sa.Column('actual_interval_json', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('tariff_artifact')
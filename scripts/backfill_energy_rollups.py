@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Build the energy_rollup and energy_ledger tables from existing EnergyRecord history.
+
+The collectors keep the 5-minute, hourly and daily rollups up to date as samples
+arrive. History recorded before the energy_rollup migration is rolled up once by
+the app shortly after startup (app.retention.backfill_history); use this script
+to do it by hand, or to rebuild after a user changes timezone. For each user
+this replaces the rollups of the selected range with ones recomputed from their
+EnergyRecords, using the user's timezone for hour and day boundaries. The 5-minute energy
+ledger (kWh and cost per interval) is rebuilt over the same range.
+
+Safe to re-run. Stop the app first (or run between collections) so a sample
+isn't folded into a bucket while it is being rebuilt.
+
+Usage:
+    python scripts/backfill_energy_rollups.py [--user-id 1] [--days 400]
+    python scripts/backfill_energy_rollups.py --database-url sqlite:///data/app.db
+
+Uses DATABASE_URL (or the app's default database) unless --database-url is given.
+Run from the repository root.
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask  # noqa: E402
+
+from app import db  # noqa: E402
+from app.energy_ledger import rebuild_ledger  # noqa: E402
+from app.history_store import rebuild_energy_rollups  # noqa: E402
+from app.models import User  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--user-id', type=int, help='Only rebuild this user (default: all users)')
+    parser.add_argument('--days', type=int, help='Only rebuild the last N days (default: all history)')
+    parser.add_argument('--database-url', help='Database to backfill (default: DATABASE_URL / app default)')
+    args = parser.parse_args()
+
+    # A bare app: create_app() would start the scheduler and WebSocket client
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url or Config.SQLALCHEMY_DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    start = datetime.now(timezone.utc) - timedelta(days=args.days) if args.days else None
+
+    with app.app_context():
+        users = User.query.order_by(User.id).all()
+        if args.user_id is not None:
+            users = [user for user in users if user.id == args.user_id]
+
+        total = 0
+        total_intervals = 0
+        for user in users:
+            written = rebuild_energy_rollups(user.id, user.timezone, start=start)
+            intervals = rebuild_ledger(user.id, start=start)
+            db.session.commit()
+            total += written
+            total_intervals += intervals
+            print(f"User {user.id} ({user.timezone or 'default timezone'}): {written} rollups, {intervals} ledger intervals")
+
+    print(f"Wrote {total} energy rollups and {total_intervals} ledger intervals for {len(users)} users")
+
+
+if __name__ == '__main__':
+    main()
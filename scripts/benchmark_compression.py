@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Benchmark the bytes app.compression saves on the JSON history endpoints.
+
+Seeds a scratch SQLite database with one user's history, then requests each
+endpoint opted into @compressed_json() through a bare app (the blueprint and
+the compression hook, without the scheduler or WebSocket client):
+
+- /api/energy-history (day)      a day of minute energy samples
+- /api/price-history (yesterday) a day of 5-minute actual prices, both channels
+- /api/energy-ledger             a week of 5-minute energy and cost intervals
+- /api/battery-health/history    a year of daily battery health scans
+- /api/tou-schedule              served from a stored tariff artifact
+
+Each is fetched without Accept-Encoding, with gzip and (when the brotli
+package is installed) with br. The table shows the body bytes per coding, the
+share saved and the extra time per request (median), then the bytes of a
+revalidation with If-None-Match (a 304, no body).
+
+Usage:
+    python scripts/benchmark_compression.py [--repeat 20]
+
+Run from the repository root so the app package can be imported.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('LOG_DIR', tempfile.mkdtemp(prefix='powersync-compression-'))
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from flask import Flask  # noqa: E402
+
+import app.compression as compression  # noqa: E402
+from app import cache, db, login  # noqa: E402
+from app.models import (  # noqa: E402
+    BatteryHealthHistory, EnergyLedger, EnergyRecord, PriceRecord, TariffArtifact, User,
+)
+from app.tariff_artifacts import settings_fingerprint  # noqa: E402
+
+TIMEZONE = 'Australia/Brisbane'  # UTC+10, no daylight saving
+
+
+def create_bare_app(database_url: str) -> Flask:
+    """The main blueprint and the compression hook, without create_app()'s background services."""
+    app = Flask('app')
+    app.config.update(
+        SECRET_KEY='benchmark',
+        SQLALCHEMY_DATABASE_URI=database_url,
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        CACHE_TYPE='SimpleCache',
+        WTF_CSRF_ENABLED=False,
+    )
+    db.init_app(app)
+    login.init_app(app)
+    cache.init_app(app)
+    from app.routes import bp
+    app.register_blueprint(bp)
+    compression.init_response_compression(app)
+    return app
+
+
+def seed(user: User, now: datetime):
+    """A day of energy samples and prices, a week of ledger intervals, a year of health scans."""
+    random.seed(42)
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)  # UTC midnight, 10:00 local
+
+    energy = []
+    for minute in range(24 * 60):
+        timestamp = day_start + timedelta(minutes=minute)
+        solar = max(0.0, 5000 * (1 - abs(minute - 720) / 420)) + random.uniform(0, 150)
+        load = 400 + random.uniform(0, 2500)
+        battery = random.uniform(-3000, 3000)
+        energy.append(dict(
+            user_id=user.id, timestamp=timestamp, solar_power=round(solar, 1), load_power=round(load, 1),
+            battery_power=round(battery, 1), grid_power=round(load - solar - battery, 1),
+            battery_level=round(random.uniform(20, 100), 1),
+        ))
+    db.session.execute(db.insert(EnergyRecord), energy)
+
+    prices = []
+    yesterday = day_start - timedelta(days=1)
+    for interval in range(-12, 300):
+        timestamp = yesterday + timedelta(minutes=5 * interval)
+        for channel in ('general', 'feedIn'):
+            per_kwh = random.uniform(5, 45) if channel == 'general' else random.uniform(-5, 15)
+            prices.append(dict(
+                user_id=user.id, timestamp=timestamp, nem_time=timestamp + timedelta(hours=10, minutes=5),
+                channel_type=channel, forecast=False, per_kwh=round(per_kwh, 5),
+                spot_per_kwh=round(per_kwh * 0.6, 5), wholesale_kwh_price=round(per_kwh * 0.5, 5),
+                network_kwh_price=9.1, market_kwh_price=1.6, green_kwh_price=0.4, spike_status='none',
+                interval_type='ActualInterval',
+            ))
+    db.session.execute(db.insert(PriceRecord), prices)
+
+    ledger = []
+    for interval in range(7 * 288):
+        ledger.append(dict(
+            user_id=user.id, interval_start=day_start - timedelta(days=6) + timedelta(minutes=5 * interval),
+            covered_seconds=300.0, solar_kwh=round(random.uniform(0, 0.4), 4),
+            load_kwh=round(random.uniform(0.03, 0.2), 4), grid_import_kwh=round(random.uniform(0, 0.1), 4),
+            grid_export_kwh=round(random.uniform(0, 0.2), 4), battery_charge_kwh=round(random.uniform(0, 0.2), 4),
+            battery_discharge_kwh=round(random.uniform(0, 0.2), 4), import_price=round(random.uniform(5, 45), 3),
+            export_price=round(random.uniform(-5, 15), 3), import_cost=round(random.uniform(0, 4), 4),
+            export_earnings=round(random.uniform(0, 3), 4),
+        ))
+    db.session.execute(db.insert(EnergyLedger), ledger)
+
+    scans = []
+    for day in range(365):
+        actual = 13500 * 2 * (1 - day / 365 * 0.04) - random.uniform(0, 200)
+        scans.append(dict(
+            user_id=user.id, scanned_at=day_start - timedelta(days=365 - day), rated_capacity_wh=27000.0,
+            actual_capacity_wh=round(actual, 1), health_percent=round(actual / 270, 2),
+            degradation_percent=round(100 - actual / 270, 2), battery_count=2,
+            pack_data=json.dumps([{'packId': pack, 'capacityWh': round(actual / 2, 1)} for pack in (1, 2)]),
+        ))
+    db.session.execute(db.insert(BatteryHealthHistory), scans)
+
+    slots = [f'PERIOD_{hour:02d}_{minute:02d}' for hour in range(24) for minute in (0, 30)]
+    tariff = {
+        'name': 'PowerSync Amber', 'utility': 'Amber Electric', 'code': 'PS',
+        'energy_charges': {'ALL': {'rates': {'ALL': 0}}, 'Summer': {'rates': {
+            slot: round(random.uniform(0.05, 0.45), 4) for slot in slots}}},
+        'sell_tariff': {'energy_charges': {'ALL': {'rates': {'ALL': 0}}, 'Summer': {'rates': {
+            slot: round(random.uniform(0.0, 0.15), 4) for slot in slots}}}},
+    }
+    db.session.add(TariffArtifact(
+        user_id=user.id, fingerprint=settings_fingerprint(user), built_at=now.replace(tzinfo=None),
+        source='sync', price_source='amber', tariff_json=json.dumps(tariff),
+    ))
+    db.session.commit()
+
+
+def endpoints(now: datetime):
+    week_start = (now - timedelta(days=6)).strftime('%Y-%m-%d')
+    return [
+        ('/api/energy-history (day)', f'/api/energy-history?timeframe=day&date={now:%Y-%m-%d}'),
+        ('/api/price-history (yesterday)', '/api/price-history?day=yesterday'),
+        ('/api/energy-ledger (week)', f'/api/energy-ledger?start={week_start}&end={now:%Y-%m-%d}'),
+        ('/api/battery-health/history', '/api/battery-health/history'),
+        ('/api/tou-schedule', '/api/tou-schedule'),
+    ]
+
+
+def timed_get(client, url: str, headers: dict, repeat: int):
+    """The last response and the median time per request in milliseconds."""
+    times = []
+    response = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        times.append((time.perf_counter() - start) * 1000)
+    return response, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20, help='Requests per endpoint and coding (default 20)')
+    args = parser.parse_args()
+
+    database = tempfile.NamedTemporaryFile(prefix='powersync-compression-', suffix='.db', delete=False)
+    database.close()
+    app = create_bare_app(f'sqlite:///{database.name}')
+    now = datetime.now(timezone.utc)
+
+    codings = ['gzip'] + (['br'] if compression.BROTLI_AVAILABLE else [])
+    try:
+        with app.app_context():
+            db.create_all()
+            user = User(email='benchmark@example.com', timezone=TIMEZONE, electricity_provider='amber')
+            db.session.add(user)
+            db.session.commit()
+            seed(user, now)
+            user_id = user.id
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+
+        print(f"Compression threshold {compression.COMPRESSION_MIN_BYTES} B, gzip level {compression.GZIP_LEVEL}"
+              + (f", brotli quality {compression.BROTLI_QUALITY}" if 'br' in codings else ', brotli not installed'))
+        header = f"{'endpoint':32} {'identity':>10}"
+        for coding in codings:
+            header += f" {coding:>10} {'saved':>6} {'+ms':>6}"
+        print(header + f" {'304':>5}")
+
+        total_identity = 0
+        total_coded = {coding: 0 for coding in codings}
+        for label, url in endpoints(now):
+            identity, identity_ms = timed_get(client, url, {}, args.repeat)
+            if identity.status_code != 200:
+                print(f"{label:32} HTTP {identity.status_code}: {identity.get_data()[:120]!r}")
+                continue
+            size = len(identity.get_data())
+            total_identity += size
+            row = f"{label:32} {size:>10,}"
+
+            etag = None
+            for coding in codings:
+                response, coded_ms = timed_get(client, url, {'Accept-Encoding': coding}, args.repeat)
+                coded = len(response.get_data())
+                total_coded[coding] += coded
+                etag = response.headers.get('ETag')
+                row += f" {coded:>10,} {100 * (1 - coded / size):>5.1f}% {coded_ms - identity_ms:>6.2f}"
+
+            revalidated = client.get(url, headers={'Accept-Encoding': codings[-1], 'If-None-Match': etag or '*'})
+            row += f" {len(revalidated.get_data()) if revalidated.status_code == 304 else revalidated.status_code:>5}"
+            print(row)
+
+        row = f"{'total':32} {total_identity:>10,}"
+        for coding in codings:
+            saved = 100 * (1 - total_coded[coding] / total_identity) if total_identity else 0.0
+            row += f" {total_coded[coding]:>10,} {saved:>5.1f}% {'':>6}"
+        print(row)
+    finally:
+        os.unlink(database.name)
+
+
+if __name__ == '__main__':
+    main()
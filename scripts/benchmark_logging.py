@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Benchmark the logging overhead of one price tick on the calling thread.
+
+A tick replays what the scheduler and WebSocket threads do when a price update
+arrives: AmberWebSocketClient._handle_message() on a price-update message, then a
+Tesla tariff conversion (Flow Power PEA + manual network pipeline) and the
+Sigenergy buy/sell conversion of the amber_30min_qld fixture.
+
+Each tick is timed with logging disabled (baseline) and under each setup:
+
+- inline: the previous setup - file and console handlers on the root logger,
+  each running SensitiveDataFilter, formatting and I/O on the logging thread
+- queue: app.logging_config - records are queued and redacted, formatted and
+  written by the listener thread
+- queue+sampled: as queue, with LOG_DEBUG_SAMPLE keeping 1 in 10 DEBUG records
+  from the converters and the WebSocket client
+- queue@INFO: as queue, with LOG_LEVEL=INFO
+
+Overhead is the mean tick time minus the baseline, both as wall time and as
+CPU time of the ticking thread (time.thread_time). With the queue setups the
+listener thread competes for the GIL while the ticks run, so the wall time
+includes its work; the thread CPU time is what the scheduler thread itself
+spends on logging. The time the listener needs to drain the queue afterwards is
+reported separately.
+
+Usage:
+    python scripts/benchmark_logging.py [--ticks 200]
+
+Run from the repository root so the app package can be imported.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Importing the tariff suite sets up LOG_DIR, TZ and the app import path
+from benchmark_tariff_suite import SETTINGS_MATRIX, convert, freeze_clock, load_fixture, make_user  # noqa: E402
+
+import app.sigenergy_client as sigenergy_client  # noqa: E402
+from app import SensitiveDataFilter  # noqa: E402
+from app.logging_config import LOG_DATE_FORMAT, LOG_FORMAT, configure_logging  # noqa: E402
+from app.price_intervals import PriceIntervals  # noqa: E402
+from app.websocket_client import AmberWebSocketClient  # noqa: E402
+
+SITE_ID = '01KAR0YMB7JQDVZ10SN1SGA0CV'
+SAMPLED_MODULES = 'app.tariff_converter=10,app.sigenergy_client=10,app.websocket_client=10'
+
+
+def price_message(fixture: dict) -> str:
+    """Amber WebSocket price-update message built from the fixture's current interval."""
+    current = [p for p in fixture['points'] if p['type'] == 'CurrentInterval']
+    return json.dumps({
+        'action': 'price-update',
+        'data': {'siteId': SITE_ID, 'prices': current},
+    })
+
+
+def make_tick(fixture: dict):
+    user = make_user(1, SETTINGS_MATRIX['flow_power_pea'][1])
+    user.network_use_manual_rates = True
+    client = AmberWebSocketClient('psk_' + 'x' * 32, SITE_ID)
+    client._should_trigger_sync = lambda: False
+    message = price_message(fixture)
+
+    def tick():
+        client._handle_message(message)
+        convert(fixture, user, include_chip_mode=False)
+        intervals = PriceIntervals.of(fixture['points'])
+        for price_type in ('buy', 'sell'):
+            sigenergy_client.convert_amber_prices_to_sigenergy(intervals, price_type=price_type,
+                                                               nem_region=fixture['nem_region'])
+    return tick
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def setup_inline(log_file: str, devnull):
+    """The pre-queue setup: both handlers redact, format and write on the logging thread."""
+    reset_root()
+    log_format = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+    sensitive_filter = SensitiveDataFilter()
+    root = logging.getLogger()
+    for handler in (logging.FileHandler(log_file, encoding='utf-8'), logging.StreamHandler(devnull)):
+        handler.addFilter(sensitive_filter)
+        handler.setFormatter(log_format)
+        root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+    return None
+
+
+def setup_queue(log_file: str, devnull, level='DEBUG', debug_sample=None):
+    reset_root()
+    stderr, sys.stderr = sys.stderr, devnull  # console handler writes to sys.stderr
+    try:
+        return configure_logging(log_file, SensitiveDataFilter(), level=level, debug_sample=debug_sample)
+    finally:
+        sys.stderr = stderr
+
+
+def time_ticks(tick, ticks: int) -> tuple:
+    """Mean wall and calling-thread CPU milliseconds per tick."""
+    tick()
+    start, start_cpu = time.perf_counter(), time.thread_time()
+    for _ in range(ticks):
+        tick()
+    return ((time.perf_counter() - start) / ticks * 1e3,
+            (time.thread_time() - start_cpu) / ticks * 1e3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ticks', type=int, default=200, help='Ticks per setup (default 200)')
+    args = parser.parse_args()
+
+    fixture = load_fixture('amber_30min_qld')
+    freeze_clock(fixture['recorded_at'])
+    tick = make_tick(fixture)
+    log_dir = tempfile.mkdtemp(prefix='powersync-logbench-')
+    devnull = open(os.devnull, 'w')
+
+    logging.disable(logging.CRITICAL)
+    baseline, baseline_cpu = time_ticks(tick, args.ticks)
+    logging.disable(logging.NOTSET)
+    print(f"{'':<16} {'wall ms/tick':>12} {'overhead':>9} {'thread cpu':>11} {'overhead':>9}")
+    print(f"{'baseline':<16} {baseline:12.3f} {'':>9} {baseline_cpu:11.3f}")
+
+    setups = {
+        'inline': lambda path: setup_inline(path, devnull),
+        'queue': lambda path: setup_queue(path, devnull),
+        'queue+sampled': lambda path: setup_queue(path, devnull, debug_sample=SAMPLED_MODULES),
+        'queue@INFO': lambda path: setup_queue(path, devnull, level='INFO'),
+    }
+    for label, setup in setups.items():
+        log_file = os.path.join(log_dir, f"{label.replace('@', '_').replace('+', '_')}.log")
+        listener = setup(log_file)
+        mean, cpu = time_ticks(tick, args.ticks)
+        drain = ''
+        if listener is not None:
+            start = time.perf_counter()
+            listener.stop()
+            drain = f"   (listener drain {(time.perf_counter() - start) * 1e3:.1f} ms)"
+        reset_root()
+        lines = sum(1 for _ in open(log_file, encoding='utf-8')) // (args.ticks + 1)
+        print(f"{label:<16} {mean:12.3f} {mean - baseline:9.3f} {cpu:11.3f} {cpu - baseline_cpu:9.3f}"
+              f"   ~{lines} lines/tick{drain}")
+
+    devnull.close()
+
+
+if __name__ == '__main__':
+    main()
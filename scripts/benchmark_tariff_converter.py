@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Benchmark AmberTariffConverter.convert_amber_to_tesla_tariff.
+
+Generates a synthetic 48-hour Amber forecast at 5-minute and 30-minute
+resolution and times how long one conversion takes for each input size,
+with the NumPy slot grid (when installed) and the pure-Python fallback.
+
+Usage:
+    python scripts/benchmark_tariff_converter.py
+    python scripts/benchmark_tariff_converter.py --runs 500
+
+Run from the repository root so the app package can be imported.
+"""
+
+import argparse
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('LOG_DIR', tempfile.mkdtemp(prefix='powersync-bench-'))
+
+import app.price_intervals as price_intervals  # noqa: E402
+import app.tariff_converter as tariff_converter  # noqa: E402
+from app.tariff_converter import AmberTariffConverter  # noqa: E402
+
+
+AEST = timezone(timedelta(hours=10))
+
+
+def build_forecast(resolution: int, hours: int = 48) -> list:
+    """Build a synthetic Amber forecast (both channels) starting at the current period."""
+    now = datetime.now(AEST)
+    start = now.replace(minute=now.minute - now.minute % resolution, second=0, microsecond=0)
+    points = []
+
+    for i in range(-2, hours * 60 // resolution):
+        interval_end = start + timedelta(minutes=resolution * (i + 1))
+        # Daily price shape: cheap midday solar, evening peak
+        hour = interval_end.hour + interval_end.minute / 60
+        base = 20 + 15 * math.sin((hour - 12) / 24 * 2 * math.pi) + (i % 7)
+
+        if i < 0:
+            interval_type = 'ActualInterval'
+        elif i == 0:
+            interval_type = 'CurrentInterval'
+        else:
+            interval_type = 'ForecastInterval'
+
+        for channel, price in (('general', base), ('feedIn', -(base * 0.6))):
+            point = {
+                'type': interval_type,
+                'duration': resolution,
+                'nemTime': interval_end.isoformat(),
+                'channelType': channel,
+                'perKwh': round(price, 2),
+                'spikeStatus': 'potential' if channel == 'general' and 18 <= hour < 19 else 'none',
+            }
+            if interval_type == 'ForecastInterval':
+                point['advancedPrice'] = {
+                    'low': round(price * 0.9, 2),
+                    'predicted': round(price, 2),
+                    'high': round(price * 1.1, 2),
+                }
+            points.append(point)
+
+    return points
+
+
+def time_conversion(converter, forecast, runs: int) -> float:
+    """Return the mean time per conversion in milliseconds."""
+    converter.convert_amber_to_tesla_tariff(forecast, powerwall_timezone='Australia/Brisbane')
+    start = time.perf_counter()
+    for _ in range(runs):
+        converter.convert_amber_to_tesla_tariff(forecast, powerwall_timezone='Australia/Brisbane')
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=200, help='Conversions per input size')
+    args = parser.parse_args()
+
+    # Measure conversion cost, not handler I/O
+    logging.disable(logging.CRITICAL)
+
+    backends = ['numpy', 'python'] if getattr(tariff_converter, 'NUMPY_AVAILABLE', False) else ['python']
+
+    converter = AmberTariffConverter()
+    for resolution in (5, 30):
+        forecast = build_forecast(resolution)
+        for backend in backends:
+            tariff_converter.NUMPY_AVAILABLE = backend == 'numpy'
+            price_intervals.NUMPY_AVAILABLE = backend == 'numpy'
+            elapsed_ms = time_conversion(converter, forecast, args.runs)
+            print(f"{resolution:>2}-min input ({len(forecast):>4} points, {backend:>6}): {elapsed_ms:.3f} ms/conversion")
+
+
+if __name__ == '__main__':
+    main()
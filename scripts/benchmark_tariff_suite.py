@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""Fixture-based benchmark and golden check for the tariff conversion hot path.
+
+Replays the price forecast fixtures in scripts/fixtures/tariff/ (Amber 5-min and
+30-min forecasts, AEMO pre-dispatch extracts) through a matrix of user settings
+with the clock frozen at each fixture's recorded_at time, then:
+
+- checks every converted tariff and Sigenergy price list against golden.json
+- times PriceIntervals parsing, convert_amber_to_tesla_tariff, each tariff
+  transform, the compiled tariff pipeline, convert_amber_prices_to_sigenergy,
+  get_tariff_hash and diff_tariffs
+
+Usage:
+    python scripts/benchmark_tariff_suite.py                      # golden check + timings
+    python scripts/benchmark_tariff_suite.py --check-only         # golden check only
+    python scripts/benchmark_tariff_suite.py --update-golden      # accept current outputs
+    python scripts/benchmark_tariff_suite.py --save-timings base.json
+    python scripts/benchmark_tariff_suite.py --compare base.json --threshold 1.25
+
+Exits non-zero if any output differs from the goldens, or (with --compare) if any
+timing is slower than the saved one by more than the threshold.
+
+Run from the repository root so the app package can be imported. Fixtures are
+(re)recorded with scripts/record_tariff_fixtures.py.
+"""
+
+import argparse
+import copy
+import gzip
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('LOG_DIR', tempfile.mkdtemp(prefix='powersync-bench-'))
+# A throwaway key, so importing the app doesn't create data/.fernet_key (nothing is encrypted here)
+os.environ.setdefault('FERNET_ENCRYPTION_KEY', 'cG93ZXJzeW5jLWJlbmNobWFyay10aHJvd2F3YXkta2U=')
+
+# The aemo_to_tariff library interprets naive datetimes as server local time
+os.environ['TZ'] = 'Australia/Brisbane'
+if hasattr(time, 'tzset'):
+    time.tzset()
+
+import app.sigenergy_client as sigenergy_client  # noqa: E402
+import app.tariff_converter as tariff_converter  # noqa: E402
+from app.models import User  # noqa: E402
+from app.price_intervals import PriceIntervals  # noqa: E402
+from app.tariff_fingerprint import diff_tariffs  # noqa: E402
+from app.tasks import get_tariff_hash  # noqa: E402
+from app.tariff_converter import (  # noqa: E402
+    AmberTariffConverter, TariffPipeline, build_tariff_pipeline_stages, get_wholesale_lookup,
+    apply_flow_power_pea, apply_network_tariff, apply_flow_power_export, apply_export_boost, apply_chip_mode,
+)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'tariff')
+GOLDEN_PATH = os.path.join(FIXTURE_DIR, 'golden.json')
+
+AMBER_FIXTURES = ('amber_30min_qld', 'amber_5min_qld', 'amber_30min_nsw_dst')
+AEMO_FIXTURES = ('aemo_predispatch_qld1',)
+
+# name -> (fixtures, user setting overrides, include Chip Mode)
+SETTINGS_MATRIX = {
+    'amber_default': (AMBER_FIXTURES, {}, False),
+    'amber_low_forecast': (AMBER_FIXTURES, {'amber_forecast_type': 'low'}, False),
+    'amber_spike_protection': (AMBER_FIXTURES, {'spike_protection_enabled': True}, False),
+    'amber_demand_charges': (AMBER_FIXTURES, {
+        'enable_demand_charges': True, 'demand_charge_apply_to': 'both', 'peak_demand_rate': 12.5,
+        'shoulder_demand_rate': 4.0, 'offpeak_demand_rate': 1.0, 'demand_artificial_price_enabled': True,
+        'daily_supply_charge': 1.15,
+    }, False),
+    'amber_export_boost': (AMBER_FIXTURES, {
+        'export_boost_enabled': True, 'export_price_offset': 5.0, 'export_min_price': 15.0,
+        'export_boost_threshold': 2.0,
+    }, False),
+    'amber_chip_mode': (AMBER_FIXTURES, {'chip_mode_enabled': True, 'chip_mode_threshold': 25.0}, True),
+    'flow_power_pea': (AMBER_FIXTURES, {'electricity_provider': 'flow_power', 'flow_power_state': 'QLD1'}, False),
+    'flow_power_pea_custom': (AMBER_FIXTURES, {
+        'electricity_provider': 'flow_power', 'flow_power_state': 'NSW1', 'pea_custom_value': -3.0,
+    }, False),
+    'flow_power_aemo_pea': (AEMO_FIXTURES, {
+        'electricity_provider': 'flow_power', 'flow_power_state': 'QLD1', 'flow_power_price_source': 'aemo',
+    }, False),
+    'flow_power_aemo_network_library': (AEMO_FIXTURES, {
+        'electricity_provider': 'flow_power', 'flow_power_state': 'QLD1', 'flow_power_price_source': 'aemo',
+        'pea_enabled': False, 'network_use_manual_rates': False,
+    }, False),
+    'flow_power_aemo_network_manual': (AEMO_FIXTURES, {
+        'electricity_provider': 'flow_power', 'flow_power_state': 'QLD1', 'flow_power_price_source': 'aemo',
+        'pea_enabled': False, 'network_use_manual_rates': True, 'network_tariff_type': 'tou',
+    }, False),
+}
+
+
+class FrozenDatetime(datetime):
+    """datetime whose now() returns the fixture's recorded_at time."""
+
+    frozen = None
+
+    @classmethod
+    def now(cls, tz=None):
+        if tz is None:
+            return cls.frozen.astimezone().replace(tzinfo=None)
+        return cls.frozen.astimezone(tz)
+
+
+def freeze_clock(recorded_at: str):
+    """Freeze datetime.now() in the converter modules at a fixture's recording time."""
+    FrozenDatetime.frozen = datetime.fromisoformat(recorded_at)
+    tariff_converter.datetime = FrozenDatetime
+    sigenergy_client.datetime = FrozenDatetime
+
+
+def load_fixture(name: str) -> dict:
+    with gzip.open(os.path.join(FIXTURE_DIR, f'{name}.json.gz'), 'rt') as f:
+        return json.load(f)
+
+
+def make_user(user_id: int, overrides: dict):
+    """User-like object with the model's column defaults plus overrides."""
+    settings = {
+        column.name: column.default.arg
+        for column in User.__table__.columns
+        if column.default is not None and not callable(column.default.arg)
+    }
+    settings.update(id=user_id, email=f'bench-{user_id}@example.com', pea_custom_value=None)
+    settings.update(overrides)
+    return types.SimpleNamespace(**settings)
+
+
+def library_version() -> str:
+    try:
+        from importlib.metadata import version
+        return version('aemo_to_tariff')
+    except Exception:
+        return 'unavailable'
+
+
+def convert(fixture: dict, user, include_chip_mode: bool) -> dict:
+    """Full conversion of one fixture for one user, as the sync does it."""
+    freeze_clock(fixture['recorded_at'])
+    intervals = PriceIntervals.of(fixture['points'])
+    tariff = AmberTariffConverter().convert_amber_to_tesla_tariff(
+        intervals, user=user, powerwall_timezone=fixture['timezone']
+    )
+    if not tariff:
+        return None
+    return TariffPipeline(build_tariff_pipeline_stages(user, include_chip_mode)).apply(tariff, intervals)
+
+
+def summarize_tariff(tariff: dict) -> dict:
+    if tariff is None:
+        return None
+    return {
+        'hash': get_tariff_hash(tariff),
+        'buy': tariff['energy_charges']['Summer']['rates'],
+        'sell': tariff['sell_tariff']['energy_charges']['Summer']['rates'],
+    }
+
+
+def build_outputs(fixtures: dict) -> dict:
+    """Every golden-checked output, keyed by case name."""
+    outputs = {}
+
+    for user_id, (case, (fixture_names, overrides, include_chip_mode)) in enumerate(SETTINGS_MATRIX.items(), start=1):
+        if case == 'flow_power_aemo_network_library' and not tariff_converter.AEMO_TARIFF_AVAILABLE:
+            print(f"  skipping {case}: aemo_to_tariff not installed")
+            continue
+        user = make_user(user_id, overrides)
+        for name in fixture_names:
+            outputs[f'tariff/{case}/{name}'] = summarize_tariff(convert(fixtures[name], user, include_chip_mode))
+
+    for name in AMBER_FIXTURES:
+        fixture = fixtures[name]
+        freeze_clock(fixture['recorded_at'])
+        intervals = PriceIntervals.of(fixture['points'])
+        for price_type in ('buy', 'sell'):
+            outputs[f'sigenergy/{price_type}/{name}'] = sigenergy_client.convert_amber_prices_to_sigenergy(
+                intervals, price_type=price_type, nem_region=fixture['nem_region']
+            )
+
+    return outputs
+
+
+def check_golden(outputs: dict) -> int:
+    """Compare outputs with golden.json; returns the number of mismatches."""
+    with open(GOLDEN_PATH) as f:
+        golden = json.load(f)
+
+    if golden.get('aemo_to_tariff') != library_version():
+        print(f"  note: goldens recorded with aemo_to_tariff {golden.get('aemo_to_tariff')}, "
+              f"installed {library_version()} - network library cases may differ")
+
+    expected = golden['outputs']
+    failures = 0
+    for key in sorted(set(expected) | set(outputs)):
+        if key not in outputs:
+            continue  # Case skipped in this environment
+        if key not in expected:
+            print(f"  NEW   {key} (run with --update-golden to record)")
+            failures += 1
+            continue
+
+        actual = json.loads(json.dumps(outputs[key]))
+        if actual == expected[key]:
+            continue
+
+        failures += 1
+        print(f"  FAIL  {key}")
+        if isinstance(actual, dict) and isinstance(expected[key], dict):
+            for side in ('buy', 'sell'):
+                diffs = [
+                    f"{period}: {expected[key][side].get(period)} -> {price}"
+                    for period, price in actual[side].items() if expected[key][side].get(period) != price
+                ]
+                for diff in diffs[:5]:
+                    print(f"          {side} {diff}")
+                if len(diffs) > 5:
+                    print(f"          {side} ... {len(diffs) - 5} more")
+
+    print(f"Golden check: {len(outputs) - failures}/{len(outputs)} outputs match")
+    return failures
+
+
+def write_golden(outputs: dict):
+    with open(GOLDEN_PATH, 'w') as f:
+        json.dump({'aemo_to_tariff': library_version(), 'outputs': outputs}, f, indent=1, sort_keys=True)
+        f.write('\n')
+    print(f"Wrote {len(outputs)} golden outputs to {GOLDEN_PATH}")
+
+
+def time_call(fn, runs: int, make_arg=None) -> float:
+    """Mean microseconds per call. make_arg() builds a fresh argument per run, outside the timing."""
+    args = [make_arg() for _ in range(runs)] if make_arg else [None] * runs
+    fn(make_arg()) if make_arg else fn(None)
+    start = time.perf_counter()
+    for arg in args:
+        fn(arg)
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+def run_timings(fixtures: dict, runs: int) -> dict:
+    timings = {}
+    converter = AmberTariffConverter()
+    amber_user = make_user(1, {})
+
+    for name in AMBER_FIXTURES + AEMO_FIXTURES:
+        fixture = fixtures[name]
+        freeze_clock(fixture['recorded_at'])
+        timings[f'PriceIntervals.of/{name}'] = time_call(lambda _: PriceIntervals.of(fixture['points']), runs)
+        timings[f'convert_amber_to_tesla_tariff/{name}'] = time_call(
+            lambda _: converter.convert_amber_to_tesla_tariff(
+                fixture['points'], user=amber_user, powerwall_timezone=fixture['timezone']),
+            runs)
+
+    # Transforms on a converted tariff (each run gets its own copy)
+    amber = fixtures['amber_30min_qld']
+    freeze_clock(amber['recorded_at'])
+    amber_tariff = converter.convert_amber_to_tesla_tariff(amber['points'], user=amber_user,
+                                                           powerwall_timezone=amber['timezone'])
+    aemo = fixtures['aemo_predispatch_qld1']
+    freeze_clock(aemo['recorded_at'])
+    aemo_tariff = converter.convert_amber_to_tesla_tariff(aemo['points'], user=amber_user,
+                                                          powerwall_timezone=aemo['timezone'])
+    wholesale = get_wholesale_lookup(aemo['points'])
+
+    def fresh(tariff):
+        return lambda: copy.deepcopy(tariff)
+
+    library_user = make_user(2, SETTINGS_MATRIX['flow_power_aemo_network_library'][1])
+    manual_user = make_user(3, SETTINGS_MATRIX['flow_power_aemo_network_manual'][1])
+    transforms = {
+        'get_wholesale_lookup': (lambda _: get_wholesale_lookup(aemo['points']), None),
+        'apply_flow_power_pea': (lambda t: apply_flow_power_pea(t, wholesale, 34.0), fresh(aemo_tariff)),
+        'apply_network_tariff/manual': (lambda t: apply_network_tariff(t, manual_user), fresh(aemo_tariff)),
+        'apply_flow_power_export': (lambda t: apply_flow_power_export(t, 'QLD1'), fresh(aemo_tariff)),
+        'apply_export_boost': (lambda t: apply_export_boost(t, 5.0, 15.0, '17:00', '21:00', 2.0), fresh(amber_tariff)),
+        'apply_chip_mode': (lambda t: apply_chip_mode(t, '22:00', '06:00', 25.0), fresh(amber_tariff)),
+    }
+    if tariff_converter.AEMO_TARIFF_AVAILABLE:
+        transforms['apply_network_tariff/library'] = (lambda t: apply_network_tariff(t, library_user), fresh(aemo_tariff))
+
+    for case in ('flow_power_aemo_pea', 'flow_power_aemo_network_manual', 'amber_export_boost', 'amber_chip_mode'):
+        fixture_names, overrides, include_chip_mode = SETTINGS_MATRIX[case]
+        pipeline = TariffPipeline(build_tariff_pipeline_stages(make_user(4, overrides), include_chip_mode))
+        source = aemo if fixture_names == AEMO_FIXTURES else amber
+        tariff = aemo_tariff if source is aemo else amber_tariff
+        transforms[f'TariffPipeline.apply/{case}'] = (
+            lambda t, pipeline=pipeline, source=source: pipeline.apply(t, source['points']), fresh(tariff))
+
+    freeze_clock(aemo['recorded_at'])
+    for label, (fn, make_arg) in transforms.items():
+        timings[label] = time_call(fn, runs, make_arg)
+
+    for name in AMBER_FIXTURES:
+        fixture = fixtures[name]
+        freeze_clock(fixture['recorded_at'])
+        timings[f'convert_amber_prices_to_sigenergy/{name}'] = time_call(
+            lambda _: sigenergy_client.convert_amber_prices_to_sigenergy(
+                fixture['points'], price_type='buy', nem_region=fixture['nem_region']),
+            runs)
+
+    timings['get_tariff_hash'] = time_call(lambda _: get_tariff_hash(amber_tariff), runs)
+    timings['diff_tariffs'] = time_call(lambda t: diff_tariffs(amber_tariff, t), runs, fresh(amber_tariff))
+    return timings
+
+
+def compare_timings(timings: dict, baseline_path: str, threshold: float) -> int:
+    """Print timings against a saved baseline; returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = 0
+    for label, micros in timings.items():
+        before = baseline.get(label)
+        if not before:
+            continue
+        ratio = micros / before
+        flag = ''
+        if ratio > threshold:
+            flag = '  << REGRESSION'
+            regressions += 1
+        print(f"  {label:<60} {before:>10.1f} -> {micros:>10.1f} us  ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=100, help='Calls per timing')
+    parser.add_argument('--check-only', action='store_true', help='Only run the golden check')
+    parser.add_argument('--update-golden', action='store_true', help='Write current outputs as the goldens')
+    parser.add_argument('--save-timings', metavar='PATH', help='Save timings as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='Compare timings with a saved JSON')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Slowdown ratio reported as a regression')
+    args = parser.parse_args()
+
+    # Measure conversion cost, not handler I/O
+    logging.disable(logging.CRITICAL)
+
+    fixtures = {name: load_fixture(name) for name in AMBER_FIXTURES + AEMO_FIXTURES}
+    synthetic = [name for name, fixture in fixtures.items() if fixture.get('origin') == 'synthetic']
+    if synthetic:
+        print(f"Fixtures ({len(fixtures)}, synthetic: {', '.join(synthetic)})")
+
+    outputs = build_outputs(fixtures)
+    if args.update_golden:
+        write_golden(outputs)
+        failures = 0
+    else:
+        failures = check_golden(outputs)
+
+    regressions = 0
+    if not args.check_only:
+        timings = run_timings(fixtures, args.runs)
+        if args.compare:
+            regressions = compare_timings(timings, args.compare, args.threshold)
+        else:
+            for label, micros in timings.items():
+                print(f"  {label:<60} {micros:>10.1f} us")
+        if args.save_timings:
+            with open(args.save_timings, 'w') as f:
+                json.dump(timings, f, indent=1, sort_keys=True)
+
+    sys.exit(1 if failures or regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Check that the history endpoints' queries are served by the composite indexes.
+
+Builds the models' schema in a scratch SQLite database, seeds it with a few
+users' worth of price and energy history (ANALYZE'd so the planner sees
+realistic statistics), then runs EXPLAIN QUERY PLAN on the queries issued by:
+
+- /api/price-history               PriceRecord by user, both channels, forecast, time range
+- /api/energy-history (day)        EnergyRecord by user and time range
+- /api/energy-history (month/year) EnergyRollup by user, granularity and time range
+- /api/sigenergy/calendar-history  EnergyRollup by user, granularity and time range
+- /api/energy-ledger               EnergyLedger by user and interval range
+
+Each plan must search the expected index (no table scan) and must not sort
+with a temporary B-tree - the index order has to satisfy ORDER BY timestamp.
+Rows are still read from the table (the endpoints load whole records), so this
+checks index range scans rather than covering indexes.
+
+With --database-url the plans are checked against an existing database
+instead (SQLite or PostgreSQL; nothing is written). PostgreSQL plans are
+checked for a scan on the expected index (or, for monthly partitioned tables,
+on the partitions' indexes).
+
+Usage:
+    python scripts/check_query_plans.py [--rows 200000]
+    python scripts/check_query_plans.py --database-url sqlite:///data/app.db
+
+Exits non-zero if any plan misses its index. Run from the repository root.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('LOG_DIR', tempfile.mkdtemp(prefix='powersync-plans-'))
+
+from sqlalchemy import create_engine, insert, select, text  # noqa: E402
+
+from app import db  # noqa: E402
+from app.history_store import nem_time_window  # noqa: E402
+from app.models import EnergyLedger, EnergyRecord, EnergyRollup, PriceRecord, User  # noqa: E402
+
+PRICE_INDEX = 'ix_price_record_user_channel_forecast_timestamp'
+ENERGY_INDEX = 'ix_energy_record_user_timestamp'
+ROLLUP_INDEX = 'ix_energy_rollup_user_granularity_bucket'
+LEDGER_INDEX = 'ix_energy_ledger_user_interval'
+
+USERS = 5
+START = datetime(2025, 1, 1)
+
+
+def history_queries(user_id: int, day_start: datetime):
+    """(label, statement, expected index) for each history endpoint query."""
+    day_end = day_start + timedelta(days=1) - timedelta(microseconds=1)
+    return [
+        ('/api/price-history',
+         select(PriceRecord).where(
+             PriceRecord.user_id == user_id,
+             PriceRecord.channel_type.in_(('general', 'feedIn')),
+             PriceRecord.forecast == False,  # noqa: E712 - mirrors the route's filter
+             PriceRecord.timestamp >= day_start,
+             PriceRecord.timestamp <= day_end,
+             nem_time_window(day_start, day_end),
+         ).order_by(PriceRecord.channel_type.asc(), PriceRecord.timestamp.asc()),
+         PRICE_INDEX),
+        ('/api/energy-history (day)',
+         select(EnergyRecord).where(
+             EnergyRecord.user_id == user_id,
+             EnergyRecord.timestamp >= day_start,
+             EnergyRecord.timestamp <= day_end,
+         ).order_by(EnergyRecord.timestamp.asc()),
+         ENERGY_INDEX),
+        ('/api/energy-history (month)',
+         select(EnergyRollup).where(
+             EnergyRollup.user_id == user_id,
+             EnergyRollup.granularity == 'hour',
+             EnergyRollup.bucket_start >= day_start - timedelta(days=30),
+             EnergyRollup.bucket_start <= day_end,
+         ).order_by(EnergyRollup.bucket_start.asc()),
+         ROLLUP_INDEX),
+        ('/api/sigenergy/calendar-history (year)',
+         select(EnergyRollup).where(
+             EnergyRollup.user_id == user_id,
+             EnergyRollup.granularity == 'day',
+             EnergyRollup.bucket_start >= day_start - timedelta(days=365),
+             EnergyRollup.bucket_start <= day_end,
+         ).order_by(EnergyRollup.bucket_start.asc()),
+         ROLLUP_INDEX),
+        ('/api/energy-ledger (week)',
+         select(EnergyLedger).where(
+             EnergyLedger.user_id == user_id,
+             EnergyLedger.interval_start >= day_start - timedelta(days=6),
+             EnergyLedger.interval_start < day_end,
+         ).order_by(EnergyLedger.interval_start.asc()),
+         LEDGER_INDEX),
+    ]
+
+
+def seed(engine, rows: int):
+    """Price records (5-min, general + feedIn, actual + forecast) and minute energy records."""
+    rng = random.Random(34)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {'id': user_id, 'email': f'plans-{user_id}@example.com', 'password_hash': 'x'}
+            for user_id in range(1, USERS + 1)
+        ])
+
+        price_rows = []
+        per_user = rows // (USERS * 4)
+        for user_id in range(1, USERS + 1):
+            for i in range(per_user):
+                timestamp = START + timedelta(minutes=5 * i)
+                for channel in ('general', 'feedIn'):
+                    for forecast in (False, True):
+                        # Forecast rows are for intervals ahead (nem_time is unique per user and channel)
+                        nem_time = timestamp + timedelta(days=365) if forecast else timestamp
+                        price_rows.append({
+                            'user_id': user_id, 'timestamp': timestamp, 'nem_time': nem_time,
+                            'channel_type': channel, 'forecast': forecast,
+                            'per_kwh': rng.uniform(-5, 60), 'spike_status': 'none',
+                        })
+        conn.execute(insert(PriceRecord), price_rows)
+
+        energy_rows = []
+        per_user = rows // USERS
+        for user_id in range(1, USERS + 1):
+            for i in range(per_user):
+                energy_rows.append({
+                    'user_id': user_id, 'timestamp': START + timedelta(minutes=i),
+                    'solar_power': rng.uniform(0, 8000), 'grid_power': rng.uniform(-5000, 5000),
+                    'battery_power': rng.uniform(-5000, 5000), 'load_power': rng.uniform(0, 6000),
+                    'battery_level': rng.uniform(0, 100),
+                })
+        conn.execute(insert(EnergyRecord), energy_rows)
+
+        rollup_rows = []
+        for user_id in range(1, USERS + 1):
+            for granularity, minutes in (('5min', 5), ('hour', 60), ('day', 1440)):
+                for i in range(per_user // minutes):
+                    rollup_rows.append({
+                        'user_id': user_id, 'granularity': granularity,
+                        'bucket_start': START + timedelta(minutes=minutes * i), 'sample_count': minutes,
+                    })
+        conn.execute(insert(EnergyRollup), rollup_rows)
+
+        ledger_rows = [
+            {'user_id': user_id, 'interval_start': START + timedelta(minutes=5 * i), 'covered_seconds': 300.0}
+            for user_id in range(1, USERS + 1)
+            for i in range(per_user // 5)
+        ]
+        conn.execute(insert(EnergyLedger), ledger_rows)
+        conn.execute(text('ANALYZE'))
+
+    print(f"Seeded {len(price_rows)} price records, {len(energy_rows)} energy records, "
+          f"{len(rollup_rows)} energy rollups and {len(ledger_rows)} ledger intervals")
+
+
+def explain(conn, statement) -> list:
+    """Query plan lines for a statement on the connection's dialect."""
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+    if conn.dialect.name == 'sqlite':
+        return [row[-1] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {compiled}'))]
+    return [row[0] for row in conn.execute(text(f'EXPLAIN {compiled}'))]
+
+
+def plan_problems(dialect: str, plan: list, index: str) -> list:
+    """Reasons the plan doesn't use the expected index the way the endpoint needs."""
+    problems = []
+    joined = '\n'.join(plan)
+    # Indexes of PostgreSQL partitions (app.partitioning) get generated names
+    partition_index = dialect == 'postgresql' and 'Index Scan using' in joined
+    if index not in joined and not partition_index:
+        problems.append(f"does not use {index}")
+    if dialect == 'sqlite':
+        if any(line.startswith('SCAN ') and 'USING' not in line for line in plan):
+            problems.append("full table scan")
+        if 'USE TEMP B-TREE' in joined:
+            problems.append("sorts with a temporary B-tree")
+    elif 'Seq Scan' in joined:
+        problems.append("sequential scan")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000, help='Approximate rows per table to seed (default 200000)')
+    parser.add_argument('--database-url', help='Check plans on an existing database instead of a seeded one')
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+        user_id, day_start = 1, datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix='powersync-plans-'), 'plans.db')
+        engine = create_engine(f'sqlite:///{path}')
+        db.metadata.create_all(engine)
+        seed(engine, args.rows)
+        user_id, day_start = 3, START + timedelta(days=60)
+
+    failures = 0
+    with engine.connect() as conn:
+        for label, statement, index in history_queries(user_id, day_start):
+            plan = explain(conn, statement)
+            problems = plan_problems(conn.dialect.name, plan, index)
+            failures += bool(problems)
+            print(f"{'FAIL' if problems else 'ok  '}  {label}: {'; '.join(problems) or index}")
+            for line in plan:
+                print(f"        {line}")
+
+    print(f"Query plans: {len(history_queries(user_id, day_start)) - failures} ok, {failures} failing")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Show, create or convert the monthly partitions of the PostgreSQL history tables.
+
+With HISTORY_PARTITIONING=monthly, price_record (on nem_time) and energy_record
+(on timestamp) are range-partitioned by month (app.partitioning): the migration
+converts them when it first runs, the nightly retention job adds the coming
+months' partitions and drops expired ones whole instead of deleting rows.
+
+--convert partitions the tables of a database that passed the migration before
+partitioning was enabled; --revert turns them back into plain tables. Both copy
+every row under an exclusive lock, so stop the app first.
+
+Usage:
+    python scripts/manage_history_partitions.py             # list partitions
+    python scripts/manage_history_partitions.py --ensure [--months-ahead 6]
+    python scripts/manage_history_partitions.py --convert
+    python scripts/manage_history_partitions.py --revert
+
+Uses DATABASE_URL (or the app's default database) unless --database-url is given.
+Run from the repository root.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from app import db  # noqa: E402
+from app.partitioning import (  # noqa: E402
+    MONTHS_AHEAD, PARTITIONED_TABLES, convert_to_partitioned, convert_to_plain, ensure_partitions,
+    is_partitioned, list_partitions,
+)
+from config import Config  # noqa: E402
+
+
+def print_partitions(conn):
+    for table, column in PARTITIONED_TABLES.items():
+        if not is_partitioned(conn, table):
+            print(f"{table}: not partitioned")
+            continue
+        print(f"{table}: partitioned by month on {column}")
+        for name, lower, upper in list_partitions(conn, table) + [(f'{table}_default', None, None)]:
+            rows = conn.execute(text(f'SELECT COUNT(*) FROM {name}')).scalar()
+            bounds = f"{lower:%Y-%m-%d} .. {upper:%Y-%m-%d}" if lower else 'default'
+            print(f"  {name:<28}{bounds:<26}{rows:>10} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--ensure', action='store_true', help='Create missing partitions up to --months-ahead')
+    action.add_argument('--convert', action='store_true', help='Partition the (plain) history tables')
+    action.add_argument('--revert', action='store_true', help='Turn partitioned history tables back into plain ones')
+    parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD, help=f'Default: {MONTHS_AHEAD}')
+    parser.add_argument('--database-url', help='Database to use (default: DATABASE_URL / app default)')
+    args = parser.parse_args()
+
+    # A bare app: create_app() would start the scheduler and WebSocket client
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url or Config.SQLALCHEMY_DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            sys.exit("History partitioning needs PostgreSQL")
+
+        with db.engine.begin() as conn:
+            for table in PARTITIONED_TABLES:
+                if args.convert:
+                    print(f"{table}: {'converted' if convert_to_partitioned(conn, table, args.months_ahead) else 'already partitioned'}")
+                elif args.revert:
+                    print(f"{table}: {'reverted' if convert_to_plain(conn, table) else 'not partitioned'}")
+                elif args.ensure and is_partitioned(conn, table):
+                    created = ensure_partitions(conn, table, args.months_ahead)
+                    print(f"{table}: created {', '.join(created) if created else 'nothing'}")
+
+        with db.engine.connect() as conn:
+            print_partitions(conn)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Record (or regenerate) the price forecast fixtures used by benchmark_tariff_suite.py.
+
+Fixtures live in scripts/fixtures/tariff/ as gzipped JSON:
+
+    {
+        "name": "amber_30min_qld",
+        "source": "amber" | "aemo",
+        "origin": "recorded" | "synthetic",
+        "recorded_at": "2025-01-15T14:07:00+10:00",
+        "timezone": "Australia/Brisbane",
+        "nem_region": "QLD1",
+        "resolution": 30,
+        "points": [...]
+    }
+
+recorded_at is the "now" the benchmark freezes the clock at, so conversions of a
+fixture are reproducible. Recorded points are anonymized: only the fields the
+converters read are kept (no site IDs, tariff information or renewables data).
+
+Usage:
+    # Record live Amber 5-min and 30-min forecasts for a site
+    python scripts/record_tariff_fixtures.py amber --token psk_... --site-id 01ABC... --region QLD1
+
+    # Record an AEMO pre-dispatch extract for a region
+    python scripts/record_tariff_fixtures.py aemo --region NSW1
+
+    # Regenerate the deterministic synthetic fixtures shipped with the repo
+    python scripts/record_tariff_fixtures.py synthetic
+
+Run from the repository root so the app package can be imported. After
+recording, refresh the goldens with: python scripts/benchmark_tariff_suite.py --update-golden
+"""
+
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('LOG_DIR', tempfile.mkdtemp(prefix='powersync-fixtures-'))
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'tariff')
+
+# Price point fields the converters read - everything else is dropped when recording
+KEPT_FIELDS = (
+    'type', 'duration', 'nemTime', 'startTime', 'endTime', 'channelType', 'perKwh',
+    'spotPerKwh', 'wholesaleKWHPrice', 'spikeStatus', 'descriptor', 'advancedPrice',
+)
+
+NEM_REGION_TIMEZONES = {
+    'NSW1': 'Australia/Sydney',
+    'VIC1': 'Australia/Melbourne',
+    'QLD1': 'Australia/Brisbane',
+    'SA1': 'Australia/Adelaide',
+    'TAS1': 'Australia/Hobart',
+}
+
+NEM_TZ = ZoneInfo('Australia/Brisbane')  # nemTime is always AEST (+10:00)
+
+
+def anonymize(points: list) -> list:
+    """Strip price points down to the fields the converters use."""
+    return [{key: point[key] for key in KEPT_FIELDS if key in point} for point in points]
+
+
+def write_fixture(name: str, source: str, origin: str, recorded_at: datetime, nem_region: str,
+                  resolution: int, points: list):
+    """Write one fixture file."""
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    fixture = {
+        'name': name,
+        'source': source,
+        'origin': origin,
+        'recorded_at': recorded_at.isoformat(),
+        'timezone': NEM_REGION_TIMEZONES.get(nem_region, 'Australia/Sydney'),
+        'nem_region': nem_region,
+        'resolution': resolution,
+        'points': points,
+    }
+    path = os.path.join(FIXTURE_DIR, f'{name}.json.gz')
+    # mtime=0 keeps regenerated files byte-identical
+    with gzip.GzipFile(path, 'wb', mtime=0) as f:
+        f.write(json.dumps(fixture, separators=(',', ':')).encode())
+    print(f"Wrote {path} ({len(points)} points)")
+
+
+def record_amber(token: str, site_id: str, region: str):
+    """Record live Amber forecasts at 5-min and 30-min resolution."""
+    from app.api_clients import AmberAPIClient
+
+    client = AmberAPIClient(token)
+    suffix = region[:-1].lower()
+    for resolution in (5, 30):
+        recorded_at = datetime.now(NEM_TZ)
+        forecast = client.get_price_forecast(site_id=site_id, next_hours=48, resolution=resolution)
+        if not forecast:
+            sys.exit(f"Failed to fetch {resolution}-min Amber forecast")
+        write_fixture(f'amber_{resolution}min_{suffix}', 'amber', 'recorded', recorded_at, region,
+                      resolution, anonymize(forecast))
+
+
+def record_aemo(region: str):
+    """Record a live AEMO pre-dispatch extract."""
+    from app.api_clients import AEMOAPIClient
+
+    recorded_at = datetime.now(NEM_TZ)
+    forecast = AEMOAPIClient().get_price_forecast(region, periods=96)
+    if not forecast:
+        sys.exit(f"Failed to fetch AEMO pre-dispatch forecast for {region}")
+    write_fixture(f'aemo_predispatch_{region.lower()}', 'aemo', 'recorded', recorded_at, region,
+                  30, anonymize(forecast))
+
+
+def _wholesale_shape(local_hour: float, rng: random.Random) -> float:
+    """Wholesale c/kWh for a time of day: negative solar trough, evening peak, noise."""
+    solar_trough = -9 * math.exp(-((local_hour - 12.5) / 2.2) ** 2)
+    evening_peak = 22 * math.exp(-((local_hour - 18.5) / 1.6) ** 2)
+    morning_peak = 6 * math.exp(-((local_hour - 7.5) / 1.2) ** 2)
+    return 7 + solar_trough + evening_peak + morning_peak + rng.gauss(0, 1.5)
+
+
+def synthetic_amber(recorded_at: datetime, resolution: int, tz: ZoneInfo, seed: int, hours: int = 48) -> list:
+    """Amber-shaped forecast: actuals, current interval and forecasts with advancedPrice."""
+    rng = random.Random(seed)
+    start = recorded_at.replace(minute=recorded_at.minute - recorded_at.minute % resolution, second=0, microsecond=0)
+    points = []
+
+    for i in range(-6, hours * 60 // resolution):
+        interval_end = start + timedelta(minutes=resolution * (i + 1))
+        local_end = interval_end.astimezone(tz)
+        local_hour = local_end.hour + local_end.minute / 60
+        wholesale = _wholesale_shape(local_hour, rng)
+
+        # One evening spike on the first day
+        spike_status = 'none'
+        if i >= 0 and 18.0 <= local_hour < 19.0 and interval_end - start < timedelta(hours=24):
+            wholesale += 120 + rng.uniform(0, 80)
+            spike_status = 'spike'
+        elif 17.5 <= local_hour < 20.0:
+            spike_status = 'potential' if rng.random() < 0.3 else 'none'
+
+        general = round(wholesale * 1.1 + 14.5, 2)
+        feed_in = round(-(wholesale * 0.95 - 0.8), 2)
+
+        if i < 0:
+            interval_type = 'ActualInterval'
+        elif i == 0:
+            interval_type = 'CurrentInterval'
+        else:
+            interval_type = 'ForecastInterval'
+
+        for channel, price in (('general', general), ('feedIn', feed_in)):
+            point = {
+                'type': interval_type,
+                'duration': resolution,
+                'nemTime': interval_end.astimezone(NEM_TZ).isoformat(),
+                'startTime': (interval_end - timedelta(minutes=resolution) + timedelta(seconds=1)).astimezone(ZoneInfo('UTC')).isoformat().replace('+00:00', 'Z'),
+                'endTime': interval_end.astimezone(ZoneInfo('UTC')).isoformat().replace('+00:00', 'Z'),
+                'channelType': channel,
+                'perKwh': price,
+                'spotPerKwh': round(wholesale, 2),
+                'spikeStatus': spike_status if channel == 'general' else 'none',
+                'descriptor': 'spike' if spike_status == 'spike' else ('low' if price < 10 else 'neutral'),
+            }
+            if interval_type == 'ForecastInterval':
+                spread = 0.08 + 0.02 * min(i, 96) / resolution
+                point['advancedPrice'] = {
+                    'low': round(price - abs(price) * spread, 2),
+                    'predicted': price,
+                    'high': round(price + abs(price) * spread, 2),
+                }
+            points.append(point)
+
+    return points
+
+
+def synthetic_aemo(recorded_at: datetime, seed: int, periods: int = 96) -> list:
+    """AEMO pre-dispatch extract in the Amber-compatible shape AEMOAPIClient returns."""
+    rng = random.Random(seed)
+    start = recorded_at.replace(minute=0 if recorded_at.minute < 30 else 30, second=0, microsecond=0)
+    points = []
+
+    for i in range(1, periods + 1):
+        period_end = start + timedelta(minutes=30 * i)
+        local_hour = period_end.hour + period_end.minute / 60
+        price_cents = round(_wholesale_shape(local_hour, rng), 5)
+        points.append({
+            'nemTime': period_end.isoformat(),
+            'perKwh': price_cents,
+            'channelType': 'general',
+            'type': 'ForecastInterval',
+            'duration': 30,
+        })
+        points.append({
+            'nemTime': period_end.isoformat(),
+            'perKwh': -price_cents,
+            'channelType': 'feedIn',
+            'type': 'ForecastInterval',
+            'duration': 30,
+        })
+
+    return points
+
+
+def write_synthetic():
+    """Regenerate the deterministic synthetic fixtures."""
+    qld = ZoneInfo('Australia/Brisbane')
+    nsw = ZoneInfo('Australia/Sydney')
+
+    # Summer weekday afternoon in QLD (no DST)
+    recorded_at = datetime(2025, 1, 15, 14, 7, tzinfo=qld)
+    write_fixture('amber_30min_qld', 'amber', 'synthetic', recorded_at, 'QLD1', 30,
+                  synthetic_amber(recorded_at, 30, qld, seed=30))
+    write_fixture('amber_5min_qld', 'amber', 'synthetic', recorded_at, 'QLD1', 5,
+                  synthetic_amber(recorded_at, 5, qld, seed=5))
+
+    # NSW evening spanning the end of daylight saving (6 April 2025, 03:00 AEDT -> 02:00 AEST)
+    recorded_at = datetime(2025, 4, 5, 19, 42, tzinfo=nsw)
+    write_fixture('amber_30min_nsw_dst', 'amber', 'synthetic', recorded_at, 'NSW1', 30,
+                  synthetic_amber(recorded_at, 30, nsw, seed=31))
+
+    # AEMO pre-dispatch for QLD1, weekend morning
+    recorded_at = datetime(2025, 1, 18, 9, 12, tzinfo=NEM_TZ)
+    write_fixture('aemo_predispatch_qld1', 'aemo', 'synthetic', recorded_at, 'QLD1', 30,
+                  synthetic_aemo(recorded_at, seed=96))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    amber = sub.add_parser('amber', help='Record live Amber forecasts')
+    amber.add_argument('--token', required=True, help='Amber API token')
+    amber.add_argument('--site-id', required=True, help='Amber site ID')
+    amber.add_argument('--region', default='QLD1', choices=sorted(NEM_REGION_TIMEZONES), help='NEM region of the site')
+
+    aemo = sub.add_parser('aemo', help='Record a live AEMO pre-dispatch extract')
+    aemo.add_argument('--region', default='QLD1', choices=sorted(NEM_REGION_TIMEZONES), help='NEM region')
+
+    sub.add_parser('synthetic', help='Regenerate the synthetic fixtures')
+
+    args = parser.parse_args()
+    if args.command == 'amber':
+        record_amber(args.token, args.site_id, args.region)
+    elif args.command == 'aemo':
+        record_aemo(args.region)
+    else:
+        write_synthetic()
+
+
+if __name__ == '__main__':
+    main()
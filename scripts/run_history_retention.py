@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Apply the history retention policy once, or report the history table sizes.
+
+Runs the same retention as the nightly scheduler job (app.retention): minute
+energy samples past the raw window are folded into the rollups and deleted,
+old rollups and price records are thinned, then the database is vacuumed or
+analyzed. Windows come from the HISTORY_RETENTION_* environment variables;
+with HISTORY_ARCHIVE_DIR set, whole months are archived before being deleted.
+
+Usage:
+    python scripts/run_history_retention.py --report
+    python scripts/run_history_retention.py [--max-seconds 600]
+    python scripts/run_history_retention.py --database-url sqlite:///data/app.db
+
+Uses DATABASE_URL (or the app's default database) unless --database-url is given.
+Run from the repository root.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask  # noqa: E402
+
+from app import db  # noqa: E402
+from app.cold_archive import archive_enabled, archive_size  # noqa: E402
+from app.retention import RetentionPolicy, run_retention, table_sizes  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def print_sizes(sizes):
+    for table, size in sizes.items():
+        rows = f"{size['rows']:>10} rows" if 'rows' in size else ' ' * 15
+        size_bytes = size.get('bytes')
+        on_disk = f"{size_bytes / 1e6:9.1f} MB" if size_bytes is not None else '        n/a'
+        extra = f"  ({size['free_bytes'] / 1e6:.1f} MB free)" if size.get('free_bytes') is not None else ''
+        print(f"  {table:<16}{rows}{on_disk}{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--report', action='store_true', help='Only report table sizes')
+    parser.add_argument('--max-seconds', type=float, help='Time budget (default: the nightly job\'s)')
+    parser.add_argument('--database-url', help='Database to use (default: DATABASE_URL / app default)')
+    args = parser.parse_args()
+
+    # A bare app: create_app() would start the scheduler and WebSocket client
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url or Config.SQLALCHEMY_DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        if args.report:
+            sizes = table_sizes()
+            if archive_enabled():
+                sizes['_archive'] = archive_size()
+            print_sizes(sizes)
+            return
+
+        policy = RetentionPolicy.from_env()
+        if args.max_seconds is not None:
+            policy.max_seconds = args.max_seconds
+        print(f"Policy: {policy}")
+
+        summary = run_retention(policy)
+        print(f"Energy samples: {summary['energy_record']}")
+        print(f"Energy rollups removed: {summary['energy_rollup']}")
+        print(f"Energy ledger intervals removed: {summary['energy_ledger']}")
+        print(f"Price records removed: {summary['price_record']}")
+        print(f"Archived: {summary['archive']}")
+        print(f"Database: {summary['maintenance']}")
+        if not summary['complete']:
+            print("Time budget reached - run again to continue")
+        print_sizes(summary['sizes'])
+
+
+if __name__ == '__main__':
+    main()